@@ -1,12 +1,16 @@
-from fastapi import Depends, HTTPException, status
-from fastapi.security import OAuth2PasswordBearer, HTTPBearer
+from fastapi import Depends, HTTPException, Request, status
+from fastapi.security import OAuth2PasswordBearer, HTTPBearer, APIKeyHeader
 from sqlalchemy.ext.asyncio import AsyncSession
-from backend.utils.database import get_db
+from backend.utils.database import get_db, read_router
 from backend.models.user import User
+from backend.services.message_writer import MessageWriter, message_writer
+from backend.services.embedders import Embedder
+from backend.services.embedding_service import EmbeddingService, embedding_service
 from openai import AsyncOpenAI
 from sqlalchemy.future import select
 from jose import JWTError, jwt
 import bcrypt
+import hmac
 import os
 from dotenv import load_dotenv
 from datetime import datetime, timedelta, timezone
@@ -21,6 +25,9 @@ security_scheme = HTTPBearer(
     description="Enter your JWT token in the format: Bearer <token>"
 )
 
+# Shared secret for operational endpoints, sent in the X-Admin-Token header
+admin_token_scheme = APIKeyHeader(name="X-Admin-Token", scheme_name="Admin Token", auto_error=False)
+
 SECRET_KEY = os.getenv("JWT_SECRET_KEY")
 ALGORITHM = os.getenv("JWT_ALGORITHM")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES"))
@@ -37,6 +44,18 @@ async def get_openai_client():
     finally:
         await client.close()
 
+# Dependency to get the embedder, the process-wide cached and batching service
+def get_embedder() -> Embedder:
+    return embedding_service
+
+# Dependency to get the embedding service itself, for its jobs and statistics
+def get_embedding_service() -> EmbeddingService:
+    return embedding_service
+
+# Dependency to get the message writer
+def get_message_writer() -> MessageWriter:
+    return message_writer
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return bcrypt.checkpw(plain_password.encode('utf-8'), hashed_password.encode('utf-8'))
 
@@ -76,4 +95,35 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession
     user = result.scalars().first()
     if user is None:
         raise credentials_exception
-    return user
\ No newline at end of file
+    # Lets writes on this session keep the user on the primary (read-your-writes)
+    db.info["user_id"] = user.id
+    return user
+
+async def get_read_db_session(
+    request: Request,
+    db: AsyncSession = Depends(get_db_session),
+    current_user: User = Depends(get_current_user),
+):
+    """
+    Dependency to get a session for read-only handlers.
+
+    Yields a read replica session when replicas are configured, the user has not
+    written recently and the replica's lag is within bounds; otherwise the
+    request's primary session. Clients can force the primary with the
+    ``X-Read-Consistency: primary`` header.
+    """
+    replica = None
+    if request.headers.get("x-read-consistency", "").lower() != "primary":
+        replica = await read_router.pick(current_user.id)
+    if replica is None:
+        yield db
+        return
+    async with replica.session_factory() as session:
+        session.info["replica"] = True
+        yield session
+
+def require_admin(token: str = Depends(admin_token_scheme)) -> None:
+    """Allow the request only if it carries the configured ADMIN_TOKEN."""
+    admin_token = os.getenv("ADMIN_TOKEN")
+    if not admin_token or not token or not hmac.compare_digest(token, admin_token):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin token required")
\ No newline at end of file
@@ -0,0 +1,186 @@
+from backend.api.schemas.admin import (
+    AgentCacheStats, CacheCounters, EmbeddingBackfillJobResponse, EmbeddingStats, ModelHealthResponse, ProfileInfo,
+    PoolStats, ReplicaStatus, ToolStats
+)
+from backend.api.dependencies import get_db_session, get_embedding_service, require_admin
+from backend.models.embedding import EmbeddingBackfillJob
+from backend.services.agent_cache import agent_cache
+from backend.services.embedding_service import EmbeddingService, create_backfill_job, set_backfill_status
+from backend.services.model_router import model_router
+from backend.services.tool_service import tool_call_stats, tool_results
+from backend.utils.profiling import list_profiles, profile_path, render_profile
+from backend.utils.database import get_pool_stats, read_router
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import FileResponse, PlainTextResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from dataclasses import asdict
+from typing import List
+
+router = APIRouter(prefix="/admin", tags=["Admin"], dependencies=[Depends(require_admin)])
+
+@router.get("/profiles", response_model=List[ProfileInfo])
+async def get_profiles():
+    """
+    List the stored request profiles, newest first.
+
+    Returns:
+        List[ProfileInfo]: Name, size and creation time of each pstats artifact
+    """
+    return list_profiles()
+
+@router.get("/profiles/{name}")
+async def download_profile(name: str, format: str = "pstats", sort: str = "cumulative", limit: int = 50):
+    """
+    Download a stored profile.
+
+    Args:
+        name (str): Artifact name as listed by ``/admin/profiles`` or returned in ``X-Profile-Id``
+        format (str): ``pstats`` for the raw artifact or ``text`` for a rendered summary
+        sort (str): pstats sort key for the text summary
+        limit (int): Number of entries in the text summary
+
+    Returns:
+        FileResponse | PlainTextResponse: The artifact or its summary
+
+    Raises:
+        HTTPException: 404 if the profile does not exist
+    """
+    path = profile_path(name)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    if format == "text":
+        return PlainTextResponse(render_profile(path, sort, limit))
+    return FileResponse(path, media_type="application/octet-stream", filename=name)
+
+@router.get("/db/pool", response_model=PoolStats)
+async def get_db_pool_stats():
+    """
+    Report live statistics of the primary engine's connection pool.
+
+    Returns:
+        PoolStats: Pool size, checked out and overflow connections and checkout wait times
+    """
+    return get_pool_stats()
+
+@router.get("/db/replicas", response_model=List[ReplicaStatus])
+async def get_db_replicas():
+    """
+    Report the configured read replicas with their last observed lag and pool statistics.
+
+    Returns:
+        List[ReplicaStatus]: One entry per replica, empty when none are configured
+    """
+    return read_router.status()
+
+
+@router.get("/models", response_model=List[ModelHealthResponse])
+async def get_model_health():
+    """
+    Report the rolling call statistics this worker routes chat models by.
+
+    Health is shown without an agent's latency target, only the error rate counts.
+
+    Returns:
+        List[ModelHealthResponse]: Calls, error rate and latency percentiles per model in the window
+    """
+    return [
+        {**asdict(health), "healthy": model_router.is_healthy(health)}
+        for health in model_router.stats()
+    ]
+
+@router.get("/cache/agents", response_model=AgentCacheStats)
+async def get_agent_cache_stats():
+    """
+    Report this worker's agent and session cache.
+
+    The lag figures are the time from a change in another worker to its
+    invalidation here, per delivery path; the poll lag bounds how long a changed
+    agent can be served stale.
+
+    Returns:
+        AgentCacheStats: Hit rates, invalidations and invalidation delays
+    """
+    return agent_cache.stats()
+
+@router.get("/cache/tools", response_model=CacheCounters)
+async def get_tool_cache_stats():
+    """
+    Report this worker's cache of deterministic tool results.
+
+    Returns:
+        CacheCounters: Entries, hits and misses
+    """
+    return tool_results.stats()
+
+@router.get("/tools", response_model=List[ToolStats])
+async def get_tool_stats(hours: float = Query(24, gt=0, le=24 * 30), db: AsyncSession = Depends(get_db_session)):
+    """
+    Report the recorded tool calls of all workers per tool, slowest first.
+
+    Args:
+        hours (float): Window of calls to include
+        db (AsyncSession): Database session dependency
+
+    Returns:
+        List[ToolStats]: Calls, errors, timeouts, cache hits and latency per tool
+    """
+    return await tool_call_stats(db, hours)
+
+@router.get("/embeddings/stats", response_model=EmbeddingStats)
+async def get_embedding_stats(service: EmbeddingService = Depends(get_embedding_service)):
+    """
+    Report this worker's embedding service counters.
+
+    Returns:
+        EmbeddingStats: Texts requested, answered from the cache or coalesced, and upstream batches
+    """
+    return service.stats()
+
+@router.post("/embeddings/backfill", response_model=EmbeddingBackfillJobResponse)
+async def start_embedding_backfill(
+    db: AsyncSession = Depends(get_db_session),
+    service: EmbeddingService = Depends(get_embedding_service),
+):
+    """
+    Queue a job embedding every existing message with the configured embedder.
+
+    Returns:
+        EmbeddingBackfillJobResponse: The new job, picked up by the next backfill run
+    """
+    return await create_backfill_job(db, service.name)
+
+@router.get("/embeddings/backfill", response_model=List[EmbeddingBackfillJobResponse])
+async def list_embedding_backfills(db: AsyncSession = Depends(get_db_session)):
+    """
+    List the backfill jobs, newest first.
+
+    Returns:
+        List[EmbeddingBackfillJobResponse]: Status and checkpoint of each job
+    """
+    result = await db.execute(select(EmbeddingBackfillJob).order_by(EmbeddingBackfillJob.id.desc()))
+    return result.scalars().all()
+
+@router.post("/embeddings/backfill/{job_id}/{action}", response_model=EmbeddingBackfillJobResponse)
+async def control_embedding_backfill(job_id: int, action: str, db: AsyncSession = Depends(get_db_session)):
+    """
+    Pause or resume a backfill job.
+
+    Args:
+        job_id (int): Job to change
+        action (str): ``pause`` or ``resume``; a resumed job continues from its checkpoint
+
+    Returns:
+        EmbeddingBackfillJobResponse: The updated job
+
+    Raises:
+        HTTPException: 404 if the job or action does not exist, 409 if a completed job is resumed
+    """
+    statuses = {"pause": "paused", "resume": "pending"}
+    job = await db.get(EmbeddingBackfillJob, job_id)
+    if job is None or action not in statuses:
+        raise HTTPException(status_code=404, detail="Backfill job not found")
+    if job.status == "completed":
+        raise HTTPException(status_code=409, detail="Backfill job already completed")
+    await set_backfill_status(db, job, statuses[action])
+    return job
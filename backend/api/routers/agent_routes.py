@@ -1,11 +1,16 @@
 from backend.models.user import User
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Header
 from sqlalchemy.ext.asyncio import AsyncSession
 from backend.models.agent import Agent
-from backend.api.schemas import AgentCreate, AgentUpdate, AgentResponse
-from backend.api.dependencies import get_current_user, get_db_session, security_scheme
+from backend.api.schemas import AgentCreate, AgentModelSettings, AgentUpdate, AgentResponse
+from backend.api.dependencies import get_current_user, get_db_session, get_read_db_session, security_scheme
 from sqlalchemy.future import select
-from typing import List
+from backend.services.agent_cache import AGENT, publish_invalidation
+from backend.services.purge_service import remove_agent, remove_audio_files
+from backend.services.versioning_service import bump_agents_version, bump_sessions_version, get_user_versions
+from backend.utils.etag import cache_headers, etag_matches, make_etag, not_modified
+from backend.utils.serialization import AGENT_COLUMNS, column_keys, json_response, rows_to_dicts
+from typing import List, Optional
 
 router = APIRouter(prefix="/agents", tags=["Agents"])
 
@@ -20,7 +25,7 @@ async def create_agent(
     Create a new agent in the database.
     
     Args:
-        agent (AgentCreate): The agent data containing name and prompt
+        agent (AgentCreate): The agent data containing name, prompt and optional model settings
         db (AsyncSession): Database session dependency
         current_user (User): Current authenticated user
         token (str): JWT Bearer token
@@ -31,7 +36,8 @@ async def create_agent(
     Raises:
         HTTPException: If there's an error during database operations
     """
-    db_agent = Agent(name=agent.name, prompt=agent.prompt, user_id=current_user.id)
+    version = await bump_agents_version(db, current_user.id)
+    db_agent = Agent(**agent.model_dump(), user_id=current_user.id, version=version)
     db.add(db_agent)
     await db.commit()
     await db.refresh(db_agent)
@@ -39,15 +45,25 @@ async def create_agent(
 
 @router.get("/", response_model=List[AgentResponse])
 async def list_agents(
-    db: AsyncSession = Depends(get_db_session),
+    since: Optional[int] = None,
+    if_none_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_read_db_session),
     current_user: User = Depends(get_current_user),
     token: str = Depends(security_scheme)
 ):
     """
     Retrieve all agents from the database.
+
+    The response carries a weak ETag and the list version in ``X-Version``; a
+    matching ``If-None-Match`` returns 304 without querying the agents. With
+    ``since=<version>`` only the agents changed after that version are returned,
+    as ``{"version", "items", "ids"}`` where ``ids`` lists every remaining agent
+    so the client can drop deleted ones.
     
     Args:
-        db (AsyncSession): Database session dependency
+        since (Optional[int]): Version previously returned in ``X-Version``
+        if_none_match (Optional[str]): ETag previously returned by this endpoint
+        db (AsyncSession): Read-only database session dependency (may be a replica)
         current_user (User): Current authenticated user
         token (str): JWT Bearer token
         
@@ -57,13 +73,28 @@ async def list_agents(
     Raises:
         HTTPException: If there's an error during database operations
     """
-    result = await db.execute(select(Agent).where(Agent.user_id == current_user.id))
-    return result.scalars().all()
+    # Read the version from the same session as the data so they stay consistent on a replica
+    version, _ = await get_user_versions(db, current_user)
+    etag = make_etag("a", current_user.id, version, since)
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag, version)
+
+    # Fast path: Core rows encoded with orjson, no per-object response validation
+    live = (Agent.user_id == current_user.id, Agent.deleted_at.is_(None))
+    query = select(*AGENT_COLUMNS).where(*live)
+    if since is None:
+        result = await db.execute(query)
+        return json_response(rows_to_dicts(result, column_keys(AGENT_COLUMNS)), headers=cache_headers(etag, version))
+
+    result = await db.execute(query.where(Agent.version > since))
+    items = rows_to_dicts(result, column_keys(AGENT_COLUMNS))
+    ids = (await db.execute(select(Agent.id).where(*live))).scalars().all()
+    return json_response({"version": version, "items": items, "ids": ids}, headers=cache_headers(etag, version))
 
 @router.get("/{agent_id}", response_model=AgentResponse)
 async def get_agent(
     agent_id: int, 
-    db: AsyncSession = Depends(get_db_session),
+    db: AsyncSession = Depends(get_read_db_session),
     current_user: User = Depends(get_current_user),
     token: str = Depends(security_scheme)
 ):
@@ -72,7 +103,7 @@ async def get_agent(
     
     Args:
         agent_id (int): The unique identifier of the agent
-        db (AsyncSession): Database session dependency
+        db (AsyncSession): Read-only database session dependency (may be a replica)
         current_user (User): Current authenticated user
         token (str): JWT Bearer token
         
@@ -82,7 +113,7 @@ async def get_agent(
     Raises:
         HTTPException: 404 if agent is not found, or other database errors
     """
-    result = await db.execute(select(Agent).where(Agent.id == agent_id, Agent.user_id == current_user.id))
+    result = await db.execute(select(Agent).where(Agent.id == agent_id, Agent.user_id == current_user.id, Agent.deleted_at.is_(None)))
     agent = result.scalar_one_or_none()
     if agent is None:
         raise HTTPException(status_code=404, detail="Agent not found")
@@ -101,7 +132,7 @@ async def update_agent(
     
     Args:
         agent_id (int): The unique identifier of the agent to update
-        agent (AgentUpdate): The updated agent data (name and/or prompt)
+        agent (AgentUpdate): The updated agent data (name, prompt and/or model settings)
         db (AsyncSession): Database session dependency
         current_user (User): Current authenticated user
         token (str): JWT Bearer token
@@ -112,7 +143,7 @@ async def update_agent(
     Raises:
         HTTPException: 404 if agent is not found, or other database errors
     """
-    result = await db.execute(select(Agent).where(Agent.id == agent_id, Agent.user_id == current_user.id))
+    result = await db.execute(select(Agent).where(Agent.id == agent_id, Agent.user_id == current_user.id, Agent.deleted_at.is_(None)))
     db_agent = result.scalar_one_or_none()
     if db_agent is None:
         raise HTTPException(status_code=404, detail="Agent not found")
@@ -121,6 +152,11 @@ async def update_agent(
         db_agent.name = agent.name
     if agent.prompt is not None:
         db_agent.prompt = agent.prompt
+    # Model settings sent as null go back to the deployment default
+    for field, value in agent.model_dump(include=set(AgentModelSettings.model_fields), exclude_unset=True).items():
+        setattr(db_agent, field, value)
+    db_agent.version = await bump_agents_version(db, current_user.id)
+    await publish_invalidation(db, AGENT, agent_id)
     
     await db.commit()
     await db.refresh(db_agent)
@@ -129,15 +165,20 @@ async def update_agent(
 @router.delete("/{agent_id}", response_model=AgentResponse)
 async def delete_agent(
     agent_id: int, 
+    background_tasks: BackgroundTasks,
     db: AsyncSession = Depends(get_db_session),
     current_user: User = Depends(get_current_user),
     token: str = Depends(security_scheme)
 ):
     """
     Delete an agent from the database.
+
+    Sessions and messages are removed by the database cascade, or later by the
+    purger when soft delete is enabled. Audio files are removed in the background.
     
     Args:
         agent_id (int): The unique identifier of the agent to delete
+        background_tasks (BackgroundTasks): Runs the audio file cleanup after the response
         db (AsyncSession): Database session dependency
         current_user (User): Current authenticated user
         token (str): JWT Bearer token
@@ -148,11 +189,15 @@ async def delete_agent(
     Raises:
         HTTPException: 404 if agent is not found, or other database errors
     """
-    result = await db.execute(select(Agent).where(Agent.id == agent_id, Agent.user_id == current_user.id))
+    result = await db.execute(select(Agent).where(Agent.id == agent_id, Agent.user_id == current_user.id, Agent.deleted_at.is_(None)))
     db_agent = result.scalar_one_or_none()
     if db_agent is None:
         raise HTTPException(status_code=404, detail="Agent not found")
     
-    await db.delete(db_agent)
+    audio_urls = await remove_agent(db, db_agent)
+    # The agent's sessions go with it
+    await bump_agents_version(db, current_user.id)
+    await bump_sessions_version(db, current_user.id)
     await db.commit()
+    background_tasks.add_task(remove_audio_files, audio_urls)
     return db_agent
\ No newline at end of file
@@ -0,0 +1,54 @@
+from backend.api.schemas.chat import BatchMessageRequest
+from backend.api.dependencies import (
+    get_current_user, get_db_session, get_embedder, get_message_writer, get_openai_client, security_scheme
+)
+from backend.models.user import User
+from backend.services.batch_service import BATCH_MAX_ITEMS, run_batch
+from backend.services.embedders import Embedder
+from backend.services.message_writer import MessageWriter
+from backend.utils.serialization import ORJSON_OPTIONS
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from openai import AsyncOpenAI
+import orjson
+
+router = APIRouter(prefix="/batch", tags=["Sessions"])
+
+@router.post("/messages")
+async def send_batch_messages(
+    batch: BatchMessageRequest,
+    db: AsyncSession = Depends(get_db_session),
+    client: AsyncOpenAI = Depends(get_openai_client),
+    embedder: Embedder = Depends(get_embedder),
+    writer: MessageWriter = Depends(get_message_writer),
+    current_user: User = Depends(get_current_user),
+    token: str = Depends(security_scheme)
+):
+    """
+    Send many messages, each to an existing session or to a new session of an agent.
+
+    The completions run concurrently; the response is NDJSON with one
+    ``BatchMessageResult`` line per item, in the order the items finish. Items for
+    the same session are answered in request order. See ``batch_service``.
+    Args:
+        batch (BatchMessageRequest): The items, at most BATCH_MAX_ITEMS
+        db (AsyncSession): Database session dependency
+        client (AsyncOpenAI): OpenAI client dependency
+        embedder (Embedder): Embeds the questions for knowledge retrieval
+        writer (MessageWriter): Stores the finished turns
+        current_user (User): Current authenticated user
+        token (str): JWT Bearer token
+    Returns:
+        StreamingResponse: NDJSON results as they complete
+    Raises:
+        HTTPException: 422 if the batch is empty or too large
+    """
+    if not batch.items or len(batch.items) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=422, detail=f"A batch holds 1 to {BATCH_MAX_ITEMS} items")
+
+    async def lines():
+        async for result in run_batch(db, client, embedder, writer, current_user.id, batch.items):
+            yield orjson.dumps(result, option=ORJSON_OPTIONS | orjson.OPT_APPEND_NEWLINE)
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
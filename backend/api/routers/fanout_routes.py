@@ -0,0 +1,58 @@
+from backend.api.schemas.chat import FanOutRequest
+from backend.api.dependencies import (
+    get_current_user, get_db_session, get_embedder, get_message_writer, get_openai_client, security_scheme
+)
+from backend.models.user import User
+from backend.services.embedders import Embedder
+from backend.services.fanout_service import FANOUT_MAX_AGENTS, prepare_fanout, run_fanout
+from backend.services.message_writer import MessageWriter
+from backend.utils.serialization import ORJSON_OPTIONS
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from openai import AsyncOpenAI
+import orjson
+
+router = APIRouter(prefix="/fanout", tags=["Sessions"])
+
+@router.post("/messages")
+async def send_fanout_message(
+    request: FanOutRequest,
+    db: AsyncSession = Depends(get_db_session),
+    client: AsyncOpenAI = Depends(get_openai_client),
+    embedder: Embedder = Depends(get_embedder),
+    writer: MessageWriter = Depends(get_message_writer),
+    current_user: User = Depends(get_current_user),
+    token: str = Depends(security_scheme)
+):
+    """
+    Send one message to several agents and stream their replies as they are generated.
+
+    Each agent answers in its most recent session, or a new one with
+    ``new_sessions``. The response is NDJSON with one ``FanOutEvent`` per line:
+    reply pieces of all agents interleaved, then each agent's stored message. An
+    aggregator agent answers last, given the other replies. See ``fanout_service``.
+    Args:
+        request (FanOutRequest): The message, the agents and the optional aggregator
+        db (AsyncSession): Database session dependency
+        client (AsyncOpenAI): OpenAI client dependency
+        embedder (Embedder): Embeds the question for knowledge retrieval
+        writer (MessageWriter): Stores the finished turns
+        current_user (User): Current authenticated user
+        token (str): JWT Bearer token
+    Returns:
+        StreamingResponse: NDJSON events as the replies arrive
+    Raises:
+        HTTPException: 404 if an agent is not found, 422 if no or too many agents are given
+    """
+    if not request.agent_ids or len(set(request.agent_ids)) > FANOUT_MAX_AGENTS:
+        raise HTTPException(status_code=422, detail=f"A fan-out goes to 1 to {FANOUT_MAX_AGENTS} agents")
+    fanout = await prepare_fanout(
+        db, current_user.id, request.content, request.agent_ids, request.new_sessions, request.aggregator_agent_id
+    )
+
+    async def lines():
+        async for event in run_fanout(db, client, embedder, writer, current_user.id, fanout):
+            yield orjson.dumps(event, option=ORJSON_OPTIONS | orjson.OPT_APPEND_NEWLINE)
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
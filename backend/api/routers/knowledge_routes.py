@@ -0,0 +1,145 @@
+from typing import List
+from backend.api.schemas.knowledge import (
+    KnowledgeDocumentCreate, KnowledgeDocumentResponse, KnowledgeSearchResponse
+)
+from backend.services.embedders import Embedder
+from backend.services.knowledge_service import KNOWLEDGE_TOP_K, add_document, remove_document, retrieve
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from backend.models.agent import Agent
+from backend.models.knowledge import KnowledgeDocument
+from backend.models.user import User
+from backend.api.dependencies import get_current_user, get_db_session, get_embedder, security_scheme
+from sqlalchemy.future import select
+from dataclasses import asdict
+import logging
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/agents", tags=["Knowledge"])
+
+async def _owned_agent(db: AsyncSession, agent_id: int, user: User) -> Agent:
+    result = await db.execute(
+        select(Agent).filter(Agent.id == agent_id, Agent.user_id == user.id, Agent.deleted_at.is_(None))
+    )
+    agent = result.scalars().first()
+    if not agent:
+        raise HTTPException(status_code=404, detail="Agent not found or not owned by user")
+    return agent
+
+@router.post("/{agent_id}/documents", response_model=KnowledgeDocumentResponse)
+async def create_document(
+    agent_id: int,
+    document: KnowledgeDocumentCreate,
+    db: AsyncSession = Depends(get_db_session),
+    embedder: Embedder = Depends(get_embedder),
+    current_user: User = Depends(get_current_user),
+    token: str = Depends(security_scheme)
+):
+    """
+    Add a document to an agent's knowledge base.
+
+    The document is split into chunks which are embedded in batches; from the next
+    message on, the chunks most relevant to each question are sent to the model
+    together with the agent's prompt.
+    Args:
+        agent_id (int): The ID of the agent
+        document (KnowledgeDocumentCreate): Title and text of the document
+        db (AsyncSession): Database session dependency
+        embedder (Embedder): Embeds the chunks
+        current_user (User): Current authenticated user
+        token (str): JWT Bearer token
+    Returns:
+        KnowledgeDocumentResponse: The stored document and its number of chunks
+    Raises:
+        HTTPException: If the agent does not exist or embedding the document fails
+    """
+    agent = await _owned_agent(db, agent_id, current_user)
+    try:
+        return await add_document(db, agent, document.title, document.content, embedder)
+    except Exception as e:
+        await db.rollback()
+        logger.error(f"Error adding document to agent {agent_id}: {e}")
+        raise HTTPException(status_code=400, detail="Failed to add document. Please try again.")
+
+@router.get("/{agent_id}/documents", response_model=List[KnowledgeDocumentResponse])
+async def list_documents(
+    agent_id: int,
+    db: AsyncSession = Depends(get_db_session),
+    current_user: User = Depends(get_current_user),
+    token: str = Depends(security_scheme)
+):
+    """
+    List the documents of an agent's knowledge base.
+    Args:
+        agent_id (int): The ID of the agent
+        db (AsyncSession): Database session dependency
+        current_user (User): Current authenticated user
+        token (str): JWT Bearer token
+    Returns:
+        List[KnowledgeDocumentResponse]: The agent's documents, oldest first
+    Raises:
+        HTTPException: If the agent does not exist
+    """
+    await _owned_agent(db, agent_id, current_user)
+    result = await db.execute(
+        select(KnowledgeDocument).filter(KnowledgeDocument.agent_id == agent_id).order_by(KnowledgeDocument.id)
+    )
+    return result.scalars().all()
+
+@router.delete("/{agent_id}/documents/{document_id}", status_code=204)
+async def delete_document(
+    agent_id: int,
+    document_id: int,
+    db: AsyncSession = Depends(get_db_session),
+    current_user: User = Depends(get_current_user),
+    token: str = Depends(security_scheme)
+):
+    """
+    Remove a document and its chunks from an agent's knowledge base.
+    Args:
+        agent_id (int): The ID of the agent
+        document_id (int): The ID of the document
+        db (AsyncSession): Database session dependency
+        current_user (User): Current authenticated user
+        token (str): JWT Bearer token
+    Raises:
+        HTTPException: If the agent or the document does not exist
+    """
+    agent = await _owned_agent(db, agent_id, current_user)
+    result = await db.execute(
+        select(KnowledgeDocument).filter(KnowledgeDocument.id == document_id, KnowledgeDocument.agent_id == agent_id)
+    )
+    document = result.scalars().first()
+    if not document:
+        raise HTTPException(status_code=404, detail="Document not found")
+    await remove_document(db, agent, document)
+
+@router.get("/{agent_id}/knowledge/search", response_model=KnowledgeSearchResponse)
+async def search_knowledge(
+    agent_id: int,
+    q: str = Query(..., min_length=1, max_length=2000),
+    k: int = Query(KNOWLEDGE_TOP_K, ge=1, le=50),
+    db: AsyncSession = Depends(get_db_session),
+    embedder: Embedder = Depends(get_embedder),
+    current_user: User = Depends(get_current_user),
+    token: str = Depends(security_scheme)
+):
+    """
+    Show which chunks of an agent's knowledge base would be used for a question.
+    Args:
+        agent_id (int): The ID of the agent
+        q (str): The question
+        k (int): Number of chunks to return
+        db (AsyncSession): Database session dependency
+        embedder (Embedder): Embeds the question
+        current_user (User): Current authenticated user
+        token (str): JWT Bearer token
+    Returns:
+        KnowledgeSearchResponse: The closest chunks, best first
+    Raises:
+        HTTPException: If the agent does not exist
+    """
+    agent = await _owned_agent(db, agent_id, current_user)
+    chunks = await retrieve(db, agent, q, embedder, k=k, min_score=float("-inf"))
+    return {"items": [asdict(chunk) for chunk in chunks]}
@@ -0,0 +1,45 @@
+from typing import Optional
+from backend.api.schemas.search import MessageSearchPage
+from backend.services.search_service import search_messages
+from backend.utils.serialization import json_response
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from backend.models.user import User
+from backend.api.dependencies import get_read_db_session, get_current_user, security_scheme
+
+router = APIRouter(prefix="/search", tags=["Search"])
+
+@router.get("/messages", response_model=MessageSearchPage)
+async def search_user_messages(
+    q: str = Query(..., min_length=1, max_length=256),
+    agent_id: Optional[int] = None,
+    session_id: Optional[int] = None,
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_read_db_session),
+    current_user: User = Depends(get_current_user),
+    token: str = Depends(security_scheme)
+):
+    """
+    Search the content of the current user's messages, best matches first.
+
+    Uses the full-text index (a GIN-indexed ``tsvector`` on Postgres, FTS5 on SQLite).
+    On Postgres ``q`` accepts web search syntax (``"exact phrase"``, ``or``, ``-word``);
+    on SQLite all words must match. Pass ``next_cursor`` of a page as ``cursor`` to get
+    the next one.
+    Args:
+        q (str): The search text
+        agent_id (Optional[int]): Only search the sessions of this agent
+        session_id (Optional[int]): Only search this session
+        limit (int): Page size, 1 to 100
+        cursor (Optional[str]): ``next_cursor`` of the previous page
+        db (AsyncSession): Read-only database session dependency (may be a replica)
+        current_user (User): Current authenticated user
+        token (str): JWT Bearer token
+    Returns:
+        MessageSearchPage: The matching messages with highlighted snippets and the cursor of the next page
+    Raises:
+        HTTPException: If the cursor is invalid
+    """
+    page = await search_messages(db, current_user.id, q, agent_id, session_id, limit, cursor)
+    return json_response(page)
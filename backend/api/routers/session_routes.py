@@ -1,14 +1,35 @@
 from typing import List, Optional
-from backend.api.schemas.chat import MessageCreate, MessageResponse, MessageResponseWithAgent, VoiceResponse
+from backend.api.schemas.chat import (
+    BranchCreate, ChatSessionOverviewPage, MessageCreate, MessageResponse, MessageResponseWithAgent, VoiceResponse
+)
 from backend.services.openai_service import generate_chat_response, generate_voice_response, transcribe_audio
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
+from backend.services.agent_cache import agent_cache
+from backend.services.archive_service import archived_messages, restore_session
+from backend.services.branch_service import create_branch, history_query, lineage, load_history
+from backend.services.purge_service import remove_audio_files, remove_session
+from backend.services.idempotency_service import request_fingerprint, run_idempotent
+from backend.services.embedders import Embedder
+from backend.services.message_writer import MessageWriter, Usage
+from backend.services.tool_service import record_tool_calls
+from backend.services.versioning_service import bump_sessions_version, get_user_versions
+from backend.utils.etag import cache_headers, etag_matches, make_etag, not_modified
+from backend.utils.pagination import decode_cursor, encode_cursor
+from backend.utils.serialization import (
+    MESSAGE_COLUMNS, SESSION_COLUMNS, SESSION_OVERVIEW_COLUMNS, column_keys, json_response, rows_to_dicts
+)
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Header, Query, UploadFile, File
 from sqlalchemy.ext.asyncio import AsyncSession
 from backend.models.agent import Agent
 from backend.models.chat import ChatSession, Message
 from backend.models.user import User
 from backend.api.schemas import ChatSessionCreate, ChatSessionResponse
-from backend.api.dependencies import get_db_session, get_openai_client, get_current_user, security_scheme
+from backend.api.dependencies import (
+    get_db_session, get_read_db_session, get_embedder, get_openai_client, get_current_user, get_message_writer,
+    security_scheme
+)
 from sqlalchemy.future import select
+from sqlalchemy import and_, func, or_
+from datetime import datetime
 from openai import AsyncOpenAI
 import aiofiles
 import os
@@ -19,17 +40,45 @@ logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/sessions", tags=["Sessions"])
 
+async def _create_session(
+    session: ChatSessionCreate,
+    db: AsyncSession,
+    current_user: User,
+):
+    try:
+        result = await db.execute(select(Agent).filter(Agent.id == session.agent_id, Agent.user_id == current_user.id, Agent.deleted_at.is_(None)))
+        if not result.scalars().first():
+            raise HTTPException(status_code=404, detail="Agent not found or not owned by user")
+        version = await bump_sessions_version(db, current_user.id)
+        db_session = ChatSession(agent_id=session.agent_id, version=version)
+        db.add(db_session)
+        await db.commit()
+        await db.refresh(db_session)
+        return db_session
+    except HTTPException:
+        raise
+    except Exception as e:
+        await db.rollback()
+        logger.error(f"Error creating session: {e}")
+        raise HTTPException(status_code=400, detail="Failed to create session. Please try again.")
+
+
 @router.post("/", response_model=ChatSessionResponse)
 async def create_session(
     session: ChatSessionCreate, 
+    idempotency_key: Optional[str] = Header(None),
     db: AsyncSession = Depends(get_db_session),
     current_user: User = Depends(get_current_user),
     token: str = Depends(security_scheme)
 ):
     """
     Create a new chat session for an agent.
+
+    With an ``Idempotency-Key`` header a retried request returns the stored
+    response of the first one instead of running again, see ``run_idempotent``.
     Args:
         session (ChatSessionCreate): The session data containing agent_id
+        idempotency_key (Optional[str]): Makes retries of this request safe
         db (AsyncSession): Database session dependency
         current_user (User): Current authenticated user
         token (str): JWT Bearer token
@@ -38,39 +87,107 @@ async def create_session(
     Raises:
         HTTPException: If the agent does not exist or if there's an error during database operations
     """
+    return await run_idempotent(
+        db,
+        current_user.id,
+        idempotency_key,
+        request_fingerprint("create_session", session.agent_id),
+        lambda: _create_session(session, db, current_user),
+        ChatSessionResponse,
+    )
+
+
+async def _send_message(
+    session_id: int,
+    message: MessageCreate,
+    db: AsyncSession,
+    client: AsyncOpenAI,
+    embedder: Embedder,
+    writer: MessageWriter,
+    current_user: User,
+):
     try:
-        result = await db.execute(select(Agent).filter(Agent.id == session.agent_id, Agent.user_id == current_user.id))
-        if not result.scalars().first():
-            raise HTTPException(status_code=404, detail="Agent not found or not owned by user")
-        db_session = ChatSession(agent_id=session.agent_id)
-        db.add(db_session)
-        await db.commit()
-        await db.refresh(db_session)
-        return db_session
+        # Verify the session exists and belongs to the user, from the agent cache
+        session = await agent_cache.get_session(db, session_id)
+        if session is None or session.user_id != current_user.id:
+            raise HTTPException(status_code=404, detail="Session not found")
+        if session.archived:
+            await restore_session(db, session_id)
+            await db.commit()
+
+        # Get the previous messages in the session for context, those of the sessions it
+        # branched from included. Read before the new message is written, so the history
+        # does not depend on the write mode.
+        openai_messages = await load_history(db, session_id, branched=session.parent_session_id is not None)
+
+        # Save user message
+        await writer.add(db, {"session_id": session_id, "content": message.content, "is_user": True}, user_id=current_user.id)
+
+        # Add the new user message to the context
+        openai_messages.append({"role": "user", "content": message.content})
+
+        logger.info(f"Sending message to OpenAI for session {session_id}: {openai_messages}")
+
+        # Generate and save agent response
+        completion = await generate_chat_response(client, db, session_id, openai_messages, embedder)
+
+        # Agent details for response and usage accounting
+        agent = await agent_cache.get_agent(db, session.agent_id)
+
+        # Save agent response message together with its usage counters
+        agent_message = await writer.add(
+            db,
+            {
+                "session_id": session_id,
+                "content": completion.content,
+                "is_user": False,
+                "model": completion.model,
+                "prompt_tokens": completion.prompt_tokens,
+                "completion_tokens": completion.completion_tokens,
+                "latency_ms": completion.latency_ms,
+                "ttft_ms": completion.ttft_ms,
+            },
+            user_id=current_user.id,
+            usage=Usage(agent.user_id, agent.id, completion),
+        )
+        if completion.tool_calls:
+            await record_tool_calls(db, session_id, agent.id, agent_message["id"], completion.tool_calls)
+            await db.commit()
+
+        return {**agent_message, "agent_name": agent.name}
     except HTTPException:
         raise
     except Exception as e:
         await db.rollback()
-        logger.error(f"Error creating session: {e}")
-        raise HTTPException(status_code=400, detail="Failed to create session. Please try again.")
+        logger.error(f"Error sending message to session {session_id}: {e}")
+        raise HTTPException(status_code=400, detail="Failed to send message. Please try again.")
 
 
 @router.post("/{session_id}/messages", response_model=MessageResponseWithAgent)
 async def send_message(
     session_id: int,
     message: MessageCreate,
+    idempotency_key: Optional[str] = Header(None),
     db: AsyncSession = Depends(get_db_session),
     client: AsyncOpenAI = Depends(get_openai_client),
+    embedder: Embedder = Depends(get_embedder),
+    writer: MessageWriter = Depends(get_message_writer),
     current_user: User = Depends(get_current_user),
     token: str = Depends(security_scheme)
 ):
     """
     Send a message to a chat session and receive a response from the agent.
+
+    With an ``Idempotency-Key`` header a retried request returns the stored
+    response of the first one instead of running again, see ``run_idempotent``.
     Args:
         session_id (int): The ID of the chat session
         message (MessageCreate): The message to send
+        idempotency_key (Optional[str]): Makes retries of this request safe
         db (AsyncSession): Database session dependency
         client (AsyncOpenAI): OpenAI client dependency
+        embedder (Embedder): Embeds the question for knowledge retrieval
+        writer (MessageWriter): Persists the messages according to MESSAGE_WRITE_MODE
         current_user (User): Current authenticated user
         token (str): JWT Bearer token
     Returns:
@@ -78,79 +195,36 @@ async def send_message(
     Raises:
         HTTPException: If the session does not exist or if there's an error during database operations
     """
-    try:
-        # Verify session exists
-        result = await db.execute(select(ChatSession).filter(ChatSession.id == session_id))
-        session = result.scalars().first()
-        if not session:
-            raise HTTPException(status_code=404, detail="Session not found")
-
-        # Save user message
-        user_message = Message(session_id=session_id, content=message.content, is_user=True)
-        db.add(user_message)
-        await db.commit()
-        await db.refresh(user_message)
-
-        # Get all messages in the session for context
-        result = await db.execute(select(Message).filter(Message.session_id == session_id).order_by(Message.created_at))
-        messages = result.scalars().all()
-        if not messages:
-            raise HTTPException(status_code=404, detail="No messages found in session")
-        
-        # Prepare messages for OpenAI API
-        openai_messages = []
-        for msg in messages:
-            if msg.is_user:
-                openai_messages.append({"role": "user", "content": msg.content})
-            else:
-                openai_messages.append({"role": "assistant", "content": msg.content})
-        
-        # Add the new user message to the context
-        openai_messages.append({"role": "user", "content": message.content})
-
-        logger.info(f"Sending message to OpenAI for session {session_id}: {openai_messages}")
-
-        # Generate and save agent response
-        agent_response_content = await generate_chat_response(client, db, session_id, openai_messages)
-
-        # Save agent response message
-        agent_message = Message(session_id=session_id, content=agent_response_content, is_user=False)
-        db.add(agent_message)
-        await db.commit()
-        await db.refresh(agent_message)
-
-        # Fetch agent details for response
-        result = await db.execute(select(Agent).filter(Agent.id == session.agent_id))
-        agent = result.scalars().first()
-
-        return {
-            "id": agent_message.id,
-            "session_id": agent_message.session_id,
-            "content": agent_message.content,
-            "is_user": agent_message.is_user,
-            "created_at": agent_message.created_at,
-            "agent_name": agent.name
-        }
-    except HTTPException:
-        raise
-    except Exception as e:
-        await db.rollback()
-        logger.error(f"Error sending message to session {session_id}: {e}")
-        raise HTTPException(status_code=400, detail="Failed to send message. Please try again.")
+    return await run_idempotent(
+        db,
+        current_user.id,
+        idempotency_key,
+        request_fingerprint("send_message", session_id, message.content),
+        lambda: _send_message(session_id, message, db, client, embedder, writer, current_user),
+        MessageResponseWithAgent,
+    )
 
 
 @router.get("/{session_id}/messages", response_model=List[MessageResponse])
 async def get_messages(
     session_id: int, 
-    db: AsyncSession = Depends(get_db_session),
+    since: Optional[int] = None,
+    if_none_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_read_db_session),
     current_user: User = Depends(get_current_user),
     token: str = Depends(security_scheme)
 ):
     """
     Retrieve all messages from a chat session.
+
+    Conditional GET is supported through a weak ETag on the session's message
+    version (also sent as ``X-Version``). With ``since=<version>`` only the messages
+    added after that version are returned, as ``{"version", "items"}``.
     Args:
         session_id (int): The ID of the chat session
-        db (AsyncSession): Database session dependency
+        since (Optional[int]): Version previously returned in ``X-Version``
+        if_none_match (Optional[str]): ETag previously returned by this endpoint
+        db (AsyncSession): Read-only database session dependency (may be a replica)
         current_user (User): Current authenticated user
         token (str): JWT Bearer token
     Returns:
@@ -159,16 +233,31 @@ async def get_messages(
         HTTPException: If the session does not exist or if there's an error during database operations
     """
     try:
-        result = await db.execute(select(ChatSession).filter(ChatSession.id == session_id))
-        if not result.scalars().first():
-            raise HTTPException(status_code=404, detail="Session not found")
-
-        # Retrieve messages for the session
         result = await db.execute(
-            select(Message).filter(Message.session_id == session_id).order_by(Message.created_at)
+            select(ChatSession.messages_version, ChatSession.archived_at)
+            .filter(ChatSession.id == session_id, ChatSession.deleted_at.is_(None))
         )
-        messages = result.scalars().all()
-        return messages
+        row = result.first()
+        if row is None:
+            raise HTTPException(status_code=404, detail="Session not found")
+        version = row.messages_version
+        etag = make_etag("m", session_id, version, since)
+        if etag_matches(if_none_match, etag):
+            return not_modified(etag, version)
+
+        if row.archived_at is not None:
+            # Cold session, its messages live in one compressed archive blob
+            items = await archived_messages(db, session_id, since)
+        else:
+            # Retrieve messages for the session as Core rows and encode them with orjson,
+            # skipping per-message response model validation
+            query = select(*MESSAGE_COLUMNS).filter(Message.session_id == session_id)
+            if since is not None:
+                query = query.filter(Message.version > since)
+            result = await db.execute(query.order_by(Message.created_at))
+            items = rows_to_dicts(result, column_keys(MESSAGE_COLUMNS))
+        payload = items if since is None else {"version": version, "items": items}
+        return json_response(payload, headers=cache_headers(etag, version))
     except HTTPException:
         raise
     except Exception as e:
@@ -176,43 +265,125 @@ async def get_messages(
         raise HTTPException(status_code=400, detail="Failed to retrieve messages. Please try again.")
 
 
-import os
-import uuid
-from pathlib import Path
-import aiofiles
-from fastapi import HTTPException, UploadFile, File, Depends
-from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
-
-@router.post("/{session_id}/voice", response_model=VoiceResponse)
-async def send_voice_message(
+@router.post("/{session_id}/branches", response_model=ChatSessionResponse)
+async def branch_session(
     session_id: int,
-    audio: bytes = File(...),
+    branch: BranchCreate,
     db: AsyncSession = Depends(get_db_session),
-    client: AsyncOpenAI = Depends(get_openai_client),
     current_user: User = Depends(get_current_user),
     token: str = Depends(security_scheme)
 ):
     """
-    Send a voice message (as binary) to a chat session and receive a response from the agent.
+    Fork a chat session at one of its messages into a new session of the same agent.
+
+    The branch starts with the session's history up to and including ``message_id``,
+    which may also be a message the session inherits from its own parent. Nothing is
+    copied: the branch points at its parent, see ``branch_service``.
     Args:
-        session_id (int): The ID of the chat session
-        audio (bytes): The audio file content as binary
+        session_id (int): The ID of the chat session to fork
+        branch (BranchCreate): The message to fork at
         db (AsyncSession): Database session dependency
-        client (AsyncOpenAI): OpenAI client dependency
         current_user (User): Current authenticated user
         token (str): JWT Bearer token
     Returns:
-        VoiceResponse: The response message and audio URL from the agent
+        ChatSessionResponse: The new branch
     Raises:
-        HTTPException: If the session does not exist or if there's an error during processing
+        HTTPException: If the session or the message does not exist or if there's an error during database operations
+    """
+    session = await agent_cache.get_session(db, session_id)
+    if session is None or session.user_id != current_user.id:
+        raise HTTPException(status_code=404, detail="Session not found")
+    try:
+        db_session = await create_branch(db, current_user.id, session_id, branch.message_id)
+        await db.commit()
+        await db.refresh(db_session)
+        return db_session
+    except HTTPException:
+        await db.rollback()
+        raise
+    except Exception as e:
+        await db.rollback()
+        logger.error(f"Error branching session {session_id}: {e}")
+        raise HTTPException(status_code=400, detail="Failed to create branch. Please try again.")
+
+
+@router.get("/{session_id}/history", response_model=List[MessageResponse])
+async def get_history(
+    session_id: int,
+    if_none_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_read_db_session),
+    current_user: User = Depends(get_current_user),
+    token: str = Depends(security_scheme)
+):
+    """
+    Retrieve the full history of a chat session, the messages it inherits as a branch included.
+
+    The inherited part never changes, so the weak ETag follows the session's own
+    message version like ``GET /sessions/{id}/messages``.
+    Args:
+        session_id (int): The ID of the chat session
+        if_none_match (Optional[str]): ETag previously returned by this endpoint
+        db (AsyncSession): Read-only database session dependency (may be a replica)
+        current_user (User): Current authenticated user
+        token (str): JWT Bearer token
+    Returns:
+        list[MessageResponse]: The messages of the session's ancestors up to the forks, then its own
+    Raises:
+        HTTPException: If the session does not exist or if there's an error during database operations
     """
     try:
-        # Verify session exists
-        result = await db.execute(select(ChatSession).filter(ChatSession.id == session_id))
-        session = result.scalars().first()
-        if not session:
+        result = await db.execute(
+            select(ChatSession.messages_version, ChatSession.archived_at)
+            .join(Agent, Agent.id == ChatSession.agent_id)
+            .filter(ChatSession.id == session_id, ChatSession.deleted_at.is_(None), Agent.user_id == current_user.id)
+        )
+        row = result.first()
+        if row is None:
+            raise HTTPException(status_code=404, detail="Session not found")
+        version = row.messages_version
+        etag = make_etag("h", session_id, version)
+        if etag_matches(if_none_match, etag):
+            return not_modified(etag, version)
+
+        result = await db.execute(history_query(lineage([session_id]), *MESSAGE_COLUMNS))
+        items = rows_to_dicts(result, column_keys(MESSAGE_COLUMNS))
+        if row.archived_at is not None:
+            # Ancestors with live branches are never archived, only the session's own messages can be
+            items += await archived_messages(db, session_id)
+        return json_response(items, headers=cache_headers(etag, version))
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error retrieving history for session {session_id}: {e}")
+        raise HTTPException(status_code=400, detail="Failed to retrieve history. Please try again.")
+
+
+import os
+import uuid
+from pathlib import Path
+import aiofiles
+from fastapi import HTTPException, UploadFile, File, Depends
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select
+
+async def _send_voice_message(
+    session_id: int,
+    audio: bytes,
+    db: AsyncSession,
+    client: AsyncOpenAI,
+    embedder: Embedder,
+    writer: MessageWriter,
+    current_user: User,
+):
+    try:
+        # Verify the session exists and belongs to the user, from the agent cache
+        session = await agent_cache.get_session(db, session_id)
+        if session is None or session.user_id != current_user.id:
             raise HTTPException(status_code=404, detail="Session not found")
+        if session.archived:
+            await restore_session(db, session_id)
+            await db.commit()
+        agent = await agent_cache.get_agent(db, session.agent_id)
 
         # Create static directory if it doesn't exist
         static_dir = Path("backend/static")
@@ -235,7 +406,7 @@ async def send_voice_message(
 
         # Transcribe audio to text
         try:
-            user_message_text = await transcribe_audio(client, str(user_audio_filepath))
+            user_message_text = await transcribe_audio(client, str(user_audio_filepath), agent.stt_model)
         except Exception as e:
             logger.error(f"Transcription failed for session {session_id}: {e}")
             try:
@@ -244,30 +415,15 @@ async def send_voice_message(
                 pass
             raise HTTPException(status_code=400, detail="Failed to transcribe audio. Please try again.")
 
+        # Get the previous messages in the session for context, before the new one is written
+        openai_messages = await load_history(db, session_id, branched=session.parent_session_id is not None)
+
         # Save transcribed user message with audio_url
-        user_message = Message(
-            session_id=session_id, 
-            content=user_message_text, 
-            is_user=True, 
-            audio_url=user_audio_url
+        user_message = await writer.add(
+            db,
+            {"session_id": session_id, "content": user_message_text, "is_user": True, "audio_url": user_audio_url},
+            user_id=current_user.id,
         )
-        db.add(user_message)
-        await db.commit()
-        await db.refresh(user_message)
-
-        # Get all messages in the session for context
-        result = await db.execute(select(Message).filter(Message.session_id == session_id).order_by(Message.created_at))
-        messages = result.scalars().all()
-        if not messages:
-            raise HTTPException(status_code=404, detail="No messages found in session")
-
-        # Prepare messages for OpenAI API
-        openai_messages = []
-        for msg in messages:
-            if msg.is_user:
-                openai_messages.append({"role": "user", "content": msg.content})
-            else:
-                openai_messages.append({"role": "assistant", "content": msg.content})
 
         # Add the new user message to the context
         openai_messages.append({"role": "user", "content": user_message_text})
@@ -275,12 +431,15 @@ async def send_voice_message(
         logger.info(f"Sending voice message to OpenAI for session {session_id}: {openai_messages}")
 
         # Generate text response
-        agent_response_content = await generate_chat_response(client, db, session_id, openai_messages)
+        completion = await generate_chat_response(client, db, session_id, openai_messages, embedder)
+        agent_response_content = completion.content
 
         # Generate voice response
         agent_audio_url = None
         try:
-            agent_audio_filename = await generate_voice_response(client, agent_response_content, session_id)
+            agent_audio_filename = await generate_voice_response(
+                client, agent_response_content, session_id, agent.tts_model, agent.tts_voice
+            )
             if agent_audio_filename:
                 filename_only = Path(agent_audio_filename).name
                 agent_audio_url = f"/static/{filename_only}"
@@ -288,15 +447,25 @@ async def send_voice_message(
             logger.error(f"Voice generation failed for session {session_id}: {e}")
 
         # Save agent response message with audio_url
-        agent_message = Message(
-            session_id=session_id, 
-            content=agent_response_content, 
-            is_user=False, 
-            audio_url=agent_audio_url
+        agent_message = await writer.add(
+            db,
+            {
+                "session_id": session_id,
+                "content": agent_response_content,
+                "is_user": False,
+                "audio_url": agent_audio_url,
+                "model": completion.model,
+                "prompt_tokens": completion.prompt_tokens,
+                "completion_tokens": completion.completion_tokens,
+                "latency_ms": completion.latency_ms,
+                "ttft_ms": completion.ttft_ms,
+            },
+            user_id=current_user.id,
+            usage=Usage(agent.user_id, agent.id, completion),
         )
-        db.add(agent_message)
-        await db.commit()
-        await db.refresh(agent_message)
+        if completion.tool_calls:
+            await record_tool_calls(db, session_id, agent.id, agent_message["id"], completion.tool_calls)
+            await db.commit()
 
         return {
             "user_message": user_message,
@@ -311,17 +480,64 @@ async def send_voice_message(
         logger.error(f"Error processing voice message for session {session_id}: {e}")
         raise HTTPException(status_code=400, detail="Failed to process voice message. Please try again.")
 
+
+@router.post("/{session_id}/voice", response_model=VoiceResponse)
+async def send_voice_message(
+    session_id: int,
+    audio: bytes = File(...),
+    idempotency_key: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_db_session),
+    client: AsyncOpenAI = Depends(get_openai_client),
+    embedder: Embedder = Depends(get_embedder),
+    writer: MessageWriter = Depends(get_message_writer),
+    current_user: User = Depends(get_current_user),
+    token: str = Depends(security_scheme)
+):
+    """
+    Send a voice message (as binary) to a chat session and receive a response from the agent.
+
+    With an ``Idempotency-Key`` header a retried request returns the stored
+    response of the first one instead of running again, see ``run_idempotent``.
+    Args:
+        session_id (int): The ID of the chat session
+        audio (bytes): The audio file content as binary
+        idempotency_key (Optional[str]): Makes retries of this request safe
+        db (AsyncSession): Database session dependency
+        client (AsyncOpenAI): OpenAI client dependency
+        embedder (Embedder): Embeds the question for knowledge retrieval
+        writer (MessageWriter): Persists the messages according to MESSAGE_WRITE_MODE
+        current_user (User): Current authenticated user
+        token (str): JWT Bearer token
+    Returns:
+        VoiceResponse: The response message and audio URL from the agent
+    Raises:
+        HTTPException: If the session does not exist or if there's an error during processing
+    """
+    return await run_idempotent(
+        db,
+        current_user.id,
+        idempotency_key,
+        request_fingerprint("send_voice_message", session_id, audio),
+        lambda: _send_voice_message(session_id, audio, db, client, embedder, writer, current_user),
+        VoiceResponse,
+    )
+
 @router.delete("/{session_id}", status_code=204)
 async def delete_session(
     session_id: int, 
+    background_tasks: BackgroundTasks,
     db: AsyncSession = Depends(get_db_session),
     current_user: User = Depends(get_current_user),
     token: str = Depends(security_scheme)
 ):
     """
     Delete a chat session and all associated messages.
+
+    Messages are removed by the database cascade, or later by the purger when soft
+    delete is enabled. Audio files are removed in the background.
     Args:
         session_id (int): The ID of the chat session to delete
+        background_tasks (BackgroundTasks): Runs the audio file cleanup after the response
         db (AsyncSession): Database session dependency
         current_user (User): Current authenticated user
         token (str): JWT Bearer token
@@ -331,27 +547,40 @@ async def delete_session(
         HTTPException: If the session does not exist or if there's an error during deletion
     """
     # Verify session exists
-    result = await db.execute(select(ChatSession).filter(ChatSession.id == session_id))
+    result = await db.execute(select(ChatSession).filter(ChatSession.id == session_id, ChatSession.deleted_at.is_(None)))
     db_session = result.scalars().first()
     if not db_session:
         raise HTTPException(status_code=404, detail="Session not found")
 
-    # Delete session (messages are deleted via cascade)
-    await db.delete(db_session)
+    # Delete session (messages are deleted by the database cascade)
+    result = await db.execute(select(Agent.user_id).filter(Agent.id == db_session.agent_id))
+    owner_id = result.scalar_one()
+    audio_urls = await remove_session(db, db_session)
+    await bump_sessions_version(db, owner_id)
     await db.commit()
+    background_tasks.add_task(remove_audio_files, audio_urls)
 
 @router.get("/", response_model=List[ChatSessionResponse])
 async def list_sessions(
     agent_id: Optional[int] = None, 
-    db: AsyncSession = Depends(get_db_session),
+    since: Optional[int] = None,
+    if_none_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_read_db_session),
     current_user: User = Depends(get_current_user),
     token: str = Depends(security_scheme)
 ):
     """
-    List all chat sessions, optionally filtered by agent_id.
+    List the current user's chat sessions, optionally filtered by agent_id.
+
+    Conditional GET is supported through a weak ETag on the user's session list
+    version (also sent as ``X-Version``). With ``since=<version>`` only the sessions
+    changed after that version are returned, as ``{"version", "items", "ids"}``
+    where ``ids`` lists every remaining session so deleted ones can be dropped.
     Args:
         agent_id (Optional[int]): The ID of the agent to filter sessions by
-        db (AsyncSession): Database session dependency
+        since (Optional[int]): Version previously returned in ``X-Version``
+        if_none_match (Optional[str]): ETag previously returned by this endpoint
+        db (AsyncSession): Read-only database session dependency (may be a replica)
         current_user (User): Current authenticated user
         token (str): JWT Bearer token
     Returns:
@@ -359,10 +588,83 @@ async def list_sessions(
     Raises:
         HTTPException: If there's an error during database operations
     """
-    # Retrieve sessions, optionally filtered by agent_id
-    query = select(ChatSession)
+    _, version = await get_user_versions(db, current_user)
+    etag = make_etag("s", current_user.id, version, agent_id, since)
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag, version)
+
+    # Retrieve the user's sessions, optionally filtered by agent_id. The list is scoped
+    # to the owner so that the per-user version covers every row it contains.
+    owned = ChatSession.agent_id.in_(select(Agent.id).filter(Agent.user_id == current_user.id))
+    owned = owned & ChatSession.deleted_at.is_(None)
+    query = select(*SESSION_COLUMNS).filter(owned)
+    if agent_id is not None:
+        query = query.filter(ChatSession.agent_id == agent_id)
+    if since is None:
+        result = await db.execute(query.order_by(ChatSession.created_at))
+        return json_response(rows_to_dicts(result, column_keys(SESSION_COLUMNS)), headers=cache_headers(etag, version))
+
+    result = await db.execute(query.filter(ChatSession.version > since).order_by(ChatSession.created_at))
+    items = rows_to_dicts(result, column_keys(SESSION_COLUMNS))
+    ids_query = select(ChatSession.id).filter(owned)
+    if agent_id is not None:
+        ids_query = ids_query.filter(ChatSession.agent_id == agent_id)
+    ids = (await db.execute(ids_query)).scalars().all()
+    return json_response({"version": version, "items": items, "ids": ids}, headers=cache_headers(etag, version))
+
+
+@router.get("/overview", response_model=ChatSessionOverviewPage)
+async def list_session_overview(
+    agent_id: Optional[int] = None,
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_read_db_session),
+    current_user: User = Depends(get_current_user),
+    token: str = Depends(security_scheme)
+):
+    """
+    List the current user's sessions with their message count and last message, most recently active first.
+
+    The counts and previews are kept on ``chat_sessions`` by the message writer, so a
+    page is a single query joining the owning agents, independent of the number of
+    messages and also covering archived sessions. Pages are keyset-paginated on
+    ``(last activity, id)``; pass ``next_cursor`` of a page as ``cursor`` to get the next.
+    Args:
+        agent_id (Optional[int]): The ID of the agent to filter sessions by
+        limit (int): Page size, 1 to 100
+        cursor (Optional[str]): ``next_cursor`` of the previous page
+        db (AsyncSession): Read-only database session dependency (may be a replica)
+        current_user (User): Current authenticated user
+        token (str): JWT Bearer token
+    Returns:
+        ChatSessionOverviewPage: The sessions of this page and the cursor of the next one
+    Raises:
+        HTTPException: If the cursor is invalid
+    """
+    # Sessions without messages count as active when they were created
+    activity = func.coalesce(ChatSession.last_message_at, ChatSession.created_at)
+    query = (
+        select(*SESSION_OVERVIEW_COLUMNS, activity.label("activity"))
+        .join(Agent, Agent.id == ChatSession.agent_id)
+        .filter(Agent.user_id == current_user.id, Agent.deleted_at.is_(None), ChatSession.deleted_at.is_(None))
+    )
     if agent_id is not None:
         query = query.filter(ChatSession.agent_id == agent_id)
-    result = await db.execute(query.order_by(ChatSession.created_at))
-    sessions = result.scalars().all()
-    return sessions
\ No newline at end of file
+    if cursor is not None:
+        after, after_id = decode_cursor(cursor, 2)
+        try:
+            after = datetime.fromisoformat(after)
+        except (TypeError, ValueError):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        if not isinstance(after_id, int):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        query = query.filter(or_(activity < after, and_(activity == after, ChatSession.id < after_id)))
+    result = await db.execute(query.order_by(activity.desc(), ChatSession.id.desc()).limit(limit + 1))
+    rows = result.all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].activity.isoformat(), rows[-1].id)
+    items = rows_to_dicts(rows, column_keys(SESSION_OVERVIEW_COLUMNS))
+    return json_response({"items": items, "next_cursor": next_cursor})
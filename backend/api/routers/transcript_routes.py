@@ -0,0 +1,160 @@
+from typing import AsyncIterator, Optional
+from backend.api.schemas.transcript import TranscriptImportResponse
+from backend.services.transcript_service import (
+    export_transcripts, gunzip_chunks, gzip_chunks, import_transcripts, ndjson_records
+)
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from backend.models.agent import Agent
+from backend.models.chat import ChatSession
+from backend.models.user import User
+from backend.api.dependencies import get_db_session, get_read_db_session, get_current_user, security_scheme
+from sqlalchemy.future import select
+import logging
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/transcripts", tags=["Transcripts"])
+
+def _export_response(chunks: AsyncIterator[bytes], name: str, gzip: bool) -> StreamingResponse:
+    if gzip:
+        return StreamingResponse(
+            gzip_chunks(chunks),
+            media_type="application/gzip",
+            headers={"Content-Disposition": f'attachment; filename="{name}.ndjson.gz"'},
+        )
+    return StreamingResponse(
+        chunks,
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="{name}.ndjson"'},
+    )
+
+@router.get("/")
+async def export_user_transcripts(
+    gzip: bool = False,
+    db: AsyncSession = Depends(get_read_db_session),
+    current_user: User = Depends(get_current_user),
+    token: str = Depends(security_scheme)
+):
+    """
+    Stream all of the current user's agents, sessions and messages as NDJSON.
+
+    The rows are read through server-side cursors and sent as they are fetched, so
+    exports of any size run in constant memory.
+    Args:
+        gzip (bool): Send the export gzip-compressed
+        db (AsyncSession): Read-only database session dependency (may be a replica)
+        current_user (User): Current authenticated user
+        token (str): JWT Bearer token
+    Returns:
+        StreamingResponse: The NDJSON transcript
+    """
+    return _export_response(export_transcripts(db, current_user.id), f"user-{current_user.id}", gzip)
+
+@router.get("/agents/{agent_id}")
+async def export_agent_transcripts(
+    agent_id: int,
+    gzip: bool = False,
+    db: AsyncSession = Depends(get_read_db_session),
+    current_user: User = Depends(get_current_user),
+    token: str = Depends(security_scheme)
+):
+    """
+    Stream an agent and all of its sessions and messages as NDJSON.
+    Args:
+        agent_id (int): The ID of the agent
+        gzip (bool): Send the export gzip-compressed
+        db (AsyncSession): Read-only database session dependency (may be a replica)
+        current_user (User): Current authenticated user
+        token (str): JWT Bearer token
+    Returns:
+        StreamingResponse: The NDJSON transcript
+    Raises:
+        HTTPException: If the agent does not exist or is not owned by the user
+    """
+    result = await db.execute(
+        select(Agent.id).filter(Agent.id == agent_id, Agent.user_id == current_user.id, Agent.deleted_at.is_(None))
+    )
+    if result.scalar_one_or_none() is None:
+        raise HTTPException(status_code=404, detail="Agent not found")
+    return _export_response(export_transcripts(db, current_user.id, agent_id=agent_id), f"agent-{agent_id}", gzip)
+
+@router.get("/sessions/{session_id}")
+async def export_session_transcript(
+    session_id: int,
+    gzip: bool = False,
+    db: AsyncSession = Depends(get_read_db_session),
+    current_user: User = Depends(get_current_user),
+    token: str = Depends(security_scheme)
+):
+    """
+    Stream one session, its agent and its messages as NDJSON.
+    Args:
+        session_id (int): The ID of the chat session
+        gzip (bool): Send the export gzip-compressed
+        db (AsyncSession): Read-only database session dependency (may be a replica)
+        current_user (User): Current authenticated user
+        token (str): JWT Bearer token
+    Returns:
+        StreamingResponse: The NDJSON transcript
+    Raises:
+        HTTPException: If the session does not exist or is not owned by the user
+    """
+    result = await db.execute(
+        select(ChatSession.id)
+        .join(Agent, Agent.id == ChatSession.agent_id)
+        .filter(ChatSession.id == session_id, ChatSession.deleted_at.is_(None), Agent.user_id == current_user.id)
+    )
+    if result.scalar_one_or_none() is None:
+        raise HTTPException(status_code=404, detail="Session not found")
+    return _export_response(export_transcripts(db, current_user.id, session_id=session_id), f"session-{session_id}", gzip)
+
+@router.post("/import", response_model=TranscriptImportResponse)
+async def import_user_transcripts(
+    request: Request,
+    agent_id: Optional[int] = None,
+    db: AsyncSession = Depends(get_db_session),
+    current_user: User = Depends(get_current_user),
+    token: str = Depends(security_scheme)
+):
+    """
+    Import an NDJSON transcript, as produced by the export endpoints, for the current user.
+
+    The request body is parsed while it is uploaded and may be gzip-compressed
+    (``Content-Encoding: gzip`` or ``Content-Type: application/gzip``). Messages are
+    written in batches, the whole import is one transaction.
+    Args:
+        request (Request): The request whose body is the transcript
+        agent_id (Optional[int]): Attach all sessions to this agent instead of creating the exported agents
+        db (AsyncSession): Database session dependency
+        current_user (User): Current authenticated user
+        token (str): JWT Bearer token
+    Returns:
+        TranscriptImportResponse: The number of imported agents, sessions and messages
+    Raises:
+        HTTPException: If the agent does not exist, a line of the transcript is invalid or it decompresses too large
+    """
+    if agent_id is not None:
+        result = await db.execute(
+            select(Agent.id).filter(Agent.id == agent_id, Agent.user_id == current_user.id, Agent.deleted_at.is_(None))
+        )
+        if result.scalar_one_or_none() is None:
+            raise HTTPException(status_code=404, detail="Agent not found")
+
+    chunks = request.stream()
+    compressed = (
+        request.headers.get("content-encoding", "").lower() == "gzip"
+        or request.headers.get("content-type", "").lower() == "application/gzip"
+    )
+    if compressed:
+        chunks = gunzip_chunks(chunks)
+    try:
+        return await import_transcripts(db, current_user.id, ndjson_records(chunks), agent_id)
+    except HTTPException:
+        await db.rollback()
+        raise
+    except Exception as e:
+        await db.rollback()
+        logger.error(f"Error importing transcript for user {current_user.id}: {e}")
+        raise HTTPException(status_code=400, detail="Failed to import transcript. Please try again.")
@@ -0,0 +1,84 @@
+from backend.models.user import User
+from backend.models.usage import UserDailyUsage, AgentDailyUsage
+from backend.api.schemas.usage import UsageResponse, AgentUsageResponse
+from backend.api.dependencies import get_current_user, get_read_db_session, security_scheme
+from fastapi import APIRouter, Depends
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from datetime import date, datetime, timezone
+from typing import Optional
+
+router = APIRouter(prefix="/usage", tags=["Usage"])
+
+def _usage_payload(row, day: date) -> dict:
+    if row is None:
+        return {"day": day}
+    return {
+        "day": row.day,
+        "turns": row.turns,
+        "prompt_tokens": row.prompt_tokens,
+        "completion_tokens": row.completion_tokens,
+        "latency_ms_total": row.latency_ms_total,
+        "ttft_ms_total": row.ttft_ms_total,
+        "avg_latency_ms": row.latency_ms_total / row.turns if row.turns else None,
+        "avg_ttft_ms": row.ttft_ms_total / row.turns if row.turns else None,
+    }
+
+@router.get("/daily", response_model=UsageResponse)
+async def get_user_daily_usage(
+    day: Optional[date] = None,
+    db: AsyncSession = Depends(get_read_db_session),
+    current_user: User = Depends(get_current_user),
+    token: str = Depends(security_scheme)
+):
+    """
+    Retrieve the current user's token and latency counters for one day.
+
+    The counters are maintained incrementally on every assistant turn, so this is
+    a single lookup on the ``(user_id, day)`` unique key.
+
+    Args:
+        day (Optional[date]): The day to read, defaults to today (UTC)
+        db (AsyncSession): Read-only database session dependency (may be a replica)
+        current_user (User): Current authenticated user
+        token (str): JWT Bearer token
+
+    Returns:
+        UsageResponse: The aggregated counters, zeroed if there was no traffic
+    """
+    day = day or datetime.now(timezone.utc).date()
+    result = await db.execute(
+        select(UserDailyUsage).where(UserDailyUsage.user_id == current_user.id, UserDailyUsage.day == day)
+    )
+    return _usage_payload(result.scalar_one_or_none(), day)
+
+@router.get("/agents/{agent_id}/daily", response_model=AgentUsageResponse)
+async def get_agent_daily_usage(
+    agent_id: int,
+    day: Optional[date] = None,
+    db: AsyncSession = Depends(get_read_db_session),
+    current_user: User = Depends(get_current_user),
+    token: str = Depends(security_scheme)
+):
+    """
+    Retrieve token and latency counters of one of the current user's agents for one day.
+
+    Args:
+        agent_id (int): The unique identifier of the agent
+        day (Optional[date]): The day to read, defaults to today (UTC)
+        db (AsyncSession): Read-only database session dependency (may be a replica)
+        current_user (User): Current authenticated user
+        token (str): JWT Bearer token
+
+    Returns:
+        AgentUsageResponse: The aggregated counters, zeroed if there was no traffic
+    """
+    day = day or datetime.now(timezone.utc).date()
+    result = await db.execute(
+        select(AgentDailyUsage).where(
+            AgentDailyUsage.agent_id == agent_id,
+            AgentDailyUsage.user_id == current_user.id,
+            AgentDailyUsage.day == day,
+        )
+    )
+    return {**_usage_payload(result.scalar_one_or_none(), day), "agent_id": agent_id}
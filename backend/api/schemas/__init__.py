@@ -1,2 +1,7 @@
 from .agent import *
-from .chat import *
\ No newline at end of file
+from .chat import *
+from .usage import *
+from .admin import *
+from .transcript import *
+from .search import *
+from .knowledge import *
\ No newline at end of file
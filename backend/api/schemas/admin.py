@@ -0,0 +1,93 @@
+from pydantic import BaseModel
+from datetime import datetime
+from typing import Optional
+
+class ProfileInfo(BaseModel):
+    name: str
+    size_bytes: int
+    created_at: datetime
+
+
+class PoolStats(BaseModel):
+    pool_class: str
+    size: int | None = None
+    checked_in: int | None = None
+    checked_out: int | None = None
+    overflow: int | None = None
+    checkouts: int | None = None
+    wait_ms_total: float | None = None
+    wait_ms_avg: float | None = None
+    wait_ms_max: float | None = None
+    timeouts: int | None = None
+
+class ReplicaStatus(BaseModel):
+    url: str
+    healthy: bool
+    lag_seconds: Optional[float] = None
+    pool: PoolStats
+
+class EmbeddingStats(BaseModel):
+    model_config = {"protected_namespaces": ()}
+
+    model: str
+    pending: int
+    texts: int
+    cache_hits: int
+    coalesced: int
+    batches: int
+    embedded: int
+
+class EmbeddingBackfillJobResponse(BaseModel):
+    model_config = {"from_attributes": True, "protected_namespaces": ()}
+
+    id: int
+    model: str
+    status: str
+    last_message_id: int
+    max_message_id: int
+    processed: int
+    error: Optional[str] = None
+    created_at: datetime
+    updated_at: datetime
+    finished_at: Optional[datetime] = None
+
+class ModelHealthResponse(BaseModel):
+    model_config = {"protected_namespaces": ()}
+
+    model: str
+    samples: int
+    error_rate: float
+    p50_ms: Optional[float] = None
+    p90_ms: Optional[float] = None
+    healthy: bool
+
+class CacheCounters(BaseModel):
+    size: int
+    hits: int
+    misses: int
+    hit_rate: float
+
+class InvalidationLag(BaseModel):
+    count: int
+    p50_ms: Optional[float] = None
+    max_ms: Optional[float] = None
+
+class AgentCacheStats(BaseModel):
+    agents: CacheCounters
+    sessions: CacheCounters
+    invalidations: int
+    ttl_seconds: float
+    poll_interval_seconds: float
+    listening: bool
+    notify_lag: InvalidationLag
+    poll_lag: InvalidationLag
+
+class ToolStats(BaseModel):
+    name: str
+    kind: str
+    calls: int
+    errors: int
+    timeouts: int
+    cached: int
+    avg_ms: float
+    max_ms: int
@@ -1,20 +1,58 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, field_validator, model_validator
 from datetime import datetime
-from typing import Optional
+from typing import List, Literal, Optional
 
-class AgentCreate(BaseModel):
+class AgentTool(BaseModel):
+    """A tool the agent's model may call, see ``tool_service`` for the kinds and their config."""
+    # Function name shown to the model
+    name: str = Field(pattern=r"^[A-Za-z0-9_-]{1,64}$")
+    kind: Literal["calculator", "http", "knowledge_search"]
+    description: str = Field("", max_length=1000)
+    config: dict = Field(default_factory=dict)
+    # Null uses TOOL_TIMEOUT_SECONDS
+    timeout_seconds: Optional[float] = Field(None, gt=0, le=60)
+    # Null uses the kind's default, 0 disables caching
+    cache_ttl_seconds: Optional[int] = Field(None, ge=0)
+
+    @model_validator(mode="after")
+    def http_url(self):
+        if self.kind == "http" and not isinstance(self.config.get("url"), str):
+            raise ValueError("http tools need a url in their config")
+        return self
+
+class AgentModelSettings(BaseModel):
+    """Per-agent model settings, unset fields use the deployment defaults."""
+    chat_model: Optional[str] = Field(None, min_length=1, max_length=100)
+    fallback_models: Optional[List[str]] = Field(None, max_length=5)
+    temperature: Optional[float] = Field(None, ge=0, le=2)
+    max_tokens: Optional[int] = Field(None, gt=0)
+    chat_timeout_seconds: Optional[float] = Field(None, gt=0, le=600)
+    max_latency_ms: Optional[int] = Field(None, gt=0)
+    tts_model: Optional[str] = Field(None, min_length=1, max_length=100)
+    tts_voice: Optional[str] = Field(None, min_length=1, max_length=50)
+    stt_model: Optional[str] = Field(None, min_length=1, max_length=100)
+    tools: Optional[List[AgentTool]] = Field(None, max_length=20)
+
+    @field_validator("tools")
+    @classmethod
+    def unique_tool_names(cls, tools):
+        if tools and len({tool.name for tool in tools}) != len(tools):
+            raise ValueError("Tool names must be unique")
+        return tools
+
+class AgentCreate(AgentModelSettings):
     name: str
     prompt: str
 
-class AgentUpdate(BaseModel):
+class AgentUpdate(AgentModelSettings):
     name: Optional[str] = None
     prompt: Optional[str] = None
 
-class AgentResponse(BaseModel):
+class AgentResponse(AgentModelSettings):
     id: int
     name: str
     prompt: str
     created_at: datetime
     user_id: int
 
-    model_config = {"from_attributes": True}
\ No newline at end of file
+    model_config = {"from_attributes": True}
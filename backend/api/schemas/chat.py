@@ -1,5 +1,6 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, model_validator
 from datetime import datetime
+from typing import List
 
 class ChatSessionCreate(BaseModel):
     agent_id: int
@@ -8,9 +9,27 @@ class ChatSessionResponse(BaseModel):
     id: int
     agent_id: int
     created_at: datetime
+    # Set on branches, see ``POST /sessions/{id}/branches``
+    parent_session_id: int | None = None
+    parent_message_id: int | None = None
 
     model_config = {"from_attributes": True}
 
+class ChatSessionOverview(ChatSessionResponse):
+    agent_name: str
+    message_count: int
+    last_message_at: datetime | None = None
+    last_message_preview: str | None = None
+
+class ChatSessionOverviewPage(BaseModel):
+    items: List[ChatSessionOverview]
+    # Pass as ``cursor`` to get the next page, None on the last page
+    next_cursor: str | None = None
+
+class BranchCreate(BaseModel):
+    # Last message of the parent's history kept in the branch
+    message_id: int
+
 class MessageCreate(BaseModel):
     content: str
 
@@ -21,8 +40,13 @@ class MessageResponse(BaseModel):
     is_user: bool
     created_at: datetime
     audio_url: str | None = None
+    model: str | None = None
+    prompt_tokens: int | None = None
+    completion_tokens: int | None = None
+    latency_ms: int | None = None
+    ttft_ms: int | None = None
 
-    model_config = {"from_attributes": True}
+    model_config = {"from_attributes": True, "protected_namespaces": ()}
 
 class MessageResponseWithAgent(MessageResponse):
     agent_name: str
@@ -30,4 +54,48 @@ class MessageResponseWithAgent(MessageResponse):
 class VoiceResponse(BaseModel):
     user_message: MessageResponse
     agent_message: MessageResponse
-    agent_audio_url: str | None = None
\ No newline at end of file
+    agent_audio_url: str | None = None
+
+class BatchMessageItem(BaseModel):
+    """One message of a batch, sent to an existing session or to a new session of an agent."""
+    session_id: int | None = None
+    agent_id: int | None = None
+    content: str
+
+    @model_validator(mode="after")
+    def one_target(self):
+        if (self.session_id is None) == (self.agent_id is None):
+            raise ValueError("Set exactly one of session_id and agent_id")
+        return self
+
+class BatchMessageRequest(BaseModel):
+    items: List[BatchMessageItem]
+
+class BatchMessageResult(BaseModel):
+    """One NDJSON line of a batch response, in completion order."""
+    # Position of the item in the request
+    index: int
+    session_id: int | None = None
+    status_code: int
+    message: MessageResponseWithAgent | None = None
+    error: str | None = None
+
+class FanOutRequest(BaseModel):
+    content: str
+    agent_ids: List[int]
+    # Start new sessions instead of continuing each agent's most recent one
+    new_sessions: bool = False
+    # Agent that answers last, given the question and the other agents' replies
+    aggregator_agent_id: int | None = None
+
+class FanOutEvent(BaseModel):
+    """One NDJSON line of a fan-out response."""
+    # "delta" (a piece of a reply), "message" (the stored reply) or "error"
+    type: str
+    agent_id: int
+    session_id: int
+    aggregator: bool = False
+    content: str | None = None
+    message: MessageResponseWithAgent | None = None
+    status_code: int | None = None
+    error: str | None = None
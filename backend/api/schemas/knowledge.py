@@ -0,0 +1,26 @@
+from pydantic import BaseModel, Field
+from datetime import datetime
+from typing import List
+
+class KnowledgeDocumentCreate(BaseModel):
+    title: str = Field(..., min_length=1, max_length=255)
+    content: str = Field(..., min_length=1, max_length=2_000_000)
+
+class KnowledgeDocumentResponse(BaseModel):
+    id: int
+    agent_id: int
+    title: str
+    chunk_count: int
+    created_at: datetime
+
+    model_config = {"from_attributes": True}
+
+class KnowledgeSearchResult(BaseModel):
+    id: int
+    document_id: int
+    title: str
+    content: str
+    score: float
+
+class KnowledgeSearchResponse(BaseModel):
+    items: List[KnowledgeSearchResult]
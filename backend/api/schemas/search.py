@@ -0,0 +1,20 @@
+from pydantic import BaseModel
+from datetime import datetime
+from typing import List
+
+class MessageSearchResult(BaseModel):
+    id: int
+    session_id: int
+    agent_id: int
+    agent_name: str
+    is_user: bool
+    created_at: datetime
+    # Higher is better, only comparable within one query
+    score: float
+    # HTML-escaped excerpt with the matches wrapped in <mark>
+    snippet: str
+
+class MessageSearchPage(BaseModel):
+    items: List[MessageSearchResult]
+    # Pass as ``cursor`` to get the next page, None on the last page
+    next_cursor: str | None = None
@@ -0,0 +1,37 @@
+from backend.api.schemas.agent import AgentModelSettings
+from pydantic import BaseModel
+from datetime import datetime
+from typing import Optional
+
+# Records of the NDJSON transcript format, one JSON object per line with a "type"
+# of "agent", "session" or "message". Ids are those of the exporting database and
+# only link the records of one file; imports assign new ids.
+
+class TranscriptAgent(AgentModelSettings):
+    """An agent with its model settings and tools, absent ones use the deployment defaults."""
+    id: int
+    name: str
+    prompt: str
+
+class TranscriptSession(BaseModel):
+    id: int
+    agent_id: int
+    created_at: Optional[datetime] = None
+
+class TranscriptMessage(BaseModel):
+    session_id: int
+    content: str
+    is_user: bool
+    created_at: Optional[datetime] = None
+    model: Optional[str] = None
+    prompt_tokens: Optional[int] = None
+    completion_tokens: Optional[int] = None
+    latency_ms: Optional[int] = None
+    ttft_ms: Optional[int] = None
+
+    model_config = {"protected_namespaces": ()}
+
+class TranscriptImportResponse(BaseModel):
+    agents: int
+    sessions: int
+    messages: int
@@ -0,0 +1,17 @@
+from pydantic import BaseModel
+from datetime import date
+
+class UsageResponse(BaseModel):
+    day: date
+    turns: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    latency_ms_total: int = 0
+    ttft_ms_total: int = 0
+    avg_latency_ms: float | None = None
+    avg_ttft_ms: float | None = None
+
+    model_config = {"from_attributes": True}
+
+class AgentUsageResponse(UsageResponse):
+    agent_id: int
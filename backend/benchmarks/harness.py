@@ -0,0 +1,183 @@
+"""
+Infrastructure for the end-to-end benchmark suite.
+
+Scenarios drive the FastAPI app in-process through ``httpx.ASGITransport`` with a
+dedicated database (SQLite file or Postgres) and the local OpenAI stand-in as
+upstream, and record per-operation latencies. Results are plain dicts so a run can
+be dumped as JSON and compared with earlier runs.
+"""
+from backend.testing.fake_openai import FakeOpenAIConfig, FakeOpenAIServer
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Iterable, Optional
+import asyncio
+import contextlib
+import math
+import os
+import tempfile
+import time
+import httpx
+
+def percentile(sorted_values: list, pct: float) -> Optional[float]:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+@dataclass
+class ScenarioResult:
+    """Latencies and errors collected for one scenario."""
+    name: str
+    params: dict = field(default_factory=dict)
+    latencies_ms: list = field(default_factory=list)
+    errors: int = 0
+    wall_seconds: float = 0.0
+    notes: dict = field(default_factory=dict)
+
+    def summary(self) -> dict:
+        values = sorted(self.latencies_ms)
+        ops = len(values) + self.errors
+        return {
+            "params": self.params,
+            "operations": ops,
+            "errors": self.errors,
+            "wall_seconds": round(self.wall_seconds, 4),
+            "throughput_ops_per_s": round(ops / self.wall_seconds, 2) if self.wall_seconds else None,
+            "latency_ms": {
+                "mean": round(sum(values) / len(values), 3) if values else None,
+                "p50": percentile(values, 50),
+                "p95": percentile(values, 95),
+                "p99": percentile(values, 99),
+                "max": values[-1] if values else None,
+            },
+            **({"notes": self.notes} if self.notes else {}),
+        }
+
+class BenchmarkContext:
+    """
+    Owns the app, database and upstream stand-in for the duration of a run.
+
+    The app's ``get_db`` dependency is pointed at the benchmark database and the
+    production ``get_openai_client`` dependency is left in place, with
+    ``OPENAI_BASE_URL`` pointing at the stand-in, so the real client construction
+    and network path are part of every measurement.
+    """
+
+    def __init__(self, database_url: Optional[str] = None, upstream: Optional[FakeOpenAIConfig] = None):
+        self._workdir = tempfile.TemporaryDirectory(prefix="agent-bench-")
+        self.database_url = database_url or f"sqlite+aiosqlite:///{self._workdir.name}/bench.db"
+        self.upstream_config = upstream or FakeOpenAIConfig()
+        self.engine = None
+        self.session_factory = None
+        self.upstream: Optional[FakeOpenAIServer] = None
+        self.http: Optional[httpx.AsyncClient] = None
+        self._saved_env = {}
+        self._saved_cwd = None
+        self._app = None
+
+    @property
+    def dialect(self) -> str:
+        return self.engine.dialect.name
+
+    async def __aenter__(self) -> "BenchmarkContext":
+        from backend.main import app
+        from backend.models.base import Base
+        from backend.utils.database import get_db
+
+        self.upstream = FakeOpenAIServer(self.upstream_config).start()
+        for key, value in {"OPENAI_BASE_URL": self.upstream.url, "OPENAI_API_KEY": "bench-key"}.items():
+            self._saved_env[key] = os.environ.get(key)
+            os.environ[key] = value
+
+        # Voice handlers write to the relative path backend/static
+        self._saved_cwd = os.getcwd()
+        os.makedirs(os.path.join(self._workdir.name, "backend", "static"), exist_ok=True)
+        os.chdir(self._workdir.name)
+
+        self.engine = create_async_engine(self.database_url, echo=False)
+        async with self.engine.begin() as conn:
+            await conn.run_sync(Base.metadata.drop_all)
+            await conn.run_sync(Base.metadata.create_all)
+        self.session_factory = sessionmaker(self.engine, class_=AsyncSession, expire_on_commit=False)
+
+        async def override_get_db():
+            async with self.session_factory() as session:
+                yield session
+
+        self._app = app
+        app.dependency_overrides[get_db] = override_get_db
+        self.http = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=60)
+        return self
+
+    async def __aexit__(self, *exc_info):
+        if self.http is not None:
+            await self.http.aclose()
+        if self._app is not None:
+            self._app.dependency_overrides.clear()
+        if self.engine is not None:
+            await self.engine.dispose()
+        if self.upstream is not None:
+            self.upstream.stop()
+        for key, value in self._saved_env.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+        if self._saved_cwd is not None:
+            os.chdir(self._saved_cwd)
+        self._workdir.cleanup()
+
+    async def register_and_login(self, username: str, password: str = "bench-password") -> dict:
+        """Create a user through the API and return its Authorization header."""
+        await self.http.post("/api/auth/register", json={"username": username, "password": password})
+        response = await self.http.post("/api/auth/login", json={"username": username, "password": password})
+        response.raise_for_status()
+        return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+async def run_operations(
+    result: ScenarioResult,
+    operations: Iterable[Callable[[], Awaitable[httpx.Response]]],
+    concurrency: int,
+) -> ScenarioResult:
+    """
+    Run operations with at most ``concurrency`` in flight and record each latency.
+
+    An operation counts as an error when it raises or returns a 4xx/5xx response.
+    """
+    iterator = iter(operations)
+    lock = asyncio.Lock()
+
+    async def next_operation():
+        async with lock:
+            return next(iterator, None)
+
+    async def worker():
+        while True:
+            operation = await next_operation()
+            if operation is None:
+                return
+            started = time.perf_counter()
+            try:
+                response = await operation()
+                failed = response.status_code >= 400
+            except Exception:
+                failed = True
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            if failed:
+                result.errors += 1
+            else:
+                result.latencies_ms.append(round(elapsed_ms, 3))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(max(1, concurrency))))
+    result.wall_seconds += time.perf_counter() - started
+    return result
+
+@contextlib.contextmanager
+def timed(result: ScenarioResult, note: str):
+    """Record the duration of a setup step (e.g. seeding) in the scenario notes."""
+    started = time.perf_counter()
+    yield
+    result.notes[f"{note}_seconds"] = round(time.perf_counter() - started, 3)
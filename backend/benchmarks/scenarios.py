@@ -0,0 +1,136 @@
+"""
+Scripted benchmark scenarios. Each scenario takes a :class:`BenchmarkContext` and
+its size parameters and returns a :class:`ScenarioResult`.
+"""
+from backend.benchmarks.harness import BenchmarkContext, ScenarioResult, run_operations, timed
+from backend.models.chat import Message
+from sqlalchemy import insert
+from datetime import datetime, timedelta, timezone
+import uuid
+
+PROFILES = {
+    "smoke": {
+        "register_login": {"users": 4, "concurrency": 2},
+        "agent_crud": {"cycles": 4, "concurrency": 2},
+        "long_session": {"sessions": 2, "history": 20, "turns": 4, "concurrency": 2},
+        "voice_turns": {"turns": 2, "concurrency": 2},
+        "history_read": {"messages": 200, "reads": 4, "concurrency": 2},
+    },
+    "default": {
+        "register_login": {"users": 200, "concurrency": 20},
+        "agent_crud": {"cycles": 200, "concurrency": 20},
+        "long_session": {"sessions": 10, "history": 500, "turns": 100, "concurrency": 10},
+        "voice_turns": {"turns": 50, "concurrency": 10},
+        "history_read": {"messages": 10000, "reads": 50, "concurrency": 5},
+    },
+}
+
+def _unique(prefix: str) -> str:
+    return f"{prefix}-{uuid.uuid4().hex[:12]}"
+
+async def _create_session(ctx: BenchmarkContext, headers: dict) -> int:
+    response = await ctx.http.post("/api/agents/", json={"name": _unique("agent"), "prompt": "You are a benchmark agent"}, headers=headers)
+    response.raise_for_status()
+    response = await ctx.http.post("/api/sessions/", json={"agent_id": response.json()["id"]}, headers=headers)
+    response.raise_for_status()
+    return response.json()["id"]
+
+async def seed_messages(ctx: BenchmarkContext, session_id: int, count: int, batch_size: int = 5000):
+    """Insert ``count`` alternating user/assistant messages with multi-row inserts."""
+    start = datetime.now(timezone.utc) - timedelta(seconds=count)
+    async with ctx.engine.begin() as conn:
+        for offset in range(0, count, batch_size):
+            rows = [
+                {
+                    "session_id": session_id,
+                    "content": f"Seeded message {i} with a little bit of realistic padding text",
+                    "is_user": i % 2 == 0,
+                    "created_at": start + timedelta(seconds=i),
+                }
+                for i in range(offset, min(offset + batch_size, count))
+            ]
+            await conn.execute(insert(Message), rows)
+
+async def register_login(ctx: BenchmarkContext, users: int, concurrency: int) -> ScenarioResult:
+    """Register storm followed by a login storm; bcrypt hashing dominates."""
+    result = ScenarioResult("register_login", {"users": users, "concurrency": concurrency})
+    names = [_unique("user") for _ in range(users)]
+    credentials = [{"username": name, "password": "bench-password"} for name in names]
+    await run_operations(
+        result, (lambda c=c: ctx.http.post("/api/auth/register", json=c) for c in credentials), concurrency
+    )
+    await run_operations(
+        result, (lambda c=c: ctx.http.post("/api/auth/login", json=c) for c in credentials), concurrency
+    )
+    return result
+
+async def agent_crud(ctx: BenchmarkContext, cycles: int, concurrency: int) -> ScenarioResult:
+    """Create, read, update, list and delete agents."""
+    result = ScenarioResult("agent_crud", {"cycles": cycles, "concurrency": concurrency})
+    headers = await ctx.register_and_login(_unique("crud"))
+
+    created = []
+
+    async def create():
+        response = await ctx.http.post("/api/agents/", json={"name": _unique("agent"), "prompt": "Prompt"}, headers=headers)
+        if response.status_code == 200:
+            created.append(response.json()["id"])
+        return response
+
+    await run_operations(result, (create for _ in range(cycles)), concurrency)
+    await run_operations(result, (lambda i=i: ctx.http.get(f"/api/agents/{i}", headers=headers) for i in created), concurrency)
+    await run_operations(
+        result, (lambda i=i: ctx.http.patch(f"/api/agents/{i}", json={"name": "renamed"}, headers=headers) for i in created), concurrency
+    )
+    await run_operations(result, (lambda: ctx.http.get("/api/agents/", headers=headers) for _ in range(cycles)), concurrency)
+    await run_operations(result, (lambda i=i: ctx.http.delete(f"/api/agents/{i}", headers=headers) for i in created), concurrency)
+    return result
+
+async def long_session(ctx: BenchmarkContext, sessions: int, history: int, turns: int, concurrency: int) -> ScenarioResult:
+    """``send_message`` into sessions that already hold ``history`` messages."""
+    result = ScenarioResult("long_session", {"sessions": sessions, "history": history, "turns": turns, "concurrency": concurrency})
+    headers = await ctx.register_and_login(_unique("chat"))
+    session_ids = [await _create_session(ctx, headers) for _ in range(sessions)]
+    with timed(result, "seed"):
+        for session_id in session_ids:
+            await seed_messages(ctx, session_id, history)
+
+    operations = (
+        lambda s=session_ids[i % sessions], i=i: ctx.http.post(
+            f"/api/sessions/{s}/messages", json={"content": f"Benchmark turn {i}"}, headers=headers
+        )
+        for i in range(turns)
+    )
+    return await run_operations(result, operations, concurrency)
+
+async def voice_turns(ctx: BenchmarkContext, turns: int, concurrency: int) -> ScenarioResult:
+    """Voice round trips: upload, transcription, completion and speech synthesis."""
+    result = ScenarioResult("voice_turns", {"turns": turns, "concurrency": concurrency})
+    headers = await ctx.register_and_login(_unique("voice"))
+    session_id = await _create_session(ctx, headers)
+    audio = b"ID3" + bytes(range(256)) * 64
+
+    operations = (
+        lambda: ctx.http.post(f"/api/sessions/{session_id}/voice", files={"audio": ("turn.mp3", audio, "audio/mpeg")}, headers=headers)
+        for _ in range(turns)
+    )
+    return await run_operations(result, operations, concurrency)
+
+async def history_read(ctx: BenchmarkContext, messages: int, reads: int, concurrency: int) -> ScenarioResult:
+    """Read the full history of a session holding ``messages`` rows."""
+    result = ScenarioResult("history_read", {"messages": messages, "reads": reads, "concurrency": concurrency})
+    headers = await ctx.register_and_login(_unique("history"))
+    session_id = await _create_session(ctx, headers)
+    with timed(result, "seed"):
+        await seed_messages(ctx, session_id, messages)
+
+    operations = (lambda: ctx.http.get(f"/api/sessions/{session_id}/messages", headers=headers) for _ in range(reads))
+    return await run_operations(result, operations, concurrency)
+
+SCENARIOS = {
+    "register_login": register_login,
+    "agent_crud": agent_crud,
+    "long_session": long_session,
+    "voice_turns": voice_turns,
+    "history_read": history_read,
+}
@@ -0,0 +1,139 @@
+"""
+Benchmark of full-text message search.
+
+Seeds a database with messages drawn from a Zipf-distributed vocabulary and times
+``search_messages`` (the indexed path behind ``GET /api/search/messages``) against a
+``LIKE '%word%'`` scan over the same scope, for a common, a medium and a rare word.
+Runs on a temporary SQLite file (FTS5) by default; pass ``--url`` to run against
+Postgres (GIN index on ``to_tsvector``). Reports median and p95 latencies in ms as JSON::
+
+    python -m backend.benchmarks.search --sizes 100000 1000000 3000000
+    python -m backend.benchmarks.search --url postgresql+asyncpg://... --sizes 3000000
+"""
+from backend.models.agent import Agent
+from backend.models.base import Base
+from backend.models.chat import ChatSession, Message
+from backend.models.user import User
+from backend.services.search_service import search_messages
+from backend.utils import search  # registers the full-text index DDL
+from backend.utils.search import migrate
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from datetime import datetime, timedelta, timezone
+import argparse
+import asyncio
+import itertools
+import json
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+VOCABULARY_SIZE = 50000
+WORDS_PER_MESSAGE = 14
+SESSIONS = 2000
+# Vocabulary ranks of the searched words: frequent, medium, rare
+QUERY_RANKS = {"common": 20, "medium": 2000, "rare": 40000}
+
+def _word(rank: int) -> str:
+    # Letters only, so that no stemmer merges two ranks into one term
+    letters = "bcdfghjklmnpqrstvwxz"
+    word = ""
+    rank += 1
+    while rank:
+        rank, digit = divmod(rank, len(letters))
+        word += letters[digit] + "a"
+    return word
+
+async def _seed(engine, count: int, seed: int = 7) -> int:
+    rng = random.Random(seed)
+    vocabulary = [_word(rank) for rank in range(VOCABULARY_SIZE)]
+    cum_weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(VOCABULARY_SIZE)))
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+        user_id = (await conn.execute(insert(User).values(username="bench", password_hash="x").returning(User.id))).scalar()
+        agent_ids = [
+            (await conn.execute(insert(Agent).values(name=f"a{i}", prompt="p", user_id=user_id).returning(Agent.id))).scalar()
+            for i in range(10)
+        ]
+        session_ids = (await conn.execute(
+            insert(ChatSession).returning(ChatSession.id),
+            [{"agent_id": agent_ids[i % len(agent_ids)]} for i in range(SESSIONS)],
+        )).scalars().all()
+    start = datetime.now(timezone.utc) - timedelta(seconds=count)
+    for offset in range(0, count, 10000):
+        rows = []
+        for i in range(offset, min(offset + 10000, count)):
+            words = rng.choices(vocabulary, cum_weights=cum_weights, k=WORDS_PER_MESSAGE)
+            rows.append({
+                "session_id": session_ids[i % len(session_ids)],
+                "content": " ".join(words),
+                "is_user": i % 2 == 0,
+                "created_at": start + timedelta(seconds=i),
+            })
+        async with engine.begin() as conn:
+            await conn.execute(insert(Message), rows)
+    # The Postgres index is built after seeding, as on a live database
+    await migrate(engine)
+    return user_id
+
+async def indexed_path(db: AsyncSession, user_id: int, word: str):
+    return await search_messages(db, user_id, word, limit=20)
+
+async def like_path(db: AsyncSession, user_id: int, word: str):
+    """Unindexed baseline: substring scan of the user's messages, newest first."""
+    result = await db.execute(
+        select(Message.id, Message.session_id, Message.content)
+        .join(ChatSession, ChatSession.id == Message.session_id)
+        .join(Agent, Agent.id == ChatSession.agent_id)
+        .where(Agent.user_id == user_id, Message.content.like(f"%{word}%"))
+        .order_by(Message.id.desc())
+        .limit(20)
+    )
+    return result.all()
+
+async def _measure(path, engine, user_id: int, word: str, repeat: int) -> dict:
+    timings = []
+    async with AsyncSession(engine) as db:
+        for _ in range(repeat):
+            started = time.perf_counter()
+            await path(db, user_id, word)
+            timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    return {
+        "p50_ms": round(statistics.median(timings), 2),
+        "p95_ms": round(timings[min(len(timings) - 1, int(len(timings) * 0.95))], 2),
+    }
+
+async def run(sizes: list, url: str = None, repeat: int = 20) -> dict:
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        engine = create_async_engine(url or f"sqlite+aiosqlite:///{workdir}/search.db")
+        try:
+            for size in sizes:
+                started = time.perf_counter()
+                user_id = await _seed(engine, size)
+                results[str(size)] = {"seed_seconds": round(time.perf_counter() - started, 1)}
+                for label, rank in QUERY_RANKS.items():
+                    word = _word(rank)
+                    results[str(size)][label] = {
+                        "indexed": await _measure(indexed_path, engine, user_id, word, repeat),
+                        "like": await _measure(like_path, engine, user_id, word, max(repeat // 5, 1)),
+                    }
+        finally:
+            await engine.dispose()
+    return results
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark full-text message search")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100000, 1000000])
+    parser.add_argument("--url", help="Database URL, defaults to a temporary SQLite file")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args(argv)
+    results = asyncio.run(run(args.sizes, args.url, args.repeat))
+    sys.stdout.write(json.dumps(results, indent=2) + "\n")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Microbenchmark of the history serialization path.
+
+Compares, for histories of 1k/10k/100k messages, the previous path (ORM objects
+validated into ``MessageResponse`` one at a time and encoded with the standard
+library) against the fast path (Core rows, plain dicts, orjson). Both include the
+database fetch from a seeded SQLite file. Reports rows/s as JSON::
+
+    python -m backend.benchmarks.serialization --sizes 1000 10000 100000
+"""
+from backend.api.schemas.chat import MessageResponse
+from backend.models.agent import Agent
+from backend.models.base import Base
+from backend.models.chat import ChatSession, Message
+from backend.models.user import User
+from backend.utils.serialization import MESSAGE_COLUMNS, ORJSON_OPTIONS, column_keys, rows_to_dicts
+from pydantic import TypeAdapter
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from datetime import datetime, timedelta, timezone
+from typing import List
+import argparse
+import asyncio
+import json
+import sys
+import tempfile
+import time
+import orjson
+
+_adapter = TypeAdapter(List[MessageResponse])
+
+async def _seed(engine, count: int) -> int:
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+        user_id = (await conn.execute(insert(User).values(username="bench", password_hash="x").returning(User.id))).scalar()
+        agent_id = (await conn.execute(insert(Agent).values(name="a", prompt="p", user_id=user_id).returning(Agent.id))).scalar()
+        session_id = (await conn.execute(insert(ChatSession).values(agent_id=agent_id).returning(ChatSession.id))).scalar()
+        start = datetime.now(timezone.utc) - timedelta(seconds=count)
+        for offset in range(0, count, 10000):
+            await conn.execute(insert(Message), [
+                {
+                    "session_id": session_id,
+                    "content": f"Message {i} with a realistic amount of text in it for encoding purposes",
+                    "is_user": i % 2 == 0,
+                    "created_at": start + timedelta(seconds=i),
+                    "model": None if i % 2 == 0 else "gpt-3.5-turbo",
+                    "prompt_tokens": None if i % 2 == 0 else 120,
+                    "completion_tokens": None if i % 2 == 0 else 40,
+                }
+                for i in range(offset, min(offset + 10000, count))
+            ])
+    return session_id
+
+async def orm_pydantic_path(engine, session_id: int) -> bytes:
+    """The previous behaviour: ORM entities validated by the response model."""
+    async with AsyncSession(engine) as db:
+        result = await db.execute(select(Message).filter(Message.session_id == session_id).order_by(Message.created_at))
+        messages = result.scalars().all()
+        payload = _adapter.dump_python(_adapter.validate_python(messages, from_attributes=True), mode="json")
+        return json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+async def core_orjson_path(engine, session_id: int) -> bytes:
+    """The fast path used by ``get_messages``."""
+    async with AsyncSession(engine) as db:
+        result = await db.execute(
+            select(*MESSAGE_COLUMNS).filter(Message.session_id == session_id).order_by(Message.created_at)
+        )
+        return orjson.dumps(rows_to_dicts(result, column_keys(MESSAGE_COLUMNS)), option=ORJSON_OPTIONS)
+
+async def _measure(path, engine, session_id: int, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        await path(engine, session_id)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+async def run(sizes: list, repeat: int = 3) -> dict:
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        engine = create_async_engine(f"sqlite+aiosqlite:///{workdir}/serialization.db")
+        try:
+            for size in sizes:
+                session_id = await _seed(engine, size)
+                before = await _measure(orm_pydantic_path, engine, session_id, repeat)
+                after = await _measure(core_orjson_path, engine, session_id, repeat)
+                results[str(size)] = {
+                    "before": {"seconds": round(before, 4), "rows_per_s": round(size / before)},
+                    "after": {"seconds": round(after, 4), "rows_per_s": round(size / after)},
+                    "speedup": round(before / after, 2),
+                }
+        finally:
+            await engine.dispose()
+    return results
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark history serialization")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args(argv)
+    results = asyncio.run(run(args.sizes, args.repeat))
+    sys.stdout.write(json.dumps(results, indent=2) + "\n")
+
+if __name__ == "__main__":
+    main()
@@ -3,7 +3,23 @@ from fastapi.middleware.cors import CORSMiddleware
 from backend.api.routers.agent_routes import router as agent_router
 from backend.api.routers.session_routes import router as session_router
 from backend.api.routers.auth_routes import router as auth_router
-from backend.utils.database import init_db
+from backend.api.routers.usage_routes import router as usage_router
+from backend.api.routers.admin_routes import router as admin_router
+from backend.api.routers.transcript_routes import router as transcript_router
+from backend.api.routers.search_routes import router as search_router
+from backend.api.routers.knowledge_routes import router as knowledge_router
+from backend.api.routers.batch_routes import router as batch_router
+from backend.api.routers.fanout_routes import router as fanout_router
+from backend.utils.database import SessionLocal, engine, engine_settings, init_db
+from backend.services.agent_cache import CacheInvalidationListener
+from backend.services.archive_service import ARCHIVE_AFTER_DAYS, Archiver
+from backend.services.purge_service import Purger, soft_delete_enabled
+from backend.services.idempotency_service import IdempotencyCleaner
+from backend.services.message_writer import message_writer
+from backend.services.llm_providers import local_provider
+from backend.services.embedding_service import EMBEDDING_BACKFILL_INTERVAL_SECONDS, EmbeddingBackfiller, embedding_service
+from backend.utils.query_monitor import QueryStatsMiddleware
+from backend.utils.profiling import PROFILE_ID_HEADER, ProfilingMiddleware
 from fastapi.staticfiles import StaticFiles
 from contextlib import asynccontextmanager
 import os
@@ -11,7 +27,30 @@ import os
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     await init_db()  # Startup logic
+    purger = Purger(SessionLocal)
+    archiver = Archiver(SessionLocal)
+    idempotency_cleaner = IdempotencyCleaner(SessionLocal)
+    idempotency_cleaner.start()
+    # LISTEN needs a session-mode connection, behind a transaction pooler only polling works
+    cache_listener = CacheInvalidationListener(engine, SessionLocal, listen=not engine_settings.transaction_pooler)
+    cache_listener.start()
+    embedding_backfiller = EmbeddingBackfiller(SessionLocal, embedding_service)
+    if EMBEDDING_BACKFILL_INTERVAL_SECONDS > 0:
+        embedding_backfiller.start()
+    if soft_delete_enabled():
+        purger.start()
+    if ARCHIVE_AFTER_DAYS > 0:
+        archiver.start()
     yield
+    # Pending write-behind messages are flushed before the pool goes away
+    await message_writer.stop()
+    await purger.stop()
+    await archiver.stop()
+    await idempotency_cleaner.stop()
+    await cache_listener.stop()
+    await embedding_backfiller.stop()
+    await embedding_service.close()
+    await local_provider.close()
 
 app = FastAPI(
     title="AI Agent Platform", 
@@ -29,6 +68,14 @@ app = FastAPI(
         {
             "name": "Sessions",
             "description": "Operations for chat sessions"
+        },
+        {
+            "name": "Usage",
+            "description": "Token and latency accounting"
+        },
+        {
+            "name": "Admin",
+            "description": "Operational endpoints, protected by the admin token"
         }
     ],
     openapi_url="/api/openapi.json",
@@ -43,8 +90,15 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Version", PROFILE_ID_HEADER],
 )
 
+# Per-request statement counting for N+1 detection
+app.add_middleware(QueryStatsMiddleware)
+
+# On-demand profiling of privileged or sampled requests
+app.add_middleware(ProfilingMiddleware)
+
 # Mount static directory for serving audio files
 static_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
 if os.path.exists(static_dir):
@@ -55,6 +109,13 @@ else:
 app.include_router(agent_router, prefix="/api")
 app.include_router(session_router, prefix="/api")
 app.include_router(auth_router, prefix="/api")
+app.include_router(usage_router, prefix="/api")
+app.include_router(admin_router, prefix="/api")
+app.include_router(transcript_router, prefix="/api")
+app.include_router(search_router, prefix="/api")
+app.include_router(knowledge_router, prefix="/api")
+app.include_router(batch_router, prefix="/api")
+app.include_router(fanout_router, prefix="/api")
 
 @app.get("/")
 async def root():
@@ -2,3 +2,10 @@ from .base import *
 from .user import *
 from .agent import *
 from .chat import *
+from .usage import *
+from .archive import *
+from .idempotency import *
+from .knowledge import *
+from .embedding import *
+from .cache_invalidation import *
+from .tool_call import *
\ No newline at end of file
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Float, JSON
 from sqlalchemy.orm import relationship
 from datetime import datetime, timezone
 from .base import Base
@@ -10,6 +10,30 @@ class Agent(Base):
     name = Column(String, nullable=False)
     prompt = Column(String, nullable=False)
     created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
-    sessions = relationship("ChatSession", back_populates="agent", cascade="all, delete-orphan")
-    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
-    user = relationship("User", back_populates="agents")
\ No newline at end of file
+    # Sessions and their messages are removed by the database (ON DELETE CASCADE),
+    # the ORM never loads them just to delete them
+    sessions = relationship("ChatSession", back_populates="agent", cascade="all, delete-orphan", passive_deletes=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+    user = relationship("User", back_populates="agents")
+    # Value of the owner's agents_version at the last change of this agent
+    version = Column(Integer, nullable=False, default=0, server_default="0")
+    # Set when the agent is soft-deleted, the purger removes the row later
+    deleted_at = Column(DateTime(timezone=True), nullable=True, index=True)
+    # Bumped whenever a knowledge document is added or removed, invalidates cached indexes
+    knowledge_version = Column(Integer, nullable=False, default=0, server_default="0")
+
+    # Model settings, null means the deployment default (CHAT_MODEL, TTS_MODEL, ...)
+    chat_model = Column(String, nullable=True)
+    # Tried in order after the chat model, see model_router
+    fallback_models = Column(JSON, nullable=True)
+    temperature = Column(Float, nullable=True)
+    max_tokens = Column(Integer, nullable=True)
+    # Per attempt, a model that does not answer in time is replaced by the next one
+    chat_timeout_seconds = Column(Float, nullable=True)
+    # Models whose recent p90 latency exceeds this are routed around
+    max_latency_ms = Column(Integer, nullable=True)
+    tts_model = Column(String, nullable=True)
+    tts_voice = Column(String, nullable=True)
+    stt_model = Column(String, nullable=True)
+    # Tools the model may call, a list of ``AgentTool`` dicts, see tool_service
+    tools = Column(JSON, nullable=True)
\ No newline at end of file
@@ -0,0 +1,11 @@
+from sqlalchemy import Column, Integer, LargeBinary, ForeignKey, DateTime
+from datetime import datetime, timezone
+from .base import Base
+
+class SessionArchive(Base):
+    """Messages of a cold session, stored as one zstd-compressed JSON array."""
+    __tablename__ = "session_archives"
+    session_id = Column(Integer, ForeignKey("chat_sessions.id", ondelete="CASCADE"), primary_key=True)
+    message_count = Column(Integer, nullable=False)
+    data = Column(LargeBinary, nullable=False)
+    archived_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
@@ -0,0 +1,14 @@
+from sqlalchemy import Column, Integer, String, DateTime
+from datetime import datetime, timezone
+from .base import Base
+
+class CacheInvalidation(Base):
+    """A change to a cached agent or session, polled by the other workers, see ``agent_cache``."""
+    __tablename__ = "cache_invalidations"
+    id = Column(Integer, primary_key=True)
+    # "agent" or "session"
+    kind = Column(String(16), nullable=False)
+    key = Column(Integer, nullable=False)
+    # Process that made the change, it has already invalidated its own cache
+    origin = Column(String(32), nullable=False)
+    created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), index=True)
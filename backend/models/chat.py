@@ -7,18 +7,43 @@ class ChatSession(Base):
     """Model for chat sessions associated with agents."""
     __tablename__ = "chat_sessions"
     id = Column(Integer, primary_key=True)
-    agent_id = Column(Integer, ForeignKey("agents.id", ondelete="CASCADE"))
+    agent_id = Column(Integer, ForeignKey("agents.id", ondelete="CASCADE"), index=True)
     created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
     agent = relationship("Agent", back_populates="sessions")
-    messages = relationship("Message", back_populates="session", cascade="all, delete-orphan")
+    messages = relationship("Message", back_populates="session", cascade="all, delete-orphan", passive_deletes=True)
+    # Value of the owner's sessions_version at the last change of this session
+    version = Column(Integer, nullable=False, default=0, server_default="0")
+    # Bumped for every message added to the session
+    messages_version = Column(Integer, nullable=False, default=0, server_default="0")
+    # Set when the session (or its agent) is soft-deleted, the purger removes the rows later
+    deleted_at = Column(DateTime(timezone=True), nullable=True, index=True)
+    # Set when the messages were moved to session_archives
+    archived_at = Column(DateTime(timezone=True), nullable=True)
+    # Denormalized from the messages by the message writer, in the same UPDATE as messages_version
+    message_count = Column(Integer, nullable=False, default=0, server_default="0")
+    last_message_at = Column(DateTime(timezone=True), nullable=True)
+    last_message_preview = Column(String, nullable=True)
+    # Set on a branch: the session and message it was forked from, see ``branch_service``
+    parent_session_id = Column(Integer, ForeignKey("chat_sessions.id", ondelete="CASCADE"), nullable=True, index=True)
+    # No foreign key, ``messages`` may be partitioned with a composite primary key
+    parent_message_id = Column(Integer, nullable=True)
 
 class Message(Base):
     """Model for messages exchanged in chat sessions."""
     __tablename__ = "messages"
     id = Column(Integer, primary_key=True)
-    session_id = Column(Integer, ForeignKey("chat_sessions.id", ondelete="CASCADE"))
+    session_id = Column(Integer, ForeignKey("chat_sessions.id", ondelete="CASCADE"), index=True)
     content = Column(String, nullable=False)
     is_user = Column(Boolean, default=True)
     created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
     session = relationship("ChatSession", back_populates="messages")
-    audio_url = Column(String, nullable=True)
\ No newline at end of file
+    audio_url = Column(String, nullable=True)
+    # Value of the session's messages_version when the message was added
+    version = Column(Integer, nullable=False, default=0, server_default="0")
+
+    # Upstream accounting, only populated for assistant messages
+    model = Column(String, nullable=True)
+    prompt_tokens = Column(Integer, nullable=True)
+    completion_tokens = Column(Integer, nullable=True)
+    latency_ms = Column(Integer, nullable=True)
+    ttft_ms = Column(Integer, nullable=True)
@@ -0,0 +1,40 @@
+from sqlalchemy import Column, Integer, String, LargeBinary, DateTime, Index
+from datetime import datetime, timezone
+from .base import Base
+
+class EmbeddingCacheEntry(Base):
+    """Embedding of a text, keyed by the SHA-256 of its content, computed once per embedder."""
+    __tablename__ = "embedding_cache"
+    # Name of the embedder, vectors of different embedders do not mix
+    model = Column(String, primary_key=True)
+    content_hash = Column(LargeBinary(32), primary_key=True)
+    # Little-endian float32, 4 bytes per dimension
+    embedding = Column(LargeBinary, nullable=False)
+    created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
+
+class MessageEmbedding(Base):
+    """Link of a message to the cached embedding of its content."""
+    __tablename__ = "message_embeddings"
+    # No foreign key, messages may be partitioned; the archiver and the purger delete
+    # the links together with their messages
+    message_id = Column(Integer, primary_key=True)
+    model = Column(String, primary_key=True)
+    content_hash = Column(LargeBinary(32), nullable=False)
+
+class EmbeddingBackfillJob(Base):
+    """Background job embedding the existing messages in id order, resumable from ``last_message_id``."""
+    __tablename__ = "embedding_backfill_jobs"
+    __table_args__ = (Index("ix_embedding_backfill_jobs_status", "status"),)
+    id = Column(Integer, primary_key=True)
+    model = Column(String, nullable=False)
+    # pending, running, paused, completed or failed
+    status = Column(String, nullable=False, default="pending")
+    # Checkpoint: every message up to this id is embedded
+    last_message_id = Column(Integer, nullable=False, default=0)
+    # Highest message id when the job was created, the job ends there
+    max_message_id = Column(Integer, nullable=False, default=0)
+    processed = Column(Integer, nullable=False, default=0)
+    error = Column(String, nullable=True)
+    created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
+    updated_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
+    finished_at = Column(DateTime(timezone=True), nullable=True)
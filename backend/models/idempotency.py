@@ -0,0 +1,18 @@
+from sqlalchemy import Column, Integer, String, LargeBinary, ForeignKey, DateTime, UniqueConstraint
+from datetime import datetime, timezone
+from .base import Base
+
+class IdempotencyKey(Base):
+    """First response of a request sent with an ``Idempotency-Key`` header, replayed to retries until it expires."""
+    __tablename__ = "idempotency_keys"
+    __table_args__ = (UniqueConstraint("user_id", "key", name="uq_idempotency_keys_user_key"),)
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    key = Column(String, nullable=False)
+    # Hash of the endpoint and payload, a key may not be reused for a different request
+    fingerprint = Column(String, nullable=False)
+    # Null while the first request is still running
+    status_code = Column(Integer, nullable=True)
+    response_body = Column(LargeBinary, nullable=True)
+    created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)
@@ -0,0 +1,27 @@
+from sqlalchemy import Column, Integer, String, LargeBinary, ForeignKey, DateTime
+from datetime import datetime, timezone
+from .base import Base
+
+class KnowledgeDocument(Base):
+    """Document attached to an agent, split into chunks for retrieval."""
+    __tablename__ = "knowledge_documents"
+    id = Column(Integer, primary_key=True)
+    agent_id = Column(Integer, ForeignKey("agents.id", ondelete="CASCADE"), nullable=False, index=True)
+    title = Column(String, nullable=False)
+    content = Column(String, nullable=False)
+    chunk_count = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
+
+class KnowledgeChunk(Base):
+    """Passage of a knowledge document with its embedding."""
+    __tablename__ = "knowledge_chunks"
+    id = Column(Integer, primary_key=True)
+    document_id = Column(Integer, ForeignKey("knowledge_documents.id", ondelete="CASCADE"), nullable=False, index=True)
+    # Denormalized from the document, an agent's index is loaded without a join
+    agent_id = Column(Integer, ForeignKey("agents.id", ondelete="CASCADE"), nullable=False, index=True)
+    position = Column(Integer, nullable=False)
+    content = Column(String, nullable=False)
+    # Little-endian float32, 4 bytes per dimension
+    embedding = Column(LargeBinary, nullable=False)
+    # Name of the embedder that produced the vector, vectors of different embedders do not mix
+    embedding_model = Column(String, nullable=False)
@@ -0,0 +1,22 @@
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, JSON
+from datetime import datetime, timezone
+from .base import Base
+
+class ToolCall(Base):
+    """A tool call made while answering a chat turn, see ``tool_service``."""
+    __tablename__ = "tool_calls"
+    id = Column(Integer, primary_key=True)
+    session_id = Column(Integer, ForeignKey("chat_sessions.id", ondelete="CASCADE"), nullable=False, index=True)
+    agent_id = Column(Integer, ForeignKey("agents.id", ondelete="CASCADE"), nullable=False, index=True)
+    # Assistant message the call led to; no foreign key, ``messages`` may be partitioned
+    message_id = Column(Integer, nullable=True)
+    name = Column(String, nullable=False)
+    kind = Column(String(32), nullable=False)
+    # As sent by the model, the raw text when it was not a JSON object
+    arguments = Column(JSON, nullable=True)
+    # "ok", "error" or "timeout"
+    status = Column(String(16), nullable=False)
+    # Answered from the tool result cache
+    cached = Column(Boolean, nullable=False, default=False)
+    latency_ms = Column(Integer, nullable=False)
+    created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), index=True)
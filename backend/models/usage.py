@@ -0,0 +1,29 @@
+from sqlalchemy import Column, Integer, Date, ForeignKey, UniqueConstraint
+from .base import Base
+
+class UserDailyUsage(Base):
+    """Per-user daily usage counters, updated incrementally on every assistant turn."""
+    __tablename__ = "user_daily_usage"
+    __table_args__ = (UniqueConstraint("user_id", "day", name="uq_user_daily_usage_user_day"),)
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    day = Column(Date, nullable=False)
+    turns = Column(Integer, nullable=False, default=0)
+    prompt_tokens = Column(Integer, nullable=False, default=0)
+    completion_tokens = Column(Integer, nullable=False, default=0)
+    latency_ms_total = Column(Integer, nullable=False, default=0)
+    ttft_ms_total = Column(Integer, nullable=False, default=0)
+
+class AgentDailyUsage(Base):
+    """Per-agent daily usage counters, updated incrementally on every assistant turn."""
+    __tablename__ = "agent_daily_usage"
+    __table_args__ = (UniqueConstraint("agent_id", "day", name="uq_agent_daily_usage_agent_day"),)
+    id = Column(Integer, primary_key=True)
+    agent_id = Column(Integer, ForeignKey("agents.id", ondelete="CASCADE"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    day = Column(Date, nullable=False)
+    turns = Column(Integer, nullable=False, default=0)
+    prompt_tokens = Column(Integer, nullable=False, default=0)
+    completion_tokens = Column(Integer, nullable=False, default=0)
+    latency_ms_total = Column(Integer, nullable=False, default=0)
+    ttft_ms_total = Column(Integer, nullable=False, default=0)
@@ -10,4 +10,7 @@ class User(Base):
     username = Column(String, unique=True, nullable=False)
     password_hash = Column(String, nullable=False)
     created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
-    agents = relationship("Agent", back_populates="user", cascade="all, delete-orphan")
\ No newline at end of file
+    # Bumped on every change to the user's agents / sessions, used for ETags and delta sync
+    agents_version = Column(Integer, nullable=False, default=0, server_default="0")
+    sessions_version = Column(Integer, nullable=False, default=0, server_default="0")
+    agents = relationship("Agent", back_populates="user", cascade="all, delete-orphan", passive_deletes=True)
\ No newline at end of file
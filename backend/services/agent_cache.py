@@ -0,0 +1,331 @@
+"""
+In-process cache of agent configurations and session ownership.
+
+Every chat turn needs the session's agent, its owner and the agent's prompt and
+model settings, data that rarely changes. ``AgentCache`` keeps snapshots of live
+agents and sessions for ``AGENT_CACHE_TTL_SECONDS``, at most ``AGENT_CACHE_SIZE``
+of each, least recently used first out.
+
+Code changing a cached row calls ``publish_invalidation`` inside its transaction.
+That records the change in ``cache_invalidations`` and, on Postgres, sends a
+``NOTIFY`` on ``AGENT_CACHE_CHANNEL``; both only take effect when the transaction
+commits, and the local cache is invalidated right after the commit. The other
+workers receive the notification on a ``LISTEN`` connection within milliseconds.
+``CacheInvalidationListener`` also polls the table every
+``AGENT_CACHE_POLL_SECONDS``, which covers notifications lost while the listening
+connection was down, transaction-mode poolers (which do not support ``LISTEN``) and
+SQLite. A worker therefore serves a changed agent for at most the poll interval,
+the TTL bounds staleness if both paths fail.
+
+A load racing with an invalidation is not stored, so a snapshot read before a
+commit cannot outlive the invalidation that followed it.
+"""
+from backend.models.agent import Agent
+from backend.models.cache_invalidation import CacheInvalidation
+from backend.models.chat import ChatSession
+from backend.utils.periodic import PeriodicTask
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import delete, event, func, insert, select
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker
+from sqlalchemy.orm import Session
+from types import SimpleNamespace
+from typing import Deque, Dict, Optional
+import logging
+import os
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+AGENT_CACHE_SIZE = int(os.getenv("AGENT_CACHE_SIZE", "10000"))
+AGENT_CACHE_TTL_SECONDS = float(os.getenv("AGENT_CACHE_TTL_SECONDS", "300"))
+AGENT_CACHE_POLL_SECONDS = float(os.getenv("AGENT_CACHE_POLL_SECONDS", "5"))
+AGENT_CACHE_CHANNEL = os.getenv("AGENT_CACHE_CHANNEL", "agent_cache")
+# Invalidations committed up to this long after their row was created are still picked up by the poll
+AGENT_CACHE_POLL_GRACE_SECONDS = 60
+AGENT_CACHE_RETENTION_SECONDS = 3600
+# Invalidation delays kept for the statistics
+AGENT_CACHE_MAX_LAGS = 1000
+
+# Identifies this process in published invalidations
+ORIGIN = uuid.uuid4().hex
+AGENT = "agent"
+SESSION = "session"
+_PENDING = "cache_invalidations"
+
+class AgentSnapshot(SimpleNamespace):
+    """Column values of a live agent, read like the ``Agent`` row."""
+
+@dataclass(frozen=True)
+class SessionSnapshot:
+    id: int
+    agent_id: int
+    # Owner of the session's agent
+    user_id: int
+    archived: bool
+    # Set on branches, never changes
+    parent_session_id: Optional[int] = None
+
+AGENT_SNAPSHOT_COLUMNS = tuple(Agent.__table__.columns)
+
+def _utc(value: datetime) -> datetime:
+    # SQLite returns naive datetimes, stored in UTC
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+class AgentCache:
+    """Agent and session snapshots with hit and staleness statistics, see the module docstring."""
+
+    def __init__(
+        self,
+        max_entries: int = AGENT_CACHE_SIZE,
+        ttl_seconds: float = AGENT_CACHE_TTL_SECONDS,
+        clock=time.monotonic,
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.clock = clock
+        # Key -> (expiry, snapshot), least recently used first
+        self._entries: Dict[str, OrderedDict] = {AGENT: OrderedDict(), SESSION: OrderedDict()}
+        # Bumped by every invalidation, loads that saw another value are not stored
+        self._generation = 0
+        self.hits = {AGENT: 0, SESSION: 0}
+        self.misses = {AGENT: 0, SESSION: 0}
+        self.invalidations = 0
+        # Milliseconds from a change to its invalidation here, per delivery path
+        self._lags: Dict[str, Deque[float]] = {
+            "notify": deque(maxlen=AGENT_CACHE_MAX_LAGS),
+            "poll": deque(maxlen=AGENT_CACHE_MAX_LAGS),
+        }
+        self.listening = False
+
+    def _get(self, kind: str, key: int):
+        entries = self._entries[kind]
+        entry = entries.get(key)
+        if entry is None or entry[0] < self.clock():
+            entries.pop(key, None)
+            self.misses[kind] += 1
+            return None
+        entries.move_to_end(key)
+        self.hits[kind] += 1
+        return entry[1]
+
+    def _put(self, kind: str, key: int, snapshot, generation: int):
+        if generation != self._generation:
+            return
+        entries = self._entries[kind]
+        entries[key] = (self.clock() + self.ttl_seconds, snapshot)
+        entries.move_to_end(key)
+        while len(entries) > self.max_entries:
+            entries.popitem(last=False)
+
+    async def get_agent(self, db: AsyncSession, agent_id: int) -> Optional[AgentSnapshot]:
+        """The live agent ``agent_id``, loaded on a miss, None if it does not exist or is deleted."""
+        agent = self._get(AGENT, agent_id)
+        if agent is not None:
+            return agent
+        generation = self._generation
+        result = await db.execute(
+            select(*AGENT_SNAPSHOT_COLUMNS).where(Agent.id == agent_id, Agent.deleted_at.is_(None))
+        )
+        row = result.first()
+        if row is None:
+            return None
+        agent = AgentSnapshot(**row._mapping)
+        self._put(AGENT, agent_id, agent, generation)
+        return agent
+
+    async def get_session(self, db: AsyncSession, session_id: int) -> Optional[SessionSnapshot]:
+        """The live session ``session_id`` with its owner, loaded on a miss, None if it does not exist or is deleted."""
+        session = self._get(SESSION, session_id)
+        if session is not None:
+            return session
+        generation = self._generation
+        result = await db.execute(
+            select(ChatSession.agent_id, ChatSession.archived_at, ChatSession.parent_session_id, Agent.user_id)
+            .join(Agent, Agent.id == ChatSession.agent_id)
+            .where(ChatSession.id == session_id, ChatSession.deleted_at.is_(None), Agent.deleted_at.is_(None))
+        )
+        row = result.first()
+        if row is None:
+            return None
+        session = SessionSnapshot(
+            session_id, row.agent_id, row.user_id, row.archived_at is not None, row.parent_session_id
+        )
+        self._put(SESSION, session_id, session, generation)
+        return session
+
+    def invalidate(self, kind: str, key: int, published_at: Optional[float] = None, source: Optional[str] = None):
+        """
+        Drop a snapshot; an agent takes its sessions along.
+
+        ``published_at`` (epoch seconds) and ``source`` record how long the change
+        took to reach this worker.
+        """
+        self._generation += 1
+        self.invalidations += 1
+        self._entries[kind].pop(key, None)
+        if kind == AGENT:
+            sessions = self._entries[SESSION]
+            for session_id in [k for k, (_, s) in sessions.items() if s.agent_id == key]:
+                del sessions[session_id]
+        if published_at is not None and source in self._lags:
+            self._lags[source].append(max(0.0, (time.time() - published_at) * 1000))
+
+    def clear(self):
+        self._generation += 1
+        for entries in self._entries.values():
+            entries.clear()
+        for kind in self.hits:
+            self.hits[kind] = self.misses[kind] = 0
+        for lags in self._lags.values():
+            lags.clear()
+        self.invalidations = 0
+
+    def stats(self) -> dict:
+        def counters(kind: str) -> dict:
+            lookups = self.hits[kind] + self.misses[kind]
+            return {
+                "size": len(self._entries[kind]),
+                "hits": self.hits[kind],
+                "misses": self.misses[kind],
+                "hit_rate": self.hits[kind] / lookups if lookups else 0.0,
+            }
+
+        def lag(source: str) -> dict:
+            values = sorted(self._lags[source])
+            return {
+                "count": len(values),
+                "p50_ms": values[len(values) // 2] if values else None,
+                "max_ms": values[-1] if values else None,
+            }
+
+        return {
+            "agents": counters(AGENT),
+            "sessions": counters(SESSION),
+            "invalidations": self.invalidations,
+            "ttl_seconds": self.ttl_seconds,
+            "poll_interval_seconds": AGENT_CACHE_POLL_SECONDS,
+            "listening": self.listening,
+            "notify_lag": lag("notify"),
+            "poll_lag": lag("poll"),
+        }
+
+# Process-wide cache, the snapshots are shared by all requests
+agent_cache = AgentCache()
+
+async def publish_invalidation(db: AsyncSession, kind: str, key: int):
+    """
+    Invalidate the cached ``kind`` (``"agent"`` or ``"session"``) ``key`` in every
+    worker once the transaction of ``db`` commits. The caller commits.
+    """
+    await db.execute(insert(CacheInvalidation).values(kind=kind, key=key, origin=ORIGIN))
+    if db.get_bind().dialect.name == "postgresql":
+        # Delivered by Postgres on commit only
+        await db.execute(select(func.pg_notify(AGENT_CACHE_CHANNEL, f"{kind}:{key}:{ORIGIN}:{time.time()}")))
+    db.info.setdefault(_PENDING, set()).add((kind, key))
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed(session):
+    for kind, key in session.info.pop(_PENDING, ()):
+        agent_cache.invalidate(kind, key)
+
+@event.listens_for(Session, "after_rollback")
+def _discard_rolled_back(session):
+    session.info.pop(_PENDING, None)
+
+class CacheInvalidationListener(PeriodicTask):
+    """Applies the other workers' invalidations to a cache, see the module docstring."""
+    name = "Cache invalidation"
+
+    def __init__(
+        self,
+        engine: AsyncEngine,
+        session_factory: async_sessionmaker,
+        cache: AgentCache = agent_cache,
+        listen: bool = True,
+        interval: float = AGENT_CACHE_POLL_SECONDS,
+    ):
+        super().__init__(interval)
+        self.engine = engine
+        self.session_factory = session_factory
+        self.cache = cache
+        self.listen = listen and engine.dialect.name == "postgresql"
+        self._connection = None
+        self._driver = None
+        # Rows applied within the grace window, by id
+        self._seen: Dict[int, datetime] = {}
+        self._polled_at = datetime.now(timezone.utc)
+
+    def _on_notify(self, connection, pid, channel, payload: str):
+        try:
+            kind, key, origin, published_at = payload.split(":")
+            if origin != ORIGIN:
+                self.cache.invalidate(kind, int(key), float(published_at), "notify")
+        except (ValueError, KeyError):
+            logger.warning(f"Ignoring malformed cache invalidation {payload!r}")
+
+    async def _ensure_listening(self):
+        if self._driver is not None and not self._driver.is_closed():
+            return
+        await self._close_connection()
+        try:
+            self._connection = await self.engine.connect()
+            raw = await self._connection.get_raw_connection()
+            self._driver = raw.driver_connection
+            await self._driver.add_listener(AGENT_CACHE_CHANNEL, self._on_notify)
+            logger.info(f"Listening for cache invalidations on {AGENT_CACHE_CHANNEL}")
+        except Exception as e:
+            logger.warning(f"Cache invalidation LISTEN failed, polling only: {e}")
+            await self._close_connection()
+
+    async def _close_connection(self):
+        if self._connection is not None:
+            try:
+                await self._connection.close()
+            except Exception:
+                pass
+        self._connection = None
+        self._driver = None
+
+    async def poll(self) -> int:
+        """Apply the invalidations committed by other workers since the last poll, returns how many."""
+        started = datetime.now(timezone.utc)
+        since = self._polled_at - timedelta(seconds=AGENT_CACHE_POLL_GRACE_SECONDS)
+        async with self.session_factory() as db:
+            result = await db.execute(
+                select(CacheInvalidation.id, CacheInvalidation.kind, CacheInvalidation.key,
+                       CacheInvalidation.origin, CacheInvalidation.created_at)
+                .where(CacheInvalidation.created_at >= since)
+                .order_by(CacheInvalidation.id)
+            )
+            rows = result.all()
+            await db.execute(delete(CacheInvalidation).where(
+                CacheInvalidation.created_at < started - timedelta(seconds=AGENT_CACHE_RETENTION_SECONDS)
+            ))
+            await db.commit()
+
+        applied = 0
+        for row in rows:
+            if row.id in self._seen:
+                continue
+            created_at = _utc(row.created_at)
+            self._seen[row.id] = created_at
+            if row.origin != ORIGIN:
+                self.cache.invalidate(row.kind, row.key, created_at.timestamp(), "poll")
+                applied += 1
+        self._seen = {row_id: at for row_id, at in self._seen.items() if at >= since}
+        self._polled_at = started
+        return applied
+
+    async def run_once(self):
+        if self.listen:
+            await self._ensure_listening()
+        self.cache.listening = self._driver is not None
+        await self.poll()
+
+    async def stop(self):
+        await super().stop()
+        await self._close_connection()
+        self.cache.listening = False
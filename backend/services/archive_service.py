@@ -0,0 +1,197 @@
+from backend.models.archive import SessionArchive
+from backend.models.chat import ChatSession, Message
+from backend.models.embedding import MessageEmbedding
+from backend.services.agent_cache import SESSION, publish_invalidation
+from backend.utils.partitioning import DB_PARTITION_MESSAGES, drop_empty_partitions, ensure_month_partitions, is_partitioned
+from backend.utils.periodic import PeriodicTask
+from backend.utils.serialization import MESSAGE_COLUMNS, ORJSON_OPTIONS, column_keys, rows_to_dicts
+from sqlalchemy import delete, exists, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlalchemy.orm import aliased
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional
+import asyncio
+import logging
+import os
+import orjson
+import zstandard
+
+logger = logging.getLogger(__name__)
+
+# Sessions without messages for this many days are archived, 0 disables the archiver
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "0"))
+# Sessions archived per run, one transaction each
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "100"))
+ARCHIVE_INTERVAL_SECONDS = float(os.getenv("ARCHIVE_INTERVAL_SECONDS", "3600"))
+ARCHIVE_ZSTD_LEVEL = int(os.getenv("ARCHIVE_ZSTD_LEVEL", "10"))
+
+# What is kept per message: the response columns plus what restoring the rows needs
+ARCHIVE_COLUMNS = MESSAGE_COLUMNS + (Message.version,)
+RESPONSE_KEYS = column_keys(MESSAGE_COLUMNS)
+
+def pack_messages(messages: List[dict]) -> bytes:
+    """Encode messages as one zstd-compressed JSON array."""
+    return zstandard.ZstdCompressor(level=ARCHIVE_ZSTD_LEVEL).compress(orjson.dumps(messages, option=ORJSON_OPTIONS))
+
+def unpack_messages(data: bytes) -> List[dict]:
+    return orjson.loads(zstandard.ZstdDecompressor().decompress(data))
+
+def has_live_branches():
+    """Whether a live branch was forked from ``ChatSession``, whose history still reads its messages."""
+    branch = aliased(ChatSession)
+    return exists().where(branch.parent_session_id == ChatSession.id, branch.deleted_at.is_(None))
+
+async def delete_message_embeddings(db: AsyncSession, message_ids):
+    """Delete the embedding links of ``message_ids`` (a list or a subquery), they have no foreign key."""
+    await db.execute(delete(MessageEmbedding).where(MessageEmbedding.message_id.in_(message_ids)))
+
+async def archive_session(db: AsyncSession, session_id: int) -> int:
+    """
+    Move the messages of a session into ``session_archives``.
+
+    The session row is locked first so a concurrent message cannot slip in between
+    reading and deleting the messages. Returns the number of archived messages, 0 if
+    the session is gone, already archived, empty or has live branches. The caller commits.
+    """
+    result = await db.execute(
+        select(ChatSession).where(ChatSession.id == session_id, ChatSession.archived_at.is_(None)).with_for_update()
+    )
+    session = result.scalar_one_or_none()
+    if session is None:
+        return 0
+    # Checked under the lock, creating a branch locks the session too
+    if (await db.execute(select(has_live_branches()).where(ChatSession.id == session_id))).scalar():
+        return 0
+    result = await db.execute(
+        select(*ARCHIVE_COLUMNS).where(Message.session_id == session_id).order_by(Message.created_at)
+    )
+    messages = rows_to_dicts(result, column_keys(ARCHIVE_COLUMNS))
+    if not messages:
+        return 0
+
+    data = await asyncio.to_thread(pack_messages, messages)
+    db.add(SessionArchive(session_id=session_id, message_count=len(messages), data=data))
+    # Archived sessions are not backfilled, their embedding links go with the rows
+    await delete_message_embeddings(db, select(Message.id).where(Message.session_id == session_id))
+    await db.execute(delete(Message).where(Message.session_id == session_id))
+    session.archived_at = datetime.now(timezone.utc)
+    await publish_invalidation(db, SESSION, session_id)
+    return len(messages)
+
+async def _load(db: AsyncSession, session_id: int) -> List[dict]:
+    result = await db.execute(select(SessionArchive.data).where(SessionArchive.session_id == session_id))
+    data = result.scalar_one_or_none()
+    return unpack_messages(data) if data is not None else []
+
+async def archived_messages(db: AsyncSession, session_id: int, since: Optional[int] = None) -> List[dict]:
+    """Messages of an archived session in the ``MessageResponse`` shape, optionally only those after ``since``."""
+    messages = await _load(db, session_id)
+    return [
+        {key: message[key] for key in RESPONSE_KEYS}
+        for message in messages
+        if since is None or message["version"] > since
+    ]
+
+async def restore_session(db: AsyncSession, session_id: int) -> int:
+    """
+    Move an archived session's messages back into ``messages`` before it is written to.
+
+    Like ``archive_session`` the session row is locked and only taken while it is
+    still archived, so concurrent writers restore it once: the others wait for the
+    lock and find it restored. Returns the number of restored messages, 0 if the
+    session is gone or not archived (anymore). The caller commits.
+    """
+    result = await db.execute(
+        select(ChatSession)
+        .where(ChatSession.id == session_id, ChatSession.archived_at.is_not(None))
+        .with_for_update()
+        .execution_options(populate_existing=True)
+    )
+    session = result.scalar_one_or_none()
+    if session is None:
+        return 0
+    messages = await _load(db, session_id)
+    for message in messages:
+        message["created_at"] = datetime.fromisoformat(message["created_at"])
+    if messages:
+        await db.execute(insert(Message), messages)
+    await db.execute(delete(SessionArchive).where(SessionArchive.session_id == session_id))
+    session.archived_at = None
+    await publish_invalidation(db, SESSION, session_id)
+    return len(messages)
+
+async def archived_audio_urls(db: AsyncSession, session_ids) -> List[str]:
+    """Audio URLs referenced from the archives of ``session_ids`` (a list or a subquery)."""
+    result = await db.execute(select(SessionArchive.data).where(SessionArchive.session_id.in_(session_ids)))
+    return [
+        message["audio_url"]
+        for data in result.scalars().all()
+        for message in unpack_messages(data)
+        if message["audio_url"]
+    ]
+
+async def archive_cold_sessions(
+    session_factory: async_sessionmaker,
+    older_than_days: int = ARCHIVE_AFTER_DAYS,
+    batch_size: int = ARCHIVE_BATCH_SIZE,
+) -> int:
+    """Archive up to ``batch_size`` sessions whose last message is older than ``older_than_days``, returns how many."""
+    cutoff = datetime.now(timezone.utc) - timedelta(days=older_than_days)
+    has_messages = exists().where(Message.session_id == ChatSession.id)
+    has_recent = exists().where(Message.session_id == ChatSession.id, Message.created_at >= cutoff)
+    async with session_factory() as db:
+        result = await db.execute(
+            select(ChatSession.id)
+            .where(
+                ChatSession.archived_at.is_(None),
+                ChatSession.deleted_at.is_(None),
+                has_messages,
+                ~has_recent,
+                ~has_live_branches(),
+            )
+            .limit(batch_size)
+        )
+        session_ids = result.scalars().all()
+
+    archived = 0
+    for session_id in session_ids:
+        async with session_factory() as db:
+            if await archive_session(db, session_id):
+                archived += 1
+            await db.commit()
+    return archived
+
+class Archiver(PeriodicTask):
+    """Background task archiving cold sessions and maintaining the ``messages`` partitions."""
+    name = "Archive"
+
+    def __init__(
+        self,
+        session_factory: async_sessionmaker,
+        older_than_days: int = ARCHIVE_AFTER_DAYS,
+        batch_size: int = ARCHIVE_BATCH_SIZE,
+        interval: float = ARCHIVE_INTERVAL_SECONDS,
+    ):
+        super().__init__(interval)
+        self.session_factory = session_factory
+        self.older_than_days = older_than_days
+        self.batch_size = batch_size
+
+    async def run_once(self):
+        archived = await archive_cold_sessions(self.session_factory, self.older_than_days, self.batch_size)
+        if archived:
+            logger.info(f"Archived {archived} cold sessions")
+        if DB_PARTITION_MESSAGES:
+            cutoff = (datetime.now(timezone.utc) - timedelta(days=self.older_than_days)).date()
+            async with self.session_factory() as db:
+                dropped = await db.run_sync(lambda session: _maintain_partitions(session, cutoff))
+                await db.commit()
+            if dropped:
+                logger.info(f"Dropped empty message partitions: {dropped}")
+
+def _maintain_partitions(session, cutoff) -> List[str]:
+    connection = session.connection()
+    if not is_partitioned(connection):
+        return []
+    ensure_month_partitions(connection)
+    return drop_empty_partitions(connection, cutoff)
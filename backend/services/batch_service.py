@@ -0,0 +1,238 @@
+"""
+Many chat turns in one request, for evaluation jobs replaying prompts.
+
+``run_batch`` authorizes every item with one query, creates the sessions asked for
+by ``agent_id`` items with one multi-row insert and loads the histories of the
+existing sessions, branches included, with another. Completions then run
+concurrently, at most ``BATCH_CONCURRENCY`` per batch and within the worker's
+``UPSTREAM_CONCURRENCY``; items sent to the same session run one after the other,
+each seeing the replies to the earlier ones. Finished turns are written with
+multi-row inserts of up to ``BATCH_WRITE_SIZE`` items, as many as have completed
+since the last write, and reported as soon as they are stored.
+
+A failed item is reported with its status code and stores nothing, the other
+items go on. Agents call their tools as in a single turn, see ``complete_with_tools``.
+"""
+from backend.models.agent import Agent
+from backend.models.chat import ChatSession
+from backend.services.agent_cache import AGENT_SNAPSHOT_COLUMNS, AgentSnapshot
+from backend.services.archive_service import restore_session
+from backend.services.branch_service import load_histories
+from backend.services.embedders import Embedder
+from backend.services.knowledge_service import system_message
+from backend.services.message_writer import MessageWriter, Usage
+from backend.services.openai_service import ChatCompletionResult, complete_with_tools
+from backend.services.tool_service import ToolContext, record_tool_calls
+from backend.services.versioning_service import bump_sessions_version
+from backend.utils.serialization import MESSAGE_COLUMNS, column_keys
+from openai import AsyncOpenAI
+from sqlalchemy import and_, insert, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import AsyncIterator, Dict, List, Optional
+import asyncio
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "1000"))
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "8"))
+BATCH_WRITE_SIZE = int(os.getenv("BATCH_WRITE_SIZE", "100"))
+
+RESPONSE_KEYS = column_keys(MESSAGE_COLUMNS)
+
+@dataclass
+class _Turn:
+    index: int
+    session_id: int
+    agent: AgentSnapshot
+    content: str
+    asked_at: datetime
+    answered_at: Optional[datetime] = None
+    completion: Optional[ChatCompletionResult] = None
+    status_code: int = 200
+    error: Optional[str] = None
+
+def _error(index: int, status_code: int, error: str, session_id: Optional[int] = None) -> dict:
+    return {"index": index, "session_id": session_id, "status_code": status_code, "message": None, "error": error}
+
+async def _authorize(db: AsyncSession, user_id: int, items: list):
+    """The user's live agents and sessions among those the items name, in one query."""
+    session_ids = {item.session_id for item in items if item.session_id is not None}
+    agent_ids = {item.agent_id for item in items if item.agent_id is not None}
+    result = await db.execute(
+        select(*AGENT_SNAPSHOT_COLUMNS, ChatSession.id.label("target_session_id"), ChatSession.archived_at.label("target_archived_at"))
+        .outerjoin(ChatSession, and_(
+            ChatSession.agent_id == Agent.id, ChatSession.id.in_(session_ids), ChatSession.deleted_at.is_(None)
+        ))
+        .where(
+            Agent.user_id == user_id,
+            Agent.deleted_at.is_(None),
+            or_(Agent.id.in_(agent_ids), ChatSession.id.is_not(None)),
+        )
+    )
+    agents: Dict[int, AgentSnapshot] = {}
+    sessions: Dict[int, tuple] = {}
+    for row in result.all():
+        mapping = row._mapping
+        agent = agents.setdefault(row.id, AgentSnapshot(**{c.key: mapping[c] for c in AGENT_SNAPSHOT_COLUMNS}))
+        if row.target_session_id is not None:
+            sessions[row.target_session_id] = (agent, row.target_archived_at is not None)
+    return agents, sessions
+
+async def create_sessions(db: AsyncSession, user_id: int, agent_ids: List[int]) -> List[int]:
+    if not agent_ids:
+        return []
+    version = await bump_sessions_version(db, user_id)
+    stmt = insert(ChatSession).returning(ChatSession.id, sort_by_parameter_order=True)
+    return list((await db.execute(stmt, [{"agent_id": agent_id, "version": version} for agent_id in agent_ids])).scalars().all())
+
+async def run_batch(
+    db: AsyncSession,
+    client: AsyncOpenAI,
+    embedder: Optional[Embedder],
+    writer: MessageWriter,
+    user_id: int,
+    items: list,
+    concurrency: int = BATCH_CONCURRENCY,
+    write_size: int = BATCH_WRITE_SIZE,
+) -> AsyncIterator[dict]:
+    """
+    Answer ``items`` (``BatchMessageItem``) for ``user_id``, see the module docstring.
+
+    Yields one ``BatchMessageResult`` dict per item in completion order: errors of
+    unauthorized items first, then the turns as they are stored.
+    """
+    agents, sessions = await _authorize(db, user_id, items)
+    # Items per target session, in request order
+    groups: Dict[int, List[int]] = {}
+    new_session_agents = []
+    for index, item in enumerate(items):
+        if item.session_id is not None and item.session_id in sessions:
+            groups.setdefault(item.session_id, []).append(index)
+        elif item.agent_id is not None and item.agent_id in agents:
+            new_session_agents.append((index, item.agent_id))
+        else:
+            yield _error(index, 404, "Session not found" if item.session_id is not None else "Agent not found", item.session_id)
+
+    for session_id, (_, archived) in sessions.items():
+        if archived and session_id in groups:
+            await restore_session(db, session_id)
+    new_ids = await create_sessions(db, user_id, [agent_id for _, agent_id in new_session_agents])
+    for (index, agent_id), session_id in zip(new_session_agents, new_ids):
+        groups[session_id] = [index]
+        sessions[session_id] = (agents[agent_id], False)
+    await db.commit()
+    created = set(new_ids)
+    histories = await load_histories(db, [session_id for session_id in groups if session_id not in created])
+
+    # The request's session is shared by the workers, one statement at a time
+    db_lock = asyncio.Lock()
+    slots = asyncio.Semaphore(concurrency)
+    done: asyncio.Queue = asyncio.Queue()
+
+    async def run_session(session_id: int, indices: List[int]):
+        agent = sessions[session_id][0]
+        history = histories.get(session_id, [])
+        for index in indices:
+            turn = _Turn(index, session_id, agent, items[index].content, datetime.now(timezone.utc))
+            messages = history + [{"role": "user", "content": turn.content}]
+            try:
+                async with slots:
+                    async with db_lock:
+                        system = await system_message(db, agent, messages, embedder)
+                    started = time.perf_counter()
+                    reply, tool_calls = await complete_with_tools(
+                        client, agent, [system, *messages], ToolContext(db, agent, embedder, db_lock)
+                    )
+                latency_ms = int((time.perf_counter() - started) * 1000)
+                turn.completion = ChatCompletionResult(
+                    content=reply.content,
+                    model=reply.model,
+                    prompt_tokens=reply.prompt_tokens,
+                    completion_tokens=reply.completion_tokens,
+                    latency_ms=latency_ms,
+                    ttft_ms=latency_ms,
+                    tool_calls=tool_calls,
+                )
+                turn.answered_at = datetime.now(timezone.utc)
+                history = messages + [{"role": "assistant", "content": reply.content}]
+            except Exception as e:
+                logger.error(f"Batch item {index} failed for session {session_id}: {e}")
+                turn.status_code, turn.error = 502, "Failed to generate response"
+            await done.put(turn)
+
+    async def store(turns: List[_Turn]) -> List[dict]:
+        completed = [turn for turn in turns if turn.completion is not None]
+        rows, usages = [], []
+        for turn in completed:
+            rows.append({"session_id": turn.session_id, "content": turn.content, "is_user": True, "created_at": turn.asked_at})
+            usages.append(None)
+            rows.append({
+                "session_id": turn.session_id,
+                "content": turn.completion.content,
+                "is_user": False,
+                "created_at": turn.answered_at,
+                "model": turn.completion.model,
+                "prompt_tokens": turn.completion.prompt_tokens,
+                "completion_tokens": turn.completion.completion_tokens,
+                "latency_ms": turn.completion.latency_ms,
+                "ttft_ms": turn.completion.ttft_ms,
+            })
+            usages.append(Usage(turn.agent.user_id, turn.agent.id, turn.completion))
+        stored = {}
+        if rows:
+            try:
+                async with db_lock:
+                    written = await writer.add_many(db, rows, user_id=user_id, usages=usages)
+                stored = {turn.index: written[2 * i + 1] for i, turn in enumerate(completed)}
+            except Exception as e:
+                await db.rollback()
+                logger.error(f"Storing {len(completed)} batch items failed: {e}")
+            calls = [turn for turn in completed if turn.index in stored and turn.completion.tool_calls]
+            if calls:
+                try:
+                    async with db_lock:
+                        for turn in calls:
+                            await record_tool_calls(
+                                db, turn.session_id, turn.agent.id, stored[turn.index]["id"], turn.completion.tool_calls
+                            )
+                        await db.commit()
+                except Exception as e:
+                    await db.rollback()
+                    logger.error(f"Recording the tool calls of {len(calls)} batch items failed: {e}")
+        results = []
+        for turn in turns:
+            if turn.index in stored:
+                message = {key: stored[turn.index][key] for key in RESPONSE_KEYS}
+                results.append({
+                    "index": turn.index,
+                    "session_id": turn.session_id,
+                    "status_code": 200,
+                    "message": {**message, "agent_name": turn.agent.name},
+                    "error": None,
+                })
+            elif turn.completion is not None:
+                results.append(_error(turn.index, 500, "Failed to store the messages", turn.session_id))
+            else:
+                results.append(_error(turn.index, turn.status_code, turn.error, turn.session_id))
+        return results
+
+    tasks = [asyncio.create_task(run_session(session_id, indices)) for session_id, indices in groups.items()]
+    remaining = sum(len(indices) for indices in groups.values())
+    try:
+        while remaining:
+            turns = [await done.get()]
+            while len(turns) < write_size and not done.empty():
+                turns.append(done.get_nowait())
+            remaining -= len(turns)
+            for result in await store(turns):
+                yield result
+    finally:
+        # The client went away or the batch failed, stop the outstanding completions
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,121 @@
+"""
+Copy-on-write conversation branches.
+
+A branch is a session forked from a message of another session: it points at its
+parent session and the fork message through ``parent_session_id`` and
+``parent_message_id`` and holds only the messages added after the fork. Nothing is
+copied, so branching costs one row whatever the length of the conversation.
+
+The history of a session is resolved by walking its ancestors with a recursive CTE
+(``lineage``): every ancestor contributes its messages up to the fork message of the
+child below it, the session itself all of its messages. ``load_histories`` assembles
+the context of any number of sessions, branched or not, in a single query. Message
+ids grow with the order of the messages within a session in every write mode, so
+the cut-off compares ids.
+
+Ancestors are never archived while they have live branches, see
+``archive_session``. Deleting a session deletes its branches.
+"""
+from backend.models.chat import ChatSession, Message
+from backend.services.archive_service import restore_session
+from backend.services.versioning_service import bump_sessions_version
+from fastapi import HTTPException
+from sqlalchemy import Integer, cast, null, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+from typing import Dict, List, Sequence
+
+def lineage(session_ids):
+    """
+    CTE pairing each of ``session_ids`` (``target_id``) with itself and its ancestors
+    (``session_id``); ``upto`` is the last message of ``session_id`` visible to the
+    target, NULL for all of them.
+    """
+    anchor = select(
+        ChatSession.id.label("target_id"),
+        ChatSession.id.label("session_id"),
+        ChatSession.parent_session_id.label("parent_id"),
+        ChatSession.parent_message_id.label("fork_id"),
+        cast(null(), Integer).label("upto"),
+    ).where(ChatSession.id.in_(session_ids))
+    cte = anchor.cte("lineage", recursive=True)
+    parent = aliased(ChatSession)
+    return cte.union_all(
+        select(cte.c.target_id, parent.id, parent.parent_session_id, parent.parent_message_id, cte.c.fork_id)
+        .where(parent.id == cte.c.parent_id)
+    )
+
+def history_query(cte, *columns):
+    """``columns`` of the messages visible through the ``lineage`` CTE, in conversation order per target."""
+    return (
+        select(*columns)
+        .select_from(Message)
+        .join(cte, Message.session_id == cte.c.session_id)
+        .where(or_(cte.c.upto.is_(None), Message.id <= cte.c.upto))
+        .order_by(cte.c.target_id, Message.created_at, Message.id)
+    )
+
+async def load_histories(db: AsyncSession, session_ids: Sequence[int]) -> Dict[int, list]:
+    """Chat context of each session as role/content dicts, ancestors included, in one query."""
+    histories: Dict[int, list] = {session_id: [] for session_id in session_ids}
+    if session_ids:
+        cte = lineage(list(session_ids))
+        result = await db.execute(history_query(cte, cte.c.target_id, Message.content, Message.is_user))
+        for row in result.all():
+            histories[row.target_id].append({"role": "user" if row.is_user else "assistant", "content": row.content})
+    return histories
+
+async def load_history(db: AsyncSession, session_id: int, branched: bool = True) -> list:
+    """
+    Chat context of one session. Callers that know the session is not a branch, e.g.
+    from its cached ``parent_session_id``, pass ``branched=False`` to read its messages
+    without walking ``chat_sessions``.
+    """
+    if branched:
+        return (await load_histories(db, [session_id]))[session_id]
+    result = await db.execute(
+        select(Message.content, Message.is_user)
+        .where(Message.session_id == session_id)
+        .order_by(Message.created_at, Message.id)
+    )
+    return [{"role": "user" if row.is_user else "assistant", "content": row.content} for row in result.all()]
+
+def descendants(session_id: int):
+    """CTE of the ids of the live branches of ``session_id``, at any depth."""
+    anchor = select(ChatSession.id).where(ChatSession.parent_session_id == session_id, ChatSession.deleted_at.is_(None))
+    cte = anchor.cte("descendants", recursive=True)
+    child = aliased(ChatSession)
+    return cte.union_all(
+        select(child.id).where(child.parent_session_id == cte.c.id, child.deleted_at.is_(None))
+    )
+
+async def branch_ids(db: AsyncSession, session_id: int) -> List[int]:
+    cte = descendants(session_id)
+    return list((await db.execute(select(cte.c.id))).scalars().all())
+
+async def create_branch(db: AsyncSession, user_id: int, session_id: int, message_id: int) -> ChatSession:
+    """
+    Fork ``session_id`` at ``message_id``, which may also be a message it inherits
+    from an ancestor; the branch then points at that ancestor directly. The branch
+    belongs to the same agent. The caller commits.
+
+    Raises:
+        HTTPException: 404 if the message is not part of the session's history
+    """
+    # Locked so the session is not archived between the check and the insert
+    result = await db.execute(select(ChatSession).where(ChatSession.id == session_id).with_for_update())
+    session = result.scalar_one()
+    if session.archived_at is not None:
+        await restore_session(db, session_id)
+
+    result = await db.execute(history_query(lineage([session_id]), Message.session_id).where(Message.id == message_id))
+    owner_id = result.scalar_one_or_none()
+    if owner_id is None:
+        raise HTTPException(status_code=404, detail="Message not found in session")
+
+    version = await bump_sessions_version(db, user_id)
+    branch = ChatSession(
+        agent_id=session.agent_id, parent_session_id=owner_id, parent_message_id=message_id, version=version
+    )
+    db.add(branch)
+    return branch
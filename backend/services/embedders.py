@@ -0,0 +1,107 @@
+"""
+Text embedders.
+
+An embedder turns a batch of texts into an ``(n, dimensions)`` float32 matrix of
+L2-normalized vectors. ``EMBEDDING_PROVIDER`` selects the implementation:
+``openai`` calls the embeddings endpoint, ``hashing`` is a deterministic local
+feature-hashing embedder without any network access (lexical rather than
+semantic similarity; used by the tests and for offline development). Vectors of
+different embedders are not comparable, so stored vectors carry the embedder's
+``name``.
+"""
+from backend.services.vector_index import as_matrix
+from openai import AsyncOpenAI
+from typing import List, Optional, Sequence
+import hashlib
+import logging
+import os
+import re
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_PROVIDER = os.getenv("EMBEDDING_PROVIDER", "openai").lower()
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
+EMBEDDING_DIMENSIONS = int(os.getenv("EMBEDDING_DIMENSIONS", "256"))
+# Texts per upstream embedding request
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
+
+EMBEDDING_PROVIDERS = ("openai", "hashing")
+
+class Embedder:
+    """Interface of the embedders, see the module docstring."""
+    name: str
+    dimensions: int
+
+    async def embed(self, texts: Sequence[str]) -> np.ndarray:
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+class HashingEmbedder(Embedder):
+    """Signed feature hashing of word unigrams and bigrams."""
+
+    def __init__(self, dimensions: int = EMBEDDING_DIMENSIONS):
+        self.dimensions = dimensions
+        self.name = f"hashing-{dimensions}"
+
+    def _features(self, text: str) -> List[str]:
+        words = re.findall(r"\w+", text.lower())
+        return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+    def embed_one(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        for feature in self._features(text):
+            digest = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "little")
+            vector[digest % self.dimensions] += 1.0 if digest >> 63 else -1.0
+        return vector
+
+    async def embed(self, texts: Sequence[str]) -> np.ndarray:
+        if not texts:
+            return np.empty((0, self.dimensions), dtype=np.float32)
+        return as_matrix(np.stack([self.embed_one(text) for text in texts]))
+
+class OpenAIEmbedder(Embedder):
+    """Embeddings endpoint of the OpenAI API (or a compatible server)."""
+
+    def __init__(
+        self, client: Optional[AsyncOpenAI] = None, model: str = EMBEDDING_MODEL, dimensions: int = EMBEDDING_DIMENSIONS
+    ):
+        # Without a client one is created on first use and closed by ``close``
+        self.client = client
+        self._owns_client = client is None
+        self.model = model
+        self.dimensions = dimensions
+        self.name = f"{model}-{dimensions}"
+
+    async def embed(self, texts: Sequence[str]) -> np.ndarray:
+        if not texts:
+            return np.empty((0, self.dimensions), dtype=np.float32)
+        if self.client is None:
+            self.client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        # The client version in use predates the dimensions argument
+        response = await self.client.embeddings.create(
+            model=self.model, input=list(texts), extra_body={"dimensions": self.dimensions}
+        )
+        data = sorted(response.data, key=lambda item: item.index)
+        return as_matrix([item.embedding for item in data])
+
+    async def close(self):
+        if self._owns_client and self.client is not None:
+            await self.client.close()
+            self.client = None
+
+def create_embedder(client: Optional[AsyncOpenAI] = None, provider: str = EMBEDDING_PROVIDER) -> Embedder:
+    if provider not in EMBEDDING_PROVIDERS:
+        raise ValueError(f"Unknown embedding provider {provider!r}, expected one of {EMBEDDING_PROVIDERS}")
+    if provider == "hashing":
+        return HashingEmbedder()
+    return OpenAIEmbedder(client)
+
+async def embed_in_batches(embedder: Embedder, texts: Sequence[str], batch_size: int = EMBEDDING_BATCH_SIZE) -> np.ndarray:
+    """Embed any number of texts, ``batch_size`` per call."""
+    batches = [await embedder.embed(texts[start:start + batch_size]) for start in range(0, len(texts), batch_size)]
+    if not batches:
+        return np.empty((0, embedder.dimensions), dtype=np.float32)
+    return np.concatenate(batches)
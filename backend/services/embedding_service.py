@@ -0,0 +1,343 @@
+"""
+Shared embedding pipeline.
+
+``EmbeddingService`` wraps the configured ``Embedder`` once per process and is an
+``Embedder`` itself, so knowledge retrieval and any later semantic feature use it
+without changes:
+
+* Texts are identified by the SHA-256 of their content. Texts embedded before are
+  read from the ``embedding_cache`` table instead of being sent upstream, and a
+  text requested twice, in one call or by concurrent callers, is embedded once.
+* The remaining texts of all callers are micro-batched: a batch goes upstream as
+  soon as ``EMBEDDING_BATCH_SIZE`` texts are waiting, at the latest
+  ``EMBEDDING_MAX_DELAY_MS`` after the first one was queued.
+* New vectors are stored packed (float32) in ``embedding_cache`` before the callers
+  get them.
+
+``EmbeddingBackfiller`` embeds the existing ``messages`` through the service for
+jobs created with ``create_backfill_job``, in id order and ``EMBEDDING_BACKFILL_BATCH_SIZE``
+messages at a time. A batch's ``message_embeddings`` links and the job's checkpoint
+are committed together and the checkpoint only advances from the value the batch
+was read at, so a restarted (or second) worker resumes after the last committed
+batch and a repeated batch is harmless. Archived sessions are not backfilled.
+"""
+from backend.models.chat import Message
+from backend.models.embedding import EmbeddingBackfillJob, EmbeddingCacheEntry, MessageEmbedding
+from backend.services.embedders import EMBEDDING_BATCH_SIZE, Embedder, create_embedder
+from backend.services.vector_index import pack_vector, unpack_vectors
+from backend.utils.database import SessionLocal, dialect_insert
+from backend.utils.periodic import PeriodicTask
+from sqlalchemy import func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Sequence, Tuple
+import asyncio
+import hashlib
+import logging
+import os
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_MAX_DELAY_MS = float(os.getenv("EMBEDDING_MAX_DELAY_MS", "10"))
+EMBEDDING_BACKFILL_BATCH_SIZE = int(os.getenv("EMBEDDING_BACKFILL_BATCH_SIZE", "500"))
+EMBEDDING_BACKFILL_INTERVAL_SECONDS = float(os.getenv("EMBEDDING_BACKFILL_INTERVAL_SECONDS", "30"))
+
+# Hashes per cache lookup, below SQLite's bound parameter limit
+CACHE_LOOKUP_CHUNK = 500
+
+ACTIVE_JOB_STATUSES = ("pending", "running")
+
+def content_hash(text: str) -> bytes:
+    """SHA-256 digest identifying ``text`` in the embedding cache."""
+    return hashlib.sha256(text.encode("utf-8")).digest()
+
+class EmbeddingService(Embedder):
+    """Cached, micro-batching embedder, see the module docstring."""
+
+    def __init__(
+        self,
+        embedder: Embedder,
+        session_factory: async_sessionmaker,
+        max_batch: int = EMBEDDING_BATCH_SIZE,
+        max_delay_ms: float = EMBEDDING_MAX_DELAY_MS,
+    ):
+        self.embedder = embedder
+        self.name = embedder.name
+        self.dimensions = embedder.dimensions
+        self.session_factory = session_factory
+        self.max_batch = max_batch
+        self.max_delay = max_delay_ms / 1000
+        # Queued and in-flight texts by hash, shared by every caller asking for them
+        self._futures: Dict[bytes, asyncio.Future] = {}
+        self._queue: List[Tuple[bytes, str]] = []
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Future] = None
+        self._flush_requested = False
+        self.texts = 0
+        self.cache_hits = 0
+        self.coalesced = 0
+        self.batches = 0
+        self.embedded = 0
+
+    async def embed(self, texts: Sequence[str]) -> np.ndarray:
+        if not texts:
+            return np.empty((0, self.dimensions), dtype=np.float32)
+        hashes = [content_hash(text) for text in texts]
+        unique = dict(zip(hashes, texts))
+        self.texts += len(texts)
+        self.coalesced += len(texts) - len(unique)
+
+        vectors = await self._cached(list(unique))
+        self.cache_hits += len(vectors)
+        missing = [digest for digest in unique if digest not in vectors]
+        if missing:
+            # Shielded, a cancelled caller must not cancel a batch other callers wait for
+            futures = [asyncio.shield(self._submit(digest, unique[digest])) for digest in missing]
+            vectors.update(zip(missing, await asyncio.gather(*futures)))
+        return np.stack([vectors[digest] for digest in hashes])
+
+    async def _cached(self, hashes: List[bytes]) -> Dict[bytes, np.ndarray]:
+        found = {}
+        try:
+            async with self.session_factory() as db:
+                for start in range(0, len(hashes), CACHE_LOOKUP_CHUNK):
+                    result = await db.execute(
+                        select(EmbeddingCacheEntry.content_hash, EmbeddingCacheEntry.embedding).where(
+                            EmbeddingCacheEntry.model == self.name,
+                            EmbeddingCacheEntry.content_hash.in_(hashes[start:start + CACHE_LOOKUP_CHUNK]),
+                        )
+                    )
+                    rows = result.all()
+                    vectors = unpack_vectors([row.embedding for row in rows], self.dimensions)
+                    found.update(zip([row.content_hash for row in rows], vectors))
+        except Exception as e:
+            # The cache only saves upstream calls, embed everything rather than fail
+            logger.warning(f"Embedding cache lookup failed: {e}")
+        return found
+
+    def _submit(self, digest: bytes, text: str) -> asyncio.Future:
+        future = self._futures.get(digest)
+        if future is not None:
+            self.coalesced += 1
+            return future
+        future = asyncio.get_running_loop().create_future()
+        self._futures[digest] = future
+        self._queue.append((digest, text))
+        if len(self._queue) >= self.max_batch:
+            self._wake()
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        return future
+
+    def _wake(self):
+        self._flush_requested = True
+        if self._wakeup is not None and not self._wakeup.done():
+            self._wakeup.set_result(None)
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while self._queue:
+            if len(self._queue) < self.max_batch and not self._flush_requested:
+                self._wakeup = loop.create_future()
+                try:
+                    await asyncio.wait_for(self._wakeup, timeout=self.max_delay)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup = None
+            self._flush_requested = False
+            await self.flush()
+
+    async def flush(self):
+        """Embed everything queued so far, one batch of at most ``max_batch`` texts at a time."""
+        while self._queue:
+            batch, self._queue = self._queue[:self.max_batch], self._queue[self.max_batch:]
+            await self._flush_batch(batch)
+
+    async def _flush_batch(self, batch: List[Tuple[bytes, str]]):
+        digests = [digest for digest, _ in batch]
+        try:
+            vectors = await self.embedder.embed([text for _, text in batch])
+        except Exception as e:
+            logger.error(f"Embedding a batch of {len(batch)} texts failed: {e}")
+            for digest in digests:
+                future = self._futures.pop(digest)
+                if not future.done():
+                    future.set_exception(e)
+            return
+        self.batches += 1
+        self.embedded += len(batch)
+        await self._store(digests, vectors)
+        for digest, vector in zip(digests, vectors):
+            future = self._futures.pop(digest)
+            if not future.done():
+                future.set_result(vector)
+
+    async def _store(self, digests: List[bytes], vectors: np.ndarray):
+        try:
+            async with self.session_factory() as db:
+                insert = dialect_insert(db)
+                await db.execute(insert(EmbeddingCacheEntry).on_conflict_do_nothing(), [
+                    {"model": self.name, "content_hash": digest, "embedding": pack_vector(vector)}
+                    for digest, vector in zip(digests, vectors)
+                ])
+                await db.commit()
+        except Exception as e:
+            logger.warning(f"Storing {len(digests)} embeddings in the cache failed: {e}")
+
+    async def close(self):
+        """Embed the queued texts and release the embedder, called on shutdown."""
+        if self._task is not None and not self._task.done():
+            self._wake()
+            await self._task
+        self._task = None
+        await self.flush()
+        await self.embedder.close()
+
+    def stats(self) -> dict:
+        return {
+            "model": self.name,
+            "pending": len(self._queue),
+            "texts": self.texts,
+            "cache_hits": self.cache_hits,
+            "coalesced": self.coalesced,
+            "batches": self.batches,
+            "embedded": self.embedded,
+        }
+
+async def load_message_embeddings(db: AsyncSession, message_ids: Sequence[int], model: str, dimensions: int) -> Dict[int, np.ndarray]:
+    """Backfilled vectors of ``message_ids`` by ``model``; messages without one are left out."""
+    result = await db.execute(
+        select(MessageEmbedding.message_id, EmbeddingCacheEntry.embedding)
+        .join(EmbeddingCacheEntry, (EmbeddingCacheEntry.model == MessageEmbedding.model)
+              & (EmbeddingCacheEntry.content_hash == MessageEmbedding.content_hash))
+        .where(MessageEmbedding.model == model, MessageEmbedding.message_id.in_(list(message_ids)))
+    )
+    rows = result.all()
+    return dict(zip([row.message_id for row in rows], unpack_vectors([row.embedding for row in rows], dimensions)))
+
+async def create_backfill_job(db: AsyncSession, model: str) -> EmbeddingBackfillJob:
+    """Queue a backfill of every message that exists now and commit."""
+    max_message_id = (await db.execute(select(func.max(Message.id)))).scalar() or 0
+    job = EmbeddingBackfillJob(model=model, max_message_id=max_message_id)
+    db.add(job)
+    await db.commit()
+    await db.refresh(job)
+    return job
+
+async def set_backfill_status(db: AsyncSession, job: EmbeddingBackfillJob, status: str):
+    """Pause or resume a job and commit. Resuming continues from the checkpoint."""
+    job.status = status
+    job.error = None
+    job.finished_at = None
+    job.updated_at = datetime.now(timezone.utc)
+    await db.commit()
+    await db.refresh(job)
+
+async def _finish_job(db: AsyncSession, job_id: int, checkpoint: int, status: str, error: Optional[str] = None):
+    now = datetime.now(timezone.utc)
+    await db.execute(
+        update(EmbeddingBackfillJob)
+        .where(EmbeddingBackfillJob.id == job_id, EmbeddingBackfillJob.last_message_id == checkpoint)
+        .values(status=status, error=error, updated_at=now, finished_at=now)
+    )
+    await db.commit()
+
+async def backfill_batch(
+    session_factory: async_sessionmaker,
+    service: EmbeddingService,
+    job_id: int,
+    batch_size: int = EMBEDDING_BACKFILL_BATCH_SIZE,
+) -> bool:
+    """Embed the next batch of messages of job ``job_id``. Returns False once the job is not active anymore."""
+    async with session_factory() as db:
+        job = await db.get(EmbeddingBackfillJob, job_id)
+        if job is None or job.status not in ACTIVE_JOB_STATUSES:
+            return False
+        checkpoint = job.last_message_id
+        if job.model != service.name:
+            await _finish_job(db, job_id, checkpoint, "failed", f"Job is for {job.model}, the embedder is {service.name}")
+            return False
+        result = await db.execute(
+            select(Message.id, Message.content)
+            .where(Message.id > checkpoint, Message.id <= job.max_message_id)
+            .order_by(Message.id)
+            .limit(batch_size)
+        )
+        rows = result.all()
+        # No transaction stays open during the upstream call
+        await db.rollback()
+        if not rows:
+            await _finish_job(db, job_id, checkpoint, "completed")
+            return False
+
+        # Blank messages are skipped, the embeddings endpoint rejects empty input
+        texts = [row for row in rows if row.content.strip()]
+        try:
+            await service.embed([row.content for row in texts])
+        except Exception as e:
+            await _finish_job(db, job_id, checkpoint, "failed", str(e))
+            return False
+
+        advanced = await db.execute(
+            update(EmbeddingBackfillJob)
+            .where(
+                EmbeddingBackfillJob.id == job_id,
+                EmbeddingBackfillJob.last_message_id == checkpoint,
+                EmbeddingBackfillJob.status.in_(ACTIVE_JOB_STATUSES),
+            )
+            .values(
+                status="running",
+                last_message_id=rows[-1].id,
+                processed=EmbeddingBackfillJob.processed + len(rows),
+                updated_at=datetime.now(timezone.utc),
+            )
+        )
+        if advanced.rowcount != 1:
+            # Paused meanwhile, or another worker committed this batch first
+            await db.rollback()
+            return True
+        if texts:
+            insert = dialect_insert(db)
+            await db.execute(insert(MessageEmbedding).on_conflict_do_nothing(), [
+                {"message_id": row.id, "model": service.name, "content_hash": content_hash(row.content)}
+                for row in texts
+            ])
+        await db.commit()
+        return True
+
+class EmbeddingBackfiller(PeriodicTask):
+    """Runs the active backfill jobs, oldest first."""
+    name = "embedding backfill"
+
+    def __init__(
+        self,
+        session_factory: async_sessionmaker,
+        service: EmbeddingService,
+        batch_size: int = EMBEDDING_BACKFILL_BATCH_SIZE,
+        interval: float = EMBEDDING_BACKFILL_INTERVAL_SECONDS,
+    ):
+        super().__init__(interval)
+        self.session_factory = session_factory
+        self.service = service
+        self.batch_size = batch_size
+
+    async def _next_job(self) -> Optional[int]:
+        async with self.session_factory() as db:
+            result = await db.execute(
+                select(EmbeddingBackfillJob.id)
+                .where(EmbeddingBackfillJob.status.in_(ACTIVE_JOB_STATUSES))
+                .order_by(EmbeddingBackfillJob.id)
+                .limit(1)
+            )
+            return result.scalar()
+
+    async def run_once(self):
+        while (job_id := await self._next_job()) is not None:
+            batches = 0
+            while await backfill_batch(self.session_factory, self.service, job_id, self.batch_size):
+                batches += 1
+            logger.info(f"Embedding backfill job {job_id} stopped after {batches} batches")
+
+# Process-wide service, batches and caches across all requests
+embedding_service = EmbeddingService(create_embedder(), SessionLocal)
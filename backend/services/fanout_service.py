@@ -0,0 +1,203 @@
+"""
+One user message answered by several agents at once.
+
+``prepare_fanout`` checks that the agents belong to the user and picks a session per
+agent: the agent's most recent live session, or a new one when asked for or when it
+has none (all new sessions in one insert). ``run_fanout`` then streams every
+agent's reply concurrently through ``stream_with_fallback``, within the worker's
+``UPSTREAM_CONCURRENCY``, and yields the pieces interleaved as they arrive. Each
+finished turn is stored at once and reported with its message. Streamed replies
+do not call the agents' tools.
+
+With an aggregator agent, its session receives the question followed by the
+replies that succeeded, and its answer is streamed the same way at the end.
+"""
+from backend.models.agent import Agent
+from backend.models.chat import ChatSession
+from backend.services.agent_cache import AGENT_SNAPSHOT_COLUMNS, AgentSnapshot
+from backend.services.archive_service import restore_session
+from backend.services.batch_service import RESPONSE_KEYS, create_sessions
+from backend.services.branch_service import load_histories
+from backend.services.embedders import Embedder
+from backend.services.knowledge_service import system_message
+from backend.services.message_writer import MessageWriter, Usage
+from backend.services.openai_service import ChatCompletionResult, stream_with_fallback
+from fastapi import HTTPException
+from openai import AsyncOpenAI
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import AsyncIterator, Dict, List, Optional
+import asyncio
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+FANOUT_MAX_AGENTS = int(os.getenv("FANOUT_MAX_AGENTS", "10"))
+
+AGGREGATOR_HEADER = "Answers of the other agents:"
+
+@dataclass
+class FanOutTarget:
+    agent: AgentSnapshot
+    session_id: int
+    history: List[dict] = field(default_factory=list)
+
+@dataclass
+class FanOut:
+    content: str
+    targets: List[FanOutTarget]
+    aggregator: Optional[FanOutTarget] = None
+
+def aggregator_prompt(content: str, replies: List[tuple]) -> str:
+    """The question followed by the ``(agent name, reply)`` pairs, as sent to the aggregator."""
+    answers = "\n\n".join(f"[{name}]\n{reply}" for name, reply in replies)
+    return f"{content}\n\n{AGGREGATOR_HEADER}\n\n{answers}"
+
+async def prepare_fanout(
+    db: AsyncSession,
+    user_id: int,
+    content: str,
+    agent_ids: List[int],
+    new_sessions: bool = False,
+    aggregator_agent_id: Optional[int] = None,
+) -> FanOut:
+    """
+    Resolve the agents and their sessions, see the module docstring.
+
+    Raises:
+        HTTPException: 404 if an agent is not found or not owned by the user
+    """
+    agent_ids = list(dict.fromkeys(agent_ids))
+    wanted = set(agent_ids) | ({aggregator_agent_id} if aggregator_agent_id is not None else set())
+    result = await db.execute(
+        select(*AGENT_SNAPSHOT_COLUMNS).where(Agent.id.in_(wanted), Agent.user_id == user_id, Agent.deleted_at.is_(None))
+    )
+    agents = {row.id: AgentSnapshot(**row._mapping) for row in result.all()}
+    if len(agents) != len(wanted):
+        raise HTTPException(status_code=404, detail="Agent not found or not owned by user")
+
+    sessions: Dict[int, int] = {}
+    if not new_sessions:
+        latest = (
+            select(func.max(ChatSession.id))
+            .where(ChatSession.agent_id.in_(wanted), ChatSession.deleted_at.is_(None))
+            .group_by(ChatSession.agent_id)
+        )
+        result = await db.execute(
+            select(ChatSession.id, ChatSession.agent_id, ChatSession.archived_at).where(ChatSession.id.in_(latest))
+        )
+        for row in result.all():
+            sessions[row.agent_id] = row.id
+            if row.archived_at is not None:
+                await restore_session(db, row.id)
+    missing = sorted(agent_id for agent_id in wanted if agent_id not in sessions)
+    sessions.update(zip(missing, await create_sessions(db, user_id, missing)))
+    await db.commit()
+
+    created = set(missing)
+    histories = await load_histories(db, [sessions[agent_id] for agent_id in wanted if agent_id not in created])
+
+    def target(agent_id: int) -> FanOutTarget:
+        return FanOutTarget(agents[agent_id], sessions[agent_id], histories.get(sessions[agent_id], []))
+
+    return FanOut(
+        content=content,
+        targets=[target(agent_id) for agent_id in agent_ids],
+        aggregator=target(aggregator_agent_id) if aggregator_agent_id is not None else None,
+    )
+
+async def run_fanout(
+    db: AsyncSession,
+    client: AsyncOpenAI,
+    embedder: Optional[Embedder],
+    writer: MessageWriter,
+    user_id: int,
+    fanout: FanOut,
+) -> AsyncIterator[dict]:
+    """
+    Answer a prepared fan-out, yielding ``FanOutEvent`` dicts: ``delta`` events with
+    reply pieces as they arrive, then per agent a ``message`` with the stored reply
+    or an ``error``. The aggregator's events come last and are marked ``aggregator``.
+    """
+    # The request's session is shared by the agents, one statement at a time
+    db_lock = asyncio.Lock()
+    events: asyncio.Queue = asyncio.Queue()
+
+    def event(kind: str, target: FanOutTarget, aggregator: bool, **values) -> dict:
+        return {"type": kind, "agent_id": target.agent.id, "session_id": target.session_id, "aggregator": aggregator, **values}
+
+    async def answer(target: FanOutTarget, content: str, aggregator: bool = False) -> Optional[str]:
+        agent = target.agent
+        asked_at = datetime.now(timezone.utc)
+        messages = target.history + [{"role": "user", "content": content}]
+        pieces, model, ttft_ms = [], None, None
+        try:
+            async with db_lock:
+                system = await system_message(db, agent, messages, embedder)
+            started = time.perf_counter()
+            async for model, piece in stream_with_fallback(client, agent, [system, *messages]):
+                if ttft_ms is None:
+                    ttft_ms = int((time.perf_counter() - started) * 1000)
+                if piece:
+                    pieces.append(piece)
+                    await events.put(event("delta", target, aggregator, content=piece))
+            latency_ms = int((time.perf_counter() - started) * 1000)
+        except Exception as e:
+            logger.error(f"Fan-out reply of agent {agent.id} failed: {e}")
+            await events.put(event("error", target, aggregator, status_code=502, error="Failed to generate response"))
+            return None
+
+        reply = "".join(pieces)
+        completion = ChatCompletionResult(content=reply, model=model, latency_ms=latency_ms, ttft_ms=ttft_ms)
+        try:
+            async with db_lock:
+                rows = await writer.add_many(
+                    db,
+                    [
+                        {"session_id": target.session_id, "content": content, "is_user": True, "created_at": asked_at},
+                        {
+                            "session_id": target.session_id,
+                            "content": reply,
+                            "is_user": False,
+                            "model": model,
+                            "latency_ms": latency_ms,
+                            "ttft_ms": ttft_ms,
+                        },
+                    ],
+                    user_id=user_id,
+                    usages=[None, Usage(agent.user_id, agent.id, completion)],
+                )
+        except Exception as e:
+            await db.rollback()
+            logger.error(f"Storing the fan-out reply of agent {agent.id} failed: {e}")
+            await events.put(event("error", target, aggregator, status_code=500, error="Failed to store the messages"))
+            return None
+        message = {key: rows[1][key] for key in RESPONSE_KEYS}
+        await events.put(event("message", target, aggregator, message={**message, "agent_name": agent.name}))
+        return reply
+
+    async def run():
+        try:
+            replies = await asyncio.gather(*(answer(target, fanout.content) for target in fanout.targets))
+            answered = [(t.agent.name, reply) for t, reply in zip(fanout.targets, replies) if reply is not None]
+            if fanout.aggregator is not None and answered:
+                await answer(fanout.aggregator, aggregator_prompt(fanout.content, answered), aggregator=True)
+        finally:
+            await events.put(None)
+
+    task = asyncio.create_task(run())
+    try:
+        while True:
+            item = await events.get()
+            if item is None:
+                break
+            yield item
+        await task
+    finally:
+        # The client went away, stop the outstanding replies
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
@@ -0,0 +1,208 @@
+from backend.models.idempotency import IdempotencyKey
+from backend.utils.periodic import PeriodicTask
+from backend.utils.serialization import ORJSON_OPTIONS
+from fastapi import HTTPException, Response
+from pydantic import BaseModel
+from sqlalchemy import and_, delete, or_, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Dict, Optional, Tuple, Type
+import asyncio
+import hashlib
+import logging
+import os
+import orjson
+
+logger = logging.getLogger(__name__)
+
+# How long the first response is replayed to retries
+IDEMPOTENCY_TTL_SECONDS = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", "86400"))
+# A claim without a response older than this is considered abandoned (crashed worker)
+IDEMPOTENCY_LOCK_TIMEOUT_SECONDS = int(os.getenv("IDEMPOTENCY_LOCK_TIMEOUT_SECONDS", "300"))
+IDEMPOTENCY_CLEANUP_INTERVAL_SECONDS = float(os.getenv("IDEMPOTENCY_CLEANUP_INTERVAL_SECONDS", "3600"))
+
+MAX_KEY_LENGTH = 255
+REPLAYED_HEADER = "Idempotent-Replayed"
+
+# Requests of this process currently executing, by (user_id, key)
+_inflight: Dict[Tuple[int, str], Tuple[str, asyncio.Future]] = {}
+
+def request_fingerprint(endpoint: str, *parts) -> str:
+    """Hash identifying a request, ``bytes`` parts are hashed as they are and everything else as text."""
+    digest = hashlib.sha256(endpoint.encode("utf-8"))
+    for part in parts:
+        digest.update(b"\0")
+        digest.update(part if isinstance(part, bytes) else str(part).encode("utf-8"))
+    return digest.hexdigest()
+
+def _response(status_code: int, body: bytes, replayed: bool) -> Response:
+    headers = {REPLAYED_HEADER: "true"} if replayed else None
+    return Response(content=body, status_code=status_code, headers=headers, media_type="application/json")
+
+def _mismatch() -> HTTPException:
+    return HTTPException(status_code=422, detail="Idempotency-Key was already used for a different request")
+
+def _stored(record: IdempotencyKey, fingerprint: str) -> Tuple[int, bytes]:
+    if record.fingerprint != fingerprint:
+        raise _mismatch()
+    if record.status_code is None:
+        raise HTTPException(
+            status_code=409,
+            detail="A request with this Idempotency-Key is still being processed",
+            headers={"Retry-After": "1"},
+        )
+    return record.status_code, record.response_body
+
+async def _load(db: AsyncSession, user_id: int, key: str) -> Optional[IdempotencyKey]:
+    result = await db.execute(
+        select(IdempotencyKey)
+        .where(IdempotencyKey.user_id == user_id, IdempotencyKey.key == key)
+        .execution_options(populate_existing=True)
+    )
+    return result.scalar_one_or_none()
+
+async def _execute_once(
+    db: AsyncSession,
+    user_id: int,
+    key: str,
+    fingerprint: str,
+    execute: Callable[[], Awaitable],
+    response_model: Type[BaseModel],
+) -> Tuple[int, bytes, bool]:
+    now = datetime.now(timezone.utc)
+    # Expired keys and abandoned claims no longer protect anything
+    result = await db.execute(
+        delete(IdempotencyKey).where(
+            IdempotencyKey.user_id == user_id,
+            IdempotencyKey.key == key,
+            or_(
+                IdempotencyKey.expires_at <= now,
+                and_(
+                    IdempotencyKey.status_code.is_(None),
+                    IdempotencyKey.created_at < now - timedelta(seconds=IDEMPOTENCY_LOCK_TIMEOUT_SECONDS),
+                ),
+            ),
+        )
+    )
+    if result.rowcount:
+        await db.commit()
+
+    record = await _load(db, user_id, key)
+    if record is not None:
+        return (*_stored(record, fingerprint), True)
+
+    # Claim the key; the unique constraint decides between concurrent workers
+    db.add(IdempotencyKey(
+        user_id=user_id,
+        key=key,
+        fingerprint=fingerprint,
+        created_at=now,
+        expires_at=now + timedelta(seconds=IDEMPOTENCY_TTL_SECONDS),
+    ))
+    try:
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        record = await _load(db, user_id, key)
+        if record is None:
+            raise HTTPException(status_code=409, detail="Idempotency-Key conflict, please retry", headers={"Retry-After": "1"})
+        return (*_stored(record, fingerprint), True)
+
+    try:
+        payload = await execute()
+    except BaseException:
+        # Failed requests are not stored, a retry executes again
+        await db.rollback()
+        await db.execute(delete(IdempotencyKey).where(IdempotencyKey.user_id == user_id, IdempotencyKey.key == key))
+        await db.commit()
+        raise
+
+    body = orjson.dumps(
+        response_model.model_validate(payload, from_attributes=True).model_dump(mode="json"), option=ORJSON_OPTIONS
+    )
+    await db.execute(
+        update(IdempotencyKey)
+        .where(IdempotencyKey.user_id == user_id, IdempotencyKey.key == key)
+        .values(status_code=200, response_body=body)
+        .execution_options(synchronize_session=False)
+    )
+    await db.commit()
+    return 200, body, False
+
+async def run_idempotent(
+    db: AsyncSession,
+    user_id: int,
+    key: Optional[str],
+    fingerprint: str,
+    execute: Callable[[], Awaitable],
+    response_model: Type[BaseModel],
+):
+    """
+    Run ``execute`` at most once per ``Idempotency-Key``.
+
+    Without a key ``execute`` simply runs and its result is returned as is. With a
+    key the successful response is stored for ``IDEMPOTENCY_TTL_SECONDS`` and
+    replayed to retries (with an ``Idempotent-Replayed: true`` header). Duplicates
+    arriving while the first request is running in this process wait for it and get
+    the same response; duplicates hitting another worker get 409 with Retry-After.
+    Reusing a key for a different request is a 422. Failed requests are not stored.
+
+    Args:
+        db (AsyncSession): The request's database session
+        user_id (int): Keys are scoped per user
+        key (Optional[str]): Value of the Idempotency-Key header
+        fingerprint (str): ``request_fingerprint`` of the endpoint and payload
+        execute (Callable[[], Awaitable]): Runs the actual handler
+        response_model (Type[BaseModel]): Model the handler's result is serialized with
+    """
+    if key is None:
+        return await execute()
+    if not key or len(key) > MAX_KEY_LENGTH:
+        raise HTTPException(status_code=400, detail=f"Idempotency-Key must be 1 to {MAX_KEY_LENGTH} characters")
+
+    slot = (user_id, key)
+    inflight = _inflight.get(slot)
+    if inflight is not None:
+        inflight_fingerprint, future = inflight
+        if inflight_fingerprint != fingerprint:
+            raise _mismatch()
+        status_code, body, _ = await asyncio.shield(future)
+        return _response(status_code, body, replayed=True)
+
+    future = asyncio.get_running_loop().create_future()
+    _inflight[slot] = (fingerprint, future)
+    try:
+        result = await _execute_once(db, user_id, key, fingerprint, execute, response_model)
+    except asyncio.CancelledError:
+        future.cancel()
+        raise
+    except BaseException as e:
+        future.set_exception(e)
+        # Nobody may be waiting, do not warn about an unretrieved exception
+        future.exception()
+        raise
+    else:
+        future.set_result(result)
+    finally:
+        _inflight.pop(slot, None)
+    return _response(*result)
+
+async def delete_expired_keys(session_factory: async_sessionmaker) -> int:
+    async with session_factory() as db:
+        result = await db.execute(delete(IdempotencyKey).where(IdempotencyKey.expires_at <= datetime.now(timezone.utc)))
+        await db.commit()
+        return result.rowcount
+
+class IdempotencyCleaner(PeriodicTask):
+    """Background task deleting expired idempotency keys."""
+    name = "Idempotency cleanup"
+
+    def __init__(self, session_factory: async_sessionmaker, interval: float = IDEMPOTENCY_CLEANUP_INTERVAL_SECONDS):
+        super().__init__(interval)
+        self.session_factory = session_factory
+
+    async def run_once(self):
+        deleted = await delete_expired_keys(self.session_factory)
+        if deleted:
+            logger.info(f"Deleted {deleted} expired idempotency keys")
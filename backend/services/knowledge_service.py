@@ -0,0 +1,213 @@
+"""
+Per-agent knowledge base for retrieval-augmented responses.
+
+Documents are split into overlapping chunks of about ``KNOWLEDGE_CHUNK_CHARS``
+characters, embedded in batches and stored as packed float32 vectors. For a chat
+turn the last user message is embedded and the ``KNOWLEDGE_TOP_K`` closest chunks
+are placed into the system message after the agent's prompt, so the prompt itself
+can stay short however much reference material an agent has.
+
+Each process keeps the indexes of recently used agents in memory
+(``KNOWLEDGE_INDEX_CACHE_SIZE``), keyed by the agent's ``knowledge_version``: a
+document upload or removal bumps the version and every worker rebuilds the index on
+its next use. Agents with at least ``KNOWLEDGE_IVF_MIN_CHUNKS`` chunks get an
+approximate ``IVFIndex``, smaller ones an exact ``FlatIndex``.
+"""
+from backend.models.agent import Agent
+from backend.models.knowledge import KnowledgeChunk, KnowledgeDocument
+from backend.services.agent_cache import AGENT, publish_invalidation
+from backend.services.embedders import Embedder, embed_in_batches
+from backend.services.vector_index import FlatIndex, IVFIndex, pack_vector, unpack_vectors
+from sqlalchemy import insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+import asyncio
+import logging
+import os
+import re
+
+logger = logging.getLogger(__name__)
+
+KNOWLEDGE_CHUNK_CHARS = int(os.getenv("KNOWLEDGE_CHUNK_CHARS", "1000"))
+KNOWLEDGE_CHUNK_OVERLAP = int(os.getenv("KNOWLEDGE_CHUNK_OVERLAP", "150"))
+KNOWLEDGE_TOP_K = int(os.getenv("KNOWLEDGE_TOP_K", "4"))
+# Chunks less similar than this to the question are not used
+KNOWLEDGE_MIN_SCORE = float(os.getenv("KNOWLEDGE_MIN_SCORE", "0.2"))
+KNOWLEDGE_INDEX_CACHE_SIZE = int(os.getenv("KNOWLEDGE_INDEX_CACHE_SIZE", "64"))
+KNOWLEDGE_IVF_MIN_CHUNKS = int(os.getenv("KNOWLEDGE_IVF_MIN_CHUNKS", "20000"))
+KNOWLEDGE_IVF_NPROBE = int(os.getenv("KNOWLEDGE_IVF_NPROBE", "8"))
+
+CONTEXT_HEADER = "Use the following excerpts from the knowledge base when they are relevant to the question:"
+
+@dataclass
+class RetrievedChunk:
+    id: int
+    document_id: int
+    title: str
+    content: str
+    score: float
+
+def chunk_text(text: str, max_chars: int = KNOWLEDGE_CHUNK_CHARS, overlap: int = KNOWLEDGE_CHUNK_OVERLAP) -> List[str]:
+    """
+    Split ``text`` into chunks of at most ``max_chars`` characters.
+
+    Chunks end at paragraph or sentence boundaries where possible and the next chunk
+    repeats up to ``overlap`` characters of the previous one, so a passage cut in two
+    is still found whole in one of them.
+    """
+    text = re.sub(r"[ \t]+", " ", text).strip()
+    chunks = []
+    start = 0
+    while start < len(text):
+        end = min(start + max_chars, len(text))
+        if end < len(text):
+            window = text[start:end]
+            # Prefer a paragraph break, then a sentence end, then a space, in the second half
+            for pattern in (r"\n\s*\n", r"[.!?]\s", r"\s"):
+                breaks = [m.end() for m in re.finditer(pattern, window) if m.end() > max_chars // 2]
+                if breaks:
+                    end = start + breaks[-1]
+                    break
+        chunk = text[start:end].strip()
+        if chunk:
+            chunks.append(chunk)
+        if end >= len(text):
+            break
+        next_start = max(end - overlap, start + 1)
+        # Start the overlap at a word boundary
+        space = text.find(" ", next_start, end)
+        start = space + 1 if space != -1 else next_start
+    return chunks
+
+async def add_document(db: AsyncSession, agent: Agent, title: str, content: str, embedder: Embedder) -> KnowledgeDocument:
+    """Chunk, embed and store a document for ``agent`` and commit."""
+    chunks = chunk_text(content)
+    vectors = await embed_in_batches(embedder, chunks)
+    document = KnowledgeDocument(agent_id=agent.id, title=title, content=content, chunk_count=len(chunks))
+    db.add(document)
+    await db.flush()
+    if chunks:
+        await db.execute(insert(KnowledgeChunk), [
+            {
+                "document_id": document.id,
+                "agent_id": agent.id,
+                "position": position,
+                "content": chunk,
+                "embedding": pack_vector(vector),
+                "embedding_model": embedder.name,
+            }
+            for position, (chunk, vector) in enumerate(zip(chunks, vectors))
+        ])
+    await _bump_knowledge_version(db, agent)
+    await db.commit()
+    await db.refresh(document)
+    return document
+
+async def remove_document(db: AsyncSession, agent: Agent, document: KnowledgeDocument):
+    """Delete a document with its chunks and commit."""
+    await db.delete(document)
+    await _bump_knowledge_version(db, agent)
+    await db.commit()
+
+async def _bump_knowledge_version(db: AsyncSession, agent: Agent):
+    # The loaded agent is synchronized with the new value
+    await db.execute(
+        update(Agent).where(Agent.id == agent.id).values(knowledge_version=Agent.knowledge_version + 1)
+    )
+    await publish_invalidation(db, AGENT, agent.id)
+
+def _build_index(ids: List[int], blobs: List[bytes], dimensions: int):
+    vectors = unpack_vectors(blobs, dimensions)
+    if len(ids) >= KNOWLEDGE_IVF_MIN_CHUNKS:
+        return IVFIndex(ids, vectors, nprobe=KNOWLEDGE_IVF_NPROBE)
+    return FlatIndex(ids, vectors)
+
+class KnowledgeIndexCache:
+    """LRU of per-agent indexes, see the module docstring."""
+
+    def __init__(self, max_agents: int = KNOWLEDGE_INDEX_CACHE_SIZE):
+        self.max_agents = max_agents
+        self._entries: "OrderedDict[Tuple[int, str], Tuple[int, object]]" = OrderedDict()
+        self.builds = 0
+
+    async def get(self, db: AsyncSession, agent: Agent, embedder: Embedder):
+        key = (agent.id, embedder.name)
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] == agent.knowledge_version:
+            self._entries.move_to_end(key)
+            return entry[1]
+
+        result = await db.execute(
+            select(KnowledgeChunk.id, KnowledgeChunk.embedding)
+            .where(KnowledgeChunk.agent_id == agent.id, KnowledgeChunk.embedding_model == embedder.name)
+            .order_by(KnowledgeChunk.id)
+        )
+        rows = result.all()
+        # Building an IVF index runs k-means, keep it off the event loop
+        index = await asyncio.to_thread(_build_index, [row.id for row in rows], [row.embedding for row in rows], embedder.dimensions)
+        self.builds += 1
+        self._entries[key] = (agent.knowledge_version, index)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_agents:
+            self._entries.popitem(last=False)
+        return index
+
+    def clear(self):
+        self._entries.clear()
+        self.builds = 0
+
+# Process-wide cache of agent indexes
+knowledge_indexes = KnowledgeIndexCache()
+
+async def retrieve(
+    db: AsyncSession,
+    agent: Agent,
+    query: str,
+    embedder: Embedder,
+    k: int = KNOWLEDGE_TOP_K,
+    min_score: float = KNOWLEDGE_MIN_SCORE,
+) -> List[RetrievedChunk]:
+    """Return the ``k`` chunks of ``agent``'s knowledge base closest to ``query``, best first."""
+    if not agent.knowledge_version or not query.strip():
+        return []
+    index = await knowledge_indexes.get(db, agent, embedder)
+    if not len(index):
+        return []
+    vector = (await embedder.embed([query]))[0]
+    hits = [(chunk_id, score) for chunk_id, score in index.search(vector, k) if score >= min_score]
+    if not hits:
+        return []
+    result = await db.execute(
+        select(KnowledgeChunk.id, KnowledgeChunk.document_id, KnowledgeDocument.title, KnowledgeChunk.content)
+        .join(KnowledgeDocument, KnowledgeDocument.id == KnowledgeChunk.document_id)
+        .where(KnowledgeChunk.id.in_([chunk_id for chunk_id, _ in hits]))
+    )
+    rows = {row.id: row for row in result.all()}
+    return [
+        RetrievedChunk(chunk_id, rows[chunk_id].document_id, rows[chunk_id].title, rows[chunk_id].content, score)
+        for chunk_id, score in hits
+        if chunk_id in rows
+    ]
+
+def build_system_prompt(prompt: str, chunks: List[RetrievedChunk]) -> str:
+    """The agent's prompt followed by the retrieved excerpts, if any."""
+    if not chunks:
+        return prompt
+    excerpts = "\n\n".join(f"[{i}] {chunk.title}\n{chunk.content}" for i, chunk in enumerate(chunks, 1))
+    return f"{prompt}\n\n{CONTEXT_HEADER}\n\n{excerpts}"
+
+async def system_message(
+    db: AsyncSession, agent: Agent, messages: list, embedder: Optional[Embedder]
+) -> dict:
+    """System message for a chat turn: the agent prompt plus the knowledge relevant to the last user message."""
+    chunks = []
+    if embedder is not None:
+        question = next((m["content"] for m in reversed(messages) if m["role"] == "user"), "")
+        try:
+            chunks = await retrieve(db, agent, question, embedder)
+        except Exception as e:
+            # Answer without the knowledge base rather than not at all
+            logger.error(f"Knowledge retrieval failed for agent {agent.id}: {e}")
+    return {"role": "system", "content": build_system_prompt(agent.prompt, chunks)}
@@ -0,0 +1,265 @@
+"""
+Model providers for chat, transcription and speech.
+
+A model name selects its provider: ``local/<name>`` runs the GGUF model
+``<LOCAL_MODEL_DIR>/<name>.gguf`` on the CPU, every other name goes to the OpenAI
+API. The prefix works wherever a model is configured, so an agent can answer from a
+local model with a hosted fallback or the other way around.
+
+``LocalProvider`` runs inference in a pool of ``LOCAL_MODEL_WORKERS`` processes;
+each worker loads a model on first use and keeps it, the event loop only waits for
+results. The default engine is llama.cpp through the optional ``llama-cpp-python``
+package (``pip install llama-cpp-python``), which needs neither a GPU nor network
+access. Local models only chat, without tools; transcription and speech stay with
+OpenAI.
+"""
+from openai import AsyncOpenAI
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import AsyncIterator, Callable, Dict, List, Optional, Tuple
+import asyncio
+import multiprocessing
+import os
+import threading
+
+LOCAL_PREFIX = "local/"
+LOCAL_MODEL_DIR = os.getenv("LOCAL_MODEL_DIR", "models")
+LOCAL_MODEL_WORKERS = int(os.getenv("LOCAL_MODEL_WORKERS", "1"))
+# Threads per worker, 0 lets llama.cpp use every core
+LOCAL_MODEL_THREADS = int(os.getenv("LOCAL_MODEL_THREADS", "0"))
+LOCAL_MODEL_CONTEXT = int(os.getenv("LOCAL_MODEL_CONTEXT", "2048"))
+# Completion length when the agent sets no max_tokens
+LOCAL_MODEL_MAX_TOKENS = int(os.getenv("LOCAL_MODEL_MAX_TOKENS", "256"))
+
+class ProviderError(Exception):
+    """A model cannot be used: unknown, not installed or not capable of the operation."""
+
+@dataclass
+class ToolCallRequest:
+    """A function call the model asked for, ``arguments`` as the JSON text it produced."""
+    id: str
+    name: str
+    arguments: str
+
+@dataclass
+class ChatReply:
+    content: str
+    model: str
+    prompt_tokens: Optional[int] = None
+    completion_tokens: Optional[int] = None
+    # Set when the model called tools instead of answering, see ``tool_service``
+    tool_calls: Optional[List[ToolCallRequest]] = None
+
+def _usage_value(usage, name: str) -> Optional[int]:
+    value = getattr(usage, name, None)
+    return value if isinstance(value, int) else None
+
+def _tool_calls(message) -> Optional[List[ToolCallRequest]]:
+    calls = getattr(message, "tool_calls", None)
+    if not isinstance(calls, list) or not calls:
+        return None
+    return [ToolCallRequest(call.id, call.function.name, call.function.arguments) for call in calls]
+
+class LLMProvider:
+    """Interface of the providers, see the module docstring."""
+    name: str
+
+    async def chat(self, model: str, messages: list, **params) -> ChatReply:
+        raise NotImplementedError
+
+    def stream_chat(self, model: str, messages: list, **params) -> AsyncIterator[str]:
+        """Yield the reply in pieces as they are generated."""
+        raise NotImplementedError
+
+    async def transcribe(self, audio: bytes, filename: str, model: str) -> str:
+        raise ProviderError(f"{self.name} models cannot transcribe audio")
+
+    async def speak(self, text: str, model: str, voice: str) -> bytes:
+        raise ProviderError(f"{self.name} models cannot generate speech")
+
+class OpenAIProvider(LLMProvider):
+    """OpenAI API (or a compatible server) through the request's client."""
+    name = "openai"
+
+    def __init__(self, client: AsyncOpenAI):
+        self.client = client
+
+    async def chat(self, model: str, messages: list, **params) -> ChatReply:
+        response = await self.client.chat.completions.create(model=model, messages=messages, **params)
+        usage = getattr(response, "usage", None)
+        reported = getattr(response, "model", None)
+        message = response.choices[0].message
+        return ChatReply(
+            content=message.content,
+            model=reported if isinstance(reported, str) else model,
+            prompt_tokens=_usage_value(usage, "prompt_tokens"),
+            completion_tokens=_usage_value(usage, "completion_tokens"),
+            tool_calls=_tool_calls(message),
+        )
+
+    async def stream_chat(self, model: str, messages: list, **params) -> AsyncIterator[str]:
+        stream = await self.client.chat.completions.create(model=model, messages=messages, stream=True, **params)
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+    async def transcribe(self, audio: bytes, filename: str, model: str) -> str:
+        transcription = await self.client.audio.transcriptions.create(model=model, file=(filename, audio, "audio/mpeg"))
+        return transcription.text
+
+    async def speak(self, text: str, model: str, voice: str) -> bytes:
+        response = await self.client.audio.speech.create(model=model, voice=voice, input=text)
+        return response.content
+
+# Models loaded in this worker process, by path
+_loaded: Dict[str, object] = {}
+
+def llama_cpp_engine(path: str, messages: list, params: dict, stream=None, stop=None) -> dict:
+    """
+    Chat completion with llama.cpp, run inside a pool worker.
+
+    With a ``stream`` queue the reply is put there piece by piece, followed by
+    ``None``. Generation ends early once the ``stop`` event is set, checked after
+    every token, in both modes. Returns the content and token counts.
+    """
+    try:
+        from llama_cpp import Llama, StoppingCriteriaList
+    except ImportError:
+        raise ProviderError("Local models need the llama-cpp-python package")
+    llm = _loaded.get(path)
+    if llm is None:
+        llm = Llama(
+            model_path=path,
+            n_ctx=LOCAL_MODEL_CONTEXT,
+            n_threads=LOCAL_MODEL_THREADS or None,
+            verbose=False,
+        )
+        _loaded[path] = llm
+    params = {"max_tokens": LOCAL_MODEL_MAX_TOKENS, **params}
+    if stop is not None:
+        params["stopping_criteria"] = StoppingCriteriaList([lambda tokens, logits: stop.is_set()])
+    if stream is None:
+        result = llm.create_chat_completion(messages=messages, **params)
+        usage = result.get("usage") or {}
+        return {
+            "content": result["choices"][0]["message"]["content"],
+            "prompt_tokens": usage.get("prompt_tokens"),
+            "completion_tokens": usage.get("completion_tokens"),
+        }
+    pieces = []
+    for chunk in llm.create_chat_completion(messages=messages, stream=True, **params):
+        piece = chunk["choices"][0]["delta"].get("content")
+        if piece:
+            pieces.append(piece)
+            stream.put(piece)
+    stream.put(None)
+    return {"content": "".join(pieces), "prompt_tokens": None, "completion_tokens": len(pieces)}
+
+class LocalProvider(LLMProvider):
+    """CPU inference in a process pool, see the module docstring."""
+    name = "local"
+
+    def __init__(
+        self,
+        model_dir: str = LOCAL_MODEL_DIR,
+        workers: int = LOCAL_MODEL_WORKERS,
+        engine: Callable = llama_cpp_engine,
+    ):
+        self.model_dir = model_dir
+        self.workers = workers
+        # A module-level function, it is pickled by reference into the workers
+        self.engine = engine
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._manager = None
+        self._lock = threading.Lock()
+
+    def model_path(self, model: str) -> str:
+        # Only plain file names, a model name must not escape the model directory
+        if not model or os.path.basename(model) != model or model.startswith("."):
+            raise ProviderError(f"Invalid local model name {model!r}")
+        path = os.path.join(self.model_dir, f"{model}.gguf")
+        if not os.path.isfile(path):
+            raise ProviderError(f"Local model {model!r} not found in {self.model_dir}")
+        return path
+
+    def _executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                # Forking a process with running threads is unsafe, workers start fresh
+                self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+            return self._pool
+
+    def _stop_event(self):
+        """
+        An event shared with the workers. Cancelling the future cannot stop a running
+        job, the engine polls this event instead.
+        """
+        with self._lock:
+            if self._manager is None:
+                self._manager = multiprocessing.get_context("spawn").Manager()
+        return self._manager.Event()
+
+    async def chat(self, model: str, messages: list, **params) -> ChatReply:
+        path = self.model_path(model)
+        # Tool support of llama.cpp depends on the model's chat format, local models answer without tools
+        params.pop("tools", None)
+        loop = asyncio.get_running_loop()
+        stop = self._stop_event()
+        try:
+            result = await loop.run_in_executor(self._executor(), self.engine, path, messages, params, None, stop)
+        except asyncio.CancelledError:
+            # Timed out (the router's wait_for) or abandoned: free the worker for the next request
+            stop.set()
+            raise
+        return ChatReply(
+            content=result["content"],
+            model=f"{LOCAL_PREFIX}{model}",
+            prompt_tokens=result.get("prompt_tokens"),
+            completion_tokens=result.get("completion_tokens"),
+        )
+
+    async def stream_chat(self, model: str, messages: list, **params) -> AsyncIterator[str]:
+        path = self.model_path(model)
+        loop = asyncio.get_running_loop()
+        stop = self._stop_event()
+        queue = self._manager.Queue()
+        job = loop.run_in_executor(self._executor(), self.engine, path, messages, params, queue, stop)
+        get = None
+        try:
+            while True:
+                # Blocking get on a helper thread; the job's failure ends the wait as well
+                get = loop.run_in_executor(None, queue.get)
+                done, _ = await asyncio.wait({get, job}, return_when=asyncio.FIRST_COMPLETED)
+                if get not in done:
+                    job.result()  # raises the worker's error
+                piece = await get
+                if piece is None:
+                    break
+                yield piece
+            await job
+        finally:
+            if get is not None and not get.done():
+                # Release the helper thread
+                queue.put(None)
+            if not job.done():
+                # The consumer went away: free the worker for the next request
+                stop.set()
+                job.cancel()
+
+    async def close(self):
+        """Stop the workers, called on shutdown."""
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+        if self._manager is not None:
+            self._manager.shutdown()
+            self._manager = None
+
+# Process-wide pool shared by every agent using a local model
+local_provider = LocalProvider()
+
+def resolve_model(model: str, client: AsyncOpenAI) -> Tuple[LLMProvider, str]:
+    """Return the provider serving ``model`` and the model's name within that provider."""
+    if model.startswith(LOCAL_PREFIX):
+        return local_provider, model[len(LOCAL_PREFIX):]
+    return OpenAIProvider(client), model
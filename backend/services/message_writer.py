@@ -0,0 +1,294 @@
+"""
+Message persistence with optional group commit and write-behind.
+
+Handlers hand every new message to ``MessageWriter.add`` instead of adding ORM
+objects and committing themselves. ``MESSAGE_WRITE_MODE`` selects where the
+durability boundary lies:
+
+``sync`` (default)
+    The message is inserted and committed in the request's own transaction before
+    ``add`` returns. Ids come from ``RETURNING`` (or the sequence on Postgres), the
+    row is never re-read with ``refresh``.
+
+``group``
+    Messages of concurrent requests are queued and written by a single flusher as
+    one multi-row ``INSERT`` and one commit, at the latest
+    ``MESSAGE_WRITE_MAX_DELAY_MS`` after the first one was queued or as soon as
+    ``MESSAGE_WRITE_MAX_BATCH`` messages are waiting. ``add`` returns after that
+    commit, so an acknowledged message is durable exactly as in ``sync`` mode; the
+    request pays up to the delay in latency and the database sees one commit per
+    batch instead of one per message.
+
+``deferred`` (Postgres only, otherwise ``group``)
+    Ids are drawn from the ``messages`` sequence up front and ``add`` returns
+    immediately; the row is written by the next group commit. An acknowledged
+    message is durable only after that flush: a crash can lose up to
+    ``MESSAGE_WRITE_MAX_DELAY_MS`` of messages, and until then reads do not see it.
+    Pending messages are flushed on a graceful shutdown.
+
+Message versions, the session's message count and last-message preview and the
+daily usage counters are written in the same transaction as the messages in every
+mode.
+"""
+from backend.models.chat import Message
+from backend.services.openai_service import ChatCompletionResult
+from backend.services.usage_service import record_usage
+from backend.services.versioning_service import bump_messages_version
+from backend.utils.database import SessionLocal, read_router
+from sqlalchemy import insert, text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import List, Optional
+import asyncio
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+MESSAGE_WRITE_MODE = os.getenv("MESSAGE_WRITE_MODE", "sync").lower()
+MESSAGE_WRITE_MAX_BATCH = int(os.getenv("MESSAGE_WRITE_MAX_BATCH", "200"))
+MESSAGE_WRITE_MAX_DELAY_MS = float(os.getenv("MESSAGE_WRITE_MAX_DELAY_MS", "5"))
+# Characters of the last message kept on the session for the overview listing
+MESSAGE_PREVIEW_LENGTH = int(os.getenv("MESSAGE_PREVIEW_LENGTH", "120"))
+
+WRITE_MODES = ("sync", "group", "deferred")
+
+# Every row of a multi-row insert needs the same columns
+MESSAGE_DEFAULTS = {
+    "audio_url": None,
+    "model": None,
+    "prompt_tokens": None,
+    "completion_tokens": None,
+    "latency_ms": None,
+    "ttft_ms": None,
+}
+
+MESSAGE_ID_SEQUENCE_SQL = text(
+    "SELECT nextval(pg_get_serial_sequence('messages', 'id')) FROM generate_series(1, :count)"
+)
+
+@dataclass
+class Usage:
+    """Accounting of an assistant turn, booked with ``record_usage``."""
+    user_id: int
+    agent_id: int
+    result: ChatCompletionResult
+
+@dataclass
+class _Write:
+    row: dict
+    user_id: Optional[int] = None
+    usage: Optional[Usage] = None
+    future: Optional[asyncio.Future] = field(default=None, repr=False)
+
+def message_preview(content: str, length: int = MESSAGE_PREVIEW_LENGTH) -> str:
+    """Shorten ``content`` to at most ``length`` characters, marking a cut with an ellipsis."""
+    if len(content) <= length:
+        return content
+    return content[:length - 1].rstrip() + "\u2026"
+
+async def allocate_message_ids(db: AsyncSession, count: int) -> List[int]:
+    """Draw ``count`` ids from the ``messages`` sequence in one round trip (Postgres only)."""
+    return list((await db.execute(MESSAGE_ID_SEQUENCE_SQL, {"count": count})).scalars().all())
+
+async def _persist(db: AsyncSession, writes: List[_Write], ids_assigned: bool):
+    """Insert the rows of ``writes`` in one statement, stamping ids and versions into them. The caller commits."""
+    per_session = {}
+    for write in writes:
+        per_session.setdefault(write.row["session_id"], []).append(write.row)
+    # Fixed lock order across concurrent writers
+    for session_id in sorted(per_session):
+        rows = per_session[session_id]
+        last = rows[-1]
+        top = await bump_messages_version(
+            db, session_id, len(rows), last["created_at"], message_preview(last["content"])
+        )
+        for offset, row in enumerate(rows):
+            row["version"] = top - len(rows) + 1 + offset
+
+    rows = [write.row for write in writes]
+    if not ids_assigned and db.get_bind().dialect.name == "postgresql":
+        # Ids from the sequence keep the insert a single multi-row statement
+        for row, message_id in zip(rows, await allocate_message_ids(db, len(rows))):
+            row["id"] = message_id
+        ids_assigned = True
+    if ids_assigned:
+        await db.execute(insert(Message), rows)
+    else:
+        # RETURNING in parameter order; SQLite executes this row by row, still in one transaction
+        stmt = insert(Message).returning(Message.id, sort_by_parameter_order=True)
+        ids = (await db.execute(stmt, rows)).scalars().all()
+        for row, message_id in zip(rows, ids):
+            row["id"] = message_id
+
+    for write in writes:
+        if write.usage is not None:
+            await record_usage(db, write.usage.user_id, write.usage.agent_id, write.usage.result)
+
+def _note_writes(writes: List[_Write]):
+    for user_id in {write.user_id for write in writes if write.user_id is not None}:
+        read_router.note_write(user_id)
+
+class MessageWriter:
+    """Writes messages according to the configured mode, see the module docstring."""
+
+    def __init__(
+        self,
+        session_factory: async_sessionmaker,
+        mode: str = MESSAGE_WRITE_MODE,
+        max_batch: int = MESSAGE_WRITE_MAX_BATCH,
+        max_delay_ms: float = MESSAGE_WRITE_MAX_DELAY_MS,
+    ):
+        if mode not in WRITE_MODES:
+            raise ValueError(f"Unknown message write mode {mode!r}, expected one of {WRITE_MODES}")
+        self.session_factory = session_factory
+        self.mode = mode
+        self.max_batch = max_batch
+        self.max_delay = max_delay_ms / 1000
+        self._pending: List[_Write] = []
+        self._task: Optional[asyncio.Task] = None
+        # Resolved to cut the batching delay short once a batch is full or on stop
+        self._wakeup: Optional[asyncio.Future] = None
+        self._flush_requested = False
+        self.batches = 0
+        self.rows_written = 0
+
+    async def add(
+        self,
+        db: AsyncSession,
+        row: dict,
+        user_id: Optional[int] = None,
+        usage: Optional[Usage] = None,
+    ) -> dict:
+        """
+        Persist one message and return its row, including ``id`` and ``created_at``.
+
+        Args:
+            db (AsyncSession): The request's session, used for the write in ``sync`` mode
+                and to allocate ids in ``deferred`` mode
+            row (dict): Message column values, at least ``session_id``, ``content`` and ``is_user``
+            user_id (Optional[int]): User whose reads must see the write (read-your-writes)
+            usage (Optional[Usage]): Daily usage to book in the same transaction
+        """
+        row = {**MESSAGE_DEFAULTS, "created_at": datetime.now(timezone.utc), **row}
+        write = _Write(row=row, user_id=user_id, usage=usage)
+
+        if self.mode == "sync":
+            await _persist(db, [write], ids_assigned=False)
+            await db.commit()
+            _note_writes([write])
+            return row
+
+        if self.mode == "deferred" and db.get_bind().dialect.name == "postgresql":
+            row["id"] = (await allocate_message_ids(db, 1))[0]
+            self._enqueue(write)
+            return row
+
+        write.future = asyncio.get_running_loop().create_future()
+        self._enqueue(write)
+        await write.future
+        return row
+
+    async def add_many(
+        self,
+        db: AsyncSession,
+        rows: List[dict],
+        user_id: Optional[int] = None,
+        usages: Optional[List[Optional[Usage]]] = None,
+    ) -> List[dict]:
+        """
+        Persist messages that are already batched with one multi-row ``INSERT`` and commit.
+
+        The write happens in the caller's transaction whatever the mode, as a group
+        commit would only add latency. Rows of a session keep their order. Returns the
+        rows like ``add``.
+        """
+        now = datetime.now(timezone.utc)
+        writes = [
+            _Write(row={**MESSAGE_DEFAULTS, "created_at": now, **row}, user_id=user_id, usage=usage)
+            for row, usage in zip(rows, usages or [None] * len(rows))
+        ]
+        await _persist(db, writes, ids_assigned=False)
+        await db.commit()
+        self.batches += 1
+        self.rows_written += len(writes)
+        _note_writes(writes)
+        return [write.row for write in writes]
+
+    def _enqueue(self, write: _Write):
+        self._pending.append(write)
+        if len(self._pending) >= self.max_batch:
+            self._wake()
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    def _wake(self):
+        self._flush_requested = True
+        if self._wakeup is not None and not self._wakeup.done():
+            self._wakeup.set_result(None)
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while self._pending:
+            if len(self._pending) < self.max_batch and not self._flush_requested:
+                self._wakeup = loop.create_future()
+                try:
+                    await asyncio.wait_for(self._wakeup, timeout=self.max_delay)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup = None
+            self._flush_requested = False
+            await self.flush()
+
+    async def flush(self):
+        """Write everything queued so far, one batch of at most ``max_batch`` rows at a time."""
+        while self._pending:
+            batch, self._pending = self._pending[:self.max_batch], self._pending[self.max_batch:]
+            await self._flush_batch(batch)
+
+    async def _flush_batch(self, batch: List[_Write]):
+        ids_assigned = "id" in batch[0].row
+        try:
+            async with self.session_factory() as db:
+                await _persist(db, batch, ids_assigned)
+                await db.commit()
+        except Exception as e:
+            if len(batch) > 1:
+                # Isolate the failing write instead of failing the whole batch
+                logger.warning(f"Group commit of {len(batch)} messages failed, retrying one by one: {e}")
+                for write in batch:
+                    await self._flush_batch([write])
+                return
+            write = batch[0]
+            if write.future is None:
+                logger.error(f"Lost deferred message {write.row.get('id')} of session {write.row['session_id']}: {e}")
+            elif not write.future.done():
+                write.future.set_exception(e)
+            return
+
+        self.batches += 1
+        self.rows_written += len(batch)
+        _note_writes(batch)
+        for write in batch:
+            if write.future is not None and not write.future.done():
+                write.future.set_result(None)
+
+    async def stop(self):
+        """Flush pending messages, called on shutdown."""
+        if self._task is not None and not self._task.done():
+            self._wake()
+            await self._task
+        self._task = None
+        await self.flush()
+
+    def stats(self) -> dict:
+        return {
+            "mode": self.mode,
+            "pending": len(self._pending),
+            "batches": self.batches,
+            "rows_written": self.rows_written,
+        }
+
+# Process-wide writer, flushed in the application lifespan on shutdown
+message_writer = MessageWriter(SessionLocal)
@@ -0,0 +1,105 @@
+"""
+Latency- and error-aware choice among an agent's chat models.
+
+An agent lists its chat model and optional fallback models in order of preference
+(typically cheapest first). Every upstream call is recorded per model in a rolling
+window of ``MODEL_ROUTER_WINDOW_SECONDS``. A model is unhealthy once it has at least
+``MODEL_ROUTER_MIN_SAMPLES`` calls in the window and either more than
+``MODEL_ROUTER_MAX_ERROR_RATE`` of them failed or its p90 latency exceeds the
+agent's ``max_latency_ms``. ``ModelRouter.order`` returns the healthy models in the
+agent's order, followed by the unhealthy ones, least bad first; the caller tries
+them in that order, moving on after a timeout or an upstream error.
+
+An unhealthy model gets no traffic while a healthy one remains, so its samples age
+out of the window and it is tried again after at most the window length. The
+windows are per process.
+"""
+from collections import deque
+from dataclasses import dataclass
+from typing import Deque, Dict, List, Optional, Sequence, Tuple
+import os
+import time
+
+MODEL_ROUTER_WINDOW_SECONDS = float(os.getenv("MODEL_ROUTER_WINDOW_SECONDS", "300"))
+MODEL_ROUTER_MIN_SAMPLES = int(os.getenv("MODEL_ROUTER_MIN_SAMPLES", "5"))
+MODEL_ROUTER_MAX_ERROR_RATE = float(os.getenv("MODEL_ROUTER_MAX_ERROR_RATE", "0.2"))
+# Samples kept per model however busy it is
+MODEL_ROUTER_MAX_SAMPLES = 1000
+
+@dataclass
+class ModelHealth:
+    model: str
+    samples: int
+    error_rate: float
+    p50_ms: Optional[float]
+    p90_ms: Optional[float]
+
+def _percentile(values: List[float], fraction: float) -> Optional[float]:
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+class ModelRouter:
+    """Rolling per-model call statistics, see the module docstring."""
+
+    def __init__(
+        self,
+        window_seconds: float = MODEL_ROUTER_WINDOW_SECONDS,
+        min_samples: int = MODEL_ROUTER_MIN_SAMPLES,
+        max_error_rate: float = MODEL_ROUTER_MAX_ERROR_RATE,
+        clock=time.monotonic,
+    ):
+        self.window_seconds = window_seconds
+        self.min_samples = min_samples
+        self.max_error_rate = max_error_rate
+        self.clock = clock
+        # (timestamp, latency in ms, succeeded) per model, oldest first
+        self._samples: Dict[str, Deque[Tuple[float, float, bool]]] = {}
+
+    def record(self, model: str, latency_ms: float, ok: bool):
+        samples = self._samples.setdefault(model, deque(maxlen=MODEL_ROUTER_MAX_SAMPLES))
+        samples.append((self.clock(), latency_ms, ok))
+
+    def health(self, model: str) -> ModelHealth:
+        samples = self._samples.get(model)
+        if samples:
+            cutoff = self.clock() - self.window_seconds
+            while samples and samples[0][0] < cutoff:
+                samples.popleft()
+        samples = samples or ()
+        latencies = [latency for _, latency, ok in samples if ok]
+        errors = sum(1 for _, _, ok in samples if not ok)
+        return ModelHealth(
+            model=model,
+            samples=len(samples),
+            error_rate=errors / len(samples) if samples else 0.0,
+            p50_ms=_percentile(latencies, 0.5),
+            p90_ms=_percentile(latencies, 0.9),
+        )
+
+    def is_healthy(self, health: ModelHealth, max_latency_ms: Optional[float] = None) -> bool:
+        if health.samples < self.min_samples:
+            return True
+        if health.error_rate > self.max_error_rate:
+            return False
+        return not (max_latency_ms and health.p90_ms is not None and health.p90_ms > max_latency_ms)
+
+    def order(self, models: Sequence[str], max_latency_ms: Optional[float] = None) -> List[str]:
+        """``models`` without duplicates, healthy ones first in the given order."""
+        healths = [self.health(model) for model in dict.fromkeys(models)]
+        healthy = [h.model for h in healths if self.is_healthy(h, max_latency_ms)]
+        unhealthy = sorted(
+            (h for h in healths if h.model not in healthy),
+            key=lambda h: (h.error_rate, h.p90_ms if h.p90_ms is not None else float("inf")),
+        )
+        return healthy + [h.model for h in unhealthy]
+
+    def stats(self) -> List[ModelHealth]:
+        return [self.health(model) for model in sorted(self._samples)]
+
+    def clear(self):
+        self._samples.clear()
+
+# Process-wide statistics shared by all agents using a model
+model_router = ModelRouter()
@@ -1,56 +1,286 @@
-from openai import AsyncOpenAI
+from openai import APIError, AsyncOpenAI
 from backend.models.agent import Agent
-from backend.models.chat import ChatSession
+from backend.services.agent_cache import agent_cache
+from backend.services.embedders import Embedder
+from backend.services.knowledge_service import system_message
+from backend.services.llm_providers import ChatReply, ProviderError, resolve_model
+from backend.services.model_router import ModelRouter, model_router
+from backend.services.tool_service import (
+    TOOL_MAX_ROUNDS, ToolCallRecord, ToolContext, run_tool_calls, tool_definitions
+)
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.future import select
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import AsyncIterator, List, Optional, Tuple
 import aiofiles
+import asyncio
 import os
+import time
 import uuid
+import weakref
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Deployment defaults, agents can override each of them
+CHAT_MODEL = os.getenv("CHAT_MODEL", "gpt-3.5-turbo")
+CHAT_TIMEOUT_SECONDS = float(os.getenv("CHAT_TIMEOUT_SECONDS", "60"))
+STT_MODEL = os.getenv("STT_MODEL", "whisper-1")
+TTS_MODEL = os.getenv("TTS_MODEL", "tts-1")
+TTS_VOICE = os.getenv("TTS_VOICE", "alloy")
+# Chat completions in flight per worker across all requests, 0 for no limit
+UPSTREAM_CONCURRENCY = int(os.getenv("UPSTREAM_CONCURRENCY", "64"))
+
+@dataclass
+class ChatCompletionResult:
+    """Text of a chat completion together with its upstream accounting."""
+    content: str
+    model: str
+    prompt_tokens: Optional[int] = None
+    completion_tokens: Optional[int] = None
+    latency_ms: Optional[int] = None
+    ttft_ms: Optional[int] = None
+    # Tools the model called on the way to the answer, stored with ``record_tool_calls``
+    tool_calls: List[ToolCallRecord] = field(default_factory=list)
+
+class UpstreamLimiter:
+    """
+    Caps the worker's concurrent upstream chat calls, whichever endpoint makes them.
+
+    Callers beyond the limit wait for a slot; the wait does not count against a
+    model's timeout or latency.
+    """
+
+    def __init__(self, limit: int = UPSTREAM_CONCURRENCY):
+        self.limit = limit
+        # One semaphore per event loop
+        self._semaphores = weakref.WeakKeyDictionary()
+        self.in_flight = 0
+        self.waiting = 0
+
+    @asynccontextmanager
+    async def slot(self):
+        semaphore = None
+        if self.limit > 0:
+            loop = asyncio.get_running_loop()
+            semaphore = self._semaphores.get(loop)
+            if semaphore is None:
+                semaphore = self._semaphores[loop] = asyncio.Semaphore(self.limit)
+            self.waiting += 1
+            try:
+                await semaphore.acquire()
+            finally:
+                self.waiting -= 1
+        self.in_flight += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            if semaphore is not None:
+                semaphore.release()
+
+    def stats(self) -> dict:
+        return {"limit": self.limit, "in_flight": self.in_flight, "waiting": self.waiting}
+
+# Process-wide limit shared by all requests
+upstream_limiter = UpstreamLimiter()
+
+def chat_models(agent: Agent) -> List[str]:
+    """The agent's chat model followed by its fallback models."""
+    return [agent.chat_model or CHAT_MODEL, *(agent.fallback_models or [])]
+
+def chat_parameters(agent: Agent) -> dict:
+    """Sampling parameters of the agent, only those it sets."""
+    params = {}
+    if agent.temperature is not None:
+        params["temperature"] = agent.temperature
+    if agent.max_tokens is not None:
+        params["max_tokens"] = agent.max_tokens
+    return params
+
+async def create_with_fallback(
+    client: AsyncOpenAI, agent: Agent, messages: list, router: ModelRouter = model_router, tools: Optional[list] = None
+) -> ChatReply:
+    """
+    Request a chat completion from the agent's models in the order chosen by ``router``.
+
+    Each attempt is limited to the agent's timeout; after a timeout, an upstream
+    error or an unusable model the next model is tried, the last one's error is
+    raised. Every attempt is recorded in the router's window. Models prefixed with
+    ``local/`` run on the local CPU provider, see ``llm_providers``. Each attempt
+    first waits for a slot of ``upstream_limiter``. ``tools`` are offered to the
+    model in the chat completions format.
+    """
+    timeout = agent.chat_timeout_seconds or CHAT_TIMEOUT_SECONDS
+    candidates = router.order(chat_models(agent), agent.max_latency_ms)
+    params = chat_parameters(agent)
+    if tools:
+        params["tools"] = tools
+    for attempt, model in enumerate(candidates):
+        started = time.perf_counter()
+        try:
+            provider, name = resolve_model(model, client)
+            async with upstream_limiter.slot():
+                started = time.perf_counter()
+                reply = await asyncio.wait_for(provider.chat(name, messages, **params), timeout)
+        except (asyncio.TimeoutError, APIError, ProviderError) as e:
+            router.record(model, (time.perf_counter() - started) * 1000, ok=False)
+            if attempt == len(candidates) - 1:
+                raise
+            logger.warning(
+                f"Chat model {model} failed for agent {agent.id} ({type(e).__name__}), "
+                f"falling back to {candidates[attempt + 1]}"
+            )
+            continue
+        router.record(model, (time.perf_counter() - started) * 1000, ok=True)
+        return reply
+
+async def complete_with_tools(
+    client: AsyncOpenAI, agent: Agent, messages: list, context: ToolContext, router: ModelRouter = model_router
+) -> Tuple[ChatReply, List[ToolCallRecord]]:
+    """
+    Request a chat completion, running the tools the model calls until it answers.
+
+    The calls of one model turn run concurrently, see ``tool_service``; their
+    results are appended to the conversation and the model is asked again. After
+    ``TOOL_MAX_ROUNDS`` turns with calls the model is asked without tools. Token
+    counts are summed over the turns. Agents without tools make a single
+    ``create_with_fallback`` call.
+    """
+    definitions = tool_definitions(agent)
+    if not definitions:
+        return await create_with_fallback(client, agent, messages, router), []
+    messages = list(messages)
+    records: List[ToolCallRecord] = []
+    prompt_tokens = completion_tokens = None
+    for turn in range(TOOL_MAX_ROUNDS + 1):
+        reply = await create_with_fallback(
+            client, agent, messages, router, tools=definitions if turn < TOOL_MAX_ROUNDS else None
+        )
+        if reply.prompt_tokens is not None:
+            prompt_tokens = (prompt_tokens or 0) + reply.prompt_tokens
+        if reply.completion_tokens is not None:
+            completion_tokens = (completion_tokens or 0) + reply.completion_tokens
+        if not reply.tool_calls:
+            break
+        calls = await run_tool_calls(context, reply.tool_calls)
+        messages.append({
+            "role": "assistant",
+            "content": reply.content,
+            "tool_calls": [
+                {"id": call.id, "type": "function", "function": {"name": call.name, "arguments": call.arguments}}
+                for call in reply.tool_calls
+            ],
+        })
+        messages += [{"role": "tool", "tool_call_id": record.call_id, "content": record.result} for record in calls]
+        records += calls
+    return ChatReply(reply.content or "", reply.model, prompt_tokens, completion_tokens), records
+
+async def stream_with_fallback(
+    client: AsyncOpenAI, agent: Agent, messages: list, router: ModelRouter = model_router
+) -> AsyncIterator[Tuple[str, str]]:
+    """
+    Stream a chat completion as ``(model, piece)`` pairs, see ``create_with_fallback``.
+
+    The agent's timeout applies to the wait for every piece. A model that fails
+    before its first piece is replaced by the next one; once pieces were yielded a
+    failure is raised, as the caller has already passed them on. An empty reply
+    yields one empty piece so the caller learns the model.
+    """
+    timeout = agent.chat_timeout_seconds or CHAT_TIMEOUT_SECONDS
+    candidates = router.order(chat_models(agent), agent.max_latency_ms)
+    params = chat_parameters(agent)
+    for attempt, model in enumerate(candidates):
+        started = time.perf_counter()
+        streamed = False
+        try:
+            provider, name = resolve_model(model, client)
+            async with upstream_limiter.slot():
+                started = time.perf_counter()
+                pieces = provider.stream_chat(name, messages, **params)
+                try:
+                    while True:
+                        try:
+                            piece = await asyncio.wait_for(pieces.__anext__(), timeout)
+                        except StopAsyncIteration:
+                            break
+                        streamed = True
+                        yield model, piece
+                finally:
+                    # Releases the upstream stream when the caller stops early
+                    await pieces.aclose()
+                if not streamed:
+                    yield model, ""
+        except (asyncio.TimeoutError, APIError, ProviderError) as e:
+            router.record(model, (time.perf_counter() - started) * 1000, ok=False)
+            if streamed or attempt == len(candidates) - 1:
+                raise
+            logger.warning(
+                f"Chat model {model} failed for agent {agent.id} ({type(e).__name__}), "
+                f"falling back to {candidates[attempt + 1]}"
+            )
+            continue
+        router.record(model, (time.perf_counter() - started) * 1000, ok=True)
+        return
+
 async def generate_chat_response(
-    client: AsyncOpenAI, db: AsyncSession, session_id: int, messages: list
-) -> str:
+    client: AsyncOpenAI, db: AsyncSession, session_id: int, messages: list, embedder: Optional[Embedder] = None
+) -> ChatCompletionResult:
     """
     Generate a chat response using OpenAI API with message history.
+
+    The upstream latency and token usage reported by the API are returned
+    alongside the text. The request is not streamed, so the time to first
+    token equals the full upstream latency, including attempts of models that
+    timed out or failed, and of the agent's tool calls (``complete_with_tools``).
+    The model, sampling parameters and fallbacks come from the agent's settings,
+    see ``create_with_fallback``. The agent's prompt is sent as the system message,
+    followed by the knowledge base excerpts relevant to the last user message when
+    the agent has documents and an embedder is given.
     
     Args:
         client (AsyncOpenAI): OpenAI client
         db (AsyncSession): Database session
         session_id (int): Chat session ID
         messages (list): List of message dicts (history), e.g. [{"role": ..., "content": ...}]
+        embedder (Optional[Embedder]): Embeds the question for knowledge retrieval
         
     Returns:
-        str: Generated response from the agent
+        ChatCompletionResult: Generated response from the agent and its accounting
         
     Raises:
         ValueError: If session or agent not found
         Exception: For other errors during API call
     """
     try:
-        # Retrieve session and associated agent
-        result = await db.execute(
-            select(ChatSession).filter(ChatSession.id == session_id)
-        )
-        session = result.scalars().first()
+        # Retrieve session and associated agent, usually from the cache
+        session = await agent_cache.get_session(db, session_id)
         if not session:
             raise ValueError("Session not found")
-        result = await db.execute(select(Agent).filter(Agent.id == session.agent_id))
-        agent = result.scalars().first()
+        agent = await agent_cache.get_agent(db, session.agent_id)
         if not agent:
             raise ValueError("Agent not found")
 
         # Prepend system prompt if not already present
         chat_messages = messages.copy()
+        if not chat_messages or chat_messages[0]["role"] != "system":
+            chat_messages.insert(0, await system_message(db, agent, messages, embedder))
 
-        # Call OpenAI API
-        response = await client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=chat_messages,
+        # Call OpenAI API, falling back to the agent's other models and running the
+        # agent's tools as the model calls them
+        started = time.perf_counter()
+        reply, tool_calls = await complete_with_tools(client, agent, chat_messages, ToolContext(db, agent, embedder))
+        latency_ms = int((time.perf_counter() - started) * 1000)
+
+        return ChatCompletionResult(
+            content=reply.content,
+            model=reply.model,
+            prompt_tokens=reply.prompt_tokens,
+            completion_tokens=reply.completion_tokens,
+            latency_ms=latency_ms,
+            ttft_ms=latency_ms,
+            tool_calls=tool_calls,
         )
-        return response.choices[0].message.content
     except ValueError as e:
         logger.error(f"Value error in generate_chat_response: {e}")
         raise
@@ -59,13 +289,14 @@ async def generate_chat_response(
         raise Exception(f"Failed to generate response: {str(e)}")
 
 
-async def transcribe_audio(client: AsyncOpenAI, audio_path: str) -> str:
+async def transcribe_audio(client: AsyncOpenAI, audio_path: str, model: Optional[str] = None) -> str:
     """
     Transcribe audio file using OpenAI Whisper API.
     
     Args:
         client (AsyncOpenAI): OpenAI client
         audio_path (str): Path to audio file
+        model (Optional[str]): Transcription model, defaults to STT_MODEL
         
     Returns:
         str: Transcribed text
@@ -79,17 +310,14 @@ async def transcribe_audio(client: AsyncOpenAI, audio_path: str) -> str:
             audio_content = await audio_file.read()
         
         # Transcribe audio using OpenAI Whisper
-        transcription = await client.audio.transcriptions.create(
-            model="whisper-1",
-            file=(os.path.basename(audio_path), audio_content, "audio/mpeg")
-        )
-        return transcription.text
+        provider, name = resolve_model(model or STT_MODEL, client)
+        return await provider.transcribe(audio_content, os.path.basename(audio_path), name)
     except Exception as e:
         logger.error(f"Error transcribing audio {audio_path}: {e}")
         raise Exception(f"Failed to transcribe audio: {str(e)}")
 
 async def generate_voice_response(
-    client: AsyncOpenAI, text: str, session_id: int
+    client: AsyncOpenAI, text: str, session_id: int, model: Optional[str] = None, voice: Optional[str] = None
 ) -> str:
     """
     Generate voice response using OpenAI TTS API.
@@ -98,6 +326,8 @@ async def generate_voice_response(
         client (AsyncOpenAI): OpenAI client
         text (str): Text to convert to speech
         session_id (int): Session ID for file naming
+        model (Optional[str]): Speech model, defaults to TTS_MODEL
+        voice (Optional[str]): Voice, defaults to TTS_VOICE
         
     Returns:
         str: Path to generated audio file
@@ -110,15 +340,12 @@ async def generate_voice_response(
         audio_filename = f"backend/static/audio_{session_id}_{uuid.uuid4().hex}.mp3"
 
         # Generate speech using OpenAI TTS
-        response = await client.audio.speech.create(
-            model="tts-1",
-            voice="alloy",
-            input=text
-        )
+        provider, name = resolve_model(model or TTS_MODEL, client)
+        audio = await provider.speak(text, name, voice or TTS_VOICE)
 
         # Save audio file asynchronously
         async with aiofiles.open(audio_filename, "wb") as f:
-            await f.write(response.content)
+            await f.write(audio)
 
         return audio_filename
     except Exception as e:
@@ -0,0 +1,183 @@
+from backend.models.agent import Agent
+from backend.models.chat import ChatSession, Message
+from backend.services.agent_cache import AGENT, SESSION, publish_invalidation
+from backend.services.archive_service import archived_audio_urls, delete_message_embeddings
+from backend.services.branch_service import branch_ids
+from backend.utils.periodic import PeriodicTask
+from sqlalchemy import delete, exists, select, update
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Iterable, List
+import asyncio
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+# Mark agents and sessions as deleted and return immediately, the purger removes the rows
+SOFT_DELETE = os.getenv("SOFT_DELETE", "false").lower() in ("1", "true", "yes")
+# Rows removed per purge transaction, keeps lock times and WAL bursts bounded
+PURGE_BATCH_SIZE = int(os.getenv("PURGE_BATCH_SIZE", "1000"))
+# Pause between purge runs
+PURGE_INTERVAL_SECONDS = float(os.getenv("PURGE_INTERVAL_SECONDS", "30"))
+
+# Audio files are written here by the voice endpoint and served under /static
+STATIC_DIR = Path("backend/static")
+
+def soft_delete_enabled() -> bool:
+    return SOFT_DELETE
+
+def audio_file_path(audio_url: str) -> Path:
+    """Map a ``/static/<name>`` URL to its file, only the file name is trusted."""
+    return STATIC_DIR / Path(audio_url).name
+
+def _unlink_files(audio_urls: List[str]) -> int:
+    removed = 0
+    for audio_url in audio_urls:
+        try:
+            audio_file_path(audio_url).unlink()
+            removed += 1
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning(f"Failed to remove audio file for {audio_url}: {e}")
+    return removed
+
+async def remove_audio_files(audio_urls: Iterable[str]) -> int:
+    """Delete the audio files behind ``audio_urls`` off the event loop, returns how many were removed."""
+    audio_urls = [url for url in audio_urls if url]
+    if not audio_urls:
+        return 0
+    return await asyncio.to_thread(_unlink_files, audio_urls)
+
+async def _audio_urls(db: AsyncSession, condition) -> List[str]:
+    result = await db.execute(select(Message.audio_url).where(condition, Message.audio_url.is_not(None)))
+    return list(result.scalars().all())
+
+async def remove_agent(db: AsyncSession, agent: Agent) -> List[str]:
+    """
+    Delete an agent together with its sessions and messages.
+
+    In soft-delete mode the agent and its sessions are only marked, with one UPDATE
+    each. Otherwise the agent row is deleted and the database cascades to the
+    sessions and messages without loading them; the messages' embedding links, which
+    have no foreign key, are deleted by one statement first. Returns the audio URLs whose files
+    should be removed once the transaction is committed. The caller commits.
+    """
+    await publish_invalidation(db, AGENT, agent.id)
+    if soft_delete_enabled():
+        now = datetime.now(timezone.utc)
+        agent.deleted_at = now
+        await db.execute(
+            update(ChatSession)
+            .where(ChatSession.agent_id == agent.id, ChatSession.deleted_at.is_(None))
+            .values(deleted_at=now)
+            .execution_options(synchronize_session=False)
+        )
+        return []
+    session_ids = select(ChatSession.id).where(ChatSession.agent_id == agent.id)
+    audio_urls = await _audio_urls(db, Message.session_id.in_(session_ids))
+    audio_urls += await archived_audio_urls(db, session_ids)
+    await delete_message_embeddings(db, select(Message.id).where(Message.session_id.in_(session_ids)))
+    await db.delete(agent)
+    return audio_urls
+
+async def remove_session(db: AsyncSession, session: ChatSession) -> List[str]:
+    """Delete a session, its branches and their messages, see ``remove_agent``. The caller commits."""
+    session_ids = [session.id, *await branch_ids(db, session.id)]
+    for session_id in session_ids:
+        await publish_invalidation(db, SESSION, session_id)
+    if soft_delete_enabled():
+        await db.execute(
+            update(ChatSession)
+            .where(ChatSession.id.in_(session_ids), ChatSession.deleted_at.is_(None))
+            .values(deleted_at=datetime.now(timezone.utc))
+        )
+        return []
+    audio_urls = await _audio_urls(db, Message.session_id.in_(session_ids))
+    audio_urls += await archived_audio_urls(db, session_ids)
+    await delete_message_embeddings(db, select(Message.id).where(Message.session_id.in_(session_ids)))
+    # The branches go with the session through the cascade
+    await db.delete(session)
+    return audio_urls
+
+async def purge_batch(db: AsyncSession, batch_size: int = PURGE_BATCH_SIZE) -> dict:
+    """
+    Remove at most ``batch_size`` rows of soft-deleted data and commit.
+
+    Messages of deleted sessions go first, with their embedding links, then the
+    emptied sessions, then the deleted agents without sessions left. Audio files are
+    removed after the commit.
+    Returns the number of rows removed per table, all zeros once nothing is left.
+    """
+    counts = {"messages": 0, "sessions": 0, "agents": 0, "audio_files": 0}
+
+    result = await db.execute(
+        select(Message.id, Message.audio_url)
+        .join(ChatSession, ChatSession.id == Message.session_id)
+        .where(ChatSession.deleted_at.is_not(None))
+        .limit(batch_size)
+    )
+    rows = result.all()
+    if rows:
+        message_ids = [row.id for row in rows]
+        await delete_message_embeddings(db, message_ids)
+        await db.execute(delete(Message).where(Message.id.in_(message_ids)))
+        await db.commit()
+        counts["messages"] = len(rows)
+        counts["audio_files"] = await remove_audio_files(row.audio_url for row in rows)
+        return counts
+
+    has_messages = exists().where(Message.session_id == ChatSession.id)
+    result = await db.execute(
+        select(ChatSession.id).where(ChatSession.deleted_at.is_not(None), ~has_messages).limit(batch_size)
+    )
+    session_ids = result.scalars().all()
+    if session_ids:
+        # Archives go with their sessions through the cascade
+        audio_urls = await archived_audio_urls(db, session_ids)
+        await db.execute(delete(ChatSession).where(ChatSession.id.in_(session_ids)))
+        await db.commit()
+        counts["sessions"] = len(session_ids)
+        counts["audio_files"] = await remove_audio_files(audio_urls)
+        return counts
+
+    has_sessions = exists().where(ChatSession.agent_id == Agent.id)
+    result = await db.execute(select(Agent.id).where(Agent.deleted_at.is_not(None), ~has_sessions).limit(batch_size))
+    agent_ids = result.scalars().all()
+    if agent_ids:
+        await db.execute(delete(Agent).where(Agent.id.in_(agent_ids)))
+        await db.commit()
+        counts["agents"] = len(agent_ids)
+    return counts
+
+async def purge_deleted(session_factory: async_sessionmaker, batch_size: int = PURGE_BATCH_SIZE) -> dict:
+    """Run ``purge_batch`` in fresh sessions until everything soft-deleted is gone, returns the totals."""
+    totals = {"messages": 0, "sessions": 0, "agents": 0, "audio_files": 0}
+    while True:
+        async with session_factory() as db:
+            counts = await purge_batch(db, batch_size)
+        for key, value in counts.items():
+            totals[key] += value
+        if not any(counts[key] for key in ("messages", "sessions", "agents")):
+            return totals
+
+class Purger(PeriodicTask):
+    """Background task removing soft-deleted rows every ``interval`` seconds."""
+    name = "Purge"
+
+    def __init__(
+        self,
+        session_factory: async_sessionmaker,
+        batch_size: int = PURGE_BATCH_SIZE,
+        interval: float = PURGE_INTERVAL_SECONDS,
+    ):
+        super().__init__(interval)
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+
+    async def run_once(self):
+        totals = await purge_deleted(self.session_factory, self.batch_size)
+        if any(totals.values()):
+            logger.info(f"Purged soft-deleted data: {totals}")
@@ -0,0 +1,113 @@
+"""
+Ranked full-text search over the caller's messages.
+
+Backed by the index from ``backend.utils.search``: ``to_tsvector(content) @@
+websearch_to_tsquery(...)``, the expression of the GIN index, ranked with ``ts_rank_cd`` on Postgres, ``messages_fts
+MATCH ...`` ranked with ``bm25`` on SQLite. Results are ordered by ``(score, id)``
+descending and keyset-paginated on that pair. Snippets are produced by the database
+with control-character markers, then HTML-escaped and turned into ``<mark>`` tags
+here, so message content can never inject markup. Archived sessions are not
+indexed until they are restored.
+"""
+from backend.models.agent import Agent
+from backend.models.chat import ChatSession, Message
+from backend.utils.pagination import decode_cursor, encode_cursor
+from backend.utils.search import SEARCH_LANGUAGE
+from fastapi import HTTPException
+from sqlalchemy import Float, and_, cast, column, func, literal_column, or_, select, table
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional
+import html
+import os
+import re
+
+# Words around the best match in a snippet
+SEARCH_SNIPPET_WORDS = int(os.getenv("SEARCH_SNIPPET_WORDS", "16"))
+
+HIGHLIGHT_START = "\x02"
+HIGHLIGHT_END = "\x03"
+
+SEARCH_RESULT_COLUMNS = (
+    Message.id,
+    Message.session_id,
+    ChatSession.agent_id,
+    Agent.name.label("agent_name"),
+    Message.is_user,
+    Message.created_at,
+)
+
+MESSAGES_FTS = table("messages_fts", column("rowid"))
+
+def fts5_query(query: str) -> str:
+    """Turn free text into an FTS5 query matching all of its words, without FTS5 operators."""
+    return " ".join(f'"{word}"' for word in re.findall(r"\w+", query))
+
+def highlight(snippet: str) -> str:
+    return html.escape(snippet).replace(HIGHLIGHT_START, "<mark>").replace(HIGHLIGHT_END, "</mark>")
+
+def _postgres_search(query: str):
+    config = literal_column(f"'{SEARCH_LANGUAGE}'::regconfig")
+    tsquery = func.websearch_to_tsquery(config, query)
+    # Same expression as the GIN index, see POSTGRES_INDEX_EXPRESSION
+    vector = func.to_tsvector(config, Message.content)
+    score = cast(func.ts_rank_cd(vector, tsquery), Float)
+    words = SEARCH_SNIPPET_WORDS
+    snippet = func.ts_headline(
+        config,
+        Message.content,
+        tsquery,
+        f"StartSel={HIGHLIGHT_START}, StopSel={HIGHLIGHT_END}, MaxWords={words}, MinWords={max(words // 2, 1)}, MaxFragments=1",
+    )
+    return select(*SEARCH_RESULT_COLUMNS, score.label("score"), snippet.label("snippet")), vector.op("@@")(tsquery), score
+
+def _sqlite_search(query: str):
+    fts = literal_column("messages_fts")
+    score = -func.bm25(fts)
+    snippet = func.snippet(fts, 0, HIGHLIGHT_START, HIGHLIGHT_END, "…", SEARCH_SNIPPET_WORDS)
+    base = (
+        select(*SEARCH_RESULT_COLUMNS, score.label("score"), snippet.label("snippet"))
+        .select_from(MESSAGES_FTS)
+        .join(Message, Message.id == MESSAGES_FTS.c.rowid)
+    )
+    return base, fts.op("MATCH")(fts5_query(query)), score
+
+async def search_messages(
+    db: AsyncSession,
+    user_id: int,
+    query: str,
+    agent_id: Optional[int] = None,
+    session_id: Optional[int] = None,
+    limit: int = 20,
+    cursor: Optional[str] = None,
+) -> dict:
+    """Return one page of ``{"items", "next_cursor"}`` of the user's messages matching ``query``."""
+    if not re.search(r"\w", query):
+        return {"items": [], "next_cursor": None}
+    if db.get_bind().dialect.name == "postgresql":
+        stmt, match, score = _postgres_search(query)
+    else:
+        stmt, match, score = _sqlite_search(query)
+
+    stmt = (
+        stmt.join(ChatSession, ChatSession.id == Message.session_id)
+        .join(Agent, Agent.id == ChatSession.agent_id)
+        .where(match, Agent.user_id == user_id, Agent.deleted_at.is_(None), ChatSession.deleted_at.is_(None))
+    )
+    if agent_id is not None:
+        stmt = stmt.where(ChatSession.agent_id == agent_id)
+    if session_id is not None:
+        stmt = stmt.where(Message.session_id == session_id)
+    if cursor is not None:
+        after_score, after_id = decode_cursor(cursor, 2)
+        if not isinstance(after_score, (int, float)) or not isinstance(after_id, int):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        stmt = stmt.where(or_(score < after_score, and_(score == after_score, Message.id < after_id)))
+    result = await db.execute(stmt.order_by(score.desc(), Message.id.desc()).limit(limit + 1))
+    rows = result.all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].score, rows[-1].id)
+    items = [{**row._asdict(), "snippet": highlight(row.snippet or "")} for row in rows]
+    return {"items": items, "next_cursor": next_cursor}
@@ -0,0 +1,400 @@
+"""
+Tools agents call through the model's function calling.
+
+An agent lists its tools in ``Agent.tools`` (``AgentTool`` dicts); each names a kind
+from ``TOOL_KINDS``, which provides the implementation and the parameters shown to
+the model:
+
+``calculator``
+    Evaluates an arithmetic expression. Deterministic, cached.
+``http``
+    ``GET`` of ``config["url"]``, a template whose ``{placeholders}`` are filled from
+    the arguments; the remaining arguments become query parameters. The host must be
+    listed in ``TOOL_HTTP_ALLOWED_HOSTS``, which is empty by default so the kind is
+    disabled until an operator lists hosts. The check compares host names only, the
+    addresses they resolve to are not checked, so only names the operator controls
+    belong in the list. Redirects are not followed. The
+    parameters are described by ``config["parameters"]`` (JSON schema). Cached only
+    when the tool sets ``cache_ttl_seconds``.
+``knowledge_search``
+    Searches the agent's knowledge base. Deterministic for a ``knowledge_version``,
+    which is part of the cache key, cached. This is the database tool: there is no
+    kind running SQL. Tool configs are written by agent owners, who must not reach
+    the other users' rows, and the application database has no per-user read-only
+    role to confine such queries. Data an agent should look up goes into its
+    knowledge base, which is scoped to the agent by construction.
+
+``run_tool_calls`` executes the calls of one model turn concurrently, each limited
+to its tool's timeout (``TOOL_TIMEOUT_SECONDS`` by default). A failed or timed out
+call is reported to the model as an error instead of failing the turn. Results of
+cacheable tools are kept per worker in ``tool_results`` for the tool's TTL
+(``TOOL_CACHE_TTL_SECONDS`` by default). Every call is returned as a
+``ToolCallRecord`` with its latency and stored in ``tool_calls`` by
+``record_tool_calls``.
+"""
+from backend.models.tool_call import ToolCall
+from backend.services.agent_cache import AgentSnapshot
+from backend.services.embedders import Embedder
+from backend.services.knowledge_service import retrieve
+from backend.services.llm_providers import ToolCallRequest
+from sqlalchemy import case, func, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+from urllib.parse import quote, urlsplit
+import ast
+import asyncio
+import httpx
+import logging
+import operator
+import orjson
+import os
+import string
+import time
+
+logger = logging.getLogger(__name__)
+
+TOOL_TIMEOUT_SECONDS = float(os.getenv("TOOL_TIMEOUT_SECONDS", "10"))
+# Model turns with tool calls per chat turn, the model then has to answer
+TOOL_MAX_ROUNDS = int(os.getenv("TOOL_MAX_ROUNDS", "5"))
+TOOL_CACHE_SIZE = int(os.getenv("TOOL_CACHE_SIZE", "10000"))
+# Default TTL of the deterministic kinds
+TOOL_CACHE_TTL_SECONDS = float(os.getenv("TOOL_CACHE_TTL_SECONDS", "300"))
+# Longer results are cut before they are sent to the model
+TOOL_RESULT_MAX_CHARS = int(os.getenv("TOOL_RESULT_MAX_CHARS", "4000"))
+# Host names http tools may call, none by default; compared by name, not by resolved address
+TOOL_HTTP_ALLOWED_HOSTS = {
+    host.strip().lower() for host in os.getenv("TOOL_HTTP_ALLOWED_HOSTS", "").split(",") if host.strip()
+}
+
+class ToolError(Exception):
+    """A tool call failed; the message is shown to the model."""
+
+@dataclass
+class ToolContext:
+    """What tools of a chat turn may use. The turn's session is shared, statements go through ``db_lock``."""
+    db: AsyncSession
+    agent: AgentSnapshot
+    embedder: Optional[Embedder] = None
+    db_lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+
+@dataclass
+class ToolCallRecord:
+    call_id: str
+    name: str
+    kind: str
+    arguments: object
+    result: str
+    # "ok", "error" or "timeout"
+    status: str
+    cached: bool
+    latency_ms: int
+    created_at: datetime
+
+def _canonical(value) -> str:
+    return orjson.dumps(value, option=orjson.OPT_SORT_KEYS).decode()
+
+class ToolKind:
+    """Implementation of a tool kind, see the module docstring."""
+    name: str
+    # Results depend only on the cache key, cached by default
+    deterministic = False
+
+    def parameters(self, config: dict) -> dict:
+        """JSON schema of the arguments."""
+        raise NotImplementedError
+
+    def cache_key(self, context: ToolContext, config: dict, arguments: dict) -> tuple:
+        return (self.name, _canonical(config), _canonical(arguments))
+
+    async def run(self, context: ToolContext, config: dict, arguments: dict) -> str:
+        raise NotImplementedError
+
+_BINARY = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+    ast.FloorDiv: operator.floordiv,
+    ast.Mod: operator.mod,
+    ast.Pow: operator.pow,
+}
+_UNARY = {ast.UAdd: operator.pos, ast.USub: operator.neg}
+# Largest integer a calculator step may produce, about 1200 decimal digits
+CALCULATOR_MAX_BITS = 4096
+
+def evaluate(expression: str):
+    """Value of an arithmetic expression of numbers, ``+ - * / // % **`` and parentheses."""
+    if len(expression) > 200:
+        raise ToolError("Expression too long")
+    try:
+        tree = ast.parse(expression, mode="eval")
+    except SyntaxError:
+        raise ToolError("Invalid expression")
+
+    def visit(node):
+        if isinstance(node, ast.Expression):
+            return visit(node.body)
+        if isinstance(node, ast.Constant) and type(node.value) in (int, float):
+            return node.value
+        if isinstance(node, ast.UnaryOp) and type(node.op) in _UNARY:
+            return _UNARY[type(node.op)](visit(node.operand))
+        if isinstance(node, ast.BinOp) and type(node.op) in _BINARY:
+            left, right = visit(node.left), visit(node.right)
+            # Integer results are bounded before they are computed: evaluation runs on
+            # the event loop, where the call's timeout cannot interrupt it
+            if isinstance(left, int) and isinstance(right, int):
+                if isinstance(node.op, ast.Pow):
+                    bits = left.bit_length() * abs(right)
+                elif isinstance(node.op, ast.Mult):
+                    bits = left.bit_length() + right.bit_length()
+                else:
+                    bits = 0
+                if bits > CALCULATOR_MAX_BITS:
+                    raise ToolError("Result too large")
+            return _BINARY[type(node.op)](left, right)
+        raise ToolError("Only numbers, arithmetic operators and parentheses are supported")
+
+    try:
+        return visit(tree)
+    except (ZeroDivisionError, OverflowError) as e:
+        raise ToolError(str(e))
+
+class CalculatorTool(ToolKind):
+    name = "calculator"
+    deterministic = True
+
+    def parameters(self, config: dict) -> dict:
+        return {
+            "type": "object",
+            "properties": {"expression": {"type": "string", "description": "Arithmetic expression, e.g. (2 + 3) * 4"}},
+            "required": ["expression"],
+        }
+
+    def cache_key(self, context: ToolContext, config: dict, arguments: dict) -> tuple:
+        return (self.name, str(arguments.get("expression", "")))
+
+    async def run(self, context: ToolContext, config: dict, arguments: dict) -> str:
+        return str(evaluate(str(arguments.get("expression", ""))))
+
+class HttpTool(ToolKind):
+    name = "http"
+
+    def parameters(self, config: dict) -> dict:
+        return config.get("parameters") or {"type": "object", "properties": {}}
+
+    def url(self, config: dict, arguments: dict) -> tuple:
+        """The URL with its placeholders filled and the query parameters left over."""
+        template = config["url"]
+        fields = {name for _, name, _, _ in string.Formatter().parse(template) if name}
+        missing = fields - set(arguments)
+        if missing:
+            raise ToolError(f"Missing arguments: {', '.join(sorted(missing))}")
+        url = template.format(**{name: quote(str(arguments[name]), safe="") for name in fields})
+        host = (urlsplit(url).hostname or "").lower()
+        if host not in TOOL_HTTP_ALLOWED_HOSTS:
+            raise ToolError(f"Host {host!r} is not allowed")
+        return url, {name: str(value) for name, value in arguments.items() if name not in fields}
+
+    def cache_key(self, context: ToolContext, config: dict, arguments: dict) -> tuple:
+        url, params = self.url(config, arguments)
+        return (self.name, url, _canonical(params))
+
+    async def run(self, context: ToolContext, config: dict, arguments: dict) -> str:
+        url, params = self.url(config, arguments)
+        async with httpx.AsyncClient(follow_redirects=False) as client:
+            response = await client.get(url, params=params)
+        if response.status_code >= 400:
+            raise ToolError(f"HTTP {response.status_code}")
+        return response.text
+
+class KnowledgeSearchTool(ToolKind):
+    name = "knowledge_search"
+    deterministic = True
+
+    def parameters(self, config: dict) -> dict:
+        return {
+            "type": "object",
+            "properties": {"query": {"type": "string", "description": "What to look up"}},
+            "required": ["query"],
+        }
+
+    def cache_key(self, context: ToolContext, config: dict, arguments: dict) -> tuple:
+        agent = context.agent
+        return (self.name, agent.id, agent.knowledge_version, _canonical(config), str(arguments.get("query", "")))
+
+    async def run(self, context: ToolContext, config: dict, arguments: dict) -> str:
+        if context.embedder is None:
+            raise ToolError("The knowledge base is not available")
+        async with context.db_lock:
+            chunks = await retrieve(
+                context.db, context.agent, str(arguments.get("query", "")), context.embedder, k=int(config.get("k", 4))
+            )
+        if not chunks:
+            return "No matching excerpts."
+        return "\n\n".join(f"[{i}] {chunk.title}\n{chunk.content}" for i, chunk in enumerate(chunks, 1))
+
+TOOL_KINDS: Dict[str, ToolKind] = {kind.name: kind for kind in (CalculatorTool(), HttpTool(), KnowledgeSearchTool())}
+
+class ToolResultCache:
+    """LRU of tool results with a per-entry TTL."""
+
+    def __init__(self, max_entries: int = TOOL_CACHE_SIZE, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.clock = clock
+        # Key -> (expiry, result), least recently used first
+        self._entries: OrderedDict = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: tuple) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is None or entry[0] < self.clock():
+            self._entries.pop(key, None)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, key: tuple, result: str, ttl_seconds: float):
+        self._entries[key] = (self.clock() + ttl_seconds, result)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+        self.hits = self.misses = 0
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+# Process-wide, shared by all agents; keys hold everything a result depends on
+tool_results = ToolResultCache()
+
+def agent_tools(agent) -> Dict[str, dict]:
+    """The agent's tools by name."""
+    return {tool["name"]: tool for tool in agent.tools or []}
+
+def tool_definitions(agent) -> List[dict]:
+    """The agent's tools in the ``tools`` format of the chat completions API."""
+    return [
+        {
+            "type": "function",
+            "function": {
+                "name": tool["name"],
+                "description": tool.get("description") or "",
+                "parameters": TOOL_KINDS[tool["kind"]].parameters(tool.get("config") or {}),
+            },
+        }
+        for tool in agent_tools(agent).values()
+    ]
+
+def _ttl(kind: ToolKind, tool: dict) -> float:
+    if tool.get("cache_ttl_seconds") is not None:
+        return tool["cache_ttl_seconds"]
+    return TOOL_CACHE_TTL_SECONDS if kind.deterministic else 0
+
+async def run_tool_call(context: ToolContext, call: ToolCallRequest, cache: ToolResultCache = tool_results) -> ToolCallRecord:
+    """Execute one call the model asked for; failures are returned as records, never raised."""
+    started_at = datetime.now(timezone.utc)
+    started = time.perf_counter()
+    tool = agent_tools(context.agent).get(call.name)
+    kind = TOOL_KINDS.get(tool["kind"]) if tool else None
+    arguments, status, cached = call.arguments, "ok", False
+    try:
+        if kind is None:
+            raise ToolError(f"Unknown tool {call.name!r}")
+        try:
+            arguments = orjson.loads(call.arguments or "{}")
+        except orjson.JSONDecodeError:
+            raise ToolError("Arguments are not valid JSON")
+        if not isinstance(arguments, dict):
+            raise ToolError("Arguments must be a JSON object")
+        config = tool.get("config") or {}
+        ttl = _ttl(kind, tool)
+        key = kind.cache_key(context, config, arguments) if ttl > 0 else None
+        result = cache.get(key) if key is not None else None
+        if result is not None:
+            cached = True
+        else:
+            timeout = tool.get("timeout_seconds") or TOOL_TIMEOUT_SECONDS
+            result = await asyncio.wait_for(kind.run(context, config, arguments), timeout)
+            if key is not None:
+                cache.put(key, result, ttl)
+    except asyncio.TimeoutError:
+        status, result = "timeout", "Error: the tool did not answer in time"
+    except ToolError as e:
+        status, result = "error", f"Error: {e}"
+    except Exception as e:
+        logger.error(f"Tool {call.name} of agent {context.agent.id} failed: {e}")
+        status, result = "error", "Error: the tool failed"
+    latency_ms = int((time.perf_counter() - started) * 1000)
+    if len(result) > TOOL_RESULT_MAX_CHARS:
+        result = result[:TOOL_RESULT_MAX_CHARS - 1] + "…"
+    return ToolCallRecord(
+        call_id=call.id,
+        name=call.name,
+        kind=tool["kind"] if tool else "unknown",
+        arguments=arguments,
+        result=result,
+        status=status,
+        cached=cached,
+        latency_ms=latency_ms,
+        created_at=started_at,
+    )
+
+async def run_tool_calls(context: ToolContext, calls: List[ToolCallRequest]) -> List[ToolCallRecord]:
+    """Execute the calls of one model turn concurrently, records in the order of ``calls``."""
+    return list(await asyncio.gather(*(run_tool_call(context, call) for call in calls)))
+
+async def record_tool_calls(
+    db: AsyncSession, session_id: int, agent_id: int, message_id: Optional[int], records: List[ToolCallRecord]
+):
+    """Store the calls of a chat turn with one multi-row insert. The caller commits."""
+    if not records:
+        return
+    await db.execute(insert(ToolCall), [
+        {
+            "session_id": session_id,
+            "agent_id": agent_id,
+            "message_id": message_id,
+            "name": record.name,
+            "kind": record.kind,
+            "arguments": record.arguments,
+            "status": record.status,
+            "cached": record.cached,
+            "latency_ms": record.latency_ms,
+            "created_at": record.created_at,
+        }
+        for record in records
+    ])
+
+async def tool_call_stats(db: AsyncSession, hours: float) -> List[dict]:
+    """Calls, failures, cache hits and latency per tool over the last ``hours``, slowest first."""
+    average = func.avg(ToolCall.latency_ms)
+    result = await db.execute(
+        select(
+            ToolCall.name,
+            ToolCall.kind,
+            func.count().label("calls"),
+            func.sum(case((ToolCall.status == "error", 1), else_=0)).label("errors"),
+            func.sum(case((ToolCall.status == "timeout", 1), else_=0)).label("timeouts"),
+            func.sum(case((ToolCall.cached, 1), else_=0)).label("cached"),
+            average.label("avg_ms"),
+            func.max(ToolCall.latency_ms).label("max_ms"),
+        )
+        .where(ToolCall.created_at >= datetime.now(timezone.utc) - timedelta(hours=hours))
+        .group_by(ToolCall.name, ToolCall.kind)
+        .order_by(average.desc())
+    )
+    return [dict(row._mapping) for row in result.all()]
@@ -0,0 +1,295 @@
+"""
+NDJSON export and import of conversations.
+
+A transcript is a stream of JSON lines: first the ``agent`` records, then the
+``session`` records, then the ``message`` records ordered by session and time (see
+``backend.api.schemas.transcript``). Branches carry their resolved history, so the
+parent links are not part of the format. Exports read every table through a
+server-side cursor in ``EXPORT_BATCH_SIZE`` row partitions, so memory use does not
+grow with the size of the export. Imports parse the upload as it arrives and write
+messages in batches of ``IMPORT_BATCH_SIZE`` rows, with ``COPY`` on asyncpg.
+"""
+from backend.api.schemas.agent import AgentModelSettings
+from backend.api.schemas.transcript import TranscriptAgent, TranscriptMessage, TranscriptSession
+from backend.models.agent import Agent
+from backend.models.chat import ChatSession, Message
+from backend.services.archive_service import archived_messages
+from backend.services.branch_service import history_query, lineage
+from backend.services.message_writer import message_preview
+from backend.services.versioning_service import bump_agents_version, bump_sessions_version
+from backend.utils.serialization import MESSAGE_COLUMNS, ORJSON_OPTIONS, column_keys
+from fastapi import HTTPException
+from pydantic import ValidationError
+from sqlalchemy import insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import datetime, timezone
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+import logging
+import os
+import orjson
+import zlib
+
+logger = logging.getLogger(__name__)
+
+# Rows fetched per round trip from the server-side cursor
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "1000"))
+# Messages written per statement (or COPY) on import
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "1000"))
+# Longest accepted line of an import, guards against unbounded buffering
+IMPORT_MAX_LINE_BYTES = int(os.getenv("IMPORT_MAX_LINE_BYTES", str(1024 * 1024)))
+# Largest accepted decompressed size of a gzip import, a small upload must not expand without bound
+IMPORT_MAX_DECOMPRESSED_BYTES = int(os.getenv("IMPORT_MAX_DECOMPRESSED_BYTES", str(1024 * 1024 * 1024)))
+# Output of a single decompression step
+GUNZIP_CHUNK_BYTES = 64 * 1024
+
+# Model settings and tools travel with the agent, named as in AgentModelSettings
+AGENT_SETTINGS = tuple(AgentModelSettings.model_fields)
+AGENT_EXPORT_COLUMNS = (Agent.id, Agent.name, Agent.prompt, *(getattr(Agent, name) for name in AGENT_SETTINGS))
+SESSION_EXPORT_COLUMNS = (ChatSession.id, ChatSession.agent_id, ChatSession.created_at)
+LINE_OPTIONS = ORJSON_OPTIONS | orjson.OPT_APPEND_NEWLINE
+
+# Column order of the COPY into messages
+COPY_COLUMNS = (
+    "session_id", "content", "is_user", "created_at", "version",
+    "model", "prompt_tokens", "completion_tokens", "latency_ms", "ttft_ms",
+)
+
+def _line(kind: str, record: dict) -> bytes:
+    return orjson.dumps({"type": kind, **record}, option=LINE_OPTIONS)
+
+async def _stream(db: AsyncSession, query, kind: str, keys: tuple) -> AsyncIterator[bytes]:
+    result = await db.stream(query.execution_options(yield_per=EXPORT_BATCH_SIZE))
+    async for partition in result.partitions():
+        yield b"".join(_line(kind, dict(zip(keys, row))) for row in partition)
+
+async def export_transcripts(
+    db: AsyncSession,
+    user_id: int,
+    agent_id: Optional[int] = None,
+    session_id: Optional[int] = None,
+) -> AsyncIterator[bytes]:
+    """
+    Yield the NDJSON transcript of a user's conversations, optionally of one agent or one session.
+
+    Chunks hold one cursor partition each. Messages of archived sessions are read
+    from their archive after the live ones. Ownership of ``agent_id`` or
+    ``session_id`` is the caller's to check, unowned ones just produce nothing.
+    """
+    agents = select(*AGENT_EXPORT_COLUMNS).where(Agent.user_id == user_id, Agent.deleted_at.is_(None))
+    sessions = select(ChatSession.id).join(Agent, Agent.id == ChatSession.agent_id).where(
+        Agent.user_id == user_id, Agent.deleted_at.is_(None), ChatSession.deleted_at.is_(None)
+    )
+    if agent_id is not None:
+        agents = agents.where(Agent.id == agent_id)
+        sessions = sessions.where(ChatSession.agent_id == agent_id)
+    if session_id is not None:
+        agents = agents.where(Agent.id == select(ChatSession.agent_id).where(ChatSession.id == session_id).scalar_subquery())
+        sessions = sessions.where(ChatSession.id == session_id)
+
+    async for chunk in _stream(db, agents.order_by(Agent.id), "agent", column_keys(AGENT_EXPORT_COLUMNS)):
+        yield chunk
+
+    session_ids = sessions.subquery()
+    session_rows = (
+        select(*SESSION_EXPORT_COLUMNS, ChatSession.archived_at)
+        .where(ChatSession.id.in_(select(session_ids.c.id)))
+        .order_by(ChatSession.id)
+    )
+    archived = []
+    result = await db.stream(session_rows.execution_options(yield_per=EXPORT_BATCH_SIZE))
+    async for partition in result.partitions():
+        archived += [row.id for row in partition if row.archived_at is not None]
+        yield b"".join(_line("session", dict(zip(column_keys(SESSION_EXPORT_COLUMNS), row))) for row in partition)
+
+    # A branch is exported with its resolved history, the messages it inherits from its
+    # ancestors included, and imports as a standalone session
+    cte = lineage(select(session_ids.c.id))
+    messages = history_query(
+        cte, *(cte.c.target_id.label("session_id") if column is Message.session_id else column for column in MESSAGE_COLUMNS)
+    )
+    async for chunk in _stream(db, messages, "message", column_keys(MESSAGE_COLUMNS)):
+        yield chunk
+
+    for archived_id in archived:
+        yield b"".join(_line("message", message) for message in await archived_messages(db, archived_id))
+
+async def gzip_chunks(chunks: AsyncIterator[bytes], level: int = 6) -> AsyncIterator[bytes]:
+    """Compress a byte stream into one gzip member as it is produced."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    async for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+async def gunzip_chunks(
+    chunks: AsyncIterator[bytes], max_bytes: int = IMPORT_MAX_DECOMPRESSED_BYTES
+) -> AsyncIterator[bytes]:
+    """
+    Decompress a gzip (or zlib) byte stream as it arrives, in pieces of at most
+    ``GUNZIP_CHUNK_BYTES``. More than ``max_bytes`` of output is refused with a 413.
+    """
+    decompressor = zlib.decompressobj(47)
+    total = 0
+    try:
+        async for chunk in chunks:
+            while chunk:
+                data = decompressor.decompress(chunk, GUNZIP_CHUNK_BYTES)
+                chunk = decompressor.unconsumed_tail
+                total += len(data)
+                if total > max_bytes:
+                    raise HTTPException(status_code=413, detail=f"Decompressed transcript exceeds {max_bytes} bytes")
+                if data:
+                    yield data
+        data = decompressor.flush()
+        if total + len(data) > max_bytes:
+            raise HTTPException(status_code=413, detail=f"Decompressed transcript exceeds {max_bytes} bytes")
+        yield data
+    except zlib.error as e:
+        raise HTTPException(status_code=400, detail=f"Invalid gzip data: {e}")
+
+async def ndjson_records(chunks: AsyncIterator[bytes]) -> AsyncIterator[Tuple[int, dict]]:
+    """Yield ``(line number, object)`` for every non-empty line of an NDJSON byte stream."""
+    buffer = b""
+    lineno = 0
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        if len(buffer) > IMPORT_MAX_LINE_BYTES:
+            raise HTTPException(status_code=400, detail=f"Line {lineno + len(lines) + 1} exceeds {IMPORT_MAX_LINE_BYTES} bytes")
+        for line in lines:
+            lineno += 1
+            if line.strip():
+                yield lineno, _parse(lineno, line)
+    if buffer.strip():
+        yield lineno + 1, _parse(lineno + 1, buffer)
+
+def _parse(lineno: int, line: bytes) -> dict:
+    try:
+        record = orjson.loads(line)
+    except orjson.JSONDecodeError as e:
+        raise HTTPException(status_code=400, detail=f"Line {lineno}: invalid JSON ({e})")
+    if not isinstance(record, dict):
+        raise HTTPException(status_code=400, detail=f"Line {lineno}: expected a JSON object")
+    return record
+
+def _validate(model, lineno: int, record: dict):
+    try:
+        return model.model_validate(record)
+    except ValidationError as e:
+        raise HTTPException(status_code=400, detail=f"Line {lineno}: {e.errors()[0]['msg']} at {e.errors()[0]['loc']}")
+
+async def _write_messages(db: AsyncSession, rows: List[dict]):
+    connection = await db.connection()
+    if connection.dialect.driver == "asyncpg":
+        raw = await connection.get_raw_connection()
+        await raw.driver_connection.copy_records_to_table(
+            "messages",
+            records=[tuple(row[column] for column in COPY_COLUMNS) for row in rows],
+            columns=COPY_COLUMNS,
+        )
+    else:
+        await db.execute(insert(Message), rows)
+
+class _SessionStats:
+    __slots__ = ("count", "last_at", "last_content")
+
+    def __init__(self):
+        self.count = 0
+        self.last_at = None
+        self.last_content = None
+
+async def import_transcripts(
+    db: AsyncSession,
+    user_id: int,
+    records: AsyncIterator[Tuple[int, dict]],
+    agent_id: Optional[int] = None,
+) -> dict:
+    """
+    Import a transcript for ``user_id`` in one transaction and return the number of created rows.
+
+    Agent records create new agents, unless ``agent_id`` is given: then every session
+    is attached to that (already owned) agent. Audio URLs are not imported, the
+    files do not exist here. Any invalid record fails the whole import with a 400.
+    """
+    agent_ids: Dict[int, int] = {}
+    session_ids: Dict[int, int] = {}
+    stats: Dict[int, _SessionStats] = {}
+    agents_version = sessions_version = None
+    counts = {"agents": 0, "sessions": 0, "messages": 0}
+    pending: List[dict] = []
+
+    async for lineno, record in records:
+        kind = record.get("type")
+        if kind == "agent":
+            if agent_id is not None:
+                continue
+            data = _validate(TranscriptAgent, lineno, record)
+            if agents_version is None:
+                agents_version = await bump_agents_version(db, user_id)
+            agent = Agent(
+                user_id=user_id,
+                name=data.name,
+                prompt=data.prompt,
+                version=agents_version,
+                **data.model_dump(include=set(AGENT_SETTINGS)),
+            )
+            db.add(agent)
+            await db.flush()
+            agent_ids[data.id] = agent.id
+            counts["agents"] += 1
+        elif kind == "session":
+            data = _validate(TranscriptSession, lineno, record)
+            target = agent_id if agent_id is not None else agent_ids.get(data.agent_id)
+            if target is None:
+                raise HTTPException(status_code=400, detail=f"Line {lineno}: unknown agent {data.agent_id}")
+            if sessions_version is None:
+                sessions_version = await bump_sessions_version(db, user_id)
+            session = ChatSession(agent_id=target, version=sessions_version)
+            if data.created_at is not None:
+                session.created_at = data.created_at
+            db.add(session)
+            await db.flush()
+            session_ids[data.id] = session.id
+            stats[session.id] = _SessionStats()
+            counts["sessions"] += 1
+        elif kind == "message":
+            data = _validate(TranscriptMessage, lineno, record)
+            target = session_ids.get(data.session_id)
+            if target is None:
+                raise HTTPException(status_code=400, detail=f"Line {lineno}: unknown session {data.session_id}")
+            session_stats = stats[target]
+            session_stats.count += 1
+            row = data.model_dump(exclude={"session_id"})
+            row["session_id"] = target
+            row["created_at"] = data.created_at or datetime.now(timezone.utc)
+            row["version"] = session_stats.count
+            session_stats.last_at = row["created_at"]
+            session_stats.last_content = data.content
+            pending.append(row)
+            if len(pending) >= IMPORT_BATCH_SIZE:
+                await _write_messages(db, pending)
+                counts["messages"] += len(pending)
+                pending = []
+        else:
+            raise HTTPException(status_code=400, detail=f"Line {lineno}: unknown record type {kind!r}")
+
+    if pending:
+        await _write_messages(db, pending)
+        counts["messages"] += len(pending)
+    updates = [
+        {
+            "id": session_id,
+            "messages_version": session_stats.count,
+            "message_count": session_stats.count,
+            "last_message_at": session_stats.last_at,
+            "last_message_preview": message_preview(session_stats.last_content),
+        }
+        for session_id, session_stats in stats.items()
+        if session_stats.count
+    ]
+    if updates:
+        await db.execute(update(ChatSession), updates)
+    await db.commit()
+    logger.info(f"Imported transcript for user {user_id}: {counts}")
+    return counts
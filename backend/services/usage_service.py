@@ -0,0 +1,75 @@
+from backend.models.usage import UserDailyUsage, AgentDailyUsage
+from backend.services.openai_service import ChatCompletionResult
+from backend.utils.database import dialect_insert, supports_on_conflict
+from sqlalchemy import exc, insert, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import date, datetime, timezone
+from typing import Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+async def _upsert_counters(db: AsyncSession, model, keys: dict, conflict_columns: list, increments: dict):
+    if not supports_on_conflict(db):
+        await _update_or_insert_counters(db, model, keys, conflict_columns, increments)
+        return
+    stmt = dialect_insert(db)(model).values(**keys, **increments)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=conflict_columns,
+        set_={name: getattr(model, name) + stmt.excluded[name] for name in increments},
+    )
+    await db.execute(stmt)
+
+async def _update_or_insert_counters(db: AsyncSession, model, keys: dict, conflict_columns: list, increments: dict):
+    """
+    Portable upsert for databases without ``ON CONFLICT``: UPDATE, then INSERT when no
+    row matched. The INSERT runs in a savepoint; if a concurrent transaction inserted
+    the row first, the unique constraint rejects it and the UPDATE is retried.
+    """
+    stmt = update(model).where(*(getattr(model, name) == keys[name] for name in conflict_columns)).values(
+        {name: getattr(model, name) + value for name, value in increments.items()}
+    )
+    if (await db.execute(stmt)).rowcount:
+        return
+    try:
+        async with db.begin_nested():
+            await db.execute(insert(model).values(**keys, **increments))
+    except exc.IntegrityError:
+        await db.execute(stmt)
+
+async def record_usage(
+    db: AsyncSession,
+    user_id: int,
+    agent_id: int,
+    result: ChatCompletionResult,
+    day: Optional[date] = None,
+):
+    """
+    Add one assistant turn to the per-user and per-agent daily counters.
+
+    Each aggregate row is upserted with ``ON CONFLICT DO UPDATE`` (UPDATE, then
+    INSERT on other databases) so the counters are maintained incrementally and
+    never recomputed from ``messages``. The
+    caller owns the transaction and is responsible for committing it.
+
+    Args:
+        db (AsyncSession): Database session
+        user_id (int): Owner of the agent that produced the turn
+        agent_id (int): Agent that produced the turn
+        result (ChatCompletionResult): Accounting for the turn
+        day (Optional[date]): Day to book the turn on, defaults to today (UTC)
+    """
+    day = day or datetime.now(timezone.utc).date()
+    increments = {
+        "turns": 1,
+        "prompt_tokens": result.prompt_tokens or 0,
+        "completion_tokens": result.completion_tokens or 0,
+        "latency_ms_total": result.latency_ms or 0,
+        "ttft_ms_total": result.ttft_ms or 0,
+    }
+    await _upsert_counters(
+        db, UserDailyUsage, {"user_id": user_id, "day": day}, ["user_id", "day"], increments
+    )
+    await _upsert_counters(
+        db, AgentDailyUsage, {"agent_id": agent_id, "user_id": user_id, "day": day}, ["agent_id", "day"], increments
+    )
@@ -0,0 +1,112 @@
+"""
+In-process nearest-neighbour indexes over float32 embeddings.
+
+Vectors are L2-normalized on the way in, so the inner product is the cosine
+similarity. ``FlatIndex`` scores every vector with one matrix-vector product and is
+exact; it is the right choice up to tens of thousands of vectors. ``IVFIndex``
+clusters the vectors with k-means and stores them int8-quantized per cluster, a
+query only scores the clusters of its ``nprobe`` closest centroids: approximate,
+a quarter of the memory and sub-linear in the corpus size.
+"""
+from typing import List, Sequence, Tuple
+import numpy as np
+
+def as_matrix(vectors) -> np.ndarray:
+    """Return ``vectors`` as a contiguous, L2-normalized float32 matrix."""
+    matrix = np.ascontiguousarray(vectors, dtype=np.float32)
+    if matrix.ndim == 1:
+        matrix = matrix[np.newaxis, :]
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return matrix / norms
+
+def pack_vector(vector) -> bytes:
+    """Encode one vector as little-endian float32 bytes, 4 bytes per dimension."""
+    return np.asarray(vector, dtype="<f4").tobytes()
+
+def unpack_vectors(blobs: Sequence[bytes], dimensions: int) -> np.ndarray:
+    """Decode ``pack_vector`` blobs into one ``(len(blobs), dimensions)`` matrix."""
+    if not blobs:
+        return np.empty((0, dimensions), dtype=np.float32)
+    return np.frombuffer(b"".join(blobs), dtype="<f4").reshape(len(blobs), dimensions).astype(np.float32)
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    k = min(k, scores.shape[0])
+    if k == 0:
+        return np.empty(0, dtype=np.int64)
+    candidates = np.argpartition(-scores, k - 1)[:k]
+    return candidates[np.argsort(-scores[candidates], kind="stable")]
+
+class FlatIndex:
+    """Exact brute-force search."""
+
+    def __init__(self, ids: Sequence[int], vectors):
+        self.ids = np.asarray(ids, dtype=np.int64)
+        self.vectors = as_matrix(vectors) if len(self.ids) else np.empty((0, 0), dtype=np.float32)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def nbytes(self) -> int:
+        return self.vectors.nbytes + self.ids.nbytes
+
+    def search(self, query, k: int) -> List[Tuple[int, float]]:
+        """Return up to ``k`` ``(id, cosine similarity)`` pairs, best first."""
+        if not len(self.ids):
+            return []
+        scores = self.vectors @ as_matrix(query)[0]
+        best = _top_k(scores, k)
+        return [(int(self.ids[i]), float(scores[i])) for i in best]
+
+def kmeans(vectors: np.ndarray, clusters: int, iterations: int = 10, seed: int = 0) -> np.ndarray:
+    """Spherical k-means, returns the normalized centroids."""
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), size=clusters, replace=False)].copy()
+    for _ in range(iterations):
+        assignment = np.argmax(vectors @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, vectors)
+        empty = np.bincount(assignment, minlength=clusters) == 0
+        # Re-seed empty clusters with random vectors instead of dropping them
+        sums[empty] = vectors[rng.choice(len(vectors), size=int(empty.sum()))]
+        centroids = as_matrix(sums)
+    return centroids
+
+class IVFIndex:
+    """Inverted-file index with int8 scalar quantization, see the module docstring."""
+
+    def __init__(self, ids: Sequence[int], vectors, clusters: int = None, nprobe: int = 8, seed: int = 0):
+        vectors = as_matrix(vectors)
+        ids = np.asarray(ids, dtype=np.int64)
+        clusters = clusters or max(1, int(np.sqrt(len(ids))))
+        clusters = min(clusters, len(ids))
+        self.nprobe = nprobe
+        self.centroids = kmeans(vectors, clusters, seed=seed)
+        assignment = np.argmax(vectors @ self.centroids.T, axis=1)
+        order = np.argsort(assignment, kind="stable")
+        self.ids = ids[order]
+        # Per-vector scale, the components of a unit vector lie in [-1, 1]
+        sorted_vectors = vectors[order]
+        self.scales = np.abs(sorted_vectors).max(axis=1).astype(np.float32) / 127
+        self.scales[self.scales == 0] = 1
+        self.codes = np.round(sorted_vectors / self.scales[:, np.newaxis]).astype(np.int8)
+        # Cluster c owns rows offsets[c]:offsets[c + 1]
+        self.offsets = np.searchsorted(assignment[order], np.arange(clusters + 1))
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def nbytes(self) -> int:
+        return self.codes.nbytes + self.scales.nbytes + self.ids.nbytes + self.centroids.nbytes
+
+    def search(self, query, k: int) -> List[Tuple[int, float]]:
+        query = as_matrix(query)[0]
+        probes = _top_k(self.centroids @ query, self.nprobe)
+        rows = np.concatenate([np.arange(self.offsets[c], self.offsets[c + 1]) for c in probes])
+        if not len(rows):
+            return []
+        scores = (self.codes[rows].astype(np.float32) @ query) * self.scales[rows]
+        best = _top_k(scores, k)
+        return [(int(self.ids[rows[i]]), float(scores[i])) for i in best]
@@ -0,0 +1,66 @@
+from backend.models.chat import ChatSession
+from backend.models.user import User
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import datetime
+from typing import Optional
+
+# Version counters backing the ETags and ``since`` delta sync of the list endpoints.
+#
+# Every mutation bumps a counter with ``UPDATE ... SET v = v + 1 RETURNING v`` inside
+# the caller's transaction and stamps the changed row with the new value. The row
+# lock taken by the UPDATE serializes concurrent writers on Postgres, so versions are
+# handed out in commit order and a client that saw version N can safely ask for the
+# rows with ``version > N``. The caller commits.
+
+async def _bump(db: AsyncSession, column, key_column, key: int, by: int = 1, **values) -> int:
+    stmt = (
+        update(column.class_)
+        .where(key_column == key)
+        .values({column.key: column + by, **values})
+        .returning(column)
+    )
+    return (await db.execute(stmt)).scalar_one()
+
+async def bump_agents_version(db: AsyncSession, user_id: int) -> int:
+    """Advance the version of a user's agent list and return the new value."""
+    return await _bump(db, User.agents_version, User.id, user_id)
+
+async def bump_sessions_version(db: AsyncSession, user_id: int) -> int:
+    """Advance the version of a user's session list and return the new value."""
+    return await _bump(db, User.sessions_version, User.id, user_id)
+
+async def bump_messages_version(
+    db: AsyncSession,
+    session_id: int,
+    count: int = 1,
+    last_message_at: Optional[datetime] = None,
+    last_message_preview: Optional[str] = None,
+) -> int:
+    """
+    Advance the version of a session's message history by ``count`` and return the new value.
+
+    When several messages are written at once they take the versions
+    ``new - count + 1`` to ``new`` in order. The same UPDATE adds ``count`` to the
+    session's ``message_count`` and, when given, records the last message.
+    """
+    values = {"message_count": ChatSession.message_count + count}
+    if last_message_at is not None:
+        values["last_message_at"] = last_message_at
+        values["last_message_preview"] = last_message_preview
+    return await _bump(db, ChatSession.messages_version, ChatSession.id, session_id, count, **values)
+
+async def get_user_versions(db: AsyncSession, user: User) -> tuple:
+    """
+    Return ``(agents_version, sessions_version)`` for ``user`` as seen by ``db``.
+
+    When ``db`` is the session the user was loaded from (the primary) the loaded
+    values are current and no query is issued. On a replica the counters are read
+    from the replica itself so they match the rows it serves; zeros if the user row
+    has not been replicated yet.
+    """
+    if user in db:
+        return user.agents_version, user.sessions_version
+    result = await db.execute(select(User.agents_version, User.sessions_version).where(User.id == user.id))
+    row = result.first()
+    return (row[0], row[1]) if row else (0, 0)
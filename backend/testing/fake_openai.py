@@ -0,0 +1,318 @@
+"""
+Local OpenAI-compatible stand-in server.
+
+Implements the subset of the OpenAI REST API the platform uses (chat completions
+with and without streaming, audio transcriptions and speech, embeddings) with configurable
+latency, throughput and failure injection. Outputs are derived from a hash of the
+request, so the same request always produces the same reply.
+
+Point ``AsyncOpenAI`` at it with ``base_url=server.url`` or by exporting
+``OPENAI_BASE_URL``. Run it standalone with::
+
+    python -m backend.testing.fake_openai --port 9000 --latency lognormal:0.3,0.4 --tps 50
+"""
+from fastapi import FastAPI, Request, UploadFile, File, Form
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from dataclasses import dataclass, field, replace
+from typing import Optional
+import argparse
+import asyncio
+import hashlib
+import json
+import math
+import os
+import random
+import threading
+import time
+import uvicorn
+
+WORDS = (
+    "the agent platform answers questions about accounts billing voice sessions "
+    "models latency tokens and everything else a helpful assistant might be asked "
+    "today with short clear and friendly replies"
+).split()
+
+@dataclass
+class LatencyDistribution:
+    """Distribution of the delay before the first byte of a response, in seconds."""
+    kind: str = "fixed"
+    a: float = 0.0
+    b: float = 0.0
+
+    def sample(self, rng: random.Random) -> float:
+        if self.kind == "fixed":
+            return max(self.a, 0.0)
+        if self.kind == "uniform":
+            return rng.uniform(self.a, self.b)
+        if self.kind == "normal":
+            return max(rng.gauss(self.a, self.b), 0.0)
+        if self.kind == "lognormal":
+            # a is the median in seconds, b the sigma of the underlying normal
+            return rng.lognormvariate(math.log(self.a), self.b) if self.a > 0 else 0.0
+        raise ValueError(f"Unknown latency distribution: {self.kind}")
+
+    @classmethod
+    def parse(cls, spec: str) -> "LatencyDistribution":
+        """Parse ``kind:a,b`` (e.g. ``uniform:0.1,0.3``) or a plain number of seconds."""
+        if ":" not in spec:
+            return cls("fixed", float(spec))
+        kind, _, params = spec.partition(":")
+        values = [float(v) for v in params.split(",") if v]
+        return cls(kind, *values)
+
+@dataclass
+class FakeOpenAIConfig:
+    """Behaviour knobs of the fake server. All rates are probabilities in ``[0, 1]``."""
+    latency: LatencyDistribution = field(default_factory=LatencyDistribution)
+    tokens_per_second: float = 0.0  # 0 streams everything at once
+    error_rate: float = 0.0
+    rate_limit_rate: float = 0.0
+    rate_limit_first_n: int = 0
+    retry_after: float = 0.05
+    min_reply_words: int = 8
+    max_reply_words: int = 40
+    seed: int = 0
+
+    @classmethod
+    def from_env(cls) -> "FakeOpenAIConfig":
+        return cls(
+            latency=LatencyDistribution.parse(os.getenv("FAKE_OPENAI_LATENCY", "0")),
+            tokens_per_second=float(os.getenv("FAKE_OPENAI_TPS", "0")),
+            error_rate=float(os.getenv("FAKE_OPENAI_ERROR_RATE", "0")),
+            rate_limit_rate=float(os.getenv("FAKE_OPENAI_RATE_LIMIT_RATE", "0")),
+            seed=int(os.getenv("FAKE_OPENAI_SEED", "0")),
+        )
+
+def _digest(*parts) -> bytes:
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode("utf-8")).digest()
+
+def deterministic_reply(config: FakeOpenAIConfig, model: str, messages: list) -> str:
+    """Return the reply the fake server gives for a chat request."""
+    rng = random.Random(_digest(config.seed, model, messages))
+    count = rng.randint(config.min_reply_words, max(config.min_reply_words, config.max_reply_words))
+    return " ".join(rng.choice(WORDS) for _ in range(count))
+
+def _count_tokens(text: str) -> int:
+    return len(text.split())
+
+def _error(status_code: int, message: str, error_type: str, headers: Optional[dict] = None) -> JSONResponse:
+    return JSONResponse(
+        status_code=status_code,
+        content={"error": {"message": message, "type": error_type, "param": None, "code": None}},
+        headers=headers,
+    )
+
+def create_app(config: Optional[FakeOpenAIConfig] = None) -> FastAPI:
+    """Create the ASGI app of the fake server. ``app.state.config`` may be replaced at runtime."""
+    app = FastAPI(title="Fake OpenAI")
+    app.state.config = config or FakeOpenAIConfig()
+    app.state.rng = random.Random(app.state.config.seed)
+    app.state.request_count = 0
+    app.state.embedded_texts = 0
+
+    async def inject(request: Request) -> Optional[JSONResponse]:
+        """Apply the configured latency and failures before a response is produced."""
+        cfg: FakeOpenAIConfig = request.app.state.config
+        rng: random.Random = request.app.state.rng
+        request.app.state.request_count += 1
+        delay = cfg.latency.sample(rng)
+        if delay:
+            await asyncio.sleep(delay)
+        if request.app.state.request_count <= cfg.rate_limit_first_n or rng.random() < cfg.rate_limit_rate:
+            return _error(429, "Rate limit reached", "requests", {"retry-after": str(cfg.retry_after)})
+        if rng.random() < cfg.error_rate:
+            return _error(500, "The server had an error while processing your request", "server_error")
+        return None
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        failure = await inject(request)
+        if failure is not None:
+            return failure
+        body = await request.json()
+        cfg: FakeOpenAIConfig = request.app.state.config
+        model = body.get("model", "gpt-3.5-turbo")
+        messages = body.get("messages", [])
+        reply = deterministic_reply(cfg, model, messages)
+        completion_id = f"chatcmpl-{_digest(model, messages).hex()[:24]}"
+        created = int(time.time())
+        prompt_tokens = sum(_count_tokens(str(m.get("content") or "")) for m in messages)
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": _count_tokens(reply),
+            "total_tokens": prompt_tokens + _count_tokens(reply),
+        }
+
+        if not body.get("stream"):
+            return {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": reply},
+                    "finish_reason": "stop",
+                }],
+                "usage": usage,
+            }
+
+        async def events():
+            def chunk(delta: dict, finish_reason=None) -> str:
+                payload = {
+                    "id": completion_id,
+                    "object": "chat.completion.chunk",
+                    "created": created,
+                    "model": model,
+                    "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+                }
+                return f"data: {json.dumps(payload)}\n\n"
+
+            yield chunk({"role": "assistant", "content": ""})
+            interval = 1.0 / cfg.tokens_per_second if cfg.tokens_per_second > 0 else 0.0
+            for i, word in enumerate(reply.split(" ")):
+                if interval:
+                    await asyncio.sleep(interval)
+                yield chunk({"content": word if i == 0 else f" {word}"})
+            yield chunk({}, "stop")
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    @app.post("/v1/audio/transcriptions")
+    async def audio_transcriptions(
+        request: Request,
+        file: UploadFile = File(...),
+        model: str = Form("whisper-1"),
+        response_format: str = Form("json"),
+    ):
+        failure = await inject(request)
+        if failure is not None:
+            return failure
+        audio = await file.read()
+        rng = random.Random(_digest(request.app.state.config.seed, model, hashlib.sha256(audio).hexdigest()))
+        text = " ".join(rng.choice(WORDS) for _ in range(rng.randint(4, 16)))
+        if response_format == "text":
+            return Response(content=text, media_type="text/plain")
+        return {"text": text}
+
+    @app.post("/v1/audio/speech")
+    async def audio_speech(request: Request):
+        failure = await inject(request)
+        if failure is not None:
+            return failure
+        body = await request.json()
+        text = body.get("input", "")
+        # An ID3 header followed by deterministic filler roughly proportional to the text length
+        seed = _digest(body.get("model"), body.get("voice"), text)
+        filler = (seed * (len(text) // len(seed) + 1))[: max(len(text) * 16, 32)]
+        return Response(content=b"ID3\x04\x00\x00\x00\x00\x00\x00" + filler, media_type="audio/mpeg")
+
+    @app.post("/v1/embeddings")
+    async def embeddings(request: Request):
+        failure = await inject(request)
+        if failure is not None:
+            return failure
+        body = await request.json()
+        model = body.get("model", "text-embedding-3-small")
+        texts = body.get("input", [])
+        if isinstance(texts, str):
+            texts = [texts]
+        dimensions = int(body.get("dimensions") or 1536)
+        request.app.state.embedded_texts += len(texts)
+        data = []
+        for i, text in enumerate(texts):
+            rng = random.Random(_digest(request.app.state.config.seed, model, text))
+            vector = [rng.gauss(0.0, 1.0) for _ in range(dimensions)]
+            norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+            data.append({"object": "embedding", "index": i, "embedding": [v / norm for v in vector]})
+        tokens = sum(_count_tokens(text) for text in texts)
+        return {
+            "object": "list",
+            "data": data,
+            "model": model,
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+        }
+
+    return app
+
+class FakeOpenAIServer:
+    """
+    Run the fake server with uvicorn in a background thread.
+
+    Usage::
+
+        with FakeOpenAIServer(FakeOpenAIConfig(tokens_per_second=100)) as server:
+            client = AsyncOpenAI(base_url=server.url, api_key="test")
+    """
+
+    def __init__(self, config: Optional[FakeOpenAIConfig] = None, host: str = "127.0.0.1", port: int = 0):
+        self.app = create_app(config)
+        self.host = host
+        self.port = port
+        self._server: Optional[uvicorn.Server] = None
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}/v1"
+
+    @property
+    def config(self) -> FakeOpenAIConfig:
+        return self.app.state.config
+
+    def configure(self, **changes) -> FakeOpenAIConfig:
+        """Replace config fields on the running server and reset its counters."""
+        self.app.state.config = replace(self.app.state.config, **changes)
+        self.app.state.rng = random.Random(self.app.state.config.seed)
+        self.app.state.request_count = 0
+        return self.app.state.config
+
+    def start(self) -> "FakeOpenAIServer":
+        config = uvicorn.Config(self.app, host=self.host, port=self.port, log_level="warning", lifespan="off")
+        self._server = uvicorn.Server(config)
+        self._thread = threading.Thread(target=self._server.run, name="fake-openai", daemon=True)
+        self._thread.start()
+        deadline = time.monotonic() + 10
+        while not self._server.started:
+            if time.monotonic() > deadline or not self._thread.is_alive():
+                raise RuntimeError("Fake OpenAI server failed to start")
+            time.sleep(0.01)
+        self.port = self._server.servers[0].sockets[0].getsockname()[1]
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.should_exit = True
+        if self._thread is not None:
+            self._thread.join(timeout=10)
+        self._server = None
+        self._thread = None
+
+    def __enter__(self) -> "FakeOpenAIServer":
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a local OpenAI-compatible stand-in server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--latency", default="0", help="fixed seconds or kind:a,b (uniform, normal, lognormal)")
+    parser.add_argument("--tps", type=float, default=0.0, help="streamed tokens per second, 0 for unthrottled")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    config = FakeOpenAIConfig(
+        latency=LatencyDistribution.parse(args.latency),
+        tokens_per_second=args.tps,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        seed=args.seed,
+    )
+    uvicorn.run(create_app(config), host=args.host, port=args.port, log_level="info")
+
+if __name__ == "__main__":
+    main()
@@ -4,10 +4,15 @@ from fastapi.testclient import TestClient
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker
 from backend.main import app
-from backend.utils.database import get_db
+from backend.utils.database import enable_sqlite_foreign_keys, get_db
 from backend.models.base import Base
 from backend.models.user import User
 from backend.api.dependencies import get_openai_client, hash_password
+from backend.services.agent_cache import agent_cache
+from backend.services.tool_service import tool_results
+from backend.testing.fake_openai import FakeOpenAIServer
+from backend.utils.query_monitor import count_queries, instrument_engine
+from contextlib import contextmanager
 from unittest.mock import AsyncMock, MagicMock
 from datetime import datetime, timezone, timedelta
 from jose import jwt
@@ -27,26 +32,48 @@ ALGORITHM = os.getenv("JWT_ALGORITHM", "HS256")
 @pytest_asyncio.fixture
 async def db_session():
     engine = create_async_engine(DATABASE_URL, echo=False)
+    enable_sqlite_foreign_keys(engine)
+    instrument_engine(engine)
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
     async_session = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    # Ids start over in every test database
+    agent_cache.clear()
+    tool_results.clear()
     async with async_session() as session:
         yield session
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.drop_all)
     await engine.dispose()
 
+def _completion(content: str, model: str = "gpt-3.5-turbo") -> MagicMock:
+    return MagicMock(
+        choices=[MagicMock(message=MagicMock(content=content))],
+        model=model,
+        usage=MagicMock(prompt_tokens=12, completion_tokens=5, total_tokens=17),
+    )
+
+def _openai_client(create=None) -> MagicMock:
+    """OpenAI client mock; ``create`` replaces chat completions, a ``str`` it returns becomes the reply."""
+    client = MagicMock()
+    if create is None:
+        client.chat.completions.create = AsyncMock(return_value=_completion("Mocked response"))
+    else:
+        async def complete(model, messages, **params):
+            reply = await create(model, messages, **params)
+            return _completion(reply, model) if isinstance(reply, str) else reply
+        client.chat.completions.create = AsyncMock(side_effect=complete)
+    client.audio.transcriptions.create = AsyncMock(return_value=MagicMock(text="Mocked transcription"))
+    client.audio.speech.create = AsyncMock(return_value=MagicMock(content=b"mocked audio data"))
+    return client
+
 @pytest_asyncio.fixture
 async def client(db_session):
     def override_get_db():
         yield db_session
 
     def override_get_openai_client():
-        client = MagicMock()
-        client.chat.completions.create = AsyncMock(return_value=MagicMock(choices=[MagicMock(message=MagicMock(content="Mocked response"))]))
-        client.audio.transcriptions.create = AsyncMock(return_value=MagicMock(text="Mocked transcription"))
-        client.audio.speech.create = AsyncMock(return_value=MagicMock(content=b"mocked audio data"))
-        yield client
+        yield _openai_client()
 
     app.dependency_overrides[get_db] = override_get_db
     app.dependency_overrides[get_openai_client] = override_get_openai_client
@@ -57,6 +84,39 @@ async def client(db_session):
     
     app.dependency_overrides.clear()
 
+@pytest.fixture
+def query_budget(db_session):
+    """
+    Fail the test when the block issues more statements than declared.
+
+    Usage::
+
+        with query_budget(3):
+            client.get("/api/agents/", headers=headers)
+    """
+    @contextmanager
+    def budget(max_statements: int, max_repeats: int | None = None):
+        with count_queries(db_session.bind) as stats:
+            yield stats
+        if stats.total > max_statements:
+            details = "\n".join(f"{count}x {statement}" for statement, count in stats.statements.most_common())
+            pytest.fail(f"Query budget exceeded: {stats.total} statements > {max_statements}\n{details}")
+        if max_repeats is not None and stats.repeated(max_repeats + 1):
+            statement, count = stats.repeated(max_repeats + 1)[0]
+            pytest.fail(f"Statement repeated {count}x (allowed {max_repeats}): {statement}")
+    return budget
+
+@pytest.fixture(scope="session")
+def fake_openai_server():
+    with FakeOpenAIServer() as server:
+        yield server
+
+@pytest.fixture
+def fake_openai(fake_openai_server):
+    """The shared fake OpenAI server, reset to its default configuration."""
+    fake_openai_server.configure(**vars(type(fake_openai_server.config)()))
+    yield fake_openai_server
+
 @pytest.fixture
 def user_credentials():
     return {"username": "testuser", "password": "securepassword"}
@@ -72,4 +132,64 @@ async def access_token(user_credentials, db_session):
     # Generate token for the created user
     expire = datetime.now(timezone.utc) + timedelta(minutes=30)
     to_encode = {"sub": user_credentials["username"], "exp": expire}
-    return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
\ No newline at end of file
+    return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+
+@pytest.fixture
+def auth_headers(access_token) -> dict:
+    return {"Authorization": f"Bearer {access_token}"}
+
+@pytest.fixture
+def other_auth_headers(client) -> dict:
+    """Headers of a second registered user, who owns nothing."""
+    credentials = {"username": "other", "password": "securepassword"}
+    client.post("/api/auth/register", json=credentials)
+    token = client.post("/api/auth/login", json=credentials).json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}
+
+@pytest.fixture
+def mock_openai(client):
+    """
+    Install an OpenAI client mock for the app and return it.
+
+    Usage::
+
+        openai = mock_openai()  # every reply is "Mocked response"
+
+        async def create(model, messages, **params):
+            return f"Re: {messages[-1]['content']}"
+        openai = mock_openai(create)
+    """
+    def install(create=None) -> MagicMock:
+        openai = _openai_client(create)
+        app.dependency_overrides[get_openai_client] = lambda: openai
+        return openai
+    return install
+
+@pytest.fixture
+def make_agent(client, auth_headers):
+    """Create an agent through the API and return its id, keyword arguments go into the request."""
+    def make(name: str = "A", prompt: str = "P", headers: dict = None, **settings) -> int:
+        response = client.post("/api/agents/", json={"name": name, "prompt": prompt, **settings}, headers=headers or auth_headers)
+        assert response.status_code == 200
+        return response.json()["id"]
+    return make
+
+@pytest.fixture
+def make_session(client, auth_headers, make_agent):
+    """Create a session through the API and return its id, with a new agent unless ``agent_id`` is given."""
+    def make(agent_id: int = None, headers: dict = None) -> int:
+        if agent_id is None:
+            agent_id = make_agent(headers=headers)
+        response = client.post("/api/sessions/", json={"agent_id": agent_id}, headers=headers or auth_headers)
+        assert response.status_code == 200
+        return response.json()["id"]
+    return make
+
+@pytest.fixture
+def send_message(client, auth_headers):
+    """Send a text message to a session through the API and return the reply, or the error for another ``status``."""
+    def send(session_id: int, content: str = "Hello", headers: dict = None, status: int = 200) -> dict:
+        response = client.post(f"/api/sessions/{session_id}/messages", json={"content": content}, headers=headers or auth_headers)
+        assert response.status_code == status
+        return response.json()
+    return send
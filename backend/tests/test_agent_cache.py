@@ -0,0 +1,103 @@
+import time
+import pytest
+from unittest.mock import MagicMock
+from fastapi.testclient import TestClient
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from backend.services import agent_cache as agent_cache_module
+from backend.services.agent_cache import AGENT, AgentCache, CacheInvalidationListener, agent_cache
+
+def _system_prompt(openai: MagicMock) -> str:
+    return openai.chat.completions.create.await_args.kwargs["messages"][0]["content"]
+
+def test_chat_turns_read_the_agent_from_the_cache(make_session, send_message, query_budget):
+    session_id = make_session()
+    send_message(session_id)
+    with query_budget(30) as stats:
+        send_message(session_id)
+    statements = " ".join(stats.statements)
+    assert "FROM agents" not in statements and "FROM chat_sessions" not in statements
+    counters = agent_cache.stats()
+    assert counters["agents"]["hit_rate"] > 0.5 and counters["sessions"]["hits"] >= 2
+
+def test_updates_and_deletes_invalidate(
+    client: TestClient, auth_headers: dict, mock_openai, make_agent, make_session, send_message
+):
+    openai = mock_openai()
+    agent_id = make_agent(prompt="Old prompt")
+    session_id = make_session(agent_id)
+    send_message(session_id)
+    assert _system_prompt(openai) == "Old prompt"
+
+    client.patch(f"/api/agents/{agent_id}", json={"prompt": "New prompt"}, headers=auth_headers)
+    send_message(session_id)
+    assert _system_prompt(openai) == "New prompt"
+
+    client.delete(f"/api/agents/{agent_id}", headers=auth_headers)
+    send_message(session_id, status=404)
+
+def test_deleted_session_is_not_served_from_the_cache(client: TestClient, auth_headers: dict, make_session, send_message):
+    session_id = make_session()
+    send_message(session_id)
+    client.delete(f"/api/sessions/{session_id}", headers=auth_headers)
+    send_message(session_id, status=404)
+
+def test_sessions_of_other_users_are_not_found(other_auth_headers: dict, make_session, send_message):
+    session_id = make_session()
+    send_message(session_id)
+    send_message(session_id, headers=other_auth_headers, status=404)
+
+@pytest.mark.asyncio
+async def test_other_workers_pick_up_invalidations_by_polling(
+    client: TestClient, auth_headers: dict, db_session: AsyncSession, make_agent, monkeypatch
+):
+    agent_id = make_agent(prompt="Old prompt")
+    # A second worker with its own cache
+    worker = AgentCache()
+    listener = CacheInvalidationListener(db_session.bind, async_sessionmaker(db_session.bind), cache=worker)
+    assert (await worker.get_agent(db_session, agent_id)).prompt == "Old prompt"
+
+    client.patch(f"/api/agents/{agent_id}", json={"prompt": "New prompt"}, headers=auth_headers)
+    assert (await worker.get_agent(db_session, agent_id)).prompt == "Old prompt"
+    # The change was published by this process, which skips its own invalidations
+    assert await listener.poll() == 0
+    monkeypatch.setattr(agent_cache_module, "ORIGIN", "other")
+    listener = CacheInvalidationListener(db_session.bind, async_sessionmaker(db_session.bind), cache=worker)
+    assert await listener.poll() == 1
+    assert await listener.poll() == 0
+    assert (await worker.get_agent(db_session, agent_id)).prompt == "New prompt"
+    assert worker.stats()["poll_lag"]["count"] == 1
+
+def test_notifications_invalidate_and_record_their_lag(db_session: AsyncSession):
+    cache = AgentCache()
+    listener = CacheInvalidationListener(db_session.bind, async_sessionmaker(db_session.bind), cache=cache)
+    listener._on_notify(None, 1, "agent_cache", f"agent:1:other:{time.time() - 0.05}")
+    listener._on_notify(None, 1, "agent_cache", f"agent:1:{agent_cache_module.ORIGIN}:{time.time()}")
+    listener._on_notify(None, 1, "agent_cache", "garbage")
+    stats = cache.stats()
+    assert stats["invalidations"] == 1
+    assert stats["notify_lag"]["count"] == 1 and stats["notify_lag"]["max_ms"] >= 50
+
+@pytest.mark.asyncio
+async def test_entries_expire_and_racing_loads_are_not_stored(db_session: AsyncSession, make_agent):
+    agent_id = make_agent()
+    now = [0.0]
+    cache = AgentCache(ttl_seconds=10, clock=lambda: now[0])
+    await cache.get_agent(db_session, agent_id)
+    await cache.get_agent(db_session, agent_id)
+    now[0] = 11
+    await cache.get_agent(db_session, agent_id)
+    assert (cache.hits[AGENT], cache.misses[AGENT]) == (1, 2)
+
+    # A snapshot loaded before an invalidation is dropped
+    cache.clear()
+    generation = cache._generation
+    cache.invalidate(AGENT, agent_id)
+    cache._put(AGENT, agent_id, object(), generation)
+    assert cache.stats()["agents"]["size"] == 0
+
+def test_admin_reports_the_cache(client: TestClient, make_session, send_message, monkeypatch):
+    monkeypatch.setenv("ADMIN_TOKEN", "admin-secret")
+    send_message(make_session())
+    stats = client.get("/api/admin/cache/agents", headers={"X-Admin-Token": "admin-secret"}).json()
+    assert stats["agents"]["size"] == 1 and stats["sessions"]["size"] == 1
+    assert stats["listening"] is False
@@ -0,0 +1,61 @@
+import pytest
+from datetime import date
+from fastapi.testclient import TestClient
+from sqlalchemy import func, select
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from backend.models.archive import SessionArchive
+from backend.models.chat import Message
+from backend.models.embedding import MessageEmbedding
+from backend.services.archive_service import archive_cold_sessions, pack_messages, unpack_messages
+from backend.utils.partitioning import month_partition_ddl, partitioned_messages_ddl
+
+def test_pack_roundtrip():
+    messages = [{"id": i, "content": "The same words again and again", "is_user": i % 2 == 0} for i in range(200)]
+    data = pack_messages(messages)
+    assert unpack_messages(data) == messages
+    assert len(data) < len(str(messages)) / 10
+
+def test_partitioned_messages_ddl():
+    create_table, *rest = partitioned_messages_ddl(postgresql.dialect())
+    assert "PRIMARY KEY (id, created_at)" in create_table
+    assert "PARTITION BY RANGE (created_at)" in create_table
+    assert "created_at TIMESTAMP WITH TIME ZONE NOT NULL" in create_table
+    assert any("ix_messages_session_id" in statement for statement in rest)
+    assert month_partition_ddl(date(2026, 12, 5)) == (
+        "CREATE TABLE IF NOT EXISTS messages_y2026m12 PARTITION OF messages "
+        "FOR VALUES FROM ('2026-12-01') TO ('2027-01-01')"
+    )
+
+@pytest.mark.asyncio
+async def test_archived_session_reads_and_restores(
+    client: TestClient, auth_headers: dict, db_session: AsyncSession, make_session, send_message
+):
+    session_id = make_session()
+    send_message(session_id)
+    live = client.get(f"/api/sessions/{session_id}/messages", headers=auth_headers)
+    db_session.add(MessageEmbedding(message_id=live.json()[0]["id"], model="test", content_hash=bytes(32)))
+    await db_session.commit()
+
+    session_factory = async_sessionmaker(db_session.bind, expire_on_commit=False)
+    assert await archive_cold_sessions(session_factory, older_than_days=0) == 1
+    assert await archive_cold_sessions(session_factory, older_than_days=0) == 0
+    # A new request would start with a fresh session
+    db_session.expire_all()
+    assert (await db_session.execute(select(func.count()).select_from(Message))).scalar() == 0
+    assert (await db_session.execute(select(SessionArchive.message_count))).scalar() == 2
+    assert (await db_session.execute(select(func.count()).select_from(MessageEmbedding))).scalar() == 0
+
+    archived = client.get(f"/api/sessions/{session_id}/messages", headers=auth_headers)
+    assert archived.json() == live.json()
+    assert archived.headers["ETag"] == live.headers["ETag"]
+    version = int(live.headers["X-Version"])
+    delta = client.get(f"/api/sessions/{session_id}/messages?since={version - 1}", headers=auth_headers).json()
+    assert [m["content"] for m in delta["items"]] == ["Mocked response"]
+
+    # Writing to an archived session brings its messages back first
+    send_message(session_id, "Again")
+    messages = client.get(f"/api/sessions/{session_id}/messages", headers=auth_headers).json()
+    assert [m["content"] for m in messages] == ["Hello", "Mocked response", "Again", "Mocked response"]
+    assert messages[:2] == live.json()
+    assert (await db_session.execute(select(func.count()).select_from(SessionArchive))).scalar() == 0
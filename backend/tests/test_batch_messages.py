@@ -0,0 +1,111 @@
+import asyncio
+import orjson
+import pytest
+from fastapi.testclient import TestClient
+from backend.services.openai_service import UpstreamLimiter
+
+class _Upstream:
+    """Replies with the question; ``delays`` maps a question to its upstream latency."""
+
+    def __init__(self, delays=None, failing=()):
+        self.delays = delays or {}
+        self.failing = failing
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def __call__(self, model, messages, **params) -> str:
+        question = messages[-1]["content"]
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.delays.get(question, 0.01))
+        finally:
+            self.in_flight -= 1
+        if question in self.failing:
+            raise RuntimeError("upstream down")
+        return f"Re: {question} ({len(messages) - 1} in context)"
+
+def _batch(client: TestClient, headers: dict, items: list):
+    response = client.post("/api/batch/messages", json={"items": items}, headers=headers)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    return [orjson.loads(line) for line in response.content.splitlines()]
+
+def test_batch_answers_sessions_and_new_sessions(
+    client: TestClient, auth_headers: dict, mock_openai, make_agent, make_session, send_message
+):
+    mock_openai(_Upstream())
+    agent_id = make_agent()
+    session_id = make_session(agent_id)
+    send_message(session_id, "Earlier")
+
+    results = _batch(client, auth_headers, [
+        {"session_id": session_id, "content": "First"},
+        {"agent_id": agent_id, "content": "Fresh"},
+        {"session_id": session_id, "content": "Second"},
+        {"session_id": 999, "content": "Nope"},
+        {"agent_id": 999, "content": "Nope"},
+    ])
+    by_index = {result["index"]: result for result in results}
+    assert sorted(by_index) == [0, 1, 2, 3, 4]
+    assert (by_index[3]["status_code"], by_index[4]["status_code"]) == (404, 404)
+    # Items of one session run in order, each with the earlier replies in its context
+    assert by_index[0]["message"]["content"] == "Re: First (3 in context)"
+    assert by_index[2]["message"]["content"] == "Re: Second (5 in context)"
+    fresh = by_index[1]
+    assert fresh["session_id"] not in (session_id, None)
+    assert fresh["message"]["content"] == "Re: Fresh (1 in context)" and fresh["message"]["agent_name"] == "A"
+
+    history = client.get(f"/api/sessions/{session_id}/messages", headers=auth_headers).json()
+    assert [m["content"] for m in history][2:] == ["First", "Re: First (3 in context)", "Second", "Re: Second (5 in context)"]
+    sessions = client.get("/api/sessions/", headers=auth_headers).json()
+    assert {s["id"] for s in sessions} == {session_id, fresh["session_id"]}
+
+def test_results_stream_in_completion_order_with_bounded_concurrency(
+    client: TestClient, auth_headers: dict, mock_openai, make_agent
+):
+    upstream = _Upstream(delays={"slow": 0.3})
+    mock_openai(upstream)
+    agent_id = make_agent()
+    items = [{"agent_id": agent_id, "content": "slow"}] + [{"agent_id": agent_id, "content": f"q{i}"} for i in range(20)]
+    results = _batch(client, auth_headers, items)
+    assert len(results) == 21 and all(r["status_code"] == 200 for r in results)
+    assert results[-1]["index"] == 0
+    assert 1 < upstream.max_in_flight <= 8
+
+def test_other_users_sessions_and_failures_are_per_item(
+    client: TestClient, auth_headers: dict, other_auth_headers: dict, mock_openai, make_agent
+):
+    mock_openai(_Upstream(failing={"boom"}))
+    agent_id = make_agent()
+    other_agent = make_agent(headers=other_auth_headers)
+
+    results = {r["index"]: r for r in _batch(client, auth_headers, [
+        {"agent_id": other_agent, "content": "Hi"},
+        {"agent_id": agent_id, "content": "boom"},
+        {"agent_id": agent_id, "content": "fine"},
+    ])}
+    assert results[0]["status_code"] == 404
+    assert (results[1]["status_code"], results[1]["message"]) == (502, None)
+    assert results[2]["status_code"] == 200
+    assert client.get(f"/api/sessions/{results[1]['session_id']}/messages", headers=auth_headers).json() == []
+
+def test_batch_items_are_validated(client: TestClient, auth_headers: dict):
+    both = client.post("/api/batch/messages", json={"items": [{"session_id": 1, "agent_id": 1, "content": "x"}]}, headers=auth_headers)
+    assert both.status_code == 422
+    assert client.post("/api/batch/messages", json={"items": []}, headers=auth_headers).status_code == 422
+
+@pytest.mark.asyncio
+async def test_upstream_limiter_caps_concurrent_calls():
+    limiter = UpstreamLimiter(limit=2)
+    peak = 0
+
+    async def call():
+        nonlocal peak
+        async with limiter.slot():
+            peak = max(peak, limiter.in_flight)
+            await asyncio.sleep(0.01)
+
+    await asyncio.gather(*(call() for _ in range(10)))
+    assert peak == 2
+    assert limiter.stats() == {"limit": 2, "in_flight": 0, "waiting": 0}
@@ -0,0 +1,25 @@
+import json
+import pytest
+from backend.benchmarks.harness import percentile
+from backend.benchmarks.run import run_benchmarks
+
+def test_percentile_nearest_rank():
+    values = list(range(1, 101))
+    assert percentile(values, 50) == 50
+    assert percentile(values, 95) == 95
+    assert percentile(values, 99) == 99
+    assert percentile([], 50) is None
+
+@pytest.mark.asyncio
+async def test_smoke_run_produces_json_report():
+    report = await run_benchmarks(["agent_crud", "history_read"], profile="smoke")
+    # The report must round-trip through JSON so runs can be compared
+    report = json.loads(json.dumps(report))
+
+    assert report["meta"]["database"] == "sqlite"
+    for name in ("agent_crud", "history_read"):
+        summary = report["scenarios"][name]
+        assert summary["errors"] == 0
+        assert summary["operations"] > 0
+        assert summary["throughput_ops_per_s"] > 0
+        assert summary["latency_ms"]["p50"] <= summary["latency_ms"]["p99"]
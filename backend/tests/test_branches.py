@@ -0,0 +1,107 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from backend.services import purge_service
+from backend.services.archive_service import archive_cold_sessions
+from backend.services.branch_service import load_histories
+
+async def _echo_context(model, messages, **params):
+    """Replies with the question and the turns the model was given, system prompt excluded."""
+    context = [m["content"] for m in messages[1:]]
+    return f"Re: {context[-1]} ({len(context)})"
+
+@pytest.fixture
+def conversation(mock_openai, make_agent, make_session, send_message):
+    """Start a conversation with ``questions``, returns the agent, session and replies."""
+    mock_openai(_echo_context)
+    def start(*questions: str) -> tuple:
+        agent_id = make_agent()
+        session_id = make_session(agent_id)
+        return agent_id, session_id, [send_message(session_id, question) for question in questions]
+    return start
+
+def _branch(client: TestClient, headers: dict, session_id: int, message_id: int):
+    return client.post(f"/api/sessions/{session_id}/branches", json={"message_id": message_id}, headers=headers)
+
+def _history(client: TestClient, headers: dict, session_id: int) -> list:
+    return [m["content"] for m in client.get(f"/api/sessions/{session_id}/history", headers=headers).json()]
+
+def test_branch_continues_from_the_fork_without_copying(
+    client: TestClient, auth_headers: dict, conversation, send_message
+):
+    agent_id, session_id, (first, _) = conversation("One", "Two")
+
+    response = _branch(client, auth_headers, session_id, first["id"])
+    assert response.status_code == 200
+    branch = response.json()
+    assert (branch["agent_id"], branch["parent_session_id"], branch["parent_message_id"]) == (agent_id, session_id, first["id"])
+    assert client.get(f"/api/sessions/{branch['id']}/messages", headers=auth_headers).json() == []
+
+    # The branch sees the parent up to the fork, the parent does not see the branch
+    assert send_message(branch["id"], "Other")["content"] == "Re: Other (3)"
+    assert _history(client, auth_headers, branch["id"]) == ["One", "Re: One (1)", "Other", "Re: Other (3)"]
+    assert _history(client, auth_headers, session_id) == ["One", "Re: One (1)", "Two", "Re: Two (3)"]
+    listed = {s["id"]: s for s in client.get("/api/sessions/", headers=auth_headers).json()}
+    assert listed[branch["id"]]["parent_message_id"] == first["id"]
+
+@pytest.mark.asyncio
+async def test_branch_of_a_branch_at_an_inherited_message(
+    client: TestClient, auth_headers: dict, conversation, send_message, db_session: AsyncSession
+):
+    _, root_id, (first, second) = conversation("One", "Two")
+    middle = _branch(client, auth_headers, root_id, second["id"]).json()
+    third = send_message(middle["id"], "Three")
+    leaf = _branch(client, auth_headers, middle["id"], third["id"]).json()
+    assert leaf["parent_session_id"] == middle["id"]
+    assert send_message(leaf["id"], "Four")["content"] == "Re: Four (7)"
+
+    # Forking at a message the middle branch inherits points at the root directly
+    sibling = _branch(client, auth_headers, middle["id"], first["id"]).json()
+    assert (sibling["parent_session_id"], sibling["parent_message_id"]) == (root_id, first["id"])
+
+    histories = await load_histories(db_session, [root_id, leaf["id"], sibling["id"]])
+    assert [m["content"] for m in histories[leaf["id"]]] == [
+        "One", "Re: One (1)", "Two", "Re: Two (3)", "Three", "Re: Three (5)", "Four", "Re: Four (7)",
+    ]
+    assert [m["content"] for m in histories[sibling["id"]]] == ["One", "Re: One (1)"]
+    assert len(histories[root_id]) == 4
+
+def test_branch_needs_a_message_of_the_history(
+    client: TestClient, auth_headers: dict, conversation, other_auth_headers: dict
+):
+    _, session_id, (first,) = conversation("One")
+    _, _, (other,) = conversation("Elsewhere")
+    assert _branch(client, auth_headers, session_id, other["id"]).status_code == 404
+    assert _branch(client, auth_headers, session_id, 999).status_code == 404
+
+    assert _branch(client, other_auth_headers, session_id, first["id"]).status_code == 404
+    assert client.get(f"/api/sessions/{session_id}/history", headers=other_auth_headers).status_code == 404
+
+@pytest.mark.parametrize("soft", [False, True])
+def test_deleting_a_session_deletes_its_branches(
+    client: TestClient, auth_headers: dict, conversation, send_message, monkeypatch, soft: bool
+):
+    monkeypatch.setattr(purge_service, "SOFT_DELETE", soft)
+    _, session_id, (first,) = conversation("One")
+    branch = _branch(client, auth_headers, session_id, first["id"]).json()
+    nested = _branch(client, auth_headers, branch["id"], send_message(branch["id"], "Two")["id"]).json()
+    assert nested["parent_session_id"] == branch["id"]
+
+    assert client.delete(f"/api/sessions/{session_id}", headers=auth_headers).status_code == 204
+    assert client.get("/api/sessions/", headers=auth_headers).json() == []
+    for deleted in (branch["id"], nested["id"]):
+        assert client.post(f"/api/sessions/{deleted}/messages", json={"content": "Hi"}, headers=auth_headers).status_code == 404
+
+@pytest.mark.asyncio
+async def test_sessions_with_branches_are_not_archived(
+    client: TestClient, auth_headers: dict, conversation, send_message, db_session: AsyncSession
+):
+    _, session_id, (first,) = conversation("One")
+    branch = _branch(client, auth_headers, session_id, first["id"]).json()
+    send_message(branch["id"], "Two")
+
+    session_factory = async_sessionmaker(db_session.bind, expire_on_commit=False)
+    # Only the branch itself is cold enough and has no branches of its own
+    assert await archive_cold_sessions(session_factory, older_than_days=0) == 1
+    assert _history(client, auth_headers, branch["id"]) == ["One", "Re: One (1)", "Two", "Re: Two (3)"]
+    assert send_message(branch["id"], "Three")["content"] == "Re: Three (5)"
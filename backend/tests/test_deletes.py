@@ -0,0 +1,88 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from backend.models.agent import Agent
+from backend.models.chat import ChatSession, Message
+from backend.models.embedding import MessageEmbedding
+from backend.services import purge_service
+
+@pytest.fixture
+def static_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(purge_service, "STATIC_DIR", tmp_path)
+    return tmp_path
+
+@pytest.fixture
+def seed(db_session: AsyncSession, static_dir, make_agent, make_session):
+    """Create an agent and a session of ``count`` messages, every fifth with an audio file."""
+    async def create(count: int) -> tuple:
+        agent_id = make_agent()
+        session_id = make_session(agent_id)
+        for i in range(count):
+            audio_url = None
+            if i % 5 == 0:
+                (static_dir / f"audio_{i}.mp3").write_bytes(b"audio")
+                audio_url = f"/static/audio_{i}.mp3"
+            message = Message(session_id=session_id, content=f"m{i}", is_user=i % 2 == 0, audio_url=audio_url)
+            db_session.add(message)
+            await db_session.flush()
+            db_session.add(MessageEmbedding(message_id=message.id, model="test", content_hash=bytes(32)))
+        await db_session.commit()
+        return agent_id, session_id
+    return create
+
+async def _count(db_session: AsyncSession, model) -> int:
+    return (await db_session.execute(select(func.count()).select_from(model))).scalar()
+
+@pytest.mark.asyncio
+async def test_hard_delete_is_set_based(
+    client: TestClient, auth_headers: dict, db_session: AsyncSession, seed, static_dir, query_budget
+):
+    agent_id, _ = await seed(50)
+
+    # The statement count does not depend on the number of messages
+    with query_budget(9):
+        response = client.delete(f"/api/agents/{agent_id}", headers=auth_headers)
+    assert response.status_code == 200
+    assert await _count(db_session, ChatSession) == 0
+    assert await _count(db_session, Message) == 0
+    assert await _count(db_session, MessageEmbedding) == 0
+    assert list(static_dir.iterdir()) == []
+
+@pytest.mark.asyncio
+async def test_soft_delete_hides_rows_until_purged(
+    client: TestClient, auth_headers: dict, db_session: AsyncSession, seed, static_dir, monkeypatch
+):
+    monkeypatch.setattr(purge_service, "SOFT_DELETE", True)
+    _, session_id = await seed(25)
+
+    assert client.delete(f"/api/sessions/{session_id}", headers=auth_headers).status_code == 204
+    assert client.get("/api/sessions/", headers=auth_headers).json() == []
+    assert client.get(f"/api/sessions/{session_id}/messages", headers=auth_headers).status_code == 404
+    assert await _count(db_session, Message) == 25
+
+    session_factory = async_sessionmaker(db_session.bind, expire_on_commit=False)
+    async with session_factory() as db:
+        assert (await purge_service.purge_batch(db, batch_size=10))["messages"] == 10
+    totals = await purge_service.purge_deleted(session_factory, batch_size=10)
+    assert totals == {"messages": 15, "sessions": 1, "agents": 0, "audio_files": 3}
+    assert await _count(db_session, Message) == 0
+    assert await _count(db_session, MessageEmbedding) == 0
+    assert await _count(db_session, ChatSession) == 0
+    assert list(static_dir.iterdir()) == []
+
+@pytest.mark.asyncio
+async def test_soft_deleted_agent_is_purged_last(
+    client: TestClient, auth_headers: dict, db_session: AsyncSession, seed, static_dir, monkeypatch
+):
+    monkeypatch.setattr(purge_service, "SOFT_DELETE", True)
+    agent_id, session_id = await seed(5)
+
+    assert client.delete(f"/api/agents/{agent_id}", headers=auth_headers).status_code == 200
+    assert client.get("/api/agents/", headers=auth_headers).json() == []
+    assert client.post("/api/sessions/", json={"agent_id": agent_id}, headers=auth_headers).status_code == 404
+    assert client.post(f"/api/sessions/{session_id}/messages", json={"content": "Hi"}, headers=auth_headers).status_code == 404
+
+    totals = await purge_service.purge_deleted(async_sessionmaker(db_session.bind, expire_on_commit=False))
+    assert totals == {"messages": 5, "sessions": 1, "agents": 1, "audio_files": 1}
+    assert await _count(db_session, Agent) == 0
@@ -0,0 +1,150 @@
+import asyncio
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+from openai import AsyncOpenAI
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from backend.api.dependencies import get_embedding_service
+from backend.main import app
+from backend.models.embedding import EmbeddingCacheEntry, MessageEmbedding
+from backend.services.embedders import HashingEmbedder, OpenAIEmbedder
+from backend.services.embedding_service import (
+    EmbeddingBackfiller, EmbeddingService, backfill_batch, create_backfill_job, load_message_embeddings
+)
+
+class CountingEmbedder(HashingEmbedder):
+    """Hashing embedder recording every upstream batch."""
+
+    def __init__(self, fail: bool = False):
+        super().__init__(dimensions=16)
+        self.calls = []
+        self.fail = fail
+
+    async def embed(self, texts):
+        self.calls.append(list(texts))
+        if self.fail:
+            raise RuntimeError("upstream down")
+        return await super().embed(texts)
+
+def _service(db_session: AsyncSession, embedder=None, **kwargs) -> EmbeddingService:
+    factory = async_sessionmaker(db_session.bind, expire_on_commit=False)
+    return EmbeddingService(embedder or CountingEmbedder(), factory, **kwargs)
+
+@pytest.fixture
+def add_messages(make_session, send_message):
+    """Send ``contents`` to a new session, each answered with the mocked reply."""
+    def add(contents):
+        session_id = make_session()
+        for content in contents:
+            send_message(session_id, content)
+    return add
+
+@pytest.mark.asyncio
+async def test_concurrent_requests_share_one_batch(db_session: AsyncSession):
+    service = _service(db_session, max_delay_ms=50)
+    results = await asyncio.gather(
+        service.embed(["alpha", "beta"]),
+        service.embed(["beta", "gamma"]),
+        service.embed(["alpha", "alpha"]),
+    )
+    # One upstream call, every distinct text once
+    assert [sorted(call) for call in service.embedder.calls] == [["alpha", "beta", "gamma"]]
+    assert np.array_equal(results[0][0], results[2][1])
+    assert np.array_equal(results[0][1], results[1][0])
+    assert service.stats()["coalesced"] == 3
+
+@pytest.mark.asyncio
+async def test_embeddings_are_cached_in_the_table(db_session: AsyncSession):
+    service = _service(db_session, max_delay_ms=1)
+    first = await service.embed(["hello world", "bye"])
+
+    rows = (await db_session.execute(select(EmbeddingCacheEntry))).scalars().all()
+    assert len(rows) == 2
+    assert all(len(row.content_hash) == 32 and len(row.embedding) == 16 * 4 for row in rows)
+
+    # A new process with an empty memory still finds them
+    restarted = _service(db_session, max_delay_ms=1)
+    second = await restarted.embed(["bye", "hello world", "new"])
+    assert restarted.embedder.calls == [["new"]]
+    assert restarted.cache_hits == 2
+    assert np.allclose(second[:2], first[::-1])
+
+@pytest.mark.asyncio
+async def test_full_batches_go_out_without_waiting(db_session: AsyncSession):
+    service = _service(db_session, max_batch=4, max_delay_ms=10_000)
+    vectors = await asyncio.wait_for(service.embed([f"text {i}" for i in range(8)]), timeout=5)
+    assert vectors.shape == (8, 16)
+    assert [len(call) for call in service.embedder.calls] == [4, 4]
+
+@pytest.mark.asyncio
+async def test_upstream_failure_reaches_every_caller(db_session: AsyncSession):
+    service = _service(db_session, CountingEmbedder(fail=True), max_delay_ms=20)
+    results = await asyncio.gather(service.embed(["a"]), service.embed(["a", "b"]), return_exceptions=True)
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert len(service.embedder.calls) == 1
+    assert (await db_session.execute(select(func.count()).select_from(EmbeddingCacheEntry))).scalar() == 0
+
+@pytest.mark.asyncio
+async def test_backfill_resumes_from_its_checkpoint(db_session: AsyncSession, add_messages):
+    add_messages(["first question", "second question", "first question"])
+    # Six messages with three distinct texts: two questions and the mocked reply
+    service = _service(db_session, max_delay_ms=1)
+    factory = service.session_factory
+    job = await create_backfill_job(db_session, service.name)
+    assert job.max_message_id == 6
+
+    assert await backfill_batch(factory, service, job.id, batch_size=4)
+    await db_session.refresh(job)
+    assert (job.status, job.last_message_id, job.processed) == ("running", 4, 4)
+
+    # A restarted worker continues after the checkpoint
+    restarted = _service(db_session, max_delay_ms=1)
+    await EmbeddingBackfiller(factory, restarted, batch_size=4).run_once()
+    await db_session.refresh(job)
+    assert (job.status, job.last_message_id, job.processed) == ("completed", 6, 6)
+    assert restarted.embedder.calls == []  # the remaining texts were all cached
+
+    assert (await db_session.execute(select(func.count()).select_from(MessageEmbedding))).scalar() == 6
+    assert (await db_session.execute(select(func.count()).select_from(EmbeddingCacheEntry))).scalar() == 3
+    vectors = await load_message_embeddings(db_session, [1, 5], service.name, service.dimensions)
+    assert np.array_equal(vectors[1], vectors[5])
+
+@pytest.mark.asyncio
+async def test_paused_job_does_not_advance(db_session: AsyncSession, add_messages):
+    add_messages(["one"])
+    service = _service(db_session, max_delay_ms=1)
+    job = await create_backfill_job(db_session, service.name)
+    job.status = "paused"
+    await db_session.commit()
+    assert not await backfill_batch(service.session_factory, service, job.id)
+    await db_session.refresh(job)
+    assert job.last_message_id == 0
+
+def test_admin_backfill_endpoints(client: TestClient, db_session: AsyncSession, add_messages, monkeypatch):
+    monkeypatch.setenv("ADMIN_TOKEN", "admin-secret")
+    service = _service(db_session)
+    app.dependency_overrides[get_embedding_service] = lambda: service
+    headers = {"X-Admin-Token": "admin-secret"}
+    add_messages(["hello"])
+
+    job = client.post("/api/admin/embeddings/backfill", headers=headers).json()
+    assert (job["status"], job["model"], job["max_message_id"]) == ("pending", "hashing-16", 2)
+    paused = client.post(f"/api/admin/embeddings/backfill/{job['id']}/pause", headers=headers).json()
+    assert paused["status"] == "paused"
+    assert client.post(f"/api/admin/embeddings/backfill/{job['id']}/resume", headers=headers).json()["status"] == "pending"
+    assert [j["id"] for j in client.get("/api/admin/embeddings/backfill", headers=headers).json()] == [job["id"]]
+    assert client.post("/api/admin/embeddings/backfill/99/pause", headers=headers).status_code == 404
+    assert client.get("/api/admin/embeddings/stats", headers=headers).json()["model"] == "hashing-16"
+    assert client.post("/api/admin/embeddings/backfill").status_code == 403
+
+@pytest.mark.asyncio
+async def test_openai_embedder_against_fake_server(fake_openai, db_session: AsyncSession):
+    client = AsyncOpenAI(base_url=fake_openai.url, api_key="test-key")
+    service = _service(db_session, OpenAIEmbedder(client, model="text-embedding-3-small", dimensions=32), max_delay_ms=20)
+    before = fake_openai.app.state.embedded_texts
+    vectors = await asyncio.gather(*(service.embed([f"text {i % 3}"]) for i in range(9)))
+    assert fake_openai.app.state.embedded_texts - before == 3
+    assert all(v.shape == (1, 32) for v in vectors)
+    assert np.allclose(vectors[0], vectors[3])
+    await client.close()
@@ -0,0 +1,83 @@
+import pytest
+from fastapi.testclient import TestClient
+from backend.utils.etag import etag_matches, make_etag
+
+def test_etag_matching():
+    etag = make_etag("a", 1, 3)
+    assert etag == 'W/"a.1.3"'
+    assert etag_matches('W/"a.1.3"', etag)
+    assert etag_matches('"a.1.3"', etag)
+    assert etag_matches('W/"x", W/"a.1.3"', etag)
+    assert etag_matches("*", etag)
+    assert not etag_matches('W/"a.1.2"', etag)
+    assert not etag_matches(None, etag)
+    # Optional parts keep their position
+    assert make_etag("s", 1, 3, 5, None) != make_etag("s", 1, 3, None, 5)
+
+@pytest.mark.asyncio
+async def test_agent_list_revalidation(client: TestClient, auth_headers: dict, make_agent, query_budget):
+    agent_id = make_agent()
+    response = client.get("/api/agents/", headers=auth_headers)
+    etag = response.headers["ETag"]
+    assert response.headers["Cache-Control"] == "private, no-cache"
+
+    with query_budget(1):
+        response = client.get("/api/agents/", headers={**auth_headers, "If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+
+    client.patch(f"/api/agents/{agent_id}", json={"name": "B"}, headers=auth_headers)
+    response = client.get("/api/agents/", headers={**auth_headers, "If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    assert [agent["name"] for agent in response.json()] == ["B"]
+
+@pytest.mark.asyncio
+async def test_agent_delta_sync(client: TestClient, auth_headers: dict):
+    first = client.post("/api/agents/", json={"name": "A", "prompt": "P"}, headers=auth_headers).json()
+    second = client.post("/api/agents/", json={"name": "B", "prompt": "P"}, headers=auth_headers).json()
+    version = int(client.get("/api/agents/", headers=auth_headers).headers["X-Version"])
+
+    assert client.get(f"/api/agents/?since={version}", headers=auth_headers).json() == {
+        "version": version, "items": [], "ids": [first["id"], second["id"]]
+    }
+
+    client.patch(f"/api/agents/{second['id']}", json={"prompt": "Q"}, headers=auth_headers)
+    client.delete(f"/api/agents/{first['id']}", headers=auth_headers)
+    delta = client.get(f"/api/agents/?since={version}", headers=auth_headers).json()
+    assert delta["version"] == version + 2
+    assert [agent["prompt"] for agent in delta["items"]] == ["Q"]
+    assert delta["ids"] == [second["id"]]
+
+@pytest.mark.asyncio
+async def test_session_list_is_versioned_per_user(client: TestClient, auth_headers: dict, make_agent, make_session):
+    agent_id = make_agent()
+    response = client.get("/api/sessions/", headers=auth_headers)
+    etag, version = response.headers["ETag"], int(response.headers["X-Version"])
+
+    session_id = make_session(agent_id)
+    assert client.get("/api/sessions/", headers={**auth_headers, "If-None-Match": etag}).status_code == 200
+    delta = client.get(f"/api/sessions/?since={version}", headers=auth_headers).json()
+    assert [session["id"] for session in delta["items"]] == [session_id]
+
+    client.delete(f"/api/sessions/{session_id}", headers=auth_headers)
+    delta = client.get(f"/api/sessions/?since={version}", headers=auth_headers).json()
+    assert delta["version"] == version + 2
+    assert delta["ids"] == []
+
+@pytest.mark.asyncio
+async def test_message_history_delta(client: TestClient, auth_headers: dict, make_session, send_message):
+    session_id = make_session()
+    send_message(session_id, "Hello")
+
+    response = client.get(f"/api/sessions/{session_id}/messages", headers=auth_headers)
+    etag, version = response.headers["ETag"], int(response.headers["X-Version"])
+    assert version == 2
+    assert client.get(
+        f"/api/sessions/{session_id}/messages", headers={**auth_headers, "If-None-Match": etag}
+    ).status_code == 304
+
+    send_message(session_id, "Again")
+    delta = client.get(f"/api/sessions/{session_id}/messages?since={version}", headers=auth_headers).json()
+    assert delta["version"] == 4
+    assert [(m["content"], m["is_user"]) for m in delta["items"]] == [("Again", True), ("Mocked response", False)]
@@ -0,0 +1,92 @@
+import pytest
+import openai
+from openai import AsyncOpenAI
+from backend.main import app
+from backend.api.dependencies import get_openai_client
+from backend.testing.fake_openai import LatencyDistribution, deterministic_reply
+
+def _client(server, **kwargs) -> AsyncOpenAI:
+    return AsyncOpenAI(base_url=server.url, api_key="test-key", **kwargs)
+
+@pytest.mark.asyncio
+async def test_chat_completion_is_deterministic(fake_openai):
+    messages = [{"role": "user", "content": "Hello there"}]
+    client = _client(fake_openai)
+    first = await client.chat.completions.create(model="gpt-3.5-turbo", messages=messages)
+    second = await client.chat.completions.create(model="gpt-3.5-turbo", messages=messages)
+    await client.close()
+
+    assert first.choices[0].message.content == second.choices[0].message.content
+    assert first.choices[0].message.content == deterministic_reply(fake_openai.config, "gpt-3.5-turbo", messages)
+    assert first.usage.prompt_tokens == 2
+    assert first.usage.completion_tokens == len(first.choices[0].message.content.split())
+
+@pytest.mark.asyncio
+async def test_streaming_matches_non_streaming(fake_openai):
+    fake_openai.configure(tokens_per_second=500)
+    messages = [{"role": "user", "content": "Stream please"}]
+    client = _client(fake_openai)
+    stream = await client.chat.completions.create(model="gpt-3.5-turbo", messages=messages, stream=True)
+    parts = [chunk.choices[0].delta.content async for chunk in stream if chunk.choices[0].delta.content]
+    await client.close()
+
+    assert len(parts) > 1
+    assert "".join(parts) == deterministic_reply(fake_openai.config, "gpt-3.5-turbo", messages)
+
+@pytest.mark.asyncio
+async def test_rate_limit_is_retried(fake_openai):
+    fake_openai.configure(rate_limit_first_n=2)
+    client = _client(fake_openai, max_retries=2)
+    response = await client.chat.completions.create(model="gpt-3.5-turbo", messages=[{"role": "user", "content": "hi"}])
+    await client.close()
+    assert response.choices[0].message.content
+
+@pytest.mark.asyncio
+async def test_rate_limit_without_retries(fake_openai):
+    fake_openai.configure(rate_limit_rate=1.0)
+    client = _client(fake_openai, max_retries=0)
+    with pytest.raises(openai.RateLimitError):
+        await client.chat.completions.create(model="gpt-3.5-turbo", messages=[{"role": "user", "content": "hi"}])
+    await client.close()
+
+@pytest.mark.asyncio
+async def test_server_error_injection(fake_openai):
+    fake_openai.configure(error_rate=1.0)
+    client = _client(fake_openai, max_retries=0)
+    with pytest.raises(openai.InternalServerError):
+        await client.chat.completions.create(model="gpt-3.5-turbo", messages=[{"role": "user", "content": "hi"}])
+    await client.close()
+
+@pytest.mark.asyncio
+async def test_client_timeout(fake_openai):
+    fake_openai.configure(latency=LatencyDistribution("fixed", 1.0))
+    client = _client(fake_openai, max_retries=0, timeout=0.2)
+    with pytest.raises(openai.APITimeoutError):
+        await client.chat.completions.create(model="gpt-3.5-turbo", messages=[{"role": "user", "content": "hi"}])
+    await client.close()
+
+@pytest.mark.asyncio
+async def test_audio_endpoints(fake_openai):
+    client = _client(fake_openai)
+    transcription = await client.audio.transcriptions.create(model="whisper-1", file=("a.mp3", b"audio-bytes", "audio/mpeg"))
+    again = await client.audio.transcriptions.create(model="whisper-1", file=("a.mp3", b"audio-bytes", "audio/mpeg"))
+    speech = await client.audio.speech.create(model="tts-1", voice="alloy", input="Hello there")
+    await client.close()
+
+    assert transcription.text
+    assert transcription.text == again.text
+    assert speech.content.startswith(b"ID3")
+
+@pytest.mark.asyncio
+async def test_send_message_through_fake_server(fake_openai, make_session, send_message):
+    async def override_get_openai_client():
+        openai_client = _client(fake_openai)
+        try:
+            yield openai_client
+        finally:
+            await openai_client.close()
+
+    app.dependency_overrides[get_openai_client] = override_get_openai_client
+    data = send_message(make_session())
+    assert data["content"]
+    assert data["completion_tokens"] == len(data["content"].split())
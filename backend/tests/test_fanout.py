@@ -0,0 +1,98 @@
+import asyncio
+import httpx
+import orjson
+from unittest.mock import MagicMock
+from fastapi.testclient import TestClient
+from openai import APIConnectionError
+from backend.services.model_router import model_router
+
+def _streaming(failing_prompts=()):
+    """Streams "<agent prompt> answers <question>" word by word."""
+    async def create(model, messages, stream=False, **params):
+        prompt = messages[0]["content"]
+        if prompt in failing_prompts:
+            raise RuntimeError("upstream down")
+        words = f"{prompt.splitlines()[0]} answers {messages[-1]['content'].splitlines()[0]}".split(" ")
+
+        async def chunks():
+            for i, word in enumerate(words):
+                await asyncio.sleep(0.01)
+                yield MagicMock(choices=[MagicMock(delta=MagicMock(content=word if i == 0 else f" {word}"))])
+        return chunks()
+    return create
+
+def _fanout(client: TestClient, headers: dict, **body) -> list:
+    response = client.post("/api/fanout/messages", json={"content": "Hello there", **body}, headers=headers)
+    assert response.status_code == 200
+    return [orjson.loads(line) for line in response.content.splitlines()]
+
+def test_replies_stream_interleaved_and_are_stored(client: TestClient, auth_headers: dict, mock_openai, make_agent):
+    mock_openai(_streaming())
+    alice, bob = make_agent("Alice", "Alice"), make_agent("Bob", "Bob")
+    events = _fanout(client, auth_headers, agent_ids=[alice, bob])
+
+    deltas = [e for e in events if e["type"] == "delta"]
+    # Both agents are generating at the same time
+    first_switch = next(i for i, e in enumerate(deltas) if e["agent_id"] != deltas[0]["agent_id"])
+    assert first_switch < len(deltas) // 2
+    messages = {e["agent_id"]: e for e in events if e["type"] == "message"}
+    assert messages[alice]["message"]["content"] == "Alice answers Hello there"
+    assert "".join(e["content"] for e in deltas if e["agent_id"] == bob) == "Bob answers Hello there"
+    assert messages[bob]["message"]["ttft_ms"] <= messages[bob]["message"]["latency_ms"]
+
+    stored = client.get(f"/api/sessions/{messages[alice]['session_id']}/messages", headers=auth_headers).json()
+    assert [m["content"] for m in stored] == ["Hello there", "Alice answers Hello there"]
+
+def test_sessions_are_reused_unless_new_ones_are_asked_for(
+    client: TestClient, auth_headers: dict, mock_openai, make_agent, make_session
+):
+    mock_openai(_streaming())
+    alice = make_agent("Alice", "Alice")
+    existing = make_session(alice)
+    first = {e["session_id"] for e in _fanout(client, auth_headers, agent_ids=[alice])}
+    assert first == {existing}
+    fresh = {e["session_id"] for e in _fanout(client, auth_headers, agent_ids=[alice], new_sessions=True)}
+    assert fresh != {existing} and len(fresh) == 1
+    # The follow-up in the reused session sees the earlier turn
+    history = client.get(f"/api/sessions/{existing}/messages", headers=auth_headers).json()
+    assert len(history) == 2
+
+def test_aggregator_summarizes_the_successful_replies(client: TestClient, auth_headers: dict, mock_openai, make_agent):
+    openai = mock_openai(_streaming(failing_prompts={"Bob"}))
+    alice, bob = make_agent("Alice", "Alice"), make_agent("Bob", "Bob")
+    judge = make_agent("Judge", "Judge")
+    events = _fanout(client, auth_headers, agent_ids=[alice, bob], aggregator_agent_id=judge)
+
+    errors = [e for e in events if e["type"] == "error"]
+    assert [(e["agent_id"], e["status_code"]) for e in errors] == [(bob, 502)]
+    final = events[-1]
+    assert (final["type"], final["agent_id"], final["aggregator"]) == ("message", judge, True)
+    assert final["message"]["content"] == "Judge answers Hello there"
+    assert all(e["aggregator"] for e in events if e["agent_id"] == judge)
+    question = openai.chat.completions.create.await_args.kwargs["messages"][-1]["content"]
+    assert "[Alice]\nAlice answers Hello there" in question and "[Bob]" not in question
+
+def test_foreign_or_missing_agents_are_rejected(
+    client: TestClient, auth_headers: dict, other_auth_headers: dict, mock_openai, make_agent
+):
+    mock_openai(_streaming())
+    alice = make_agent("Alice", "Alice")
+    foreign = make_agent("Mallory", "Mallory", headers=other_auth_headers)
+    assert client.post("/api/fanout/messages", json={"content": "Hi", "agent_ids": [alice, foreign]}, headers=auth_headers).status_code == 404
+    assert client.post("/api/fanout/messages", json={"content": "Hi", "agent_ids": [alice], "aggregator_agent_id": 99}, headers=auth_headers).status_code == 404
+    assert client.post("/api/fanout/messages", json={"content": "Hi", "agent_ids": []}, headers=auth_headers).status_code == 422
+
+def test_stream_falls_back_before_the_first_piece(client: TestClient, auth_headers: dict, mock_openai, make_agent):
+    create = _streaming()
+
+    async def flaky(model, messages, **params):
+        if model == "gpt-4o-mini":
+            raise APIConnectionError(request=httpx.Request("POST", "http://upstream"))
+        return await create(model, messages, **params)
+    mock_openai(flaky)
+    agent_id = make_agent(prompt="Alice", chat_model="gpt-4o-mini", fallback_models=["gpt-3.5-turbo"])
+    try:
+        message = _fanout(client, auth_headers, agent_ids=[agent_id])[-1]["message"]
+    finally:
+        model_router.clear()
+    assert (message["content"], message["model"]) == ("Alice answers Hello there", "gpt-3.5-turbo")
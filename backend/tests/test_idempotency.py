@@ -0,0 +1,124 @@
+import asyncio
+import pytest
+from datetime import datetime, timedelta, timezone
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+from sqlalchemy import func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from backend.api.schemas import ChatSessionResponse
+from backend.models.chat import ChatSession, Message
+from backend.models.idempotency import IdempotencyKey
+from backend.services.idempotency_service import REPLAYED_HEADER, delete_expired_keys, run_idempotent
+
+async def _count(db_session: AsyncSession, model) -> int:
+    return (await db_session.execute(select(func.count()).select_from(model))).scalar()
+
+@pytest.mark.asyncio
+async def test_retried_message_is_replayed(
+    client: TestClient, auth_headers: dict, mock_openai, make_session, db_session: AsyncSession
+):
+    session_id = make_session()
+    openai = mock_openai()
+
+    url = f"/api/sessions/{session_id}/messages"
+    first = client.post(url, json={"content": "Hello"}, headers={**auth_headers, "Idempotency-Key": "k1"})
+    retry = client.post(url, json={"content": "Hello"}, headers={**auth_headers, "Idempotency-Key": "k1"})
+    assert first.status_code == retry.status_code == 200
+    assert REPLAYED_HEADER not in first.headers
+    assert retry.headers[REPLAYED_HEADER] == "true"
+    assert retry.json() == first.json()
+    assert first.json()["agent_name"] == "A"
+
+    # The model was asked once and only one exchange was stored
+    assert openai.chat.completions.create.await_count == 1
+    assert await _count(db_session, Message) == 2
+
+@pytest.mark.asyncio
+async def test_key_reused_for_another_payload_is_rejected(
+    client: TestClient, auth_headers: dict, make_session, db_session: AsyncSession
+):
+    session_id = make_session()
+    url = f"/api/sessions/{session_id}/messages"
+    assert client.post(url, json={"content": "Hello"}, headers={**auth_headers, "Idempotency-Key": "k1"}).status_code == 200
+    response = client.post(url, json={"content": "Bye"}, headers={**auth_headers, "Idempotency-Key": "k1"})
+    assert response.status_code == 422
+    assert await _count(db_session, Message) == 2
+
+@pytest.mark.asyncio
+async def test_requests_without_key_are_not_deduplicated(
+    client: TestClient, auth_headers: dict, make_session, db_session: AsyncSession
+):
+    session_id = make_session()
+    url = f"/api/sessions/{session_id}/messages"
+    for _ in range(2):
+        assert client.post(url, json={"content": "Hello"}, headers=auth_headers).status_code == 200
+    assert await _count(db_session, Message) == 4
+    assert await _count(db_session, IdempotencyKey) == 0
+
+@pytest.mark.asyncio
+async def test_create_session_is_idempotent(
+    client: TestClient, auth_headers: dict, make_agent, db_session: AsyncSession
+):
+    agent_id = make_agent()
+    responses = [
+        client.post("/api/sessions/", json={"agent_id": agent_id}, headers={**auth_headers, "Idempotency-Key": "s1"})
+        for _ in range(2)
+    ]
+    assert [r.status_code for r in responses] == [200, 200]
+    assert responses[0].json()["id"] == responses[1].json()["id"]
+    assert await _count(db_session, ChatSession) == 1
+
+@pytest.mark.asyncio
+async def test_failed_request_is_not_stored(
+    client: TestClient, auth_headers: dict, make_agent, db_session: AsyncSession
+):
+    agent_id = make_agent()
+    # Unknown session: the failure is returned, not remembered
+    response = client.post("/api/sessions/999/messages", json={"content": "Hello"}, headers={**auth_headers, "Idempotency-Key": "k1"})
+    assert response.status_code == 404
+    assert await _count(db_session, IdempotencyKey) == 0
+
+    response = client.post("/api/sessions/", json={"agent_id": agent_id}, headers={**auth_headers, "Idempotency-Key": "k1"})
+    assert response.status_code == 200
+
+def test_key_length_is_validated(client: TestClient, auth_headers: dict, make_agent):
+    agent_id = make_agent()
+    response = client.post("/api/sessions/", json={"agent_id": agent_id}, headers={**auth_headers, "Idempotency-Key": "x" * 256})
+    assert response.status_code == 400
+
+@pytest.mark.asyncio
+async def test_concurrent_duplicates_share_one_execution(client: TestClient, make_agent, db_session: AsyncSession):
+    make_agent()
+    calls = 0
+
+    async def execute():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        return {"id": 7, "agent_id": 1, "created_at": datetime.now(timezone.utc)}
+
+    responses = await asyncio.gather(*(
+        run_idempotent(db_session, 1, "k1", "fp", execute, ChatSessionResponse) for _ in range(3)
+    ))
+    assert calls == 1
+    assert len({r.body for r in responses}) == 1
+    assert [REPLAYED_HEADER in r.headers for r in responses] == [False, True, True]
+
+    with pytest.raises(HTTPException) as e:
+        await run_idempotent(db_session, 1, "k1", "other", execute, ChatSessionResponse)
+    assert e.value.status_code == 422
+
+@pytest.mark.asyncio
+async def test_expired_keys_run_again_and_are_cleaned_up(
+    client: TestClient, auth_headers: dict, make_agent, db_session: AsyncSession
+):
+    agent_id = make_agent()
+    first = client.post("/api/sessions/", json={"agent_id": agent_id}, headers={**auth_headers, "Idempotency-Key": "s1"}).json()
+
+    await db_session.execute(update(IdempotencyKey).values(expires_at=datetime.now(timezone.utc) - timedelta(seconds=1)))
+    await db_session.commit()
+    factory = async_sessionmaker(db_session.bind, expire_on_commit=False)
+    assert await delete_expired_keys(factory) == 1
+
+    second = client.post("/api/sessions/", json={"agent_id": agent_id}, headers={**auth_headers, "Idempotency-Key": "s1"}).json()
+    assert second["id"] != first["id"]
@@ -0,0 +1,147 @@
+import numpy as np
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+from fastapi.testclient import TestClient
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from backend.api.dependencies import get_embedder
+from backend.main import app
+from backend.models.knowledge import KnowledgeChunk
+from backend.services.embedders import HashingEmbedder, OpenAIEmbedder, embed_in_batches
+from backend.services.knowledge_service import CONTEXT_HEADER, chunk_text, knowledge_indexes
+from backend.services.vector_index import FlatIndex, IVFIndex, pack_vector, unpack_vectors
+
+MANUAL = (
+    "Resetting the router: hold the reset button for ten seconds until the lights blink.\n\n"
+    "Billing questions: invoices are sent on the first day of every month by email.\n\n"
+    "Warranty: hardware is covered for two years from the date of purchase."
+)
+
+@pytest.fixture(autouse=True)
+def hashing_embedder():
+    # Ids restart in every test database, cached indexes must not leak between tests
+    knowledge_indexes.clear()
+    embedder = HashingEmbedder()
+    app.dependency_overrides[get_embedder] = lambda: embedder
+    yield embedder
+    knowledge_indexes.clear()
+
+@pytest.fixture
+def agent_id(make_agent) -> int:
+    return make_agent("Support", "You are a support agent.")
+
+@pytest.fixture
+def system_prompt(mock_openai, make_session, send_message):
+    """Ask ``question`` in a new session of the agent, returns the system prompt the model got."""
+    def ask(agent_id: int, question: str) -> str:
+        openai = mock_openai()
+        send_message(make_session(agent_id), question)
+        messages = openai.chat.completions.create.await_args.kwargs["messages"]
+        assert messages[0]["role"] == "system"
+        assert messages[1:] == [{"role": "user", "content": question}]
+        return messages[0]["content"]
+    return ask
+
+def _upload(client: TestClient, headers: dict, agent_id: int, content: str = MANUAL, title: str = "Manual"):
+    response = client.post(f"/api/agents/{agent_id}/documents", json={"title": title, "content": content}, headers=headers)
+    assert response.status_code == 200
+    return response.json()
+
+@pytest.mark.asyncio
+async def test_upload_chunks_and_embeds(
+    client: TestClient, auth_headers: dict, agent_id: int, db_session: AsyncSession
+):
+    document = _upload(client, auth_headers, agent_id, "word " * 1000)
+    assert document["chunk_count"] > 1
+
+    rows = (await db_session.execute(select(KnowledgeChunk.embedding, KnowledgeChunk.embedding_model))).all()
+    assert len(rows) == document["chunk_count"]
+    assert {row.embedding_model for row in rows} == {"hashing-256"}
+    assert all(len(row.embedding) == 256 * 4 for row in rows)
+
+    listed = client.get(f"/api/agents/{agent_id}/documents", headers=auth_headers).json()
+    assert [d["id"] for d in listed] == [document["id"]]
+
+def test_relevant_chunks_are_sent_with_the_prompt(client: TestClient, auth_headers: dict, agent_id: int, system_prompt):
+    # One document per topic, each becomes its own chunk
+    for i, section in enumerate(MANUAL.split("\n\n")):
+        _upload(client, auth_headers, agent_id, section, title=f"Section {i}")
+
+    system = system_prompt(agent_id, "When are the invoices sent?")
+    assert system.startswith("You are a support agent.\n\n" + CONTEXT_HEADER)
+    assert "invoices are sent on the first day" in system
+    assert "reset button" not in system
+
+def test_agent_without_knowledge_gets_its_prompt(agent_id: int, system_prompt):
+    assert system_prompt(agent_id, "Hello") == "You are a support agent."
+
+def test_deleted_document_is_no_longer_used(client: TestClient, auth_headers: dict, agent_id: int, system_prompt):
+    document = _upload(client, auth_headers, agent_id)
+    assert "invoices" in system_prompt(agent_id, "invoices sent by email")
+
+    response = client.delete(f"/api/agents/{agent_id}/documents/{document['id']}", headers=auth_headers)
+    assert response.status_code == 204
+    assert system_prompt(agent_id, "invoices sent by email") == "You are a support agent."
+
+def test_search_endpoint_and_ownership(client: TestClient, auth_headers: dict, agent_id: int):
+    _upload(client, auth_headers, agent_id, "Warranty covers two years.", title="Warranty")
+    _upload(client, auth_headers, agent_id, "Invoices arrive monthly.", title="Billing")
+    response = client.get(f"/api/agents/{agent_id}/knowledge/search", params={"q": "warranty years", "k": 1}, headers=auth_headers)
+    assert [item["title"] for item in response.json()["items"]] == ["Warranty"]
+
+    assert client.get("/api/agents/999/documents", headers=auth_headers).status_code == 404
+
+@pytest.mark.asyncio
+async def test_index_is_cached_per_knowledge_version(
+    client: TestClient, auth_headers: dict, agent_id: int, system_prompt
+):
+    _upload(client, auth_headers, agent_id)
+    system_prompt(agent_id, "invoices")
+    system_prompt(agent_id, "warranty")
+    assert knowledge_indexes.builds == 1
+    _upload(client, auth_headers, agent_id, "More text", title="Extra")
+    system_prompt(agent_id, "invoices")
+    assert knowledge_indexes.builds == 2
+
+def test_chunk_text_respects_size_and_overlap():
+    text = " ".join(f"Sentence number {i}." for i in range(200))
+    chunks = chunk_text(text, max_chars=200, overlap=40)
+    assert all(len(chunk) <= 200 for chunk in chunks)
+    assert all(chunk.endswith(".") for chunk in chunks)
+    # Consecutive chunks share text
+    assert all(a[-20:] in b for a, b in zip(chunks, chunks[1:]))
+    assert chunk_text("short") == ["short"]
+    assert chunk_text("   ") == []
+
+def test_packed_vectors_round_trip():
+    vectors = np.random.default_rng(0).normal(size=(3, 8)).astype(np.float32)
+    assert np.array_equal(unpack_vectors([pack_vector(v) for v in vectors], 8), vectors)
+
+def test_ivf_index_finds_the_flat_neighbours():
+    rng = np.random.default_rng(1)
+    vectors = rng.normal(size=(2000, 32)).astype(np.float32)
+    ids = np.arange(2000) + 100
+    flat = FlatIndex(ids, vectors)
+    ivf = IVFIndex(ids, vectors, clusters=20, nprobe=20)
+    queries = vectors[:20] + rng.normal(scale=0.1, size=(20, 32)).astype(np.float32)
+    # Probing every cluster, only the int8 quantization separates the results
+    for query in queries:
+        assert ivf.search(query, 1)[0][0] == flat.search(query, 1)[0][0]
+    recall = np.mean([
+        len({i for i, _ in ivf.search(query, 10)} & {i for i, _ in flat.search(query, 10)}) / 10 for query in queries
+    ])
+    assert recall >= 0.9
+    # Int8 codes take a quarter of the float32 matrix
+    assert ivf.codes.nbytes * 4 == flat.vectors.nbytes
+
+@pytest.mark.asyncio
+async def test_openai_embedder_batches_requests():
+    client = MagicMock()
+    client.embeddings.create = AsyncMock(side_effect=lambda model, input, extra_body: MagicMock(
+        data=[MagicMock(index=i, embedding=[1.0, float(i)]) for i in range(len(input))]
+    ))
+    embedder = OpenAIEmbedder(client, model="m", dimensions=2)
+    vectors = await embed_in_batches(embedder, [f"t{i}" for i in range(5)], batch_size=2)
+    assert vectors.shape == (5, 2)
+    assert client.embeddings.create.await_count == 3
+    assert np.allclose(np.linalg.norm(vectors, axis=1), 1)
@@ -0,0 +1,128 @@
+import asyncio
+import os
+import time
+import pytest
+import pytest_asyncio
+from openai import AsyncOpenAI
+from backend.services.llm_providers import LocalProvider, OpenAIProvider, ProviderError, local_provider
+from backend.testing.fake_openai import deterministic_reply
+
+def echo_engine(path: str, messages: list, params: dict, stream=None, stop=None) -> dict:
+    """Stand-in for llama.cpp: echoes the question from the worker process."""
+    question = messages[-1]["content"]
+    if question == "fail":
+        raise ProviderError("engine failed")
+    if question == "slow":
+        time.sleep(0.3)
+    content = f"{os.path.basename(path)} in {os.getpid()}: {question}"
+    if question == "endless":
+        # Generates for a minute unless stopped
+        content = " ".join(["word"] * 6000)
+    pieces = []
+    for i, word in enumerate(content.split(" ")):
+        if stop is not None and stop.is_set():
+            break
+        if question == "endless":
+            time.sleep(0.01)
+        pieces.append(word if i == 0 else f" {word}")
+        if stream is not None:
+            stream.put(pieces[-1])
+    if stream is not None:
+        stream.put(None)
+    return {"content": "".join(pieces), "prompt_tokens": len(question.split()), "completion_tokens": len(pieces)}
+
+@pytest.fixture(scope="module")
+def model_dir(tmp_path_factory):
+    path = tmp_path_factory.mktemp("models")
+    (path / "tiny.gguf").write_bytes(b"GGUF")
+    return path
+
+@pytest_asyncio.fixture
+async def provider(model_dir):
+    provider = LocalProvider(str(model_dir), workers=1, engine=echo_engine)
+    yield provider
+    await provider.close()
+
+@pytest.mark.asyncio
+async def test_local_chat_runs_in_a_worker_process(provider: LocalProvider):
+    reply = await provider.chat("tiny", [{"role": "user", "content": "hello"}])
+    content, _, question = reply.content.partition(": ")
+    assert content.startswith("tiny.gguf in ") and int(content.rsplit(" ", 1)[1]) != os.getpid()
+    assert question == "hello"
+    assert (reply.model, reply.prompt_tokens) == ("local/tiny", 1)
+
+@pytest.mark.asyncio
+async def test_local_inference_does_not_block_the_event_loop(provider: LocalProvider):
+    await provider.chat("tiny", [{"role": "user", "content": "warm up"}])
+    ticks = 0
+
+    async def ticker():
+        nonlocal ticks
+        while True:
+            await asyncio.sleep(0.01)
+            ticks += 1
+
+    task = asyncio.create_task(ticker())
+    await provider.chat("tiny", [{"role": "user", "content": "slow"}])
+    task.cancel()
+    assert ticks >= 10
+
+@pytest.mark.asyncio
+async def test_local_streaming(provider: LocalProvider):
+    pieces = [piece async for piece in provider.stream_chat("tiny", [{"role": "user", "content": "one two"}])]
+    assert len(pieces) > 3
+    assert "".join(pieces).endswith(": one two")
+
+    with pytest.raises(ProviderError):
+        async for _ in provider.stream_chat("tiny", [{"role": "user", "content": "fail"}]):
+            pass
+
+@pytest.mark.asyncio
+async def test_abandoned_stream_frees_the_worker(provider: LocalProvider):
+    stream = provider.stream_chat("tiny", [{"role": "user", "content": "endless"}])
+    assert await stream.__anext__() == "word"
+    await stream.aclose()
+    # The only worker is free again well before the endless reply would end
+    reply = await asyncio.wait_for(provider.chat("tiny", [{"role": "user", "content": "next"}]), timeout=10)
+    assert reply.content.endswith(": next")
+
+@pytest.mark.asyncio
+async def test_timed_out_chat_frees_the_worker(provider: LocalProvider):
+    with pytest.raises(asyncio.TimeoutError):
+        await asyncio.wait_for(provider.chat("tiny", [{"role": "user", "content": "endless"}]), timeout=1)
+    reply = await asyncio.wait_for(provider.chat("tiny", [{"role": "user", "content": "next"}]), timeout=10)
+    assert reply.content.endswith(": next")
+
+@pytest.mark.asyncio
+async def test_local_models_are_confined_to_the_model_dir(provider: LocalProvider):
+    for name in ("missing", "../tiny", ".hidden", ""):
+        with pytest.raises(ProviderError):
+            await provider.chat(name, [{"role": "user", "content": "hi"}])
+    with pytest.raises(ProviderError):
+        await provider.transcribe(b"audio", "a.mp3", "tiny")
+
+def test_agent_selects_the_local_model(mock_openai, make_agent, make_session, send_message, model_dir, monkeypatch):
+    monkeypatch.setattr(local_provider, "model_dir", str(model_dir))
+    monkeypatch.setattr(local_provider, "engine", echo_engine)
+    openai = mock_openai()
+    try:
+        session_id = make_session(make_agent("FAQ", chat_model="local/tiny"))
+        reply = send_message(session_id, "Opening hours?")
+    finally:
+        asyncio.run(local_provider.close())
+    assert reply["content"].endswith(": Opening hours?")
+    assert reply["model"] == "local/tiny"
+    openai.chat.completions.create.assert_not_awaited()
+
+def test_missing_local_model_falls_back(make_agent, make_session, send_message):
+    agent_id = make_agent("FAQ", chat_model="local/missing", fallback_models=["gpt-3.5-turbo"])
+    reply = send_message(make_session(agent_id), "Hi")
+    assert (reply["content"], reply["model"]) == ("Mocked response", "gpt-3.5-turbo")
+
+@pytest.mark.asyncio
+async def test_openai_streaming_matches_the_reply(fake_openai):
+    client = AsyncOpenAI(base_url=fake_openai.url, api_key="test-key")
+    messages = [{"role": "user", "content": "Hi"}]
+    pieces = [piece async for piece in OpenAIProvider(client).stream_chat("gpt-3.5-turbo", messages)]
+    assert "".join(pieces) == deterministic_reply(fake_openai.config, "gpt-3.5-turbo", messages)
+    await client.close()
@@ -0,0 +1,92 @@
+import asyncio
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import select
+from sqlalchemy.exc import NoResultFound
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from backend.api.dependencies import get_message_writer
+from backend.main import app
+from backend.models.chat import ChatSession, Message
+from backend.models.usage import UserDailyUsage
+from backend.services.message_writer import MessageWriter
+from backend.utils.query_monitor import count_queries
+
+def _writer(db_session: AsyncSession, **kwargs) -> MessageWriter:
+    return MessageWriter(async_sessionmaker(db_session.bind, expire_on_commit=False), **kwargs)
+
+def _row(session_id: int, i: int) -> dict:
+    return {"session_id": session_id, "content": f"m{i}", "is_user": True}
+
+@pytest.mark.asyncio
+async def test_group_commit_batches_concurrent_writes(make_session, db_session: AsyncSession):
+    session_id = make_session()
+    writer = _writer(db_session, mode="group", max_delay_ms=50)
+
+    with count_queries(db_session.bind) as stats:
+        rows = await asyncio.gather(*(writer.add(db_session, _row(session_id, i)) for i in range(20)))
+    # One version bump and one transaction for all twenty messages
+    assert sum(n for statement, n in stats.statements.items() if statement.startswith("UPDATE")) == 1
+    assert writer.stats() == {"mode": "group", "pending": 0, "batches": 1, "rows_written": 20}
+
+    result = await db_session.execute(select(Message.id, Message.version).order_by(Message.version))
+    assert [tuple(r) for r in result.all()] == [(row["id"], row["version"]) for row in rows]
+    assert [row["version"] for row in rows] == list(range(1, 21))
+
+@pytest.mark.asyncio
+async def test_group_commit_respects_max_batch(make_session, db_session: AsyncSession):
+    session_id = make_session()
+    writer = _writer(db_session, mode="group", max_batch=5, max_delay_ms=50)
+    await asyncio.gather(*(writer.add(db_session, _row(session_id, i)) for i in range(12)))
+    assert writer.batches == 3
+    assert writer.rows_written == 12
+
+@pytest.mark.asyncio
+async def test_failing_write_does_not_fail_the_batch(make_session, db_session: AsyncSession):
+    session_id = make_session()
+    writer = _writer(db_session, mode="group", max_delay_ms=50)
+    results = await asyncio.gather(
+        writer.add(db_session, _row(session_id, 0)),
+        writer.add(db_session, _row(session_id + 100, 1)),
+        writer.add(db_session, _row(session_id, 2)),
+        return_exceptions=True,
+    )
+    # The session does not exist
+    assert isinstance(results[1], NoResultFound)
+    assert [row["content"] for row in (results[0], results[2])] == ["m0", "m2"]
+    messages = (await db_session.execute(select(Message.content).order_by(Message.id))).scalars().all()
+    assert messages == ["m0", "m2"]
+
+@pytest.mark.asyncio
+async def test_stop_flushes_pending_writes(make_session, db_session: AsyncSession):
+    session_id = make_session()
+    writer = _writer(db_session, mode="group", max_delay_ms=10_000)
+    tasks = [asyncio.create_task(writer.add(db_session, _row(session_id, i))) for i in range(3)]
+    await asyncio.sleep(0)
+    assert writer.stats()["pending"] == 3
+    await writer.stop()
+    await asyncio.gather(*tasks)
+    assert writer.rows_written == 3
+
+@pytest.mark.asyncio
+async def test_send_message_in_group_mode(
+    client: TestClient, auth_headers: dict, make_session, send_message, db_session: AsyncSession
+):
+    session_id = make_session()
+    writer = _writer(db_session, mode="group", max_delay_ms=1)
+    app.dependency_overrides[get_message_writer] = lambda: writer
+
+    reply = send_message(session_id)
+    assert reply["content"] == "Mocked response"
+    assert reply["agent_name"] == "A"
+    assert writer.rows_written == 2
+
+    db_session.expire_all()
+    messages = client.get(f"/api/sessions/{session_id}/messages", headers=auth_headers).json()
+    assert [m["content"] for m in messages] == ["Hello", "Mocked response"]
+    assert messages[1]["id"] == reply["id"]
+    assert (await db_session.execute(select(ChatSession.messages_version))).scalar() == 2
+    assert (await db_session.execute(select(UserDailyUsage.turns))).scalar() == 1
+
+def test_unknown_mode_is_rejected():
+    with pytest.raises(ValueError):
+        MessageWriter(None, mode="eventually")
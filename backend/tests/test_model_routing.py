@@ -0,0 +1,125 @@
+import asyncio
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+from openai import APIConnectionError
+from backend.services.model_router import ModelRouter, model_router
+
+SETTINGS = {
+    "chat_model": "gpt-4o-mini",
+    "fallback_models": ["gpt-3.5-turbo"],
+    "temperature": 0.2,
+    "max_tokens": 300,
+    "chat_timeout_seconds": 0.2,
+    "tts_model": "tts-1-hd",
+    "tts_voice": "nova",
+    "stt_model": "whisper-2",
+}
+
+@pytest.fixture(autouse=True)
+def clear_router():
+    model_router.clear()
+    yield
+    model_router.clear()
+
+def _models(slow_models=(), failing_models=()):
+    async def create(model, messages, **params):
+        if model in slow_models:
+            await asyncio.sleep(5)
+        if model in failing_models:
+            raise APIConnectionError(request=httpx.Request("POST", "http://upstream"))
+        return f"Reply from {model}"
+    return create
+
+def test_settings_are_stored_and_can_be_reset(client: TestClient, auth_headers: dict):
+    agent = client.post("/api/agents/", json={"name": "A", "prompt": "P", **SETTINGS}, headers=auth_headers).json()
+    assert {key: agent[key] for key in SETTINGS} == SETTINGS
+    listed = client.get("/api/agents/", headers=auth_headers).json()
+    assert listed[0]["fallback_models"] == ["gpt-3.5-turbo"]
+
+    updated = client.patch(
+        f"/api/agents/{agent['id']}", json={"chat_model": None, "temperature": 1.0}, headers=auth_headers
+    ).json()
+    assert (updated["chat_model"], updated["temperature"], updated["max_tokens"]) == (None, 1.0, 300)
+
+    invalid = client.post("/api/agents/", json={"name": "A", "prompt": "P", "temperature": 3}, headers=auth_headers)
+    assert invalid.status_code == 422
+
+def test_chat_uses_the_agent_settings(mock_openai, make_agent, make_session, send_message):
+    openai = mock_openai(_models())
+    session_id = make_session(make_agent(**SETTINGS))
+    reply = send_message(session_id)
+    kwargs = openai.chat.completions.create.await_args.kwargs
+    assert (kwargs["model"], kwargs["temperature"], kwargs["max_tokens"]) == ("gpt-4o-mini", 0.2, 300)
+    assert reply["model"] == "gpt-4o-mini"
+
+def test_defaults_send_no_sampling_parameters(mock_openai, make_session, send_message):
+    openai = mock_openai(_models())
+    send_message(make_session())
+    kwargs = openai.chat.completions.create.await_args.kwargs
+    assert kwargs["model"] == "gpt-3.5-turbo"
+    assert "temperature" not in kwargs and "max_tokens" not in kwargs
+
+def test_timeout_falls_back_to_the_next_model(mock_openai, make_agent, make_session, send_message):
+    openai = mock_openai(_models(slow_models={"gpt-4o-mini"}))
+    session_id = make_session(make_agent(**SETTINGS))
+    reply = send_message(session_id)
+    assert reply["content"] == "Reply from gpt-3.5-turbo"
+    assert reply["model"] == "gpt-3.5-turbo"
+    assert [call.kwargs["model"] for call in openai.chat.completions.create.await_args_list] == ["gpt-4o-mini", "gpt-3.5-turbo"]
+    assert {h.model: h.error_rate for h in model_router.stats()} == {"gpt-4o-mini": 1.0, "gpt-3.5-turbo": 0.0}
+
+def test_unhealthy_model_is_routed_around(mock_openai, make_agent, make_session, send_message):
+    openai = mock_openai(_models(failing_models={"gpt-4o-mini"}))
+    session_id = make_session(make_agent(**SETTINGS))
+    for _ in range(model_router.min_samples + 1):
+        assert send_message(session_id)["model"] == "gpt-3.5-turbo"
+    # Once the window marks the primary as failing it is not tried first anymore
+    models = [call.kwargs["model"] for call in openai.chat.completions.create.await_args_list]
+    assert models[-1:] == ["gpt-3.5-turbo"]
+    assert models.count("gpt-4o-mini") == model_router.min_samples
+
+def test_last_model_failure_is_an_error(client: TestClient, auth_headers: dict, mock_openai, make_agent, make_session):
+    mock_openai(_models(failing_models={"gpt-4o-mini", "gpt-3.5-turbo"}))
+    session_id = make_session(make_agent(**SETTINGS))
+    response = client.post(f"/api/sessions/{session_id}/messages", json={"content": "Hi"}, headers=auth_headers)
+    assert response.status_code >= 400
+
+def test_voice_uses_the_agent_speech_settings(
+    client: TestClient, auth_headers: dict, mock_openai, make_agent, make_session, tmp_path, monkeypatch
+):
+    # Audio files are written relative to the working directory
+    (tmp_path / "backend" / "static").mkdir(parents=True)
+    monkeypatch.chdir(tmp_path)
+    openai = mock_openai(_models())
+    session_id = make_session(make_agent(**SETTINGS))
+    response = client.post(
+        f"/api/sessions/{session_id}/voice", files={"audio": ("a.mp3", b"audio", "audio/mpeg")}, headers=auth_headers
+    )
+    assert response.status_code == 200
+    assert openai.audio.transcriptions.create.await_args.kwargs["model"] == "whisper-2"
+    speech = openai.audio.speech.create.await_args.kwargs
+    assert (speech["model"], speech["voice"]) == ("tts-1-hd", "nova")
+
+def test_router_orders_by_error_rate_and_latency_budget():
+    now = [0.0]
+    router = ModelRouter(window_seconds=60, min_samples=3, max_error_rate=0.5, clock=lambda: now[0])
+    for _ in range(3):
+        router.record("cheap", 900, ok=True)
+        router.record("fast", 100, ok=True)
+    assert router.order(["cheap", "fast"]) == ["cheap", "fast"]
+    # Over the latency target the cheap model goes last
+    assert router.order(["cheap", "fast"], max_latency_ms=500) == ["fast", "cheap"]
+    for _ in range(4):
+        router.record("fast", 100, ok=False)
+    assert router.order(["fast", "cheap", "fast"]) == ["cheap", "fast"]
+    # Old samples leave the window and the model is tried again
+    now[0] = 120
+    assert router.order(["fast", "cheap"]) == ["fast", "cheap"]
+
+def test_admin_reports_model_health(client: TestClient, mock_openai, make_session, send_message, monkeypatch):
+    monkeypatch.setenv("ADMIN_TOKEN", "admin-secret")
+    mock_openai(_models())
+    send_message(make_session())
+    stats = client.get("/api/admin/models", headers={"X-Admin-Token": "admin-secret"}).json()
+    assert [(s["model"], s["samples"], s["healthy"]) for s in stats] == [("gpt-3.5-turbo", 1, True)]
@@ -0,0 +1,71 @@
+import pytest
+from fastapi.testclient import TestClient
+from backend.main import app
+from backend.utils import profiling
+from backend.utils.profiling import ProfilingMiddleware
+
+ADMIN_HEADERS = {"X-Admin-Token": "admin-secret"}
+
+@pytest.fixture
+def profile_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILE_DIR", str(tmp_path))
+    monkeypatch.setenv("ADMIN_TOKEN", "admin-secret")
+    return tmp_path
+
+@pytest.fixture
+def profiled_client(client, profile_dir):
+    # client installs the dependency overrides; wrap the same app with a configured middleware
+    return TestClient(ProfilingMiddleware(app, token="profile-secret", directory=str(profile_dir), max_files=3))
+
+@pytest.mark.asyncio
+async def test_unprivileged_request_is_not_profiled(profiled_client: TestClient, auth_headers: dict, profile_dir):
+    response = profiled_client.get("/api/agents/", headers=auth_headers)
+    assert response.status_code == 200
+    assert "x-profile-id" not in response.headers
+
+    response = profiled_client.get("/api/agents/", headers={**auth_headers, "X-Profile": "wrong"})
+    assert "x-profile-id" not in response.headers
+    assert list(profile_dir.iterdir()) == []
+
+@pytest.mark.asyncio
+async def test_privileged_request_is_profiled_and_listed(profiled_client: TestClient, auth_headers: dict, profile_dir):
+    response = profiled_client.get(
+        "/api/agents/", headers={**auth_headers, "X-Profile": "profile-secret"}
+    )
+    assert response.status_code == 200
+    name = response.headers["x-profile-id"]
+    assert (profile_dir / name).exists()
+
+    listing = profiled_client.get("/api/admin/profiles", headers=ADMIN_HEADERS)
+    assert listing.status_code == 200
+    assert [p["name"] for p in listing.json()] == [name]
+
+    summary = profiled_client.get(f"/api/admin/profiles/{name}?format=text", headers=ADMIN_HEADERS)
+    assert summary.status_code == 200
+    assert "function calls" in summary.text
+
+    raw = profiled_client.get(f"/api/admin/profiles/{name}", headers=ADMIN_HEADERS)
+    assert raw.status_code == 200
+    assert raw.content
+
+@pytest.mark.asyncio
+async def test_profile_directory_is_bounded(profiled_client: TestClient, auth_headers: dict, profile_dir):
+    for _ in range(5):
+        profiled_client.get("/api/agents/", headers={**auth_headers, "X-Profile": "profile-secret"})
+    assert len(list(profile_dir.glob("*.pstats"))) == 3
+
+@pytest.mark.asyncio
+async def test_sampled_requests_are_profiled(client, auth_headers: dict, profile_dir):
+    sampled = TestClient(ProfilingMiddleware(app, token=None, sample_rate=1.0, directory=str(profile_dir)))
+    response = sampled.get("/api/agents/", headers=auth_headers)
+    assert "x-profile-id" in response.headers
+
+@pytest.mark.asyncio
+async def test_admin_endpoints_require_token(client: TestClient, profile_dir):
+    assert client.get("/api/admin/profiles").status_code == 403
+    assert client.get("/api/admin/profiles", headers={"X-Admin-Token": "wrong"}).status_code == 403
+    assert client.get("/api/admin/profiles/../../etc/passwd", headers=ADMIN_HEADERS).status_code == 404
+
+def test_profile_id_is_exposed_to_browsers(client: TestClient):
+    response = client.get("/", headers={"Origin": "http://localhost:3000"})
+    assert "X-Profile-Id" in response.headers["access-control-expose-headers"]
@@ -0,0 +1,94 @@
+import json
+import logging
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from backend.utils import query_monitor
+from backend.utils.query_monitor import QueryStatsMiddleware, redact_params
+
+def _events(caplog, name: str) -> list:
+    events = []
+    for record in caplog.records:
+        try:
+            payload = json.loads(record.getMessage())
+        except ValueError:
+            continue
+        if payload.get("event") == name:
+            events.append(payload)
+    return events
+
+def test_redact_params_hides_values():
+    assert redact_params({"username": "alice", "id": 3}, log_values=False) == {"username": "<str>", "id": "<int>"}
+    assert redact_params(("alice", 3), log_values=False) == ["<str>", "<int>"]
+    assert redact_params([("a",), ("b",)], log_values=False) == {"rows": 2, "first": ["<str>"]}
+
+@pytest.mark.asyncio
+async def test_slow_query_is_logged_with_redacted_params(db_session: AsyncSession, caplog, monkeypatch):
+    monkeypatch.setattr(query_monitor, "SLOW_QUERY_MS", 0.0)
+    with caplog.at_level(logging.WARNING, logger=query_monitor.__name__):
+        await db_session.execute(text("SELECT :secret AS value"), {"secret": "hunter2"})
+
+    events = _events(caplog, "slow_query")
+    assert events
+    assert events[-1]["statement"] == "SELECT ? AS value"
+    assert "hunter2" not in json.dumps(events[-1])
+
+@pytest.mark.asyncio
+async def test_slow_query_sampling(db_session: AsyncSession, caplog, monkeypatch):
+    monkeypatch.setattr(query_monitor, "SLOW_QUERY_MS", 0.0)
+    monkeypatch.setattr(query_monitor, "SLOW_QUERY_SAMPLE_RATE", 0.0)
+    with caplog.at_level(logging.WARNING, logger=query_monitor.__name__):
+        await db_session.execute(text("SELECT 1"))
+    assert not _events(caplog, "slow_query")
+
+@pytest.mark.asyncio
+async def test_n_plus_one_is_flagged(db_session: AsyncSession, caplog):
+    async def app(scope, receive, send):
+        for i in range(6):
+            await db_session.execute(text("SELECT :i"), {"i": i})
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    async def receive():
+        return {"type": "http.request"}
+
+    async def send(message):
+        pass
+
+    middleware = QueryStatsMiddleware(app, threshold=5)
+    with caplog.at_level(logging.WARNING, logger=query_monitor.__name__):
+        await middleware({"type": "http", "method": "GET", "path": "/loop"}, receive, send)
+
+    events = _events(caplog, "n_plus_one")
+    assert len(events) == 1
+    assert events[0]["path"] == "/loop"
+    assert events[0]["count"] == 6
+
+@pytest.mark.asyncio
+async def test_list_agents_query_budget(client: TestClient, auth_headers: dict, make_agent, query_budget):
+    for i in range(5):
+        make_agent(f"Agent{i}")
+
+    # User lookup + one agent query, independent of the number of agents
+    with query_budget(2, max_repeats=1):
+        response = client.get("/api/agents/", headers=auth_headers)
+    assert response.status_code == 200
+
+@pytest.mark.asyncio
+async def test_get_messages_query_budget(
+    client: TestClient, auth_headers: dict, make_session, send_message, query_budget
+):
+    session_id = make_session()
+    for i in range(3):
+        send_message(session_id, f"m{i}")
+
+    with query_budget(3, max_repeats=1):
+        response = client.get(f"/api/sessions/{session_id}/messages", headers=auth_headers)
+    assert response.status_code == 200
+
+@pytest.mark.asyncio
+async def test_query_budget_fails_when_exceeded(client: TestClient, auth_headers: dict, query_budget):
+    with pytest.raises(pytest.fail.Exception, match="Query budget exceeded"):
+        with query_budget(0):
+            client.get("/api/agents/", headers=auth_headers)
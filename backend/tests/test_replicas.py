@@ -0,0 +1,110 @@
+import asyncio
+import pytest
+import pytest_asyncio
+from fastapi.testclient import TestClient
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from backend.api import dependencies
+from backend.models.agent import Agent
+from backend.models.base import Base
+from backend.models.user import User
+from backend.utils.database import EngineSettings, ReplicaRouter, create_engine_from_settings
+
+@pytest_asyncio.fixture
+async def replica_engine(tmp_path):
+    engine = create_engine_from_settings(EngineSettings(f"sqlite+aiosqlite:///{tmp_path}/replica.db"))
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    yield engine
+    await engine.dispose()
+
+@pytest.fixture
+def lag():
+    return {"seconds": 0.0}
+
+@pytest.fixture
+def router(replica_engine, lag, monkeypatch):
+    async def probe(engine):
+        return lag["seconds"]
+
+    router = ReplicaRouter([replica_engine], max_lag_seconds=5, check_interval=0, read_your_writes_seconds=60, lag_probe=probe)
+    monkeypatch.setattr(dependencies, "read_router", router)
+    monkeypatch.setattr("backend.utils.database.read_router", router)
+    return router
+
+async def _seed_replica(replica_engine, user_id: int, name: str):
+    async with AsyncSession(replica_engine) as session:
+        # The replica enforces foreign keys, the owner has to be replicated too
+        session.add(User(id=user_id, username=f"user{user_id}", password_hash="x"))
+        session.add(Agent(name=name, prompt="Replica prompt", user_id=user_id))
+        await session.commit()
+
+def _names(client: TestClient, headers: dict) -> list:
+    response = client.get("/api/agents/", headers=headers)
+    assert response.status_code == 200
+    return [agent["name"] for agent in response.json()]
+
+@pytest.mark.asyncio
+async def test_reads_go_to_replica(client: TestClient, auth_headers: dict, router, replica_engine):
+    await _seed_replica(replica_engine, user_id=1, name="FromReplica")
+    assert _names(client, auth_headers) == ["FromReplica"]
+
+@pytest.mark.asyncio
+async def test_read_your_writes_stays_on_primary(
+    client: TestClient, auth_headers: dict, make_agent, router, replica_engine
+):
+    await _seed_replica(replica_engine, user_id=1, name="FromReplica")
+    make_agent("FromPrimary")
+    assert _names(client, auth_headers) == ["FromPrimary"]
+
+@pytest.mark.asyncio
+async def test_lagging_replica_falls_back_to_primary(
+    client: TestClient, auth_headers: dict, router, replica_engine, lag
+):
+    await _seed_replica(replica_engine, user_id=1, name="FromReplica")
+    lag["seconds"] = 30.0
+    assert _names(client, auth_headers) == []
+    lag["seconds"] = 0.0
+    assert _names(client, auth_headers) == ["FromReplica"]
+
+@pytest.mark.asyncio
+async def test_statement_writes_count_for_read_your_writes(router, db_session: AsyncSession):
+    # Bulk UPDATE/DELETE/INSERT statements do not flush, they are noted as they run
+    db_session.info["user_id"] = 7
+    await db_session.execute(select(User).where(User.id == 0))
+    assert await router.pick(user_id=7) is not None
+    await db_session.execute(update(User).where(User.id == 0).values(username="nobody"))
+    assert await router.pick(user_id=7) is None
+
+@pytest.mark.asyncio
+async def test_consistency_header_forces_primary(client: TestClient, auth_headers: dict, router, replica_engine):
+    await _seed_replica(replica_engine, user_id=1, name="FromReplica")
+    assert _names(client, {**auth_headers, "X-Read-Consistency": "primary"}) == []
+
+@pytest.mark.asyncio
+async def test_failed_probe_marks_replica_unhealthy(replica_engine):
+    async def probe(engine):
+        raise ConnectionError("replica down")
+
+    router = ReplicaRouter([replica_engine], check_interval=0, lag_probe=probe)
+    assert await router.pick(user_id=1) is None
+    assert router.status()[0]["healthy"] is False
+
+@pytest.mark.asyncio
+async def test_expired_writers_are_pruned(replica_engine):
+    router = ReplicaRouter([replica_engine], read_your_writes_seconds=0.2)
+    router.note_write(1)
+    router.note_write(2)
+    await asyncio.sleep(0.1)
+    router.note_write(1)
+    await asyncio.sleep(0.15)
+    router.note_write(3)
+    # 2 expired, 1 was renewed
+    assert list(router._recent_writers) == [1, 3]
+
+@pytest.mark.asyncio
+async def test_no_replicas_configured():
+    router = ReplicaRouter([])
+    router.note_write(1)
+    assert not router.enabled
+    assert await router.pick(user_id=1) is None
@@ -0,0 +1,95 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import delete
+from sqlalchemy.ext.asyncio import AsyncSession
+from backend.models.chat import Message
+from backend.services.archive_service import archive_session, restore_session
+from backend.services.search_service import fts5_query, highlight, HIGHLIGHT_END, HIGHLIGHT_START
+
+def _search(client: TestClient, headers: dict, **params) -> dict:
+    response = client.get("/api/search/messages", params=params, headers=headers)
+    assert response.status_code == 200
+    return response.json()
+
+def test_search_ranks_and_highlights(client: TestClient, auth_headers: dict, make_session, send_message):
+    session_id = make_session()
+    send_message(session_id, "My invoice is wrong")
+    send_message(session_id, "Invoice, invoice, where is my invoice?")
+    send_message(session_id, "Unrelated question")
+
+    items = _search(client, auth_headers, q="invoice")["items"]
+    assert [item["snippet"] for item in items] == [
+        "<mark>Invoice</mark>, <mark>invoice</mark>, where is my <mark>invoice</mark>?",
+        "My <mark>invoice</mark> is wrong",
+    ]
+    assert items[0]["score"] > items[1]["score"]
+    assert items[0]["agent_name"] == "A"
+    assert items[0]["session_id"] == session_id
+    assert items[0]["is_user"] is True
+
+def test_search_stems_and_requires_all_words(client: TestClient, auth_headers: dict, make_session, send_message):
+    session_id = make_session()
+    send_message(session_id, "The payments failed twice")
+    assert len(_search(client, auth_headers, q="payment failing")["items"]) == 1
+    assert _search(client, auth_headers, q="payment refund")["items"] == []
+
+def test_search_is_scoped_to_the_caller(
+    client: TestClient, auth_headers: dict, other_auth_headers: dict, make_agent, make_session, send_message
+):
+    agent_id = make_agent()
+    send_message(make_session(agent_id), "shared secret")
+    send_message(make_session(make_agent("B")), "secret plans")
+    assert len(_search(client, auth_headers, q="secret")["items"]) == 2
+    assert [i["agent_id"] for i in _search(client, auth_headers, q="secret", agent_id=agent_id)["items"]] == [agent_id]
+
+    assert _search(client, other_auth_headers, q="secret")["items"] == []
+
+def test_search_pages_with_a_cursor(client: TestClient, auth_headers: dict, make_session, send_message):
+    session_id = make_session()
+    for i in range(5):
+        send_message(session_id, "ticket " + "ticket " * i)
+
+    seen, cursor = [], None
+    while True:
+        params = {"q": "ticket", "limit": 2} if cursor is None else {"q": "ticket", "limit": 2, "cursor": cursor}
+        page = _search(client, auth_headers, **params)
+        seen += page["items"]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert len(seen) == 5
+    assert len({item["id"] for item in seen}) == 5
+    scores = [item["score"] for item in seen]
+    assert scores == sorted(scores, reverse=True)
+
+def test_search_escapes_content_and_operators(client: TestClient, auth_headers: dict, make_session, send_message):
+    session_id = make_session()
+    send_message(session_id, "<script>alert(1)</script> NEAR me")
+    items = _search(client, auth_headers, q='script" NEAR(')["items"]
+    assert items[0]["snippet"] == "&lt;<mark>script</mark>&gt;alert(1)&lt;/<mark>script</mark>&gt; <mark>NEAR</mark> me"
+    assert _search(client, auth_headers, q="***")["items"] == []
+
+@pytest.mark.asyncio
+async def test_index_follows_deletes_and_archiving(
+    client: TestClient, auth_headers: dict, make_session, send_message, db_session: AsyncSession
+):
+    session_id = make_session()
+    send_message(session_id, "archived words")
+    assert len(_search(client, auth_headers, q="archived")["items"]) == 1
+
+    await archive_session(db_session, session_id)
+    await db_session.commit()
+    assert _search(client, auth_headers, q="archived")["items"] == []
+
+    assert await restore_session(db_session, session_id) == 2
+    await db_session.commit()
+    assert await restore_session(db_session, session_id) == 0
+    assert len(_search(client, auth_headers, q="archived")["items"]) == 1
+
+    await db_session.execute(delete(Message))
+    await db_session.commit()
+    assert _search(client, auth_headers, q="archived")["items"] == []
+
+def test_helpers():
+    assert fts5_query('say "hi" OR bye*') == '"say" "hi" "OR" "bye"'
+    assert highlight(f"a<b {HIGHLIGHT_START}c{HIGHLIGHT_END}") == "a&lt;b <mark>c</mark>"
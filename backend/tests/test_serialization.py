@@ -0,0 +1,34 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from backend.api.schemas.chat import MessageResponse, ChatSessionResponse
+from backend.api.schemas.agent import AgentResponse
+from backend.benchmarks import serialization
+from backend.models.agent import Agent
+from backend.models.chat import ChatSession, Message
+
+@pytest.mark.asyncio
+async def test_fast_path_matches_response_models(
+    client: TestClient, auth_headers: dict, make_session, send_message, db_session: AsyncSession
+):
+    session_id = make_session()
+    send_message(session_id)
+
+    messages = (await db_session.execute(select(Message).order_by(Message.created_at))).scalars().all()
+    expected = [MessageResponse.model_validate(m).model_dump(mode="json") for m in messages]
+    assert client.get(f"/api/sessions/{session_id}/messages", headers=auth_headers).json() == expected
+
+    agents = (await db_session.execute(select(Agent))).scalars().all()
+    expected = [AgentResponse.model_validate(a).model_dump(mode="json") for a in agents]
+    assert client.get("/api/agents/", headers=auth_headers).json() == expected
+
+    sessions = (await db_session.execute(select(ChatSession))).scalars().all()
+    expected = [ChatSessionResponse.model_validate(s).model_dump(mode="json") for s in sessions]
+    assert client.get("/api/sessions/", headers=auth_headers).json() == expected
+
+@pytest.mark.asyncio
+async def test_serialization_microbenchmark_smoke():
+    results = await serialization.run([50], repeat=1)
+    assert results["50"]["before"]["rows_per_s"] > 0
+    assert results["50"]["after"]["rows_per_s"] > 0
@@ -0,0 +1,73 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy.ext.asyncio import AsyncSession
+from backend.services.archive_service import archive_session
+from backend.services.message_writer import message_preview
+
+def _overview(client: TestClient, headers: dict, **params) -> dict:
+    response = client.get("/api/sessions/overview", params=params, headers=headers)
+    assert response.status_code == 200
+    return response.json()
+
+def test_overview_counts_and_previews(client: TestClient, auth_headers: dict, make_agent, make_session, send_message, query_budget):
+    agent_id = make_agent()
+    quiet = make_session(agent_id)
+    busy = make_session(agent_id)
+    for _ in range(3):
+        send_message(busy)
+
+    with query_budget(2):
+        page = _overview(client, auth_headers)
+    assert [item["id"] for item in page["items"]] == [busy, quiet]
+    assert page["next_cursor"] is None
+    first, second = page["items"]
+    assert first["agent_name"] == "A"
+    assert first["message_count"] == 6
+    assert first["last_message_preview"] == "Mocked response"
+    assert first["last_message_at"] is not None
+    assert second["message_count"] == 0
+    assert second["last_message_at"] is None
+
+def test_overview_is_scoped_to_the_caller(client: TestClient, auth_headers: dict, other_auth_headers: dict, make_agent, make_session):
+    agent_id = make_agent()
+    make_session(agent_id)
+    # Another user's token sees nothing
+    assert _overview(client, other_auth_headers)["items"] == []
+    assert len(_overview(client, auth_headers, agent_id=agent_id)["items"]) == 1
+
+def test_overview_pages_with_a_cursor(client: TestClient, auth_headers: dict, make_agent, make_session, send_message):
+    agent_id = make_agent()
+    session_ids = [make_session(agent_id) for _ in range(5)]
+    send_message(session_ids[0])
+
+    seen, cursor = [], None
+    while True:
+        params = {"limit": 2} if cursor is None else {"limit": 2, "cursor": cursor}
+        page = _overview(client, auth_headers, **params)
+        seen += [item["id"] for item in page["items"]]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    # The session with a message is the most recently active one
+    assert seen == [session_ids[0]] + session_ids[:0:-1]
+
+def test_invalid_cursor_is_rejected(client: TestClient, auth_headers: dict):
+    response = client.get("/api/sessions/overview", params={"cursor": "nonsense"}, headers=auth_headers)
+    assert response.status_code == 400
+
+@pytest.mark.asyncio
+async def test_archived_sessions_keep_their_counts(
+    client: TestClient, auth_headers: dict, db_session: AsyncSession, make_session, send_message
+):
+    session_id = make_session()
+    send_message(session_id)
+    assert await archive_session(db_session, session_id) == 2
+    await db_session.commit()
+
+    item = _overview(client, auth_headers)["items"][0]
+    assert item["message_count"] == 2
+    assert item["last_message_preview"] == "Mocked response"
+
+def test_message_preview_is_truncated():
+    assert message_preview("short", 10) == "short"
+    assert message_preview("a" * 20, 10) == "a" * 9 + "…"
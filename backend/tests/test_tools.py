@@ -0,0 +1,169 @@
+import asyncio
+import time
+import orjson
+import pytest
+from types import SimpleNamespace
+from fastapi.testclient import TestClient
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from backend.models.tool_call import ToolCall
+from backend.services import tool_service
+from backend.services.llm_providers import ToolCallRequest
+from backend.services.tool_service import (
+    TOOL_KINDS, HttpTool, ToolContext, ToolError, ToolKind, ToolResultCache, evaluate, run_tool_calls
+)
+
+def _call(call_id: str, name: str, arguments: dict) -> SimpleNamespace:
+    return SimpleNamespace(id=call_id, function=SimpleNamespace(name=name, arguments=orjson.dumps(arguments).decode()))
+
+def _tool_turns(*turns):
+    """Answers with the tool calls of ``turns`` one turn after the other, then with the tool results it was sent."""
+    remaining = list(turns)
+
+    async def create(model, messages, **params):
+        if remaining:
+            message = SimpleNamespace(content=None, tool_calls=remaining.pop(0))
+        else:
+            results = [m["content"] for m in messages if m["role"] == "tool"]
+            message = SimpleNamespace(content=f"Results: {', '.join(results)}", tool_calls=None)
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=message)],
+            model=model,
+            usage=SimpleNamespace(prompt_tokens=10, completion_tokens=2),
+        )
+    return create
+
+CALCULATOR = {"name": "calc", "kind": "calculator", "description": "Arithmetic"}
+
+@pytest.mark.asyncio
+async def test_tool_calls_are_run_and_recorded(
+    client: TestClient, db_session: AsyncSession, mock_openai, make_agent, make_session, send_message, monkeypatch
+):
+    monkeypatch.setenv("ADMIN_TOKEN", "admin-secret")
+    openai = mock_openai(_tool_turns(
+        [_call("c1", "calc", {"expression": "6 * 7"}), _call("c2", "calc", {"expression": "2 ** 10"})],
+        [_call("c3", "calc", {"expression": "6 * 7"}), _call("c4", "nope", {})],
+    ))
+    session_id = make_session(make_agent(tools=[CALCULATOR]))
+
+    message = send_message(session_id, "Compute")
+    assert message["content"] == "Results: 42, 1024, 42, Error: Unknown tool 'nope'"
+    # Three model turns, their tokens summed
+    assert (message["prompt_tokens"], message["completion_tokens"]) == (30, 6)
+    first = openai.chat.completions.create.await_args_list[0].kwargs
+    assert first["tools"][0]["function"]["name"] == "calc"
+    assert first["tools"][0]["function"]["parameters"]["required"] == ["expression"]
+
+    calls = (await db_session.execute(select(ToolCall).order_by(ToolCall.id))).scalars().all()
+    assert [(c.name, c.status, c.cached) for c in calls] == [
+        ("calc", "ok", False), ("calc", "ok", False), ("calc", "ok", True), ("nope", "error", False),
+    ]
+    assert {c.message_id for c in calls} == {message["id"]}
+    assert calls[0].arguments == {"expression": "6 * 7"} and calls[0].session_id == session_id
+
+    stats = client.get("/api/admin/tools", headers={"X-Admin-Token": "admin-secret"}).json()
+    by_name = {s["name"]: s for s in stats}
+    assert (by_name["calc"]["calls"], by_name["calc"]["cached"]) == (3, 1)
+    assert by_name["nope"]["errors"] == 1
+    assert client.get("/api/admin/cache/tools", headers={"X-Admin-Token": "admin-secret"}).json()["hits"] == 1
+
+@pytest.mark.asyncio
+async def test_batch_items_call_tools(client: TestClient, auth_headers: dict, db_session: AsyncSession, mock_openai, make_agent):
+    mock_openai(_tool_turns([_call("c1", "calc", {"expression": "1 + 1"})]))
+    agent_id = make_agent(tools=[CALCULATOR])
+    response = client.post("/api/batch/messages", json={"items": [{"agent_id": agent_id, "content": "Add"}]}, headers=auth_headers)
+    result = orjson.loads(response.content.splitlines()[0])
+    assert result["message"]["content"] == "Results: 2"
+    calls = (await db_session.execute(select(ToolCall))).scalars().all()
+    assert [(c.session_id, c.message_id) for c in calls] == [(result["session_id"], result["message"]["id"])]
+
+def test_agents_without_tools_are_not_offered_any(mock_openai, make_agent, make_session, send_message):
+    openai = mock_openai(_tool_turns())
+    send_message(make_session(make_agent(tools=None)), "Hi")
+    assert "tools" not in openai.chat.completions.create.await_args.kwargs
+
+def test_tool_settings_are_validated(client: TestClient, auth_headers: dict):
+    twice = client.post("/api/agents/", json={"name": "A", "prompt": "P", "tools": [CALCULATOR, CALCULATOR]}, headers=auth_headers)
+    assert twice.status_code == 422
+    no_url = client.post("/api/agents/", json={"name": "A", "prompt": "P", "tools": [{"name": "h", "kind": "http"}]}, headers=auth_headers)
+    assert no_url.status_code == 422
+    agent = client.post("/api/agents/", json={"name": "A", "prompt": "P", "tools": [CALCULATOR]}, headers=auth_headers).json()
+    assert agent["tools"][0]["kind"] == "calculator"
+    cleared = client.patch(f"/api/agents/{agent['id']}", json={"tools": None}, headers=auth_headers).json()
+    assert cleared["tools"] is None
+
+class SleepyTool(ToolKind):
+    name = "sleepy"
+
+    def parameters(self, config: dict) -> dict:
+        return {"type": "object", "properties": {"seconds": {"type": "number"}}}
+
+    async def run(self, context, config: dict, arguments: dict) -> str:
+        await asyncio.sleep(arguments["seconds"])
+        return "awake"
+
+@pytest.mark.asyncio
+async def test_calls_of_one_turn_run_concurrently_with_timeouts(monkeypatch):
+    monkeypatch.setitem(TOOL_KINDS, "sleepy", SleepyTool())
+    agent = SimpleNamespace(id=1, tools=[
+        {"name": "nap", "kind": "sleepy", "config": {}},
+        {"name": "coma", "kind": "sleepy", "config": {}, "timeout_seconds": 0.05},
+    ])
+    calls = [ToolCallRequest(f"c{i}", "nap", orjson.dumps({"seconds": 0.2}).decode()) for i in range(5)]
+    calls.append(ToolCallRequest("c9", "coma", '{"seconds": 5}'))
+
+    started = time.perf_counter()
+    records = await run_tool_calls(ToolContext(db=None, agent=agent), calls)
+    assert time.perf_counter() - started < 0.6
+    assert [r.status for r in records] == ["ok"] * 5 + ["timeout"]
+    assert all(r.latency_ms >= 150 for r in records[:5]) and records[5].latency_ms < 150
+    assert [r.call_id for r in records] == [c.id for c in calls]
+
+@pytest.mark.asyncio
+async def test_invalid_arguments_are_reported_to_the_model():
+    agent = SimpleNamespace(id=1, tools=[CALCULATOR])
+    records = await run_tool_calls(ToolContext(db=None, agent=agent), [
+        ToolCallRequest("a", "calc", "not json"),
+        ToolCallRequest("b", "calc", "[1]"),
+        ToolCallRequest("c", "calc", '{"expression": "__import__(\'os\')"}'),
+    ])
+    assert [r.status for r in records] == ["error"] * 3
+    assert records[0].arguments == "not json"
+    assert all(r.result.startswith("Error: ") for r in records)
+
+def test_calculator_only_evaluates_arithmetic():
+    assert evaluate("(2 + 3) * 4 - 10 / 4") == 17.5
+    assert evaluate("-2 ** 3 % 5") == 2
+    assert evaluate("2 ** 1000 // 2 ** 990") == 1024
+    for expression in ("x + 1", "2 ** 5000", "(((9**99)**99)**99)**9", "10**1000 * 10**1000", "1 / 0", "'a' * 3", "len('abc')", "1" * 300):
+        with pytest.raises(ToolError):
+            evaluate(expression)
+
+def test_http_urls_are_filled_and_restricted(monkeypatch):
+    tool = HttpTool()
+    with pytest.raises(ToolError):
+        tool.url({"url": "http://localhost:8080/"}, {})
+    monkeypatch.setattr(tool_service, "TOOL_HTTP_ALLOWED_HOSTS", {"localhost"})
+    config = {"url": "http://localhost:8080/items/{sku}"}
+    assert tool.url(config, {"sku": "a/b c", "fields": "price"}) == (
+        "http://localhost:8080/items/a%2Fb%20c", {"fields": "price"}
+    )
+    with pytest.raises(ToolError):
+        tool.url(config, {})
+    with pytest.raises(ToolError):
+        tool.url({"url": "http://example.com/{q}"}, {"q": "x"})
+    with pytest.raises(ToolError):
+        tool.url({"url": "http://{host}/"}, {"host": "169.254.169.254"})
+
+def test_result_cache_expires_and_evicts():
+    now = [0.0]
+    cache = ToolResultCache(max_entries=2, clock=lambda: now[0])
+    cache.put(("a",), "1", ttl_seconds=10)
+    cache.put(("b",), "2", ttl_seconds=1)
+    assert cache.get(("a",)) == "1"
+    now[0] = 5
+    assert cache.get(("b",)) is None
+    cache.put(("c",), "3", ttl_seconds=10)
+    cache.put(("d",), "4", ttl_seconds=10)
+    assert cache.get(("a",)) is None and cache.get(("d",)) == "4"
+    assert cache.stats()["hits"] == 2
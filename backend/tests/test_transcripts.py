@@ -0,0 +1,179 @@
+import gzip
+import orjson
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from backend.models.agent import Agent
+from backend.models.chat import ChatSession
+from backend.services.archive_service import archive_session
+from backend.services.transcript_service import GUNZIP_CHUNK_BYTES, gunzip_chunks
+
+def _records(body: bytes) -> list:
+    return [orjson.loads(line) for line in body.splitlines()]
+
+def _transcript(*records) -> bytes:
+    return b"".join(orjson.dumps(record) + b"\n" for record in records)
+
+async def _count(db_session: AsyncSession, model) -> int:
+    return (await db_session.execute(select(func.count()).select_from(model))).scalar()
+
+def test_export_session(client: TestClient, auth_headers: dict, make_agent, make_session, send_message):
+    agent_id = make_agent()
+    session_id = make_session(agent_id)
+    make_session(agent_id)
+    send_message(session_id, "Hello")
+
+    response = client.get(f"/api/transcripts/sessions/{session_id}", headers=auth_headers)
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    records = _records(response.content)
+    assert [r["type"] for r in records] == ["agent", "session", "message", "message"]
+    assert records[0]["name"] == "A"
+    assert records[1]["id"] == session_id
+    assert [r["content"] for r in records[2:]] == ["Hello", "Mocked response"]
+
+def test_export_user_gzip(client: TestClient, auth_headers: dict, make_agent, make_session, send_message):
+    for name in ("A", "B"):
+        session_id = make_session(make_agent(name))
+        send_message(session_id, f"Hi {name}")
+
+    response = client.get("/api/transcripts/", params={"gzip": True}, headers=auth_headers)
+    assert response.status_code == 200
+    records = _records(gzip.decompress(response.content))
+    assert [r["type"] for r in records] == ["agent"] * 2 + ["session"] * 2 + ["message"] * 4
+
+def test_export_requires_ownership(client: TestClient, auth_headers: dict):
+    assert client.get("/api/transcripts/sessions/999", headers=auth_headers).status_code == 404
+    assert client.get("/api/transcripts/agents/999", headers=auth_headers).status_code == 404
+
+@pytest.mark.asyncio
+async def test_export_includes_archived_messages(
+    client: TestClient, auth_headers: dict, make_session, send_message, db_session: AsyncSession
+):
+    session_id = make_session()
+    send_message(session_id, "Hello")
+    await archive_session(db_session, session_id)
+    await db_session.commit()
+
+    response = client.get(f"/api/transcripts/sessions/{session_id}", headers=auth_headers)
+    assert [r["content"] for r in _records(response.content) if r["type"] == "message"] == ["Hello", "Mocked response"]
+
+@pytest.mark.asyncio
+async def test_export_import_round_trip(
+    client: TestClient, auth_headers: dict, make_agent, make_session, send_message, db_session: AsyncSession
+):
+    agent_id = make_agent()
+    session_id = make_session(agent_id)
+    send_message(session_id, "Hello")
+    send_message(session_id, "Again")
+    exported = client.get(f"/api/transcripts/agents/{agent_id}", params={"gzip": True}, headers=auth_headers).content
+
+    response = client.post(
+        "/api/transcripts/import",
+        content=exported,
+        headers={**auth_headers, "Content-Type": "application/gzip"},
+    )
+    assert response.status_code == 200
+    assert response.json() == {"agents": 1, "sessions": 1, "messages": 4}
+
+    db_session.expire_all()
+    new_agent = (await db_session.execute(select(Agent).where(Agent.id != agent_id))).scalar_one()
+    new_session = (await db_session.execute(select(ChatSession).where(ChatSession.agent_id == new_agent.id))).scalar_one()
+    assert new_session.message_count == new_session.messages_version == 4
+    assert new_session.last_message_preview == "Mocked response"
+
+    messages = client.get(f"/api/sessions/{new_session.id}/messages", headers=auth_headers).json()
+    assert [m["content"] for m in messages] == ["Hello", "Mocked response", "Again", "Mocked response"]
+    assert messages[1]["prompt_tokens"] == 12
+
+@pytest.mark.asyncio
+async def test_agent_settings_round_trip(client: TestClient, auth_headers: dict, make_agent, db_session: AsyncSession):
+    settings = {
+        "chat_model": "gpt-4o",
+        "fallback_models": ["gpt-4o-mini"],
+        "temperature": 0.2,
+        "max_tokens": 300,
+        "chat_timeout_seconds": 12.5,
+        "max_latency_ms": 4000,
+        "tools": [{"name": "calc", "kind": "calculator", "description": "Arithmetic"}],
+    }
+    agent_id = make_agent(**settings)
+    exported = client.get(f"/api/transcripts/agents/{agent_id}", headers=auth_headers).content
+    record = _records(exported)[0]
+    assert record["chat_model"] == "gpt-4o" and record["tools"][0]["name"] == "calc"
+
+    assert client.post("/api/transcripts/import", content=exported, headers=auth_headers).json()["agents"] == 1
+    new_agent = (await db_session.execute(select(Agent).where(Agent.id != agent_id))).scalar_one()
+    for name, value in settings.items():
+        if name == "tools":
+            assert [tool["name"] for tool in new_agent.tools] == ["calc"]
+        else:
+            assert getattr(new_agent, name) == value
+    assert new_agent.tts_model is None
+
+def test_branches_export_their_resolved_history(
+    client: TestClient, auth_headers: dict, make_agent, make_session, send_message
+):
+    agent_id = make_agent()
+    session_id = make_session(agent_id)
+    send_message(session_id, "Hello")
+    send_message(session_id, "Again")
+    fork = client.get(f"/api/sessions/{session_id}/messages", headers=auth_headers).json()[1]["id"]
+    branch_id = client.post(f"/api/sessions/{session_id}/branches", json={"message_id": fork}, headers=auth_headers).json()["id"]
+    send_message(branch_id, "Other")
+
+    exported = client.get(f"/api/transcripts/sessions/{branch_id}", headers=auth_headers).content
+    messages = [r for r in _records(exported) if r["type"] == "message"]
+    assert [m["content"] for m in messages] == ["Hello", "Mocked response", "Other", "Mocked response"]
+    assert {m["session_id"] for m in messages} == {branch_id}
+
+    response = client.post("/api/transcripts/import", content=exported, headers=auth_headers)
+    assert response.json() == {"agents": 1, "sessions": 1, "messages": 4}
+
+@pytest.mark.asyncio
+async def test_import_into_existing_agent(client: TestClient, auth_headers: dict, make_agent, db_session: AsyncSession):
+    agent_id = make_agent()
+    body = _transcript(
+        {"type": "agent", "id": 1, "name": "Elsewhere", "prompt": "P"},
+        {"type": "session", "id": 5, "agent_id": 1},
+        {"type": "message", "session_id": 5, "content": "Hi", "is_user": True},
+    )
+    response = client.post(f"/api/transcripts/import?agent_id={agent_id}", content=body, headers=auth_headers)
+    assert response.json() == {"agents": 0, "sessions": 1, "messages": 1}
+    assert await _count(db_session, Agent) == 1
+
+@pytest.mark.asyncio
+async def test_invalid_import_is_rolled_back(client: TestClient, auth_headers: dict, db_session: AsyncSession):
+    body = _transcript(
+        {"type": "agent", "id": 1, "name": "A", "prompt": "P"},
+        {"type": "session", "id": 5, "agent_id": 1},
+        {"type": "message", "session_id": 6, "content": "Hi", "is_user": True},
+    )
+    response = client.post("/api/transcripts/import", content=body, headers=auth_headers)
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Line 3: unknown session 6"
+    assert await _count(db_session, Agent) == 0
+    assert await _count(db_session, ChatSession) == 0
+
+    response = client.post("/api/transcripts/import", content=b'{"type": "agent"\n', headers=auth_headers)
+    assert response.status_code == 400
+    assert response.json()["detail"].startswith("Line 1: invalid JSON")
+
+@pytest.mark.asyncio
+async def test_gunzip_is_bounded():
+    async def upload(data: bytes):
+        for start in range(0, len(data), 1000):
+            yield data[start:start + 1000]
+
+    # Highly compressible, a few KB expand to 10 MB
+    bomb = gzip.compress(b"\n" * 10_000_000)
+    pieces = [len(piece) async for piece in gunzip_chunks(upload(bomb), max_bytes=20_000_000)]
+    assert sum(pieces) == 10_000_000
+    assert max(pieces) <= GUNZIP_CHUNK_BYTES
+
+    with pytest.raises(HTTPException) as error:
+        async for _ in gunzip_chunks(upload(bomb), max_bytes=1_000_000):
+            pass
+    assert error.value.status_code == 413
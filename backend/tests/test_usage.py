@@ -0,0 +1,81 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from backend.services import usage_service
+from backend.models.chat import Message
+from backend.models.usage import UserDailyUsage, AgentDailyUsage
+
+@pytest.mark.asyncio
+async def test_assistant_message_records_usage(make_session, send_message, db_session: AsyncSession):
+    session_id = make_session()
+
+    data = send_message(session_id)
+    assert data["prompt_tokens"] == 12
+    assert data["completion_tokens"] == 5
+    assert data["model"] == "gpt-3.5-turbo"
+    assert data["latency_ms"] is not None
+
+    result = await db_session.execute(select(Message).where(Message.session_id == session_id, Message.is_user == False))
+    agent_msg = result.scalar_one()
+    assert agent_msg.prompt_tokens == 12
+    assert agent_msg.completion_tokens == 5
+    assert agent_msg.ttft_ms is not None
+
+@pytest.mark.asyncio
+async def test_daily_aggregates_are_incremental(
+    client: TestClient, auth_headers: dict, make_agent, make_session, send_message, db_session: AsyncSession
+):
+    agent_id = make_agent("TestAgent")
+    session_id = make_session(agent_id)
+    other_session_id = make_session(make_agent("OtherAgent"))
+
+    for _ in range(3):
+        send_message(session_id)
+    send_message(other_session_id)
+
+    # One row per (user, day) and per (agent, day), never one row per turn
+    result = await db_session.execute(select(UserDailyUsage))
+    assert len(result.scalars().all()) == 1
+    result = await db_session.execute(select(AgentDailyUsage))
+    assert len(result.scalars().all()) == 2
+
+    response = client.get("/api/usage/daily", headers=auth_headers)
+    assert response.status_code == 200
+    data = response.json()
+    assert data["turns"] == 4
+    assert data["prompt_tokens"] == 48
+    assert data["completion_tokens"] == 20
+
+    response = client.get(f"/api/usage/agents/{agent_id}/daily", headers=auth_headers)
+    assert response.status_code == 200
+    data = response.json()
+    assert data["agent_id"] == agent_id
+    assert data["turns"] == 3
+    assert data["prompt_tokens"] == 36
+
+@pytest.mark.asyncio
+async def test_aggregates_without_on_conflict(make_session, send_message, db_session: AsyncSession, monkeypatch):
+    # Databases other than Postgres and SQLite take the UPDATE-then-INSERT path
+    monkeypatch.setattr(usage_service, "supports_on_conflict", lambda db: False)
+    session_id = make_session()
+    for _ in range(2):
+        send_message(session_id)
+
+    usage = (await db_session.execute(select(UserDailyUsage))).scalar_one()
+    assert (usage.turns, usage.prompt_tokens) == (2, 24)
+    assert len((await db_session.execute(select(AgentDailyUsage))).scalars().all()) == 1
+
+@pytest.mark.asyncio
+async def test_usage_empty_day(client: TestClient, auth_headers: dict):
+    response = client.get("/api/usage/daily?day=2001-01-01", headers=auth_headers)
+    assert response.status_code == 200
+    data = response.json()
+    assert data["day"] == "2001-01-01"
+    assert data["turns"] == 0
+    assert data["avg_latency_ms"] is None
+
+@pytest.mark.asyncio
+async def test_usage_unauthorized(client: TestClient):
+    response = client.get("/api/usage/daily")
+    assert response.status_code == 401
@@ -1,7 +1,24 @@
+import asyncio
+import itertools
+import logging
 import os
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
-from sqlalchemy.orm import sessionmaker
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Optional
+from sqlalchemy import event, exc, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncEngine, AsyncSession
+from sqlalchemy.orm import Session
 from backend.models.base import Base
+from backend.utils.partitioning import create_partitioned_messages
+from backend.utils.query_monitor import instrument_engine
+from backend.utils.schema import add_missing_columns, missing_indexes
+from backend.utils import search  # adds the full-text index DDL to create_all
+
+logger = logging.getLogger(__name__)
 
 # Get database configuration from environment variables
 DB_HOST = os.getenv("DB_HOST", "localhost")
@@ -13,24 +30,316 @@ DB_PASSWORD = os.getenv("DB_PASSWORD")
 # Construct PostgreSQL async URL
 DATABASE_URL = f"postgresql+asyncpg://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
 
-# Create async engine
-engine = create_async_engine(
-    DATABASE_URL, 
-    echo=True,
-    pool_pre_ping=True,  # Verify connections before use
-    pool_recycle=300,    # Recycle connections every 5 minutes
+# Optional read replicas, comma-separated async URLs
+DB_REPLICA_URLS = [u.strip() for u in os.getenv("DB_REPLICA_URLS", "").split(",") if u.strip()]
+DB_REPLICA_MAX_LAG_SECONDS = float(os.getenv("DB_REPLICA_MAX_LAG_SECONDS", "5"))
+DB_REPLICA_LAG_CHECK_SECONDS = float(os.getenv("DB_REPLICA_LAG_CHECK_SECONDS", "1"))
+DB_READ_YOUR_WRITES_SECONDS = float(os.getenv("DB_READ_YOUR_WRITES_SECONDS", "5"))
+
+def _env_bool(name: str, default: bool) -> bool:
+    return os.getenv(name, str(default)).lower() in ("1", "true", "yes")
+
+@dataclass
+class EngineSettings:
+    """Connection pool and driver settings of one engine."""
+    url: str
+    echo: bool = False
+    pool_size: int = 5
+    max_overflow: int = 10
+    pool_timeout: float = 30.0
+    pool_recycle: int = 300
+    pool_pre_ping: bool = True
+    # asyncpg's per-connection prepared statement cache
+    statement_cache_size: int = 100
+    # Compatibility with transaction-mode poolers such as pgbouncer
+    transaction_pooler: bool = False
+    # Let the external pooler do all pooling
+    null_pool: bool = False
+
+    @classmethod
+    def from_env(cls, url: str, prefix: str = "DB_") -> "EngineSettings":
+        """Read ``<prefix>POOL_SIZE``, ``<prefix>MAX_OVERFLOW`` etc. from the environment."""
+        return cls(
+            url=url,
+            echo=_env_bool(f"{prefix}ECHO", False),
+            pool_size=int(os.getenv(f"{prefix}POOL_SIZE", "5")),
+            max_overflow=int(os.getenv(f"{prefix}MAX_OVERFLOW", "10")),
+            pool_timeout=float(os.getenv(f"{prefix}POOL_TIMEOUT", "30")),
+            pool_recycle=int(os.getenv(f"{prefix}POOL_RECYCLE", "300")),
+            pool_pre_ping=_env_bool(f"{prefix}POOL_PRE_PING", True),
+            statement_cache_size=int(os.getenv(f"{prefix}STATEMENT_CACHE_SIZE", "100")),
+            transaction_pooler=_env_bool(f"{prefix}TRANSACTION_POOLER", False),
+            null_pool=_env_bool(f"{prefix}NULL_POOL", False),
+        )
+
+class InstrumentedAsyncQueuePool(AsyncAdaptedQueuePool):
+    """Queue pool that records how long checkouts wait for a free connection."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.wait_count = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.timeouts = 0
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            self.timeouts += 1
+            raise
+        finally:
+            waited = time.perf_counter() - started
+            self.wait_count += 1
+            self.wait_total += waited
+            self.wait_max = max(self.wait_max, waited)
+
+def build_engine_kwargs(settings: EngineSettings) -> dict:
+    """Translate settings into ``create_async_engine`` arguments for the URL's dialect."""
+    url = make_url(settings.url)
+    kwargs = {"url": url, "echo": settings.echo, "pool_pre_ping": settings.pool_pre_ping}
+
+    if url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:"):
+        # In-memory databases live in a single connection, pool sizing does not apply
+        return kwargs
+
+    if settings.null_pool:
+        kwargs["poolclass"] = NullPool
+    else:
+        kwargs.update(
+            poolclass=InstrumentedAsyncQueuePool,
+            pool_size=settings.pool_size,
+            max_overflow=settings.max_overflow,
+            pool_timeout=settings.pool_timeout,
+            pool_recycle=settings.pool_recycle,
+        )
+
+    if url.get_driver_name() == "asyncpg":
+        connect_args = {"statement_cache_size": settings.statement_cache_size}
+        if settings.transaction_pooler:
+            # Server-side prepared statements do not survive a transaction-mode pooler
+            # handing the next transaction to another backend: disable both caches and
+            # give every statement a unique name.
+            connect_args["statement_cache_size"] = 0
+            connect_args["prepared_statement_name_func"] = lambda: f"__asyncpg_{uuid.uuid4()}__"
+            kwargs["url"] = url.update_query_dict({"prepared_statement_cache_size": "0"})
+        kwargs["connect_args"] = connect_args
+    return kwargs
+
+def enable_sqlite_foreign_keys(target: AsyncEngine):
+    """
+    Turn on foreign key enforcement for every SQLite connection of ``target``.
+
+    SQLite ignores ``ON DELETE CASCADE`` unless the pragma is set per connection,
+    and deletes rely on the database cascading to sessions and messages.
+    """
+    if target.dialect.name != "sqlite":
+        return
+
+    @event.listens_for(target.sync_engine, "connect")
+    def _set_pragma(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA foreign_keys=ON")
+        cursor.close()
+
+def create_engine_from_settings(settings: EngineSettings) -> AsyncEngine:
+    """Create an instrumented async engine from settings."""
+    kwargs = build_engine_kwargs(settings)
+    new_engine = create_async_engine(kwargs.pop("url"), **kwargs)
+    enable_sqlite_foreign_keys(new_engine)
+    instrument_engine(new_engine)
+    return new_engine
+
+def get_pool_stats(target: Optional[AsyncEngine] = None) -> dict:
+    """Return live statistics of an engine's connection pool."""
+    pool = (target or engine).sync_engine.pool
+    stats = {"pool_class": type(pool).__name__}
+    if hasattr(pool, "checkedout"):
+        stats.update(
+            size=pool.size(),
+            checked_in=pool.checkedin(),
+            checked_out=pool.checkedout(),
+            overflow=pool.overflow(),
+        )
+    if isinstance(pool, InstrumentedAsyncQueuePool):
+        stats.update(
+            checkouts=pool.wait_count,
+            wait_ms_total=round(pool.wait_total * 1000, 3),
+            wait_ms_avg=round(pool.wait_total * 1000 / pool.wait_count, 3) if pool.wait_count else 0.0,
+            wait_ms_max=round(pool.wait_max * 1000, 3),
+            timeouts=pool.timeouts,
+        )
+    return stats
+
+# Seconds of replay lag on a streaming replica, 0 when it has replayed everything it received
+POSTGRES_REPLICA_LAG_SQL = text(
+    "SELECT CASE WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
 )
 
+async def probe_replica_lag(replica: AsyncEngine) -> float:
+    """Return the replication lag of a replica in seconds."""
+    if replica.dialect.name != "postgresql":
+        return 0.0
+    async with replica.connect() as conn:
+        return float((await conn.execute(POSTGRES_REPLICA_LAG_SQL)).scalar() or 0.0)
+
+class Replica:
+    """A read replica together with its last observed replication lag."""
+
+    def __init__(self, replica_engine: AsyncEngine):
+        self.engine = replica_engine
+        self.session_factory = async_sessionmaker(replica_engine, class_=AsyncSession, expire_on_commit=False)
+        self.lag: Optional[float] = None
+        self.healthy = True
+        self.checked_at = 0.0
+        self.lock = asyncio.Lock()
+
+class ReplicaRouter:
+    """
+    Chooses a replica for read-only work, or None to stay on the primary.
+
+    Replicas are used round-robin. One is skipped when its replication lag exceeds
+    ``max_lag_seconds`` or the lag probe fails; lag is probed at most once every
+    ``check_interval`` seconds per replica. A user who wrote to the primary within
+    the last ``read_your_writes_seconds`` is kept on the primary so they read their
+    own writes.
+
+    The write markers live in this process only. With several workers a user's next
+    request may reach one that has not seen the write and read a lagging replica;
+    ``max_lag_seconds`` bounds how stale that read can be.
+    """
+
+    def __init__(
+        self,
+        replica_engines: list,
+        max_lag_seconds: float = DB_REPLICA_MAX_LAG_SECONDS,
+        check_interval: float = DB_REPLICA_LAG_CHECK_SECONDS,
+        read_your_writes_seconds: float = DB_READ_YOUR_WRITES_SECONDS,
+        lag_probe: Callable[[AsyncEngine], Awaitable[float]] = probe_replica_lag,
+    ):
+        self.replicas = [Replica(e) for e in replica_engines]
+        self.max_lag_seconds = max_lag_seconds
+        self.check_interval = check_interval
+        self.read_your_writes_seconds = read_your_writes_seconds
+        self.lag_probe = lag_probe
+        self._cycle = itertools.cycle(self.replicas) if self.replicas else None
+        # user id -> expiry, oldest first: every entry has the same window, so moving a
+        # renewed entry to the end keeps the order and expired ones are pruned from the front
+        self._recent_writers: "OrderedDict[int, float]" = OrderedDict()
+
+    @classmethod
+    def from_env(cls) -> "ReplicaRouter":
+        return cls([create_engine_from_settings(EngineSettings.from_env(url, prefix="DB_REPLICA_")) for url in DB_REPLICA_URLS])
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.replicas)
+
+    def note_write(self, user_id: int):
+        """Keep ``user_id`` on the primary for the read-your-writes window."""
+        if self.enabled:
+            now = time.monotonic()
+            self._recent_writers[user_id] = now + self.read_your_writes_seconds
+            self._recent_writers.move_to_end(user_id)
+            while next(iter(self._recent_writers.values())) < now:
+                self._recent_writers.popitem(last=False)
+
+    def _recently_wrote(self, user_id: Optional[int]) -> bool:
+        if user_id is None:
+            return False
+        expires = self._recent_writers.get(user_id)
+        if expires is None:
+            return False
+        if expires < time.monotonic():
+            self._recent_writers.pop(user_id, None)
+            return False
+        return True
+
+    async def _usable(self, replica: Replica) -> bool:
+        if time.monotonic() - replica.checked_at >= self.check_interval:
+            async with replica.lock:
+                if time.monotonic() - replica.checked_at >= self.check_interval:
+                    try:
+                        replica.lag = await asyncio.wait_for(self.lag_probe(replica.engine), timeout=1.0)
+                        replica.healthy = True
+                    except Exception as e:
+                        logger.warning(f"Replica lag probe failed: {e}")
+                        replica.healthy = False
+                    replica.checked_at = time.monotonic()
+        return replica.healthy and (replica.lag or 0.0) <= self.max_lag_seconds
+
+    async def pick(self, user_id: Optional[int] = None) -> Optional[Replica]:
+        """Return the replica to read from, or None if the read must go to the primary."""
+        if not self.enabled or self._recently_wrote(user_id):
+            return None
+        for _ in range(len(self.replicas)):
+            replica = next(self._cycle)
+            if await self._usable(replica):
+                return replica
+        return None
+
+    def status(self) -> list:
+        return [
+            {
+                "url": r.engine.url.render_as_string(hide_password=True),
+                "healthy": r.healthy,
+                "lag_seconds": r.lag,
+                "pool": get_pool_stats(r.engine),
+            }
+            for r in self.replicas
+        ]
+
+# Create async engine and the module-level session factory
+engine_settings = EngineSettings.from_env(DATABASE_URL)
+engine = create_engine_from_settings(engine_settings)
+SessionLocal = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+read_router = ReplicaRouter.from_env()
+
+@event.listens_for(Session, "after_flush")
+def _note_primary_write(session, flush_context):
+    # Sessions are tagged with the authenticated user in get_current_user
+    user_id = session.info.get("user_id")
+    if user_id is not None and not session.info.get("replica"):
+        read_router.note_write(user_id)
+
+@event.listens_for(Session, "do_orm_execute")
+def _note_primary_dml(orm_execute_state):
+    # INSERT, UPDATE and DELETE statements run through the session never flush
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        _note_primary_write(orm_execute_state.session, None)
+
+def supports_on_conflict(db: AsyncSession) -> bool:
+    """Whether ``dialect_insert`` works on the database of ``db``."""
+    return db.get_bind().dialect.name in ("postgresql", "sqlite")
+
+def dialect_insert(db: AsyncSession):
+    """Return the dialect specific ``insert`` construct that supports ``ON CONFLICT``."""
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        raise NotImplementedError(f"Upserts are not supported on {dialect}")
+    return insert
+
 async def init_db():
     """Initialize database tables"""
     async with engine.begin() as conn:
+        # Must run first, create_all skips the messages table once it exists
+        await conn.run_sync(create_partitioned_messages)
         await conn.run_sync(Base.metadata.create_all)
+        # Tables created by an earlier release lack the newer columns
+        await conn.run_sync(add_missing_columns)
+        missing = await conn.run_sync(missing_indexes)
+    if missing:
+        logger.warning(
+            f"Missing indexes {[index.name for index in missing]}, build them with python -m backend.utils.schema"
+        )
 
 async def get_db():
     """Dependency to get database session"""
-    async_session = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
-    async with async_session() as session:
-        try:
-            yield session
-        finally:
-            await session.close()
\ No newline at end of file
+    async with SessionLocal() as session:
+        yield session
@@ -0,0 +1,36 @@
+"""
+Weak ETags and conditional GET for the list endpoints.
+
+Tags are derived from the version counters maintained by
+``backend.services.versioning_service`` instead of hashing the payload, so a
+revalidation costs one primary key lookup and the data query is skipped on a match.
+Responses carry ``Cache-Control: private, no-cache`` which makes browsers (and the
+XHR requests of the frontend) revalidate transparently with ``If-None-Match``.
+"""
+from fastapi import Response
+from typing import Optional
+
+CACHE_CONTROL = "private, no-cache"
+
+def make_etag(*parts) -> str:
+    """
+    Build a weak ETag from the parts identifying the representation. Parts keep
+    their position, ``None`` becomes an empty part, so optional parameters such as
+    ``agent_id`` and ``since`` cannot stand in for each other.
+    """
+    return 'W/"' + ".".join("" if part is None else str(part) for part in parts) + '"'
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Weak comparison of an ``If-None-Match`` header against ``etag``."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(candidate.strip().removeprefix("W/") == opaque for candidate in if_none_match.split(","))
+
+def cache_headers(etag: str, version: int) -> dict:
+    return {"ETag": etag, "Cache-Control": CACHE_CONTROL, "X-Version": str(version)}
+
+def not_modified(etag: str, version: int) -> Response:
+    return Response(status_code=304, headers=cache_headers(etag, version))
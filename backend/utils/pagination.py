@@ -0,0 +1,18 @@
+"""Opaque cursors for keyset pagination."""
+from fastapi import HTTPException
+import base64
+import orjson
+
+def encode_cursor(*values) -> str:
+    """Pack the sort key of the last row of a page into a URL-safe token."""
+    return base64.urlsafe_b64encode(orjson.dumps(values)).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor: str, length: int) -> list:
+    """Unpack a token from ``encode_cursor`` holding ``length`` values, 400 if it is malformed."""
+    try:
+        values = orjson.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (ValueError, orjson.JSONDecodeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(values, list) or len(values) != length:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return values
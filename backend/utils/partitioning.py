@@ -0,0 +1,118 @@
+"""
+Monthly range partitioning of ``messages`` on Postgres.
+
+With ``DB_PARTITION_MESSAGES=true`` the ``messages`` table is created as a
+declaratively partitioned table (``PARTITION BY RANGE (created_at)``) instead of a
+single heap. The DDL is compiled from the ``Message`` model so columns, foreign keys
+and indexes stay in sync; the primary key becomes ``(id, created_at)`` because
+Postgres requires the partition key in every unique constraint. Partitions are
+named ``messages_yYYYYmMM``, created a few months ahead, and a default partition
+catches anything outside them. Partitioning only applies to a fresh database, an
+existing plain ``messages`` table is left alone.
+"""
+from backend import models  # registers every table on Base.metadata
+from backend.models.base import Base
+from sqlalchemy import MetaData, PrimaryKeyConstraint, Table, exc, inspect, text
+from sqlalchemy.engine import Connection
+from sqlalchemy.schema import CreateIndex, CreateTable
+from datetime import date
+from typing import List
+import logging
+import os
+import re
+import warnings
+
+logger = logging.getLogger(__name__)
+
+DB_PARTITION_MESSAGES = os.getenv("DB_PARTITION_MESSAGES", "false").lower() in ("1", "true", "yes")
+# Monthly partitions created ahead of the current month
+DB_PARTITION_MONTHS_AHEAD = int(os.getenv("DB_PARTITION_MONTHS_AHEAD", "3"))
+
+PARTITION_NAME = re.compile(r"^messages_y(\d{4})m(\d{2})$")
+
+def partitioned_messages_table() -> Table:
+    """Return a copy of the ``messages`` table declared as partitioned by month."""
+    metadata = MetaData()
+    for table in Base.metadata.sorted_tables:
+        table.to_metadata(metadata)
+    table = metadata.tables["messages"]
+    table.c.created_at.nullable = False
+    table.c.id.autoincrement = True
+    with warnings.catch_warnings():
+        # Replacing the model's primary key is the point here
+        warnings.simplefilter("ignore", exc.SAWarning)
+        table.append_constraint(PrimaryKeyConstraint(table.c.id, table.c.created_at))
+    table.dialect_kwargs["postgresql_partition_by"] = "RANGE (created_at)"
+    return table
+
+def partitioned_messages_ddl(dialect) -> List[str]:
+    table = partitioned_messages_table()
+    statements = [str(CreateTable(table).compile(dialect=dialect))]
+    statements += [str(CreateIndex(index).compile(dialect=dialect)) for index in table.indexes]
+    statements.append("CREATE TABLE IF NOT EXISTS messages_default PARTITION OF messages DEFAULT")
+    return statements
+
+def _add_months(day: date, months: int) -> date:
+    month = day.month - 1 + months
+    return date(day.year + month // 12, month % 12 + 1, 1)
+
+def partition_name(month: date) -> str:
+    return f"messages_y{month.year:04d}m{month.month:02d}"
+
+def month_partition_ddl(month: date) -> str:
+    start = date(month.year, month.month, 1)
+    return (
+        f"CREATE TABLE IF NOT EXISTS {partition_name(start)} PARTITION OF messages "
+        f"FOR VALUES FROM ('{start.isoformat()}') TO ('{_add_months(start, 1).isoformat()}')"
+    )
+
+def ensure_month_partitions(connection: Connection, months_ahead: int = DB_PARTITION_MONTHS_AHEAD, today: date = None):
+    """Create the partitions of the current month and the next ``months_ahead`` months."""
+    today = today or date.today()
+    for offset in range(months_ahead + 1):
+        connection.execute(text(month_partition_ddl(_add_months(today, offset))))
+
+def is_partitioned(connection: Connection) -> bool:
+    return connection.execute(text(
+        "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = 'messages'::regclass)"
+    )).scalar()
+
+def create_partitioned_messages(connection: Connection):
+    """Create ``messages`` as a partitioned table if partitioning is enabled and it does not exist yet."""
+    if not DB_PARTITION_MESSAGES or connection.dialect.name != "postgresql":
+        return
+    if not inspect(connection).has_table("messages"):
+        for statement in partitioned_messages_ddl(connection.dialect):
+            connection.execute(text(statement))
+        logger.info("Created messages as a partitioned table")
+    if is_partitioned(connection):
+        ensure_month_partitions(connection)
+    else:
+        logger.warning("messages already exists as a plain table, partitioning skipped")
+
+def drop_empty_partitions(connection: Connection, before: date) -> List[str]:
+    """
+    Drop monthly partitions that end before ``before`` and hold no rows.
+
+    Once the sessions of a month are archived its partition is empty and dropping it
+    reclaims the space and index pages without a vacuum.
+    """
+    if not DB_PARTITION_MESSAGES or connection.dialect.name != "postgresql":
+        return []
+    result = connection.execute(text(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = 'messages'::regclass"
+    ))
+    dropped = []
+    for (name,) in result.all():
+        match = PARTITION_NAME.match(name)
+        if not match:
+            continue
+        month = date(int(match.group(1)), int(match.group(2)), 1)
+        if _add_months(month, 1) > before:
+            continue
+        if connection.execute(text(f"SELECT EXISTS (SELECT 1 FROM {name})")).scalar():
+            continue
+        connection.execute(text(f"DROP TABLE {name}"))
+        dropped.append(name)
+    return dropped
@@ -0,0 +1,42 @@
+from typing import Optional
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+class PeriodicTask:
+    """
+    Background job started in the application lifespan.
+
+    Subclasses implement ``run_once``; it is called every ``interval`` seconds and
+    failures are logged without stopping the loop.
+    """
+    name = "periodic task"
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    async def run_once(self):
+        raise NotImplementedError
+
+    async def _run(self):
+        while True:
+            try:
+                await self.run_once()
+            except Exception as e:
+                logger.error(f"{self.name} run failed: {e}")
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
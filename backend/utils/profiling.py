@@ -0,0 +1,153 @@
+"""
+On-demand per-request profiling.
+
+:class:`ProfilingMiddleware` profiles a request with ``cProfile`` when it carries
+the ``X-Profile`` header with the value of ``PROFILE_TOKEN``, or for a random
+``PROFILE_SAMPLE_RATE`` fraction of requests. The stats are dumped as a ``.pstats``
+file into ``PROFILE_DIR``, which keeps at most ``PROFILE_MAX_FILES`` artifacts, and
+the file name is returned in the ``X-Profile-Id`` response header.
+
+Unsampled requests only pay for a header lookup when a token is configured and a
+``random()`` call when sampling is enabled. Only one request is profiled at a
+time; ``cProfile`` hooks the whole thread, so coroutine steps of other requests
+interleaved on the event loop show up in the same profile.
+"""
+from datetime import datetime, timezone
+from typing import Optional
+import asyncio
+import cProfile
+import hmac
+import io
+import os
+import pstats
+import random
+import re
+import tempfile
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN")
+PROFILE_HEADER = b"x-profile"
+# Response header naming the artifact, exposed to browsers through CORS in main
+PROFILE_ID_HEADER = "X-Profile-Id"
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join(tempfile.gettempdir(), "ai-agent-platform-profiles"))
+PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", "50"))
+
+_UNSAFE_CHARS = re.compile(r"[^A-Za-z0-9_.-]+")
+_PROFILE_NAME = re.compile(r"^[A-Za-z0-9_.-]+\.pstats$")
+
+def _artifact_name(method: str, path: str) -> str:
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%fZ")
+    slug = _UNSAFE_CHARS.sub("_", path.strip("/"))[:80] or "root"
+    return f"{stamp}_{method}_{slug}.pstats"
+
+def _prune(directory: str, max_files: int):
+    """Delete the oldest artifacts so that at most ``max_files`` remain."""
+    entries = [e for e in os.scandir(directory) if e.is_file() and e.name.endswith(".pstats")]
+    entries.sort(key=lambda e: e.stat().st_mtime)
+    for entry in entries[: max(len(entries) - max_files, 0)]:
+        try:
+            os.unlink(entry.path)
+        except FileNotFoundError:
+            pass
+
+def _write_artifact(profiler: cProfile.Profile, directory: str, name: str, max_files: int):
+    os.makedirs(directory, exist_ok=True)
+    profiler.dump_stats(os.path.join(directory, name))
+    _prune(directory, max_files)
+
+def list_profiles(directory: Optional[str] = None) -> list:
+    """Return metadata of the stored artifacts, newest first."""
+    directory = directory or PROFILE_DIR
+    if not os.path.isdir(directory):
+        return []
+    profiles = []
+    for entry in os.scandir(directory):
+        if entry.is_file() and entry.name.endswith(".pstats"):
+            stat = entry.stat()
+            profiles.append({
+                "name": entry.name,
+                "size_bytes": stat.st_size,
+                "created_at": datetime.fromtimestamp(stat.st_mtime, timezone.utc),
+            })
+    profiles.sort(key=lambda p: p["created_at"], reverse=True)
+    return profiles
+
+def profile_path(name: str, directory: Optional[str] = None) -> Optional[str]:
+    """Resolve an artifact name to its path, rejecting anything that is not a plain file name."""
+    if not _PROFILE_NAME.match(name):
+        return None
+    path = os.path.join(directory or PROFILE_DIR, name)
+    return path if os.path.isfile(path) else None
+
+def render_profile(path: str, sort: str = "cumulative", limit: int = 50) -> str:
+    """Render the top entries of a pstats artifact as text."""
+    out = io.StringIO()
+    pstats.Stats(path, stream=out).sort_stats(sort).print_stats(limit)
+    return out.getvalue()
+
+class ProfilingMiddleware:
+    """ASGI middleware that profiles privileged or sampled requests with ``cProfile``."""
+
+    def __init__(
+        self,
+        app,
+        token: Optional[str] = PROFILE_TOKEN,
+        sample_rate: float = PROFILE_SAMPLE_RATE,
+        directory: str = PROFILE_DIR,
+        max_files: int = PROFILE_MAX_FILES,
+    ):
+        self.app = app
+        self.token = token.encode("utf-8") if token else None
+        self.sample_rate = sample_rate
+        self.directory = directory
+        self.max_files = max_files
+        self._lock = threading.Lock()
+
+    def _requested(self, scope) -> bool:
+        if self.token is not None:
+            for name, value in scope["headers"]:
+                if name == PROFILE_HEADER:
+                    return hmac.compare_digest(value, self.token)
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self._requested(scope) or not self._lock.acquire(blocking=False):
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            name = _artifact_name(scope.get("method", ""), scope.get("path", ""))
+
+            async def send_with_profile_id(message):
+                if message["type"] == "http.response.start":
+                    headers = list(message.get("headers", []))
+                    headers.append((PROFILE_ID_HEADER.lower().encode("latin-1"), name.encode("latin-1")))
+                    message = {**message, "headers": headers}
+                await send(message)
+
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+            except ValueError:
+                # Another profiler is active in this interpreter
+                await self.app(scope, receive, send)
+                return
+
+            started = time.perf_counter()
+            try:
+                await self.app(scope, receive, send_with_profile_id)
+            finally:
+                profiler.disable()
+                elapsed_ms = (time.perf_counter() - started) * 1000
+                try:
+                    await asyncio.to_thread(_write_artifact, profiler, self.directory, name, self.max_files)
+                    logger.info(f"Profiled {scope.get('method')} {scope.get('path')} in {elapsed_ms:.1f}ms -> {name}")
+                except OSError as e:
+                    logger.error(f"Failed to write profile {name}: {e}")
+        finally:
+            self._lock.release()
@@ -0,0 +1,166 @@
+"""
+Slow-query logging and per-request statement accounting for SQLAlchemy engines.
+
+Statements slower than ``DB_SLOW_QUERY_MS`` are logged as one JSON line each, with
+bound parameters redacted unless ``DB_LOG_QUERY_PARAMS`` is enabled and sampled at
+``DB_SLOW_QUERY_SAMPLE_RATE``. :class:`QueryStatsMiddleware` counts the statements
+issued while serving each request and logs a warning when the same statement runs
+``DB_N_PLUS_ONE_THRESHOLD`` times or more, the usual signature of an N+1 pattern.
+"""
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncEngine
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Optional, Union
+import json
+import logging
+import os
+import random
+import re
+import time
+
+logger = logging.getLogger(__name__)
+
+SLOW_QUERY_MS = float(os.getenv("DB_SLOW_QUERY_MS", "200"))
+SLOW_QUERY_SAMPLE_RATE = float(os.getenv("DB_SLOW_QUERY_SAMPLE_RATE", "1.0"))
+LOG_QUERY_PARAMS = os.getenv("DB_LOG_QUERY_PARAMS", "false").lower() == "true"
+N_PLUS_ONE_THRESHOLD = int(os.getenv("DB_N_PLUS_ONE_THRESHOLD", "5"))
+MAX_STATEMENT_LENGTH = 2000
+
+_WHITESPACE = re.compile(r"\s+")
+
+@dataclass
+class QueryStats:
+    """Statements executed within one scope (a request or a ``count_queries`` block)."""
+    total: int = 0
+    duration_ms: float = 0.0
+    statements: Counter = field(default_factory=Counter)
+
+    def record(self, statement: str, duration_ms: float):
+        self.total += 1
+        self.duration_ms += duration_ms
+        self.statements[statement] += 1
+
+    def repeated(self, threshold: int) -> list:
+        """Statements executed at least ``threshold`` times, most frequent first."""
+        return [(statement, count) for statement, count in self.statements.most_common() if count >= threshold]
+
+_request_stats: ContextVar[Optional[QueryStats]] = ContextVar("request_query_stats", default=None)
+_request_path: ContextVar[Optional[str]] = ContextVar("request_path", default=None)
+
+def normalize_statement(statement: str) -> str:
+    return _WHITESPACE.sub(" ", statement).strip()[:MAX_STATEMENT_LENGTH]
+
+def redact_params(parameters, log_values: bool = LOG_QUERY_PARAMS):
+    """Replace bound values by their type name unless value logging is enabled."""
+    def redact(value):
+        if log_values:
+            return value if not isinstance(value, (str, bytes)) else value[:100]
+        return f"<{type(value).__name__}>"
+
+    if isinstance(parameters, dict):
+        return {key: redact(value) for key, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        if parameters and isinstance(parameters[0], (list, tuple, dict)):
+            # executemany: only describe the first row
+            return {"rows": len(parameters), "first": redact_params(parameters[0], log_values)}
+        return [redact(value) for value in parameters]
+    return parameters
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info["query_start_time"].pop()
+    duration_ms = (time.perf_counter() - started) * 1000
+    normalized = None
+
+    stats = _request_stats.get()
+    if stats is not None:
+        normalized = normalize_statement(statement)
+        stats.record(normalized, duration_ms)
+
+    if duration_ms >= SLOW_QUERY_MS and random.random() < SLOW_QUERY_SAMPLE_RATE:
+        logger.warning(json.dumps({
+            "event": "slow_query",
+            "duration_ms": round(duration_ms, 2),
+            "threshold_ms": SLOW_QUERY_MS,
+            "statement": normalized or normalize_statement(statement),
+            "params": redact_params(parameters),
+            "executemany": executemany,
+            "path": _request_path.get(),
+        }, default=str))
+
+def _sync_engine(engine: Union[Engine, AsyncEngine]) -> Engine:
+    return engine.sync_engine if isinstance(engine, AsyncEngine) else engine
+
+def instrument_engine(engine: Union[Engine, AsyncEngine]):
+    """Attach the slow-query log and per-request statement counting to an engine."""
+    sync_engine = _sync_engine(engine)
+    if not event.contains(sync_engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(sync_engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(sync_engine, "after_cursor_execute", _after_cursor_execute)
+
+@contextmanager
+def count_queries(engine: Union[Engine, AsyncEngine]):
+    """
+    Count every statement executed on ``engine`` inside the block, from any task or thread.
+
+    Yields:
+        QueryStats: Filled in as statements run
+    """
+    sync_engine = _sync_engine(engine)
+    stats = QueryStats()
+
+    def before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("count_queries_start", []).append(time.perf_counter())
+
+    def after(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info["count_queries_start"].pop()
+        stats.record(normalize_statement(statement), (time.perf_counter() - started) * 1000)
+
+    event.listen(sync_engine, "before_cursor_execute", before)
+    event.listen(sync_engine, "after_cursor_execute", after)
+    try:
+        yield stats
+    finally:
+        event.remove(sync_engine, "before_cursor_execute", before)
+        event.remove(sync_engine, "after_cursor_execute", after)
+
+class QueryStatsMiddleware:
+    """
+    ASGI middleware that scopes statement counting to each HTTP request and flags
+    statements repeated ``threshold`` times or more.
+    """
+
+    def __init__(self, app, threshold: int = N_PLUS_ONE_THRESHOLD):
+        self.app = app
+        self.threshold = threshold
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = QueryStats()
+        stats_token = _request_stats.set(stats)
+        path_token = _request_path.set(scope.get("path"))
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _request_stats.reset(stats_token)
+            _request_path.reset(path_token)
+            repeated = stats.repeated(self.threshold)
+            if repeated:
+                statement, count = repeated[0]
+                logger.warning(json.dumps({
+                    "event": "n_plus_one",
+                    "method": scope.get("method"),
+                    "path": scope.get("path"),
+                    "statement": statement,
+                    "count": count,
+                    "total_statements": stats.total,
+                }))
@@ -0,0 +1,207 @@
+"""
+Upgrade of databases created by earlier releases.
+
+``create_all`` only creates missing tables, it never alters existing ones. The columns
+added since to tables that already existed are listed in ``ADDED_COLUMNS``, in the
+order they were introduced, and ``add_missing_columns`` adds the ones a database
+lacks. It runs in ``init_db`` right after ``create_all``: every listed column is
+nullable or has a constant server default, which Postgres (11+) adds to the catalog
+without rewriting the table. Foreign keys are added inline with the column.
+
+Missing indexes are not built at startup, an index build reads the whole table. They
+are listed in a warning and built by an explicit step::
+
+    python -m backend.utils.schema
+
+which uses ``CREATE INDEX CONCURRENTLY`` on Postgres and so never blocks writes. The
+same step backfills the data the new columns derive from existing rows, see
+``backfill_session_counters``. The full-text index has its own step, see
+``backend.utils.search``.
+"""
+from backend import models  # registers every table on Base.metadata
+from backend.models.base import Base
+from sqlalchemy import Column, Index, func, inspect, select, text, update
+from sqlalchemy.engine import Connection
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.schema import CreateColumn, CreateIndex
+from typing import Dict, List, Set
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+# ``table.column`` of the columns added to existing tables, oldest first. Tables
+# created after the first release are created whole and never listed.
+ADDED_COLUMNS = (
+    # Token usage and latency of the replies
+    "messages.model", "messages.prompt_tokens", "messages.completion_tokens", "messages.latency_ms", "messages.ttft_ms",
+    # Version counters of the ETags and delta sync
+    "users.agents_version", "users.sessions_version", "agents.version", "chat_sessions.version",
+    "chat_sessions.messages_version", "messages.version",
+    # Soft deletes
+    "agents.deleted_at", "chat_sessions.deleted_at",
+    # Archived sessions
+    "chat_sessions.archived_at",
+    # Session overview counters
+    "chat_sessions.message_count", "chat_sessions.last_message_at", "chat_sessions.last_message_preview",
+    # Invalidation of the cached knowledge indexes
+    "agents.knowledge_version",
+    # Per-agent model settings
+    "agents.chat_model", "agents.fallback_models", "agents.temperature", "agents.max_tokens",
+    "agents.chat_timeout_seconds", "agents.max_latency_ms", "agents.tts_model", "agents.tts_voice", "agents.stt_model",
+    # Branches
+    "chat_sessions.parent_session_id", "chat_sessions.parent_message_id",
+    # Tool calling
+    "agents.tools",
+)
+
+def missing_columns(connection: Connection) -> List[Column]:
+    """Columns of ``ADDED_COLUMNS`` absent from the existing tables."""
+    inspector = inspect(connection)
+    tables = set(inspector.get_table_names())
+    present: Dict[str, Set[str]] = {}
+    missing = []
+    for name in ADDED_COLUMNS:
+        table_name, column_name = name.split(".")
+        if table_name not in tables:
+            continue
+        if table_name not in present:
+            present[table_name] = {column["name"] for column in inspector.get_columns(table_name)}
+        if column_name not in present[table_name]:
+            missing.append(Base.metadata.tables[table_name].c[column_name])
+    return missing
+
+def add_column_ddl(column: Column, dialect) -> str:
+    preparer = dialect.identifier_preparer
+    ddl = str(CreateColumn(column).compile(dialect=dialect))
+    for foreign_key in column.foreign_keys:
+        target = foreign_key.column
+        ddl += f" REFERENCES {preparer.format_table(target.table)} ({preparer.quote(target.name)})"
+        if foreign_key.ondelete:
+            ddl += f" ON DELETE {foreign_key.ondelete}"
+    # Concurrent starts of several workers may race, Postgres tolerates the loser
+    if_not_exists = " IF NOT EXISTS" if dialect.name == "postgresql" else ""
+    return f"ALTER TABLE {preparer.format_table(column.table)} ADD COLUMN{if_not_exists} {ddl}"
+
+def add_missing_columns(connection: Connection) -> List[str]:
+    """Add the listed columns the existing tables lack, returns them as ``table.column``."""
+    added = []
+    for column in missing_columns(connection):
+        connection.execute(text(add_column_ddl(column, connection.dialect)))
+        added.append(f"{column.table.name}.{column.name}")
+    if added:
+        logger.info(f"Added columns: {added}")
+    return added
+
+def missing_indexes(connection: Connection) -> List[Index]:
+    """Model indexes absent from the existing tables, on columns those tables have."""
+    inspector = inspect(connection)
+    tables = set(inspector.get_table_names())
+    missing = []
+    for table in Base.metadata.sorted_tables:
+        if table.name in tables:
+            present = {index["name"] for index in inspector.get_indexes(table.name)}
+            columns = {column["name"] for column in inspector.get_columns(table.name)}
+            missing += [
+                index for index in table.indexes
+                if index.name not in present and {column.name for column in index.columns} <= columns
+            ]
+    return missing
+
+def create_missing_indexes(connection: Connection) -> List[str]:
+    """
+    Build the missing indexes, concurrently on Postgres. ``connection`` must be in
+    autocommit mode there, ``CREATE INDEX CONCURRENTLY`` cannot run in a transaction.
+    Partitioned tables do not support concurrent builds and get a plain one.
+    """
+    partitioned = set()
+    if connection.dialect.name == "postgresql":
+        partitioned = set(connection.execute(text(
+            "SELECT c.relname FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid"
+        )).scalars().all())
+    created = []
+    for index in missing_indexes(connection):
+        ddl = str(CreateIndex(index, if_not_exists=True).compile(dialect=connection.dialect))
+        if connection.dialect.name == "postgresql" and index.table.name not in partitioned:
+            ddl = ddl.replace("CREATE INDEX", "CREATE INDEX CONCURRENTLY", 1)
+        connection.execute(text(ddl))
+        created.append(index.name)
+    return created
+
+def backfill_session_counters(connection: Connection) -> int:
+    """
+    Derive the message counters of the sessions from their messages, returns the number
+    of sessions updated. Messages written before the versions existed still have
+    version 0; they are numbered in order after the session's ``messages_version``,
+    so delta sync sees them as new. Then ``message_count``, ``last_message_at``,
+    ``last_message_preview`` and ``messages_version`` are set wherever they disagree
+    with the messages. Sessions already in step are not touched, a second run is a
+    no-op. Archived and deleted sessions have no messages left to count and are skipped.
+    """
+    from backend.services.message_writer import MESSAGE_PREVIEW_LENGTH, message_preview
+
+    sessions = Base.metadata.tables["chat_sessions"]
+    messages = Base.metadata.tables["messages"]
+    live = (messages.c.session_id == sessions.c.id) & sessions.c.archived_at.is_(None) & sessions.c.deleted_at.is_(None)
+
+    numbered = select(
+        messages.c.id,
+        (sessions.c.messages_version + func.row_number().over(
+            partition_by=messages.c.session_id, order_by=(messages.c.created_at, messages.c.id)
+        )).label("version"),
+    ).join(sessions, live).where(messages.c.version == 0).subquery()
+    connection.execute(update(messages).where(messages.c.id == numbered.c.id).values(version=numbered.c.version))
+
+    # Only the head of the latest message is read, the preview cuts it anyway
+    content = select(func.substr(messages.c.content, 1, MESSAGE_PREVIEW_LENGTH + 1)).where(
+        messages.c.session_id == sessions.c.id
+    ).order_by(messages.c.created_at.desc(), messages.c.id.desc()).limit(1).scalar_subquery()
+    counted = select(
+        messages.c.session_id,
+        func.count().label("count"),
+        func.max(messages.c.created_at).label("last_at"),
+        func.max(messages.c.version).label("version"),
+    ).group_by(messages.c.session_id).subquery()
+    rows = connection.execute(
+        select(
+            sessions.c.id, counted.c.count, counted.c.last_at, sessions.c.messages_version, counted.c.version, content
+        )
+        .join(counted, counted.c.session_id == sessions.c.id)
+        .where(sessions.c.archived_at.is_(None), sessions.c.deleted_at.is_(None))
+        .where((sessions.c.message_count != counted.c.count) | (sessions.c.messages_version < counted.c.version))
+    ).all()
+    for session_id, count, last_at, messages_version, version, content in rows:
+        connection.execute(
+            update(sessions).where(sessions.c.id == session_id).values(
+                message_count=count,
+                last_message_at=last_at,
+                last_message_preview=message_preview(content),
+                messages_version=max(messages_version, version),
+            )
+        )
+    if rows:
+        logger.info(f"Backfilled the message counters of {len(rows)} sessions")
+    return len(rows)
+
+async def migrate(engine: AsyncEngine) -> List[str]:
+    """Add missing columns and backfill them, then build missing indexes; the explicit upgrade step."""
+    async with engine.begin() as connection:
+        await connection.run_sync(add_missing_columns)
+        await connection.run_sync(backfill_session_counters)
+    async with engine.connect() as connection:
+        connection = await connection.execution_options(isolation_level="AUTOCOMMIT")
+        created = await connection.run_sync(create_missing_indexes)
+    if created:
+        logger.info(f"Created indexes: {created}")
+    return created
+
+async def _main():
+    from backend.utils.database import engine
+    try:
+        await migrate(engine)
+    finally:
+        await engine.dispose()
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(_main())
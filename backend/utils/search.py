@@ -0,0 +1,132 @@
+"""
+Full-text index over ``messages.content``.
+
+On Postgres the index is a GIN expression index on ``to_tsvector(SEARCH_LANGUAGE,
+content)``, which the search query repeats so the planner uses it. It is not created
+at startup: building it on a large table takes long, so it is an explicit step run
+once per database (and again after changing ``SEARCH_LANGUAGE``)::
+
+    python -m backend.utils.search
+
+which uses ``CREATE INDEX CONCURRENTLY`` and so never blocks writes. On a
+partitioned ``messages`` the parent index is created ``ON ONLY`` the parent, each
+partition is indexed concurrently and attached; partitions created later inherit
+it. Search works without the index, as a scan. On SQLite an external-content FTS5
+table ``messages_fts`` mirrors the column through triggers, so the tests exercise a
+real index as well; it is cheap to create and is added after every ``create_all``
+(see the listeners at the bottom).
+
+Neither is part of the ``Message`` model: the DDL is dialect specific and idempotent.
+"""
+from backend.models.base import Base
+from sqlalchemy import event, inspect, text
+from sqlalchemy.engine import Connection
+from sqlalchemy.ext.asyncio import AsyncEngine
+import asyncio
+import logging
+import os
+import re
+
+logger = logging.getLogger(__name__)
+
+# Text search configuration of the Postgres index, part of its name so that a change
+# makes the migration build a new index
+SEARCH_LANGUAGE = os.getenv("SEARCH_LANGUAGE", "english")
+
+if not re.fullmatch(r"[a-z_]+", SEARCH_LANGUAGE):
+    raise ValueError(f"Invalid SEARCH_LANGUAGE {SEARCH_LANGUAGE!r}")
+
+POSTGRES_INDEX = f"ix_messages_content_tsv_{SEARCH_LANGUAGE}"
+POSTGRES_INDEX_EXPRESSION = f"to_tsvector('{SEARCH_LANGUAGE}'::regconfig, content)"
+
+SQLITE_DDL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5("
+    "content, content='messages', content_rowid='id', tokenize='porter unicode61')",
+    "CREATE TRIGGER IF NOT EXISTS messages_fts_insert AFTER INSERT ON messages BEGIN "
+    "INSERT INTO messages_fts(rowid, content) VALUES (new.id, new.content); END",
+    "CREATE TRIGGER IF NOT EXISTS messages_fts_delete AFTER DELETE ON messages BEGIN "
+    "INSERT INTO messages_fts(messages_fts, rowid, content) VALUES ('delete', old.id, old.content); END",
+    "CREATE TRIGGER IF NOT EXISTS messages_fts_update AFTER UPDATE OF content ON messages BEGIN "
+    "INSERT INTO messages_fts(messages_fts, rowid, content) VALUES ('delete', old.id, old.content); "
+    "INSERT INTO messages_fts(rowid, content) VALUES (new.id, new.content); END",
+)
+
+def _postgres_index_valid(connection: Connection, name: str):
+    """True or False if the index exists and is valid or not, None if it does not exist."""
+    return connection.execute(text(
+        "SELECT i.indisvalid FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid WHERE c.relname = :name"
+    ), {"name": name}).scalar()
+
+def _create_postgres_index(connection: Connection, name: str, table_name: str, only: bool = False):
+    # A failed concurrent build leaves an invalid index behind, which is rebuilt
+    if _postgres_index_valid(connection, name) is False and not only:
+        connection.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+    concurrently = "" if only else "CONCURRENTLY "
+    target = f"ONLY {table_name}" if only else table_name
+    connection.execute(text(
+        f"CREATE INDEX {concurrently}IF NOT EXISTS {name} ON {target} USING GIN ({POSTGRES_INDEX_EXPRESSION})"
+    ))
+
+def create_postgres_search_index(connection: Connection):
+    """
+    Build the GIN index without blocking writes. ``connection`` must be in autocommit
+    mode, ``CREATE INDEX CONCURRENTLY`` cannot run inside a transaction.
+    """
+    partitions = connection.execute(text(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = 'messages'::regclass ORDER BY c.relname"
+    )).scalars().all()
+    if not partitions:
+        _create_postgres_index(connection, POSTGRES_INDEX, "messages")
+        return
+    _create_postgres_index(connection, POSTGRES_INDEX, "messages", only=True)
+    for partition in partitions:
+        name = f"ix_{partition}_content_tsv_{SEARCH_LANGUAGE}"
+        _create_postgres_index(connection, name, partition)
+        # A no-op for an index that is attached already
+        connection.execute(text(f"ALTER INDEX {POSTGRES_INDEX} ATTACH PARTITION {name}"))
+
+def create_search_index(connection: Connection):
+    """Create the SQLite full-text index if it does not exist yet, run after every ``create_all``."""
+    if connection.dialect.name != "sqlite" or not inspect(connection).has_table("messages"):
+        return
+    existed = inspect(connection).has_table("messages_fts")
+    for statement in SQLITE_DDL:
+        connection.execute(text(statement))
+    if not existed:
+        # Index the rows written before the table existed
+        connection.execute(text("INSERT INTO messages_fts(messages_fts) VALUES ('rebuild')"))
+        logger.info("Created the messages_fts full-text index")
+
+async def migrate(engine: AsyncEngine):
+    """Create the full-text index of ``engine``'s database, the explicit step for Postgres."""
+    async with engine.connect() as connection:
+        connection = await connection.execution_options(isolation_level="AUTOCOMMIT")
+        if connection.dialect.name == "postgresql":
+            await connection.run_sync(create_postgres_search_index)
+            logger.info(f"Created the {POSTGRES_INDEX} full-text index")
+        else:
+            await connection.run_sync(create_search_index)
+
+def drop_search_index(connection: Connection):
+    if connection.dialect.name == "sqlite":
+        connection.execute(text("DROP TABLE IF EXISTS messages_fts"))
+
+@event.listens_for(Base.metadata, "after_create")
+def _after_create(target, connection, **kwargs):
+    create_search_index(connection)
+
+@event.listens_for(Base.metadata, "before_drop")
+def _before_drop(target, connection, **kwargs):
+    drop_search_index(connection)
+
+async def _main():
+    from backend.utils.database import engine
+    try:
+        await migrate(engine)
+    finally:
+        await engine.dispose()
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(_main())
@@ -0,0 +1,79 @@
+"""
+Fast serialization path for large list responses.
+
+Handlers select only the columns of the response model as Core rows, turn them into
+plain dicts and encode them with orjson, bypassing the per-object response model
+validation FastAPI would otherwise run. The column lists here must stay in sync with
+the corresponding response schemas, which are still declared on the routes for the
+OpenAPI documentation.
+"""
+from backend.models.agent import Agent
+from backend.models.chat import ChatSession, Message
+from fastapi import Response
+from typing import Optional, Sequence
+import orjson
+
+MESSAGE_COLUMNS = (
+    Message.id,
+    Message.session_id,
+    Message.content,
+    Message.is_user,
+    Message.created_at,
+    Message.audio_url,
+    Message.model,
+    Message.prompt_tokens,
+    Message.completion_tokens,
+    Message.latency_ms,
+    Message.ttft_ms,
+)
+
+AGENT_COLUMNS = (
+    Agent.id,
+    Agent.name,
+    Agent.prompt,
+    Agent.created_at,
+    Agent.user_id,
+    Agent.chat_model,
+    Agent.fallback_models,
+    Agent.temperature,
+    Agent.max_tokens,
+    Agent.chat_timeout_seconds,
+    Agent.max_latency_ms,
+    Agent.tts_model,
+    Agent.tts_voice,
+    Agent.stt_model,
+    Agent.tools,
+)
+
+SESSION_COLUMNS = (
+    ChatSession.id,
+    ChatSession.agent_id,
+    ChatSession.created_at,
+    ChatSession.parent_session_id,
+    ChatSession.parent_message_id,
+)
+SESSION_OVERVIEW_COLUMNS = SESSION_COLUMNS + (
+    Agent.name.label("agent_name"),
+    ChatSession.message_count,
+    ChatSession.last_message_at,
+    ChatSession.last_message_preview,
+)
+
+# UTC datetimes are rendered with a "Z" suffix, like Pydantic does
+ORJSON_OPTIONS = orjson.OPT_UTC_Z
+
+def column_keys(columns: Sequence) -> tuple:
+    return tuple(column.key for column in columns)
+
+def rows_to_dicts(rows, keys: Sequence[str]) -> list:
+    """Convert result rows into dicts keyed by ``keys`` without building ORM objects."""
+    return [dict(zip(keys, row)) for row in rows]
+
+def json_response(payload, status_code: int = 200, headers: Optional[dict] = None) -> Response:
+    """Encode an already validated payload with orjson."""
+    return Response(
+        content=orjson.dumps(payload, option=ORJSON_OPTIONS),
+        status_code=status_code,
+        headers=headers,
+        media_type="application/json",
+    )